@@ -0,0 +1,338 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Caches the artifacts that packages download onto VMs.
+
+Packages such as ycsb and hadoop download the same tarballs onto every VM.
+With --artifact_cache, each artifact is instead downloaded once, into a cache
+on the PKB controller that persists across runs, and VMs get their copy from
+there:
+
+  push: the controller copies the artifact to each VM over SSH.
+  mirror: the controller serves the cache over HTTP, and VMs download the
+      artifact from --artifact_cache_host. Any other host that serves a copy
+      of the cache directory, such as one of the VMs, works too.
+
+The cache is content addressed: each artifact is stored once, under its
+SHA-256 digest, and an index maps URLs to digests.
+"""
+
+import BaseHTTPServer
+import collections
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import SimpleHTTPServer
+import SocketServer
+import tempfile
+import threading
+import urllib2
+import urlparse
+
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import events
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import temp_dir
+from perfkitbenchmarker import vm_util
+
+NONE = 'none'
+PUSH = 'push'
+MIRROR = 'mirror'
+
+flags.DEFINE_enum('artifact_cache', NONE, [NONE, PUSH, MIRROR],
+                  'How VMs get the artifacts, such as tarballs, that '
+                  'packages download. "none": each VM downloads them. '
+                  '"push": the controller downloads them into its artifact '
+                  'cache and copies them to each VM. "mirror": the controller '
+                  'downloads them into its artifact cache and serves them '
+                  'over HTTP to the VMs.')
+flags.DEFINE_string('artifact_cache_dir', None,
+                    'Directory of the artifact cache. Defaults to a '
+                    'directory under --temp_dir, so that artifacts are reused '
+                    'across runs.')
+flags.DEFINE_string('artifact_cache_host', None,
+                    'With --artifact_cache=mirror, the address of the '
+                    'controller, as seen by the VMs.')
+flags.DEFINE_integer('artifact_cache_port', 0,
+                     'With --artifact_cache=mirror, the port the controller '
+                     'serves the artifact cache on. The default, 0, picks any '
+                     'free port.')
+
+FLAGS = flags.FLAGS
+
+_INDEX_FILE = 'index.json'
+_BLOB_DIR = 'sha256'
+_BLOB_PATH_RE = re.compile(r'^/%s/([0-9a-f]{64})$' % _BLOB_DIR)
+_CHUNK_SIZE = 1024 * 1024
+# Seconds to wait for the origin server to connect or send more data.
+_DOWNLOAD_TIMEOUT = 60
+
+
+class ArtifactChecksumError(Exception):
+  """Raised when an artifact does not have the expected SHA-256 digest."""
+  pass
+
+
+def BlobName(digest):
+  """Returns the path of an artifact relative to the root of a cache."""
+  return posixpath.join(_BLOB_DIR, digest)
+
+
+class ArtifactCache(object):
+  """A content-addressed cache of downloaded artifacts.
+
+  Artifacts are downloaded into a temporary file and renamed into place, so
+  the cache can be shared by concurrent PKB runs. Within a run, concurrent
+  fetches of the same URL download it once.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._lock = threading.Lock()
+    self._url_locks = collections.defaultdict(threading.Lock)
+
+  def GetPath(self, digest):
+    """Returns the local path of a cached artifact."""
+    return os.path.join(self.path, BlobName(digest))
+
+  def _ReadIndex(self):
+    try:
+      with open(os.path.join(self.path, _INDEX_FILE)) as index_file:
+        return json.load(index_file)
+    except (IOError, ValueError):
+      return {}
+
+  def _AddToIndex(self, url, digest):
+    with self._lock:
+      index = self._ReadIndex()
+      index[url] = digest
+      fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.index-')
+      with os.fdopen(fd, 'w') as tmp_file:
+        json.dump(index, tmp_file, indent=2, sort_keys=True)
+      os.rename(tmp_path, os.path.join(self.path, _INDEX_FILE))
+
+  def Lookup(self, url, sha256=None):
+    """Returns the digest of a cached artifact, or None if it is not cached.
+
+    Args:
+      url: string. URL the artifact is downloaded from.
+      sha256: string or None. Expected SHA-256 digest of the artifact. If set,
+          the artifact is found by digest, whatever URL it was cached from.
+    """
+    digest = sha256.lower() if sha256 else self._ReadIndex().get(url)
+    if digest and os.path.exists(self.GetPath(digest)):
+      return digest
+    return None
+
+  def Fetch(self, url, sha256=None):
+    """Downloads an artifact into the cache, unless it is already cached.
+
+    Args:
+      url: string. URL to download the artifact from.
+      sha256: string or None. Expected SHA-256 digest of the artifact.
+
+    Returns:
+      The SHA-256 digest of the artifact.
+
+    Raises:
+      ArtifactChecksumError: If the artifact does not match sha256.
+    """
+    with self._lock:
+      url_lock = self._url_locks[url]
+    with url_lock:
+      digest = self.Lookup(url, sha256)
+      if digest:
+        logging.info('Artifact cache hit for %s (%s).', url, digest)
+        return digest
+      digest = self._Download(url, sha256)
+      self._AddToIndex(url, digest)
+      return digest
+
+  def _Download(self, url, sha256):
+    blob_dir = os.path.join(self.path, _BLOB_DIR)
+    try:
+      os.makedirs(blob_dir)
+    except OSError:
+      if not os.path.isdir(blob_dir):
+        raise
+    logging.info('Downloading %s into the artifact cache.', url)
+    fd, tmp_path = tempfile.mkstemp(dir=blob_dir, prefix='.download-')
+    hasher = hashlib.sha256()
+    try:
+      with os.fdopen(fd, 'wb') as tmp_file:
+        response = urllib2.urlopen(url, timeout=_DOWNLOAD_TIMEOUT)
+        for chunk in iter(lambda: response.read(_CHUNK_SIZE), b''):
+          hasher.update(chunk)
+          tmp_file.write(chunk)
+      digest = hasher.hexdigest()
+      if sha256 and digest != sha256.lower():
+        raise ArtifactChecksumError(
+            '{0} has SHA-256 digest {1}, expected {2}.'.format(
+                url, digest, sha256))
+      os.rename(tmp_path, self.GetPath(digest))
+    finally:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return digest
+
+
+class _ArtifactRequestHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+  """Serves the artifacts of the server's cache, and nothing else."""
+
+  def translate_path(self, path):
+    cache = self.server.cache
+    match = _BLOB_PATH_RE.match(urlparse.urlsplit(path).path)
+    if not match:
+      # A path that does not exist, so that the request fails with a 404.
+      return os.path.join(cache.path, _BLOB_DIR, 'invalid')
+    return cache.GetPath(match.group(1))
+
+  def list_directory(self, path):
+    self.send_error(404)
+
+  def log_message(self, format, *args):
+    logging.debug('Artifact server: ' + format, *args)
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+
+
+class ArtifactServer(object):
+  """Serves the artifacts of an ArtifactCache over HTTP.
+
+  Artifacts are served at /sha256/<digest>, see BlobName.
+
+  Attributes:
+    port: int. The port the server listens on.
+  """
+
+  def __init__(self, cache, port=0, address=''):
+    """Initializes the server.
+
+    Args:
+      cache: ArtifactCache. The cache to serve.
+      port: int. The port to listen on, or 0 for any free port.
+      address: string. The address to listen on, or '' for all addresses.
+    """
+    self._server = _ThreadingHTTPServer((address, port),
+                                        _ArtifactRequestHandler)
+    self._server.cache = cache
+    self.port = self._server.server_address[1]
+    self._thread = threading.Thread(target=self._server.serve_forever,
+                                    name='ArtifactServer')
+    self._thread.daemon = True
+
+  def Start(self):
+    self._thread.start()
+    logging.info('Serving the artifact cache on port %d.', self.port)
+
+  def Stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+    self._thread.join()
+
+
+_cache = None
+_server = None
+_lock = threading.Lock()
+
+
+def _GetCache():
+  global _cache
+  with _lock:
+    if _cache is None:
+      _cache = ArtifactCache(FLAGS.artifact_cache_dir or
+                             temp_dir.GetArtifactCacheDirPath())
+    return _cache
+
+
+def _GetMirrorUrl(digest):
+  """Returns the URL of an artifact on the mirror, starting it if needed."""
+  global _server
+  if not FLAGS.artifact_cache_host:
+    raise errors.Setup.InvalidFlagConfigurationError(
+        '--artifact_cache=mirror requires --artifact_cache_host.')
+  cache = _GetCache()
+  with _lock:
+    if _server is None:
+      _server = ArtifactServer(cache, FLAGS.artifact_cache_port)
+      _server.Start()
+  return 'http://{0}:{1}/{2}'.format(FLAGS.artifact_cache_host, _server.port,
+                                     BlobName(digest))
+
+
+def _StopServer(sender, benchmark_spec):
+  """Stops the mirror, if it was started, at the end of a benchmark."""
+  global _server
+  with _lock:
+    server, _server = _server, None
+  if server:
+    server.Stop()
+
+
+events.benchmark_end.connect(_StopServer, weak=False)
+
+
+def InstallArtifact(vm, url, remote_path, sha256=None):
+  """Puts an artifact onto a VM, getting it as --artifact_cache specifies.
+
+  Without an artifact cache and in mirror mode, the VM downloads the artifact
+  with curl, so 'curl' must be installed on it.
+
+  Args:
+    vm: VirtualMachine. The VM to put the artifact on.
+    url: string. URL of the artifact.
+    remote_path: string. Path of the artifact on the VM.
+    sha256: string or None. Expected SHA-256 digest of the artifact.
+
+  Raises:
+    ArtifactChecksumError: If the artifact, downloaded by the controller, does
+        not match sha256.
+  """
+  if FLAGS.artifact_cache != NONE:
+    digest = _GetCache().Fetch(url, sha256)
+    if FLAGS.artifact_cache == PUSH:
+      vm.PushFile(_GetCache().GetPath(digest), remote_path)
+      return
+    url = _GetMirrorUrl(digest)
+    sha256 = digest
+  command = 'curl -fL {0} -o {1}'.format(url, remote_path)
+  if sha256:
+    command += ' && echo "{0}  {1}" | sha256sum -c -'.format(
+        sha256, remote_path)
+  vm.RemoteCommand(command)
+
+
+def InstallTarball(vm, url, directory, sha256=None):
+  """Extracts a gzipped tarball artifact into a directory on a VM.
+
+  The top-level directory of the tarball is stripped.
+
+  Args:
+    vm: VirtualMachine. The VM to extract the tarball on.
+    url: string. URL of the tarball.
+    directory: string. Directory on the VM to extract the tarball into. It is
+        created if it does not exist.
+    sha256: string or None. Expected SHA-256 digest of the tarball.
+  """
+  tarball = posixpath.join(
+      vm_util.VM_TMP_DIR, posixpath.basename(urlparse.urlsplit(url).path))
+  InstallArtifact(vm, url, tarball, sha256)
+  vm.RemoteCommand('mkdir -p {0} && tar -C {0} --strip-components=1 -xzf {1} '
+                   '&& rm {1}'.format(directory, tarball))
@@ -49,6 +49,14 @@ While it would take a significant and impractical redesign of PKB's code to
 completely eliminate any risk of deadlock following a KeyboardInterrupt, the
 code in this module is designed to allow interrupting parallel tasks while
 keeping the risk of deadlock low.
+
+Threads are expensive to start and to shut down, and PKB runs parallel tasks
+dozens of times per benchmark, often nested (e.g. provisioning VMs, each of
+which creates disks in parallel). Tasks started by RunParallelThreads therefore
+run on long-lived worker threads from a process-wide pool. Each call borrows
+idle workers from the pool, starting new ones only when none are idle, and
+returns them when it completes, so nested calls can't deadlock on a full pool.
+GetWorkerPoolSamples reports how busy the pool was.
 """
 
 import abc
@@ -66,7 +74,9 @@ import traceback
 
 from perfkitbenchmarker import context
 from perfkitbenchmarker import errors
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import log_util
+from perfkitbenchmarker import sample
 
 
 # For situations where an interruptable wait is necessary, a loop of waits with
@@ -82,6 +92,13 @@ _WAIT_MAX_RECHECK_DELAY = 0.050  # 50 ms
 _THREAD_STOP_PROCESSING = 0
 _THREAD_WAIT_FOR_KEYBOARD_INTERRUPT = 1
 
+# The most idle workers kept by the worker pool. Workers returned to a pool
+# that already has this many idle workers are stopped.
+_MAX_IDLE_WORKERS = 256
+
+# Percentiles of the worker pool histograms that are added to sample metadata.
+_PERCENTILES = (50, 90, 99)
+
 
 def _GetCallString(target_arg_tuple):
   """Returns the string representation of a function call."""
@@ -218,6 +235,10 @@ class _BackgroundTask(object):
         otherwise.
     traceback: The traceback string if the call raised an exception, or None
         otherwise.
+    start_time: float. When the task started running, or None if it has not
+        run in this process.
+    end_time: float. When the task finished running, or None if it has not
+        run in this process.
   """
 
   def __init__(self, target, args, kwargs, thread_context):
@@ -227,14 +248,19 @@ class _BackgroundTask(object):
     self.context = thread_context
     self.return_value = None
     self.traceback = None
+    self.start_time = None
+    self.end_time = None
 
   def Run(self):
     """Sets the current thread context and executes the target."""
+    self.start_time = time.time()
     self.context.CopyToCurrentThread()
     try:
       self.return_value = self.target(*self.args, **self.kwargs)
     except Exception:
       self.traceback = traceback.format_exc()
+    finally:
+      self.end_time = time.time()
 
 
 class _BackgroundTaskManager(object):
@@ -291,27 +317,26 @@ class _BackgroundTaskManager(object):
     raise NotImplemented()
 
 
-def _ExecuteBackgroundThreadTasks(worker_id, task_queue, response_queue):
+def _ExecuteBackgroundThreadTasks(task_queue, response_queue):
   """Executes tasks received on a task queue.
 
-  Executed in a child Thread by _BackgroundThreadTaskManager.
+  Executed in a worker thread of the _WorkerPool.
 
   Args:
-    worker_id: int. Identifier for the child thread relative to other child
-        threads.
     task_queue: _NonPollingSingleReaderQueue. Queue from which input is read.
         Each value in the queue can be one of three types of values. If it is a
-        (task_id, _BackgroundTask) pair, the task is executed on this thread.
-        If it is _THREAD_STOP_PROCESSING, the thread stops executing. If it is
+        (worker_id, task_id, _BackgroundTask, response queue) tuple, the task
+        is executed on this thread, and (worker_id, task_id) is written to the
+        response queue, a _SingleReaderQueue, once it completes. If it is
+        _THREAD_STOP_PROCESSING, the thread stops executing. If it is
         _THREAD_WAIT_FOR_KEYBOARD_INTERRUPT, the thread waits for a
         KeyboardInterrupt.
-    response_queue: _SingleReaderQueue. Queue to which output is written. It
-        receives worker_id when this thread's bootstrap code has completed and
-        receives a (worker_id, task_id) pair for each task completed on this
-        thread.
+    response_queue: _SingleReaderQueue. Queue that receives None when this
+        thread's bootstrap code has completed.
   """
+  worker_id = None
   try:
-    response_queue.Put(worker_id)
+    response_queue.Put(None)
     while True:
       task_tuple = task_queue.Get()
       if task_tuple == _THREAD_STOP_PROCESSING:
@@ -319,9 +344,9 @@ def _ExecuteBackgroundThreadTasks(worker_id, task_queue, response_queue):
       elif task_tuple == _THREAD_WAIT_FOR_KEYBOARD_INTERRUPT:
         while True:
           time.sleep(_WAIT_MAX_RECHECK_DELAY)
-      task_id, task = task_tuple
+      worker_id, task_id, task, task_response_queue = task_tuple
       task.Run()
-      response_queue.Put((worker_id, task_id))
+      task_response_queue.Put((worker_id, task_id))
   except KeyboardInterrupt:
     # TODO(skschneider): Detect when the log would be unhelpful (e.g. if the
     # current thread was spinning in the _THREAD_WAIT_FOR_KEYBOARD_INTERRUPT
@@ -330,39 +355,204 @@ def _ExecuteBackgroundThreadTasks(worker_id, task_queue, response_queue):
                   'parent.', worker_id, exc_info=True)
 
 
+class _PoolWorker(object):
+  """A long-lived thread of the _WorkerPool.
+
+  Attributes:
+    task_queue: _NonPollingSingleReaderQueue. Queue of the tasks to execute,
+        see _ExecuteBackgroundThreadTasks.
+    thread: threading.Thread. The worker thread.
+    start_time: float. When the thread was started.
+    stop_time: float or None. When the thread was stopped, or None if it is
+        running.
+  """
+
+  def __init__(self, response_queue):
+    self.task_queue = _NonPollingSingleReaderQueue()
+    self.thread = threading.Thread(
+        target=_ExecuteBackgroundThreadTasks,
+        args=(self.task_queue, response_queue))
+    self.thread.daemon = True
+    self.start_time = time.time()
+    self.stop_time = None
+
+
+class _WorkerPool(object):
+  """A process-wide pool of worker threads.
+
+  Like the rest of this module, the pool avoids Locks: idle workers are kept in
+  a deque, whose appends and pops are atomic, so a KeyboardInterrupt can't
+  leave the pool locked.
+  """
+
+  def __init__(self):
+    self.pid = os.getpid()
+    self._idle_workers = deque()
+    # Every worker started, in the order started, for the statistics.
+    self.workers = []
+    self.statistics = _WorkerPoolStatistics(self)
+
+  def Acquire(self, num_workers):
+    """Borrows workers from the pool, starting new ones if too few are idle.
+
+    Args:
+      num_workers: int. Number of workers to borrow.
+
+    Returns:
+      list of _PoolWorker.
+    """
+    workers = []
+    while len(workers) < num_workers:
+      try:
+        workers.append(self._idle_workers.pop())
+      except IndexError:
+        break
+    new_workers = []
+    response_queue = _SingleReaderQueue()
+    for _ in xrange(num_workers - len(workers)):
+      worker = _PoolWorker(response_queue)
+      self.workers.append(worker)
+      new_workers.append(worker)
+      worker.thread.start()
+    # Wait for each Thread to finish its bootstrap code. Starting threads
+    # upfront like this and reusing them for later calls minimizes the risk of
+    # a KeyboardInterrupt interfering with any of the Lock interactions.
+    for _ in new_workers:
+      response_queue.Get()
+    return workers + new_workers
+
+  def Release(self, workers):
+    """Returns borrowed workers to the pool.
+
+    Workers whose thread stopped, e.g. after a KeyboardInterrupt, are dropped,
+    as are workers beyond _MAX_IDLE_WORKERS, whose thread is stopped.
+    """
+    for worker in workers:
+      if not worker.thread.is_alive():
+        worker.stop_time = worker.stop_time or time.time()
+      elif len(self._idle_workers) >= _MAX_IDLE_WORKERS:
+        worker.task_queue.Put(_THREAD_STOP_PROCESSING)
+        worker.stop_time = time.time()
+      else:
+        self._idle_workers.append(worker)
+
+
+class _WorkerPoolStatistics(object):
+  """Statistics of the tasks executed by a _WorkerPool.
+
+  Appends to lists are atomic, so tasks are recorded without Locks.
+  """
+
+  def __init__(self, pool):
+    self._pool = pool
+    self.Reset()
+
+  def Reset(self):
+    """Starts a new measurement interval."""
+    self.start_time = time.time()
+    self.queue_waits = []
+    # (start time, end time) of each task.
+    self.run_times = []
+
+  def AddTask(self, ready_time, task):
+    """Records a task that ran on the pool.
+
+    Args:
+      ready_time: float. When the task was ready to be started.
+      task: _BackgroundTask. The completed task.
+    """
+    self.queue_waits.append(max(task.start_time - ready_time, 0))
+    self.run_times.append((task.start_time, task.end_time))
+
+  def GetMaxBusyWorkers(self):
+    """Returns the most tasks that were running at the same time."""
+    events = sorted([(start, 1) for start, _ in self.run_times] +
+                    [(end, -1) for _, end in self.run_times])
+    busy = max_busy = 0
+    for _, change in events:
+      busy += change
+      max_busy = max(max_busy, busy)
+    return max_busy
+
+  def GetWorkerSeconds(self, end_time):
+    """Returns the total time workers were alive during the interval."""
+    total = 0.0
+    for worker in self._pool.workers:
+      start = max(worker.start_time, self.start_time)
+      stop = min(worker.stop_time or end_time, end_time)
+      total += max(stop - start, 0)
+    return total
+
+  def GetSamples(self):
+    """Returns Samples describing the interval, or [] if no task ran."""
+    if not self.run_times:
+      return []
+    now = time.time()
+    worker_seconds = self.GetWorkerSeconds(now)
+    durations = [end - start for start, end in self.run_times]
+    busy_seconds = sum(durations)
+    metadata = {'num_tasks': len(durations),
+                'num_workers': len(self._pool.workers),
+                'interval_seconds': now - self.start_time}
+    samples = [
+        sample.Sample('Worker Pool Utilization',
+                      (100.0 * busy_seconds / worker_seconds
+                       if worker_seconds else 0.0), '%', metadata),
+        sample.Sample('Worker Pool Peak Busy Workers',
+                      self.GetMaxBusyWorkers(), 'count', metadata)]
+    for metric, values in (('Worker Pool Queue Wait', self.queue_waits),
+                           ('Worker Pool Task Duration', durations)):
+      hist = histogram.Histogram.FromValues(values)
+      hist_metadata = metadata.copy()
+      hist_metadata['histogram'] = hist.ToJson()
+      for percentile, value in zip(_PERCENTILES,
+                                   hist.Percentiles(_PERCENTILES)):
+        hist_metadata['p{0}'.format(percentile)] = value
+      samples.append(sample.Sample(metric, sum(values) / len(values),
+                                   'seconds', hist_metadata))
+    return samples
+
+
+_worker_pool = None
+
+
+def _GetWorkerPool():
+  """Returns the worker pool of this process, creating it if needed."""
+  global _worker_pool
+  # Threads don't survive a fork, e.g. by RunParallelProcesses.
+  if _worker_pool is None or _worker_pool.pid != os.getpid():
+    _worker_pool = _WorkerPool()
+  return _worker_pool
+
+
+def ResetWorkerPoolStatistics():
+  """Starts a new interval for GetWorkerPoolSamples."""
+  _GetWorkerPool().statistics.Reset()
+
+
+def GetWorkerPoolSamples():
+  """Returns Samples describing the worker pool since the last reset.
+
+  The samples are the pool utilization (the share of the worker threads' time
+  spent running tasks), the peak number of busy workers, and the averages and
+  histograms of the time tasks waited before starting, including waits for the
+  concurrency limit or for dependencies, and of the task durations.
+  """
+  return _GetWorkerPool().statistics.GetSamples()
+
+
 class _BackgroundThreadTaskManager(_BackgroundTaskManager):
-  """Manages state for background tasks started in child threads."""
+  """Manages state for background tasks started on pooled worker threads."""
 
   def __init__(self, *args, **kwargs):
     super(_BackgroundThreadTaskManager, self).__init__(*args, **kwargs)
     self._response_queue = _SingleReaderQueue()
-    self._task_queues = []
-    self._threads = []
-    self._available_worker_ids = range(self._max_concurrency)
-    uninitialized_worker_ids = set(self._available_worker_ids)
-    for worker_id in self._available_worker_ids:
-      task_queue = _NonPollingSingleReaderQueue()
-      self._task_queues.append(task_queue)
-      thread = threading.Thread(
-          target=_ExecuteBackgroundThreadTasks,
-          args=(worker_id, task_queue, self._response_queue))
-      thread.daemon = True
-      self._threads.append(thread)
-      thread.start()
-    # Wait for each Thread to finish its bootstrap code. Starting all the
-    # threads upfront like this and reusing them for later calls minimizes the
-    # risk of a KeyboardInterrupt interfering with any of the Lock interactions.
-    for _ in self._threads:
-      worker_id = self._response_queue.Get()
-      uninitialized_worker_ids.remove(worker_id)
-    assert not uninitialized_worker_ids, uninitialized_worker_ids
+    self._pool = _GetWorkerPool()
+    self._workers = self._pool.Acquire(self._max_concurrency)
+    self._available_worker_ids = range(len(self._workers))
 
   def __exit__(self, *unused_args, **unused_kwargs):
-    # Shut down worker threads.
-    for task_queue in self._task_queues:
-      task_queue.Put(_THREAD_STOP_PROCESSING)
-    for thread in self._threads:
-      _WaitForCondition(lambda: not thread.is_alive())
+    self._pool.Release(self._workers)
 
   def StartTask(self, target, args, kwargs, thread_context):
     assert self._available_worker_ids, ('StartTask called when no threads were '
@@ -371,7 +561,8 @@ class _BackgroundThreadTaskManager(_BackgroundTaskManager):
     task_id = len(self.tasks)
     self.tasks.append(task)
     worker_id = self._available_worker_ids.pop()
-    self._task_queues[worker_id].Put((task_id, task))
+    self._workers[worker_id].task_queue.Put(
+        (worker_id, task_id, task, self._response_queue))
 
   def AwaitAnyTask(self):
     worker_id, task_id = self._response_queue.Get()
@@ -380,14 +571,15 @@ class _BackgroundThreadTaskManager(_BackgroundTaskManager):
 
   def HandleKeyboardInterrupt(self):
     # Raise a KeyboardInterrupt in each child thread.
-    for thread in self._threads:
+    threads = [worker.thread for worker in self._workers]
+    for thread in threads:
       ctypes.pythonapi.PyThreadState_SetAsyncExc(
           ctypes.c_long(thread.ident), ctypes.py_object(KeyboardInterrupt))
     # Wake threads up from possible non-interruptable wait states so they can
     # actually see the KeyboardInterrupt.
-    for task_queue, thread in zip(self._task_queues, self._threads):
-      task_queue.Put(_THREAD_WAIT_FOR_KEYBOARD_INTERRUPT)
-    for thread in self._threads:
+    for worker in self._workers:
+      worker.task_queue.Put(_THREAD_WAIT_FOR_KEYBOARD_INTERRUPT)
+    for thread in threads:
       _WaitForCondition(lambda: not thread.is_alive())
 
 
@@ -471,8 +663,51 @@ class _BackgroundProcessTaskManager(_BackgroundTaskManager):
     self._executor.shutdown(wait=True)
 
 
+def _GetDependents(dependencies):
+  """Inverts a task dependency list.
+
+  Args:
+    dependencies: list with one iterable of task indices per task. Element i
+        contains the indices of the tasks that must complete before task i is
+        started.
+
+  Returns:
+    list with one list of task indices per task. Element i contains the indices
+    of the tasks that depend on task i.
+
+  Raises:
+    ValueError: If a dependency index is invalid or the dependencies contain a
+        cycle.
+  """
+  num_tasks = len(dependencies)
+  dependents = [[] for _ in xrange(num_tasks)]
+  remaining = []
+  for index, task_dependencies in enumerate(dependencies):
+    task_dependencies = set(task_dependencies)
+    for dependency in task_dependencies:
+      if not 0 <= dependency < num_tasks or dependency == index:
+        raise ValueError('Task {0} has an invalid dependency: {1}'.format(
+            index, dependency))
+      dependents[dependency].append(index)
+    remaining.append(len(task_dependencies))
+  # Check that every task can eventually be started (Kahn's algorithm).
+  ready = [index for index in xrange(num_tasks) if not remaining[index]]
+  visited = 0
+  while ready:
+    index = ready.pop()
+    visited += 1
+    for dependent in dependents[index]:
+      remaining[dependent] -= 1
+      if not remaining[dependent]:
+        ready.append(dependent)
+  if visited != num_tasks:
+    raise ValueError('Task dependencies contain a cycle.')
+  return dependents
+
+
 def _RunParallelTasks(target_arg_tuples, max_concurrency, get_task_manager,
-                      parallel_exception_class):
+                      parallel_exception_class, dependencies=None,
+                      skip_dependents_on_failure=True):
   """Executes function calls concurrently in separate threads or processes.
 
   Args:
@@ -484,6 +719,13 @@ def _RunParallelTasks(target_arg_tuples, max_concurrency, get_task_manager,
         returns a _TaskManager.
     parallel_exception_class: Type of exception to raise upon an exception in
         one of the called functions.
+    dependencies: Optional list with one iterable of indices into
+        target_arg_tuples per call. A call is only started once all of the calls
+        it depends on have completed. If not provided, calls are started in
+        order as soon as the concurrency limit allows.
+    skip_dependents_on_failure: bool. If True, calls that directly or
+        indirectly depend on a call that raised an exception are not started.
+        If False, they are started regardless.
 
   Returns:
     list of function return values in the order corresponding to the order of
@@ -494,35 +736,57 @@ def _RunParallelTasks(target_arg_tuples, max_concurrency, get_task_manager,
         functions.
   """
   thread_context = _BackgroundTaskThreadContext()
-  max_concurrency = min(max_concurrency, len(target_arg_tuples))
+  num_tasks = len(target_arg_tuples)
+  max_concurrency = min(max_concurrency, num_tasks)
+  if dependencies is None:
+    dependencies = [()] * num_tasks
+  dependents = _GetDependents(dependencies)
+  remaining_dependencies = [len(set(d)) for d in dependencies]
+  ready_task_indices = deque(
+      index for index in xrange(num_tasks) if not remaining_dependencies[index])
+  # When each task was ready to be started.
+  ready_times = [time.time()] * num_tasks
+  # Index into target_arg_tuples of each started task, in the order started.
+  started_task_indices = []
   error_strings = []
-  started_task_count = 0
   active_task_count = 0
   with get_task_manager(max_concurrency) as task_manager:
     try:
-      while started_task_count < len(target_arg_tuples) or active_task_count:
-        if (started_task_count < len(target_arg_tuples) and
-            active_task_count < max_concurrency):
+      while ready_task_indices or active_task_count:
+        if ready_task_indices and active_task_count < max_concurrency:
           # Start a new task.
-          target, args, kwargs = target_arg_tuples[started_task_count]
+          index = ready_task_indices.popleft()
+          target, args, kwargs = target_arg_tuples[index]
           task_manager.StartTask(target, args, kwargs, thread_context)
-          started_task_count += 1
+          started_task_indices.append(index)
           active_task_count += 1
           continue
 
         # Wait for a task to complete.
         task_id = task_manager.AwaitAnyTask()
         active_task_count -= 1
+        index = started_task_indices[task_id]
+        task = task_manager.tasks[task_id]
+        if task.start_time is not None:
+          # Only tasks run on threads of this process are timed.
+          _GetWorkerPool().statistics.AddTask(ready_times[index], task)
         # If the task failed, it may still be a long time until all remaining
         # tasks complete. Log the failure immediately before continuing to wait
         # for other tasks.
-        stacktrace = task_manager.tasks[task_id].traceback
+        stacktrace = task.traceback
         if stacktrace:
           msg = ('Exception occurred while calling {0}:{1}{2}'.format(
-              _GetCallString(target_arg_tuples[task_id]), os.linesep,
+              _GetCallString(target_arg_tuples[index]), os.linesep,
               stacktrace))
           logging.error(msg)
           error_strings.append(msg)
+          if skip_dependents_on_failure:
+            continue
+        for dependent in dependents[index]:
+          remaining_dependencies[dependent] -= 1
+          if not remaining_dependencies[dependent]:
+            ready_task_indices.append(dependent)
+            ready_times[dependent] = time.time()
 
     except KeyboardInterrupt:
       logging.error(
@@ -531,6 +795,14 @@ def _RunParallelTasks(target_arg_tuples, max_concurrency, get_task_manager,
       task_manager.HandleKeyboardInterrupt()
       raise
 
+  if len(started_task_indices) < num_tasks:
+    started = set(started_task_indices)
+    for index in xrange(num_tasks):
+      if index not in started:
+        error_strings.append(
+            'Did not call {0} because a call it depends on failed.'.format(
+                _GetCallString(target_arg_tuples[index])))
+
   if error_strings:
     # TODO(skschneider): Combine errors.VmUtil.ThreadException and
     # errors.VmUtil.CalledProcessException so this can be a single exception
@@ -538,7 +810,9 @@ def _RunParallelTasks(target_arg_tuples, max_concurrency, get_task_manager,
     raise parallel_exception_class(
         'The following exceptions occurred during parallel execution:'
         '{0}{1}'.format(os.linesep, os.linesep.join(error_strings)))
-  results = [task.return_value for task in task_manager.tasks]
+  results = [None] * num_tasks
+  for index, task in zip(started_task_indices, task_manager.tasks):
+    results[index] = task.return_value
   assert len(target_arg_tuples) == len(results), (target_arg_tuples, results)
   return results
 
@@ -565,6 +839,45 @@ def RunParallelThreads(target_arg_tuples, max_concurrency):
       errors.VmUtil.ThreadException)
 
 
+def RunDependentThreads(target_arg_tuples, dependencies, max_concurrency,
+                        skip_dependents_on_failure=True):
+  """Executes function calls concurrently, respecting dependencies between them.
+
+  Each call is started in a separate thread as soon as every call it depends on
+  has completed and the concurrency limit allows, so independent chains of
+  calls overlap instead of being executed in fixed stages.
+
+  Args:
+    target_arg_tuples: list of (target, args, kwargs) tuples. Each tuple
+        contains the function to call and the arguments to pass it.
+    dependencies: list with one iterable of indices into target_arg_tuples per
+        call. Element i contains the indices of the calls that must complete
+        before call i is started.
+    max_concurrency: int or None. The maximum number of concurrent new
+        threads.
+    skip_dependents_on_failure: bool. If True, calls that directly or
+        indirectly depend on a call that raised an exception are not started.
+        If False, every call is started once its dependencies have completed,
+        whether or not they succeeded.
+
+  Returns:
+    list of function return values in the order corresponding to the order of
+    target_arg_tuples.
+
+  Raises:
+    ValueError: When the dependencies are invalid or contain a cycle.
+    errors.VmUtil.ThreadException: When an exception occurred in any of the
+        called functions, or when a call was skipped because a call it depends
+        on failed.
+  """
+  if len(dependencies) != len(target_arg_tuples):
+    raise ValueError('Expected one dependency list per call.')
+  return _RunParallelTasks(
+      target_arg_tuples, max_concurrency, _BackgroundThreadTaskManager,
+      errors.VmUtil.ThreadException, dependencies=dependencies,
+      skip_dependents_on_failure=skip_dependents_on_failure)
+
+
 def RunThreaded(target, thread_params, max_concurrent_threads=200):
   """Runs the target method in parallel threads.
 
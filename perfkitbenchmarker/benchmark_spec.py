@@ -22,8 +22,10 @@ import os
 import pickle
 import thread
 import threading
+import time
 import uuid
 
+from perfkitbenchmarker import background_tasks
 from perfkitbenchmarker import benchmark_status
 from perfkitbenchmarker import container_service
 from perfkitbenchmarker import context
@@ -31,9 +33,13 @@ from perfkitbenchmarker import disk
 from perfkitbenchmarker import dpb_service
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import lifecycle_batch
+from perfkitbenchmarker import network
 from perfkitbenchmarker import os_types
 from perfkitbenchmarker import provider_info
 from perfkitbenchmarker import providers
+from perfkitbenchmarker import resource_journal
+from perfkitbenchmarker import sample
 from perfkitbenchmarker import spark_service
 from perfkitbenchmarker import stages
 from perfkitbenchmarker import static_virtual_machine as static_vm
@@ -59,6 +65,9 @@ SUPPORTED = 'strict'
 NOT_EXCLUDED = 'permissive'
 SKIP_CHECK = 'none'
 
+# Maximum number of resources created or deleted concurrently.
+MAX_PROVISIONING_THREADS = 200
+
 FLAGS = flags.FLAGS
 
 flags.DEFINE_enum('cloud', providers.GCP,
@@ -112,6 +121,14 @@ class BenchmarkSpec(object):
     self.spark_service = None
     self.dpb_service = None
     self.container_cluster = None
+    # (operation, resource, start_time, stop_time) tuples recorded by Provision
+    # and Delete.
+    self.resource_timings = []
+    # Records resource changes since the last snapshot written by Pickle.
+    self.resource_journal = None
+    # Resources found in the journal that are not reachable from the spec,
+    # e.g. scratch disks created after the last snapshot. Deleted by Delete.
+    self.recovered_resources = []
 
     self._zone_index = 0
 
@@ -212,6 +229,12 @@ class BenchmarkSpec(object):
             spec.mount_point += str(i)
       vms.append(vm)
 
+    if FLAGS.batch_vm_lifecycle_calls:
+      cloud_vms = [cloud_vm for cloud_vm in vms if not cloud_vm.is_static]
+      group = lifecycle_batch.LifecycleGroup(group_name, cloud_vms)
+      for cloud_vm in cloud_vms:
+        cloud_vm.lifecycle_group = group
+
     return vms
 
   def _CheckBenchmarkSupport(self, cloud):
@@ -308,71 +331,150 @@ class BenchmarkSpec(object):
     targets = [(vm.PrepareBackgroundWorkload, (), {}) for vm in self.vms]
     vm_util.RunParallelThreads(targets, len(targets))
 
-  def Provision(self):
-    """Prepares the VMs and networks necessary for the benchmark to run."""
-    # Sort networks into a guaranteed order of creation based on dict key.
-    # There is a finite limit on the number of threads that are created to
-    # provision networks. Until support is added to provision resources in an
-    # order based on dependencies, this key ordering can be used to avoid
-    # deadlock by placing dependent networks later and their dependencies
-    # earlier. As an example, AWS stores both per-region and per-zone objects
-    # in this dict, and each per-zone object depends on a corresponding
-    # per-region object, so the per-region objects are given keys that come
-    # first when sorted.
-    networks = [self.networks[key] for key in sorted(self.networks.iterkeys())]
-    vm_util.RunThreaded(lambda net: net.Create(), networks)
+  def _GetResourceGraph(self):
+    """Returns the resources managed by the spec and their dependencies.
 
+    Dependencies are declared by each resource's GetProvisioningDependencies.
+    In addition, VMs running on a Kubernetes cluster depend on the spec's
+    container cluster, since creating it produces the kubeconfig they use.
+
+    Returns:
+      (resources, dependencies) tuple. resources is a list of networks, the
+      container cluster, VMs and the spark and dpb services. dependencies
+      contains one list per resource of the indices in resources that must be
+      created before it.
+    """
+    resources = [self.networks[key] for key in sorted(self.networks.iterkeys())]
     if self.container_cluster:
-      self.container_cluster.Create()
+      resources.append(self.container_cluster)
+    resources.extend(self.vms)
+    for service in self.spark_service, self.dpb_service:
+      if service:
+        resources.append(service)
+
+    indices = {id(resource): i for i, resource in enumerate(resources)}
+    dependencies = []
+    for resource in resources:
+      prerequisites = list(resource.GetProvisioningDependencies())
+      if (self.container_cluster and
+          isinstance(resource, virtual_machine.BaseVirtualMachine) and
+          resource.CLOUD == providers.KUBERNETES):
+        prerequisites.append(self.container_cluster)
+      dependencies.append(sorted({indices[id(p)] for p in prerequisites
+                                  if id(p) in indices}))
+    return resources, dependencies
+
+  def _TimeResourceOperation(self, operation, resource, function):
+    """Calls function and records how long it took.
+
+    Args:
+      operation: string. Either 'Create' or 'Delete'.
+      resource: The resource being created or deleted.
+      function: Callable that performs the operation.
+    """
+    start_time = time.time()
+    try:
+      function()
+    finally:
+      self.resource_timings.append(
+          (operation, resource, start_time, time.time()))
+
+  def _CreateResource(self, resource):
+    """Creates a single resource managed by the spec."""
+    if isinstance(resource, virtual_machine.BaseVirtualMachine):
+      self._TimeResourceOperation(
+          'Create', resource, lambda: self.PrepareVm(resource))
+    else:
+      self._TimeResourceOperation('Create', resource, resource.Create)
+
+  def _DeleteResource(self, resource):
+    """Deletes a single resource managed by the spec."""
+    if isinstance(resource, virtual_machine.BaseVirtualMachine):
+      self._TimeResourceOperation(
+          'Delete', resource, lambda: self.DeleteVm(resource))
+    elif isinstance(resource, network.BaseFirewall):
+      resource.DisallowAllPorts()
+    else:
+      self._TimeResourceOperation('Delete', resource, resource.Delete)
+
+  def Provision(self):
+    """Prepares the VMs and networks necessary for the benchmark to run.
+
+    Each resource is created as soon as the resources it depends on have been
+    created, so e.g. VMs in one zone are created while the network of another
+    zone is still being set up.
+    """
+    resources, dependencies = self._GetResourceGraph()
+    if resources:
+      background_tasks.RunDependentThreads(
+          [(self._CreateResource, (resource,), {}) for resource in resources],
+          dependencies, MAX_PROVISIONING_THREADS)
 
     if self.vms:
-      vm_util.RunThreaded(self.PrepareVm, self.vms)
       sshable_vms = [vm for vm in self.vms if vm.OS_TYPE != os_types.WINDOWS]
       sshable_vm_groups = {}
       for group_name, group_vms in self.vm_groups.iteritems():
         sshable_vm_groups[group_name] = [vm for vm in group_vms
                                          if vm.OS_TYPE != os_types.WINDOWS]
       vm_util.GenerateSSHConfig(sshable_vms, sshable_vm_groups)
-    if self.spark_service:
-      self.spark_service.Create()
-    if self.dpb_service:
-      self.dpb_service.Create()
 
   def Delete(self):
+    """Deletes the resources created by Provision.
+
+    Resources are deleted in the reverse order of their dependencies: a
+    resource is deleted once everything that depends on it has been deleted.
+    Firewall rules are removed after all VMs are deleted and before any
+    network is. Failures are logged and teardown continues.
+    """
     if self.deleted:
       return
 
-    if self.spark_service:
-      self.spark_service.Delete()
-
-    if self.dpb_service:
-      self.dpb_service.Delete()
-
-    if self.vms:
-      try:
-        vm_util.RunThreaded(self.DeleteVm, self.vms)
-      except Exception:
-        logging.exception('Got an exception deleting VMs. '
-                          'Attempting to continue tearing down.')
-
-    for firewall in self.firewalls.itervalues():
-      try:
-        firewall.DisallowAllPorts()
-      except Exception:
-        logging.exception('Got an exception disabling firewalls. '
-                          'Attempting to continue tearing down.')
-
-    for net in self.networks.itervalues():
+    resources, dependencies = self._GetResourceGraph()
+    dependents = [[] for _ in resources]
+    for index, prerequisites in enumerate(dependencies):
+      for prerequisite in prerequisites:
+        dependents[prerequisite].append(index)
+
+    firewalls = list(self.firewalls.itervalues())
+    vm_indices = [i for i, resource in enumerate(resources)
+                  if isinstance(resource, virtual_machine.BaseVirtualMachine)]
+    firewall_indices = range(len(resources), len(resources) + len(firewalls))
+    for _ in firewalls:
+      dependents.append(vm_indices)
+    for index, resource in enumerate(resources):
+      if isinstance(resource, network.BaseNetwork):
+        dependents[index].extend(firewall_indices)
+    resources.extend(firewalls)
+    # Recovered resources, such as disks, may be attached to VMs.
+    for _ in self.recovered_resources:
+      dependents.append(vm_indices)
+    resources.extend(self.recovered_resources)
+
+    if resources:
       try:
-        net.Delete()
+        background_tasks.RunDependentThreads(
+            [(self._DeleteResource, (resource,), {}) for resource in resources],
+            dependents, MAX_PROVISIONING_THREADS,
+            skip_dependents_on_failure=False)
       except Exception:
-        logging.exception('Got an exception deleting networks. '
+        logging.exception('Got an exception deleting resources. '
                           'Attempting to continue tearing down.')
-    if self.container_cluster:
-      self.container_cluster.Delete()
 
     self.deleted = True
 
+  def GetResourceTimingSamples(self):
+    """Returns Samples with the time taken to create and delete resources."""
+    samples = []
+    for operation, resource, start_time, stop_time in self.resource_timings:
+      metadata = {'resource_type': type(resource).__name__,
+                  'resource_name': getattr(resource, 'name', None),
+                  'start_time': start_time,
+                  'stop_time': stop_time}
+      samples.append(sample.Sample('Resource %s Time' % operation,
+                                   stop_time - start_time, 'seconds',
+                                   metadata))
+    return samples
+
   def StartBackgroundWorkload(self):
     targets = [(vm.StartBackgroundWorkload, (), {}) for vm in self.vms]
     vm_util.RunParallelThreads(targets, len(targets))
@@ -445,18 +547,45 @@ class BenchmarkSpec(object):
     """
     if vm.is_static and vm.install_packages:
       vm.PackageCleanup()
+    vm.CloseRemoteConnection()
     vm.Delete()
     vm.DeleteScratchDisks()
 
+  def GetRemoteConnectionSamples(self):
+    """Returns Samples describing remote connection reuse for all VMs."""
+    return [s for vm in self.vms for s in vm.GetRemoteConnectionSamples()]
+
+  def GetPackageInstallSamples(self):
+    """Returns Samples with the install time of each package on all VMs."""
+    return [s for vm in self.vms for s in vm.GetPackageInstallSamples()]
+
   @staticmethod
   def _GetPickleFilename(uid):
     """Returns the filename for the pickled BenchmarkSpec."""
     return os.path.join(vm_util.GetTempDir(), uid)
 
+  @staticmethod
+  def _GetJournalFilename(uid):
+    """Returns the filename for the BenchmarkSpec's resource journal."""
+    return os.path.join(vm_util.GetTempDir(), uid + '.journal')
+
   def Pickle(self):
-    """Pickles the spec so that it can be unpickled on a subsequent run."""
-    with open(self._GetPickleFilename(self.uid), 'wb') as pickle_file:
+    """Pickles the spec so that it can be unpickled on a subsequent run.
+
+    The pickle is a snapshot of the whole spec. Later resource changes are
+    appended to the resource journal, which restarts with each snapshot.
+    """
+    filename = self._GetPickleFilename(self.uid)
+    if not self.resource_journal:
+      self.resource_journal = resource_journal.ResourceJournal(
+          self._GetJournalFilename(self.uid))
+    resource_journal.AssignKeys(self)
+    # Replaced atomically, so that a crash while pickling keeps the last
+    # snapshot, which the journal applies to.
+    with open(filename + '.tmp', 'wb') as pickle_file:
       pickle.dump(self, pickle_file, 2)
+    os.rename(filename + '.tmp', filename)
+    self.resource_journal.Truncate()
 
   @classmethod
   def GetBenchmarkSpec(cls, benchmark_module, config, uid):
@@ -481,6 +610,11 @@ class BenchmarkSpec(object):
       logging.error('Unable to unpickle spec file for benchmark %s.',
                     benchmark_module.BENCHMARK_NAME)
       raise e
+    # Specs pickled before the journal was added have neither attribute.
+    spec.resource_journal = getattr(spec, 'resource_journal', None)
+    spec.recovered_resources = getattr(spec, 'recovered_resources', [])
+    if spec.resource_journal:
+      spec.recovered_resources.extend(spec.resource_journal.Replay(spec))
     # Always let the spec be deleted after being unpickled so that
     # it's possible to run cleanup even if cleanup has already run.
     spec.deleted = False
@@ -0,0 +1,599 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs local commands from a single event loop thread.
+
+vm_util.IssueCommand used to start a timer thread and two temporary files
+for each command, and RunThreaded runs hundreds of them at once, so large
+runs ran out of threads and file descriptors. A CommandEngine instead runs
+every command from one thread, which:
+
+  - starts at most --max_concurrent_commands processes at a time, and queues
+    the other commands,
+  - reads the stdout and stderr pipes of all processes with poll(), keeping
+    at most --command_output_max_bytes of each,
+  - kills processes whose timeout has passed, and processes whose command is
+    cancelled.
+
+Callers wait for their command, and run its line callback, in their own
+thread. The engine needs poll(), so it is not used on Windows.
+"""
+
+# Without it, 'import resource' would import perfkitbenchmarker.resource.
+from __future__ import absolute_import
+
+import collections
+import errno
+import logging
+import os
+import select
+import subprocess
+import threading
+import time
+
+from perfkitbenchmarker import flags
+
+try:
+  import fcntl
+  import resource
+except ImportError:
+  # Windows, where the engine is not used.
+  fcntl = resource = None
+
+flags.DEFINE_integer('max_concurrent_commands', None,
+                     'The most local commands, such as ssh or cloud CLI '
+                     'commands, that PKB runs at the same time. Other '
+                     'commands wait for one of them to finish. Defaults to '
+                     'a quarter of the open file limit of the PKB process.',
+                     lower_bound=1)
+flags.DEFINE_integer('command_output_max_bytes', 64 * 1024 * 1024,
+                     'The most bytes of stdout, and of stderr, kept for each '
+                     'local command. Output beyond that is dropped.',
+                     lower_bound=0)
+
+FLAGS = flags.FLAGS
+
+_READ_SIZE = 64 * 1024
+# How often processes are checked for having exited without closing their
+# pipes, e.g. because a background child inherited them.
+_EXIT_CHECK_INTERVAL = 0.1
+# How often, at most, a process that closed its pipes is checked for having
+# exited. Processes usually exit right after closing them, so the checks start
+# more often.
+_CLOSED_EXIT_CHECK_INTERVAL = 0.005
+# Each command uses three file descriptors, for stdin, stdout and stderr, and
+# leaves one for other files.
+_FDS_PER_COMMAND = 4
+_MIN_CONCURRENT_COMMANDS = 16
+
+
+class CommandCancelledError(Exception):
+  """Raised when waiting for a command that was cancelled before starting."""
+  pass
+
+
+def _SetNonBlocking(fd):
+  fd_flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+  fcntl.fcntl(fd, fcntl.F_SETFL, fd_flags | os.O_NONBLOCK)
+
+
+def _SetCloseOnExec(fd):
+  fd_flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+  fcntl.fcntl(fd, fcntl.F_SETFD, fd_flags | fcntl.FD_CLOEXEC)
+
+
+def _GetDefaultMaxConcurrentCommands():
+  soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+  if soft_limit == resource.RLIM_INFINITY:
+    soft_limit = 4096
+  return max(soft_limit // _FDS_PER_COMMAND, _MIN_CONCURRENT_COMMANDS)
+
+
+_main_thread_pipe = None
+
+
+def _GetMainThreadPipe():
+  global _main_thread_pipe
+  if _main_thread_pipe is None or _main_thread_pipe[0] != os.getpid():
+    read_fd, write_fd = os.pipe()
+    _SetCloseOnExec(read_fd)
+    _SetCloseOnExec(write_fd)
+    _SetNonBlocking(write_fd)
+    _main_thread_pipe = os.getpid(), read_fd, write_fd
+  return _main_thread_pipe[1:]
+
+
+class Waiter(object):
+  """Wakes up a thread waiting for a command.
+
+  threading.Event.wait can't be interrupted by signals in Python 2, so the
+  main thread, which receives KeyboardInterrupt, waits on a pipe instead. The
+  pipe is shared by the main thread's commands, so a notification may be
+  meant for an earlier command: waiters check what they wait for again after
+  waking up.
+  """
+
+  def __init__(self):
+    self._pipe = None
+    self._event = None
+    if isinstance(threading.current_thread(), threading._MainThread):
+      self._pipe = _GetMainThreadPipe()
+    else:
+      self._event = threading.Event()
+
+  def Notify(self):
+    if self._event:
+      self._event.set()
+      return
+    try:
+      os.write(self._pipe[1], b'x')
+    except OSError as e:
+      # A full pipe already holds a notification.
+      if e.errno != errno.EAGAIN:
+        raise
+
+  def Wait(self, timeout=None):
+    """Waits for at least one notification since the last Wait.
+
+    Args:
+      timeout: float or None. If provided, the most seconds to wait for.
+    """
+    if self._event:
+      self._event.wait(timeout)
+      self._event.clear()
+      return
+    while True:
+      try:
+        if timeout is not None:
+          if not select.select([self._pipe[0]], [], [], timeout)[0]:
+            return
+        os.read(self._pipe[0], _READ_SIZE)
+        return
+      except (OSError, select.error) as e:
+        if e.args[0] != errno.EINTR:
+          raise
+
+
+class OutputStream(object):
+  """The output of one pipe of a command.
+
+  Attributes:
+    data: bytearray. The output kept so far.
+    dropped: int. Number of bytes dropped beyond the size cap.
+  """
+
+  def __init__(self, max_bytes, lines=None):
+    """Initializes the stream.
+
+    Args:
+      max_bytes: int. The most bytes to keep.
+      lines: collections.deque or None. If set, complete lines are appended
+          to it as they are read, instead of being kept in 'data', and
+          max_bytes caps the length of each line.
+    """
+    self.data = bytearray()
+    self.dropped = 0
+    self._max_bytes = max_bytes
+    self._lines = lines
+
+  def Append(self, data):
+    if self._lines is None:
+      self._Keep(data)
+      return
+    start = 0
+    end = data.find(b'\n') + 1
+    while end:
+      self._Keep(data[start:end])
+      self._lines.append(bytes(self.data))
+      self.data = bytearray()
+      start = end
+      end = data.find(b'\n', start) + 1
+    self._Keep(data[start:])
+
+  def _Keep(self, data):
+    room = self._max_bytes - len(self.data)
+    if len(data) > room:
+      self.dropped += len(data) - max(room, 0)
+      data = data[:max(room, 0)]
+    self.data.extend(data)
+
+  def Close(self):
+    """Passes on the last line, if it has no newline."""
+    if self._lines is not None and self.data:
+      self._lines.append(bytes(self.data))
+      self.data = bytearray()
+
+
+class Command(object):
+  """A command submitted to a CommandEngine.
+
+  Attributes:
+    cmd: list of strings. The command, as given to subprocess.Popen.
+    timeout: float or None. Seconds after which the process is killed.
+    returncode: int or None. The return code of the process, once it is done.
+        -9 if the process was killed.
+    timed_out: bool. Whether the process was killed because of its timeout.
+  """
+
+  def __init__(self, engine, cmd, env, cwd, shell, timeout, stream_stdout,
+               max_output_bytes):
+    self.cmd = cmd
+    self.env = env
+    self.cwd = cwd
+    self.shell = shell
+    self.timeout = timeout
+    self.returncode = None
+    self.timed_out = False
+    self.process = None
+    self.deadline = None
+    self.pipes_closed_at = None
+    self.cancelled = False
+    self.error = None
+    self.done = False
+    self.lines = collections.deque() if stream_stdout else None
+    self.stdout = OutputStream(max_output_bytes, self.lines)
+    self.stderr = OutputStream(max_output_bytes)
+    self._engine = engine
+    self._waiter = Waiter()
+
+  def Cancel(self):
+    """Kills the process, or drops the command if it has not started."""
+    self._engine.Cancel(self)
+
+  def Notify(self):
+    self._waiter.Notify()
+
+  def Wait(self, line_callback=None):
+    """Waits for the command to finish.
+
+    If the thread is interrupted, e.g. by KeyboardInterrupt, or line_callback
+    raises an exception, the command is cancelled and the exception re-raised.
+
+    Args:
+      line_callback: function or None. If the command streams its stdout,
+          called with each line of stdout, in this thread.
+
+    Returns:
+      A tuple of stdout, stderr and return code. Stdout is empty if the
+      command streams its stdout.
+
+    Raises:
+      CommandCancelledError: If the command was cancelled before it started.
+      OSError: If the process could not be started.
+    """
+    try:
+      while True:
+        done = self.done
+        while self.lines:
+          line = self.lines.popleft()
+          if line_callback:
+            line_callback(line.decode('ascii', 'ignore'))
+        if done:
+          break
+        self._waiter.Wait()
+    except:
+      self.Cancel()
+      raise
+    if self.error:
+      raise self.error
+    for name, stream in (('stdout', self.stdout), ('stderr', self.stderr)):
+      if stream.dropped:
+        logging.warning('Dropped the last %d bytes of the %s of "%s", beyond '
+                        '--command_output_max_bytes.', stream.dropped, name,
+                        ' '.join(self.cmd))
+    return (bytes(self.stdout.data).decode('ascii', 'ignore'),
+            bytes(self.stderr.data).decode('ascii', 'ignore'),
+            self.returncode)
+
+
+class CommandEngine(object):
+  """Runs commands from a single event loop thread.
+
+  The thread is started by the first command. Pending commands start in the
+  order they were submitted.
+  """
+
+  def __init__(self, max_concurrent_commands, max_output_bytes):
+    self.max_concurrent_commands = max_concurrent_commands
+    self.max_output_bytes = max_output_bytes
+    self.pid = os.getpid()
+    self._lock = threading.Lock()
+    self._pending = collections.deque()
+    self._cancelled = []
+    self._running = set()
+    # Maps each open pipe file descriptor to its command and OutputStream.
+    self._fds = {}
+    self._poller = select.poll()
+    self._wakeup = os.pipe()
+    for fd in self._wakeup:
+      _SetNonBlocking(fd)
+      _SetCloseOnExec(fd)
+    self._poller.register(self._wakeup[0], select.POLLIN)
+    self._thread = None
+    self._saturated = False
+
+  def Submit(self, cmd, env=None, cwd=None, shell=False, timeout=None,
+             stream_stdout=False):
+    """Queues a command.
+
+    Args:
+      cmd: list of strings. The command, as given to subprocess.Popen.
+      env: dict or None. The environment of the process.
+      cwd: string or None. The working directory of the process.
+      shell: bool. Whether to run the command through the shell.
+      timeout: float or None. Seconds after its start after which the process
+          is killed.
+      stream_stdout: bool. Whether to pass each line of stdout to the
+          line_callback of Command.Wait instead of keeping it.
+
+    Returns:
+      Command.
+    """
+    command = Command(self, cmd, env, cwd, shell, timeout, stream_stdout,
+                      self.max_output_bytes)
+    with self._lock:
+      self._pending.append(command)
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._Loop,
+                                        name='CommandEngine')
+        self._thread.daemon = True
+        self._thread.start()
+    self._WakeUp()
+    return command
+
+  def Run(self, cmd, env=None, cwd=None, shell=False, timeout=None,
+          line_callback=None):
+    """Runs a command and waits for it.
+
+    Returns:
+      See Command.Wait.
+    """
+    command = self.Submit(cmd, env=env, cwd=cwd, shell=shell, timeout=timeout,
+                          stream_stdout=bool(line_callback))
+    return command.Wait(line_callback)
+
+  def Cancel(self, command):
+    with self._lock:
+      if command.done or command.cancelled:
+        return
+      command.cancelled = True
+      self._cancelled.append(command)
+    self._WakeUp()
+
+  def _WakeUp(self):
+    try:
+      os.write(self._wakeup[1], b'x')
+    except OSError as e:
+      if e.errno != errno.EAGAIN:
+        raise
+
+  def _Loop(self):
+    last_exit_check = 0
+    while True:
+      try:
+        last_exit_check = self._RunOnce(last_exit_check)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception('Command engine failed.')
+        self._FailAll(e)
+
+  def _FailAll(self, error):
+    """Kills all processes, and fails all commands, after an engine error."""
+    for command in list(self._running):
+      self._Kill(command)
+      command.process.wait()
+      command.returncode = command.process.returncode
+    for fd in list(self._fds):
+      self._ClosePipe(fd)
+    with self._lock:
+      commands = list(self._running) + list(self._pending)
+      self._running.clear()
+      self._pending.clear()
+      self._cancelled = []
+      for command in commands:
+        command.error = error
+        self._SetDone(command)
+
+  def _RunOnce(self, last_exit_check):
+    """Runs one iteration of the event loop.
+
+    Args:
+      last_exit_check: float. When all processes were last checked for
+          having exited.
+
+    Returns:
+      When all processes were last checked for having exited.
+    """
+    try:
+      events = self._poller.poll(self._GetPollTimeout(last_exit_check))
+    except select.error as e:
+      # Signals may be delivered to this thread too.
+      if e.args[0] != errno.EINTR:
+        raise
+      events = []
+    for fd, _ in events:
+      if fd == self._wakeup[0]:
+        self._DrainWakeUp()
+      else:
+        self._Read(fd)
+    self._StartAndCancel()
+    now = time.time()
+    for command in list(self._running):
+      if command.deadline is not None and now >= command.deadline:
+        logging.error('IssueCommand timed out after %d seconds. '
+                      'Killing command "%s".', command.timeout,
+                      ' '.join(command.cmd))
+        command.timed_out = True
+        command.deadline = None
+        self._Kill(command)
+    check_all = now - last_exit_check >= _EXIT_CHECK_INTERVAL
+    if check_all:
+      last_exit_check = now
+    for command in list(self._running):
+      if ((check_all or command.pipes_closed_at is not None) and
+          command.process.poll() is not None):
+        self._Finish(command)
+    return last_exit_check
+
+  def _GetPollTimeout(self, last_exit_check):
+    """Returns how many milliseconds poll() may wait for events."""
+    if not self._running:
+      return None
+    now = time.time()
+    closed_times = [now - command.pipes_closed_at for command in self._running
+                    if command.pipes_closed_at is not None]
+    if closed_times:
+      return min(min(closed_times), _CLOSED_EXIT_CHECK_INTERVAL) * 1000
+    timeout = last_exit_check + _EXIT_CHECK_INTERVAL - now
+    deadlines = [command.deadline for command in self._running
+                 if command.deadline is not None]
+    if deadlines:
+      timeout = min(timeout, min(deadlines) - now)
+    return max(timeout, 0) * 1000
+
+  def _DrainWakeUp(self):
+    try:
+      while os.read(self._wakeup[0], _READ_SIZE):
+        pass
+    except OSError as e:
+      if e.errno not in (errno.EAGAIN, errno.EINTR):
+        raise
+
+  def _StartAndCancel(self):
+    with self._lock:
+      cancelled = self._cancelled
+      self._cancelled = []
+      for command in cancelled:
+        if command in self._pending:
+          self._pending.remove(command)
+          command.error = CommandCancelledError(
+              'Cancelled before starting: ' + ' '.join(command.cmd))
+          self._SetDone(command)
+      to_start = []
+      while (self._pending and
+             len(self._running) + len(to_start) <
+             self.max_concurrent_commands):
+        to_start.append(self._pending.popleft())
+      if self._pending and not self._saturated:
+        logging.info('%d local commands are running, the most allowed by '
+                     '--max_concurrent_commands. Later commands wait for '
+                     'them to finish.', self.max_concurrent_commands)
+      self._saturated = bool(self._pending)
+    for command in cancelled:
+      if command in self._running:
+        self._Kill(command)
+    for command in to_start:
+      self._Start(command)
+
+  def _Start(self, command):
+    try:
+      command.process = subprocess.Popen(
+          command.cmd, env=command.env, shell=command.shell,
+          stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+          stderr=subprocess.PIPE, cwd=command.cwd)
+    except Exception as e:  # pylint: disable=broad-except
+      command.error = e
+      with self._lock:
+        self._SetDone(command)
+      return
+    if command.timeout is not None:
+      command.deadline = time.time() + command.timeout
+    self._running.add(command)
+    # Keep later commands from inheriting the pipes.
+    _SetCloseOnExec(command.process.stdin.fileno())
+    for pipe, stream in ((command.process.stdout, command.stdout),
+                         (command.process.stderr, command.stderr)):
+      fd = pipe.fileno()
+      _SetCloseOnExec(fd)
+      _SetNonBlocking(fd)
+      self._fds[fd] = (command, stream)
+      self._poller.register(fd, select.POLLIN | select.POLLPRI)
+
+  def _Read(self, fd):
+    """Reads what is available from a pipe, closing it at EOF."""
+    command, stream = self._fds[fd]
+    while True:
+      try:
+        data = os.read(fd, _READ_SIZE)
+      except OSError as e:
+        if e.errno == errno.EAGAIN:
+          return
+        if e.errno == errno.EINTR:
+          continue
+        raise
+      if not data:
+        self._ClosePipe(fd)
+        return
+      stream.Append(data)
+      if command.lines:
+        command.Notify()
+      if len(data) < _READ_SIZE:
+        return
+
+  def _ClosePipe(self, fd):
+    command, stream = self._fds.pop(fd)
+    self._poller.unregister(fd)
+    stream.Close()
+    for pipe in (command.process.stdout, command.process.stderr):
+      if not pipe.closed and pipe.fileno() == fd:
+        pipe.close()
+    if command.process.stdout.closed and command.process.stderr.closed:
+      command.pipes_closed_at = time.time()
+
+  def _Kill(self, command):
+    try:
+      command.process.kill()
+    except OSError as e:
+      # The process already exited.
+      if e.errno != errno.ESRCH:
+        raise
+
+  def _Finish(self, command):
+    """Completes a command whose process exited."""
+    # Read what the process wrote before exiting, without waiting for EOF,
+    # which never comes while a background child holds the pipes open.
+    for pipe in (command.process.stdout, command.process.stderr):
+      if not pipe.closed:
+        fd = pipe.fileno()
+        self._Read(fd)
+        if fd in self._fds:
+          self._ClosePipe(fd)
+    command.process.stdin.close()
+    self._running.discard(command)
+    command.returncode = command.process.returncode
+    with self._lock:
+      self._SetDone(command)
+
+  def _SetDone(self, command):
+    command.done = True
+    command.Notify()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_engine_lock_pid = os.getpid()
+
+
+def GetEngine():
+  """Returns the CommandEngine of this process, creating it if needed."""
+  global _engine, _engine_lock, _engine_lock_pid
+  if _engine_lock_pid != os.getpid():
+    # Forked, e.g. by multiprocessing: the engine thread did not survive.
+    _engine_lock = threading.Lock()
+    _engine_lock_pid = os.getpid()
+  with _engine_lock:
+    if _engine is None or _engine.pid != os.getpid():
+      _engine = CommandEngine(
+          FLAGS.max_concurrent_commands or _GetDefaultMaxConcurrentCommands(),
+          FLAGS.command_output_max_bytes)
+    return _engine
@@ -294,6 +294,32 @@ def LoadMinimalConfig(benchmark_config, benchmark_name):
   return config[benchmark_name]
 
 
+def GetConfigSummary(benchmark_config, benchmark_name):
+  """Summarizes a benchmark's default config for help text.
+
+  Args:
+    benchmark_config: str. The default config in YAML format.
+    benchmark_name: str. The name of the benchmark.
+
+  Returns:
+    dict with the benchmark's 'description', its total 'vm_count' (None if
+    it is variable) and whether it uses a 'scratch_disk'.
+  """
+  config = LoadMinimalConfig(benchmark_config, benchmark_name)
+  vm_count = 0
+  scratch_disk = False
+  for group in config.get('vm_groups', {}).itervalues():
+    group_vm_count = group.get('vm_count', 1)
+    if group_vm_count is None or vm_count is None:
+      vm_count = None
+    else:
+      vm_count += group_vm_count
+    if group.get('disk_spec'):
+      scratch_disk = True
+  return {'description': config['description'], 'vm_count': vm_count,
+          'scratch_disk': scratch_disk}
+
+
 def LoadConfig(benchmark_config, user_config, benchmark_name):
   """Loads a benchmark configuration.
 
@@ -40,6 +40,10 @@ class Setup(object):
     """Error raised when the given run_uri is invalid."""
     pass
 
+  class InvalidFlagConfigurationError(Error):
+    """Error raised when a combination of flag values is invalid."""
+    pass
+
 
 class VirtualMachine(object):
   """Errors raised by virtual_machine.py."""
@@ -0,0 +1,245 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Mergeable histograms of benchmark measurements, such as latencies.
+
+Benchmarks report histograms with their own bucket layouts: netperf uses ten
+linear buckets per decade, fio a log-linear layout of bin means and YCSB 1 ms
+buckets. A Histogram keeps whatever layout it was created with, so that
+percentiles match what the tool itself would report, and counts are stored in
+NumPy arrays, so merging histograms from many VMs is linear in the number of
+buckets.
+
+Measurements that have not been bucketed yet can be recorded with
+Histogram.FromValues, which uses a log-linear layout with a fixed number of
+significant figures.
+"""
+
+import json
+
+import numpy as np
+
+# Rules for the rank of the measurement at a percentile, see
+# Histogram.Percentiles.
+NEAREST_RANK = 'nearest_rank'
+FLOOR_RANK = 'floor_rank'
+
+
+def LogLinearBucket(values, significant_figures=2):
+  """Returns the lower bound of the log-linear bucket of each value.
+
+  Each decade is divided into linear buckets, so that each bucket's lower bound
+  is its values truncated to 'significant_figures' significant figures. The
+  relative width of a bucket is therefore at most 10 ** (1 -
+  significant_figures). Values <= 0 are put in a bucket with lower bound 0.
+
+  Args:
+    values: Sequence or NumPy array of numbers.
+    significant_figures: int. Number of significant figures to keep.
+
+  Returns:
+    NumPy float64 array of bucket lower bounds.
+  """
+  values = np.asarray(values, dtype=np.float64)
+  positive = values > 0
+  bounds = np.zeros_like(values)
+  exponents = (significant_figures - 1 -
+               np.floor(np.log10(values[positive])))
+  scales = 10.0 ** exponents
+  # Dividing by a power of ten, rather than multiplying by its inverse, keeps
+  # bounds such as 0.3 exact.
+  bounds[positive] = np.floor(values[positive] * scales) / scales
+  return bounds
+
+
+class Histogram(object):
+  """A histogram of counts per bucket.
+
+  For compatibility with code that represents histograms as lists of
+  (bucket_lower_bound, count) tuples, a Histogram can be iterated and compared
+  with such a list; both only include non-empty buckets.
+
+  Attributes:
+    bounds: NumPy array of sorted, unique bucket lower bounds.
+    counts: NumPy int64 array. counts[i] is the number of measurements in the
+        bucket starting at bounds[i].
+  """
+
+  def __init__(self, bounds=(), counts=()):
+    """Initializes the histogram.
+
+    Args:
+      bounds: Sequence or NumPy array of bucket lower bounds. Need not be sorted
+          or unique; counts of duplicate bounds are added.
+      counts: Sequence or NumPy array of counts, one per bound.
+
+    Raises:
+      ValueError: If bounds and counts have different lengths.
+    """
+    bounds = np.asarray(bounds)
+    counts = np.asarray(counts, dtype=np.int64)
+    if bounds.shape != counts.shape:
+      raise ValueError('Got {0} bounds but {1} counts.'.format(
+          len(bounds), len(counts)))
+    if len(bounds) > 1 and not np.all(bounds[1:] > bounds[:-1]):
+      bounds, inverse = np.unique(bounds, return_inverse=True)
+      # Float weights are exact for any realistic count (< 2 ** 53).
+      counts = np.bincount(inverse, weights=counts,
+                           minlength=len(bounds)).astype(np.int64)
+    self.bounds = bounds
+    self.counts = counts
+
+  @classmethod
+  def FromPairs(cls, pairs):
+    """Creates a histogram from (bucket_lower_bound, count) pairs."""
+    pairs = np.array(list(pairs))
+    if not len(pairs):
+      return cls()
+    return cls(pairs[:, 0], pairs[:, 1])
+
+  @classmethod
+  def FromDict(cls, bucket_counts):
+    """Creates a histogram from a dict mapping bucket lower bound to count."""
+    return cls.FromPairs(bucket_counts.iteritems())
+
+  @classmethod
+  def FromValues(cls, values, significant_figures=2):
+    """Creates a histogram of raw measurements in log-linear buckets.
+
+    See LogLinearBucket for the bucket layout.
+    """
+    bounds, counts = np.unique(LogLinearBucket(values, significant_figures),
+                               return_counts=True)
+    return cls(bounds, counts)
+
+  @classmethod
+  def FromJson(cls, serialized):
+    """Creates a histogram from the output of ToJson."""
+    return cls.FromPairs((float(bound), count)
+                         for bound, count in json.loads(serialized).items())
+
+  def ToJson(self):
+    """Serializes the non-empty buckets as a compact JSON object.
+
+    The object maps each bucket lower bound to its count, which is the format
+    used for the 'histogram' metadata of samples.
+    """
+    return json.dumps(dict(self), separators=(',', ':'), sort_keys=True)
+
+  def Merge(self, other):
+    """Adds the counts of another histogram to this one in place.
+
+    Histograms with the same layout are merged with a single vector addition.
+    Otherwise the result has the union of both layouts.
+
+    Args:
+      other: Histogram.
+
+    Returns:
+      This histogram.
+    """
+    if not len(self.bounds):
+      self.bounds = other.bounds.copy()
+      self.counts = other.counts.copy()
+    elif np.array_equal(self.bounds, other.bounds):
+      self.counts += other.counts
+    elif len(other.bounds):
+      bounds = np.union1d(self.bounds, other.bounds)
+      counts = np.zeros(len(bounds), dtype=np.int64)
+      counts[np.searchsorted(bounds, self.bounds)] += self.counts
+      counts[np.searchsorted(bounds, other.bounds)] += other.counts
+      self.bounds = bounds
+      self.counts = counts
+    return self
+
+  def Total(self):
+    """Returns the number of measurements in the histogram."""
+    return int(self.counts.sum())
+
+  def Mean(self):
+    """Returns the mean measurement, taking each to be its bucket's bound."""
+    return float(np.dot(self.bounds, self.counts)) / self._NonEmptyTotal()
+
+  def Stddev(self):
+    """Returns the sample standard deviation of the measurements."""
+    total = self._NonEmptyTotal()
+    if total == 1:
+      return 0
+    squared_error = np.dot((self.bounds - self.Mean()) ** 2, self.counts)
+    return float(squared_error / (total - 1)) ** 0.5
+
+  def Percentiles(self, percentiles, rank=NEAREST_RANK):
+    """Finds the bucket containing each of the given percentiles.
+
+    With NEAREST_RANK, the p-th percentile is the lower bound of the first
+    bucket at which the cumulative count reaches p percent of the total N.
+    With FLOOR_RANK, it is the bucket of the measurement with 0-based rank
+    int(N * p / 100), i.e. the first bucket at which the cumulative count
+    exceeds that rank, which is one measurement higher whenever N * p / 100 is
+    a whole number. All percentiles are found with a single cumulative sum.
+
+    Args:
+      percentiles: iterable of numbers in the interval [0, 100].
+      rank: NEAREST_RANK or FLOOR_RANK. The rule for the rank of the
+          measurement at each percentile.
+
+    Returns:
+      List of bucket lower bounds, one per percentile.
+
+    Raises:
+      ValueError: If the histogram is empty or a percentile is not in the
+          interval [0, 100].
+    """
+    percentiles = np.asarray(list(percentiles), dtype=np.float64)
+    if np.any((percentiles < 0) | (percentiles > 100)):
+      raise ValueError('Invalid percentiles: {0}'.format(percentiles))
+    total = self._NonEmptyTotal()
+    cumulative = np.cumsum(self.counts)
+    if rank == NEAREST_RANK:
+      targets = np.maximum(total * percentiles / 100.0, 1)
+      indices = np.searchsorted(cumulative, targets, side='left')
+    elif rank == FLOOR_RANK:
+      targets = np.floor(total * percentiles / 100.0)
+      indices = np.searchsorted(cumulative, targets, side='right')
+    else:
+      raise ValueError('Invalid rank: {0}'.format(rank))
+    indices = np.minimum(indices, len(cumulative) - 1)
+    return self.bounds[indices].tolist()
+
+  def _NonEmptyTotal(self):
+    total = self.Total()
+    if not total:
+      raise ValueError('Histogram is empty.')
+    return total
+
+  def __iter__(self):
+    non_empty = np.flatnonzero(self.counts)
+    return iter(zip(self.bounds[non_empty].tolist(),
+                    self.counts[non_empty].tolist()))
+
+  def __len__(self):
+    return int(np.count_nonzero(self.counts))
+
+  def __eq__(self, other):
+    try:
+      return list(self) == list(other)
+    except TypeError:
+      return NotImplemented
+
+  def __ne__(self, other):
+    result = self.__eq__(other)
+    return result if result is NotImplemented else not result
+
+  def __repr__(self):
+    return '{0}({1!r})'.format(type(self).__name__, list(self))
@@ -14,8 +14,10 @@
 
 """Utilities for dynamically importing python files."""
 
+import collections
 import importlib
 import pkgutil
+import threading
 
 
 def LoadModulesForPath(path, package_prefix=None):
@@ -32,12 +34,197 @@ def LoadModulesForPath(path, package_prefix=None):
     Imported modules.
   """
   prefix = package_prefix + '.' if package_prefix else ''
+  for modname in _ListModules(path):
+    yield importlib.import_module(prefix + modname)
+
+
+def _ListModules(path):
+  """Returns the names of the modules on 'path', without importing them."""
   # If iter_modules is invoked within a zip file, the zipimporter adds the
   # prefix to the names of archived modules, but not archived packages. Because
   # the prefix is necessary to correctly import a package, this behavior is
   # undesirable, so do not pass the prefix to iter_modules. Instead, apply it
   # explicitly afterward.
-  for _, modname, _ in pkgutil.iter_modules(path):
-    # Skip recursively listed modules (e.g. 'subpackage.module').
-    if '.' not in modname:
-      yield importlib.import_module(prefix + modname)
+  return [modname for _, modname, _ in pkgutil.iter_modules(path)
+          # Skip recursively listed modules (e.g. 'subpackage.module').
+          if '.' not in modname]
+
+
+class LazyModuleDict(collections.MutableMapping):
+  """A dict of the entries that the modules on a path register.
+
+  Each module registers (name, value) entries, e.g. a benchmark module
+  registers its BENCHMARK_NAME. The names registered by the modules are read
+  from the module index (see module_index), so modules are only imported
+  when one of their entries is first accessed. Modules missing from the
+  index, such as ones added since it was generated, are imported right away.
+
+  Iterating over the values loads every module. Modules are imported without
+  holding the dict's lock, since importing one may use other registries, and
+  their entries are added under the lock once imported.
+  """
+
+  def __init__(self, path, package_name, get_entries, get_metadata=None):
+    """Initializes the dict.
+
+    Args:
+      path: Path containing python modules.
+      package_name: string. Name of the package containing the modules.
+      get_entries: function. Called with an imported module, returns the
+          (name, value) pairs it registers.
+      get_metadata: function or None. Called with an imported module, returns
+          a dict of JSON-serializable metadata that is stored in the module
+          index, so that it is available without importing the module.
+    """
+    # Imported here, since module_index imports the registries when building
+    # the index.
+    from perfkitbenchmarker import module_index
+    self.package_name = package_name
+    self._get_entries = get_entries
+    self._get_metadata = get_metadata
+    self._lock = threading.RLock()
+    self._entries = {}
+    # Maps the names of entries not loaded yet to their modules.
+    self._pending = {}
+    self._names_by_module = collections.OrderedDict()
+    self._metadata = {}
+    indexed_modules = module_index.GetIndexedModules(package_name)
+    for module_name in _ListModules(path):
+      if indexed_modules and module_name in indexed_modules:
+        entry = indexed_modules[module_name]
+        self._names_by_module[module_name] = list(entry['names'])
+        self._metadata[module_name] = entry.get('metadata')
+        for name in entry['names']:
+          self._pending[name] = module_name
+      else:
+        self._names_by_module[module_name] = []
+        self._Load(module_name)
+
+  def _Load(self, module_name):
+    """Imports a module and adds its entries.
+
+    Must be called without holding the lock.
+    """
+    module = importlib.import_module(self.package_name + '.' + module_name)
+    entries = self._get_entries(module)
+    metadata = self._get_metadata(module) if self._get_metadata else None
+    with self._lock:
+      for name in self._names_by_module[module_name]:
+        self._pending.pop(name, None)
+      self._names_by_module[module_name] = [name for name, _ in entries]
+      self._entries.update(entries)
+      if self._get_metadata:
+        self._metadata[module_name] = metadata
+
+  def LoadAll(self):
+    """Imports every module that has entries not loaded yet."""
+    with self._lock:
+      module_names = set(self._pending.itervalues())
+    for module_name in module_names:
+      self._Load(module_name)
+
+  def GetIndexEntries(self):
+    """Returns the module index entries of all modules, loading them all.
+
+    Returns:
+      dict mapping module name to a dict with the names the module registers
+      and, if the dict has a get_metadata function, the module's metadata.
+    """
+    self.LoadAll()
+    index_entries = {}
+    for module_name, names in self._names_by_module.iteritems():
+      index_entries[module_name] = {'names': sorted(names)}
+      if self._get_metadata:
+        index_entries[module_name]['metadata'] = self._metadata[module_name]
+    return index_entries
+
+  def GetMetadata(self, name):
+    """Returns the metadata of the module registering an entry.
+
+    Does not import the module if its metadata is in the module index.
+    """
+    with self._lock:
+      module_name = next((module_name for module_name, names
+                          in self._names_by_module.iteritems()
+                          if name in names), None)
+      if module_name is None:
+        raise KeyError(name)
+      if self._metadata.get(module_name) is not None or not self._get_metadata:
+        return self._metadata[module_name]
+    self._Load(module_name)
+    with self._lock:
+      return self._metadata[module_name]
+
+  def __getitem__(self, name):
+    with self._lock:
+      module_name = None if name in self._entries else self._pending.get(name)
+    if module_name:
+      self._Load(module_name)
+    with self._lock:
+      return self._entries[name]
+
+  def __setitem__(self, name, value):
+    with self._lock:
+      self._pending.pop(name, None)
+      self._entries[name] = value
+
+  def __delitem__(self, name):
+    with self._lock:
+      if name in self._pending:
+        del self._pending[name]
+      else:
+        del self._entries[name]
+
+  def __contains__(self, name):
+    return name in self._entries or name in self._pending
+
+  def __iter__(self):
+    with self._lock:
+      return iter(list(self._entries) + list(self._pending))
+
+  def __len__(self):
+    return len(self._entries) + len(self._pending)
+
+  def iteritems(self):
+    # Loads all modules first, so that names in an outdated index that their
+    # module no longer registers are not listed.
+    self.LoadAll()
+    with self._lock:
+      return iter(self._entries.items())
+
+  def items(self):
+    return list(self.iteritems())
+
+  def itervalues(self):
+    return (value for _, value in self.iteritems())
+
+  def values(self):
+    return list(self.itervalues())
+
+
+class LazyModuleList(collections.Sequence):
+  """The modules registered in a LazyModuleDict, sorted by name.
+
+  The modules are loaded when the list is first used.
+  """
+
+  def __init__(self, lazy_dict):
+    self._dict = lazy_dict
+
+  def _GetModules(self):
+    return sorted(self._dict.itervalues(), key=lambda module: module.__name__)
+
+  def __getitem__(self, index):
+    return self._GetModules()[index]
+
+  def __len__(self):
+    return len(self._GetModules())
+
+  def __iter__(self):
+    return iter(self._GetModules())
+
+  def __add__(self, other):
+    return self._GetModules() + list(other)
+
+  def __radd__(self, other):
+    return list(other) + self._GetModules()
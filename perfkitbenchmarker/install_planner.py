@@ -0,0 +1,263 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Plans the installation of PerfKit packages, see linux_packages.
+
+PerfKit packages install their dependencies and OS packages imperatively,
+with vm.Install and vm.InstallPackages calls, so each OS package costs a
+package manager transaction and an SSH round trip. With
+--batch_package_installs, VMs record which PerfKit packages and OS packages
+each PerfKit package installs. The records are kept across runs of the same
+PKB version, so that later installs can resolve the whole dependency closure
+of a package up front and install its OS packages in a single transaction.
+The package's own install steps then find them already installed.
+
+Records describe what a package installed the last time, under the flags of
+that run. An outdated record only costs an extra or a missing OS package in
+the batched transaction: the install steps still run, and install whatever
+is missing themselves.
+"""
+
+import collections
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import temp_dir
+
+flags.DEFINE_boolean('batch_package_installs', False,
+                     'If true, VMs install the OS packages needed by a PerfKit '
+                     'package and its dependencies in a single package '
+                     'manager transaction, based on what the package '
+                     'installed in earlier runs, and run the install steps of '
+                     'independent packages in parallel.')
+
+FLAGS = flags.FLAGS
+
+_PLANS_FILE = 'install_plans.json'
+
+
+class PackageRecord(collections.namedtuple(
+        'PackageRecord', ['packages', 'os_packages'])):
+  """What installing a PerfKit package installed.
+
+  Attributes:
+    packages: list of strings. PerfKit packages it installed, in order.
+    os_packages: list of strings. OS packages it installed directly.
+  """
+
+
+class InstallPlan(collections.namedtuple(
+        'InstallPlan', ['packages', 'os_packages', 'unplanned'])):
+  """The installation of some PerfKit packages and their dependencies.
+
+  Attributes:
+    packages: list of strings. The packages and their recorded dependencies,
+        each after its dependencies.
+    os_packages: list of strings. OS packages needed by any of 'packages'.
+    unplanned: list of strings. Packages in 'packages' that have no record,
+        so their dependencies are unknown.
+  """
+
+
+class InstallRecorder(object):
+  """Records what the PerfKit packages installed on a VM install.
+
+  Installs may be nested, since packages install their dependencies, and may
+  run in parallel threads, so each thread has its own stack of packages being
+  installed.
+  """
+
+  def __init__(self):
+    self._local = threading.local()
+
+  def _Stack(self):
+    if not hasattr(self._local, 'stack'):
+      self._local.stack = []
+    return self._local.stack
+
+  def IsNested(self):
+    """Returns whether a package is being installed by this thread."""
+    return bool(self._Stack())
+
+  def Start(self, package_name):
+    """Starts recording the installation of a package.
+
+    The package is recorded as a dependency of the package being installed,
+    if any.
+    """
+    stack = self._Stack()
+    if stack:
+      stack[-1][1].packages.append(package_name)
+    stack.append((package_name, PackageRecord([], [])))
+
+  def AddDependency(self, package_name):
+    """Records a dependency that is already installed."""
+    stack = self._Stack()
+    if stack:
+      stack[-1][1].packages.append(package_name)
+
+  def AddOsPackages(self, os_packages):
+    """Records OS packages installed by the package being installed."""
+    stack = self._Stack()
+    if stack:
+      stack[-1][1].os_packages.extend(os_packages)
+
+  def Finish(self):
+    """Stops recording the current package.
+
+    Returns:
+      (package name, PackageRecord) tuple.
+    """
+    return self._Stack().pop()
+
+
+class InstallPlanner(object):
+  """Stores PackageRecords and plans installs with them.
+
+  Records are stored per OS type in a JSON file, and shared by the VMs of a
+  run and by later runs.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._lock = threading.Lock()
+    self._records = None
+
+  def _Load(self):
+    try:
+      with open(self.path) as plans_file:
+        return json.load(plans_file)
+    except (IOError, ValueError):
+      return {}
+
+  def _GetRecords(self):
+    if self._records is None:
+      self._records = self._Load()
+    return self._records
+
+  def GetRecord(self, os_type, package_name):
+    """Returns the PackageRecord of a package, or None if it has none."""
+    with self._lock:
+      record = self._GetRecords().get(os_type, {}).get(package_name)
+    return PackageRecord(**record) if record else None
+
+  def Record(self, os_type, package_name, record):
+    """Stores the PackageRecord of a package."""
+    record = PackageRecord(
+        list(collections.OrderedDict.fromkeys(record.packages)),
+        list(collections.OrderedDict.fromkeys(record.os_packages)))
+    with self._lock:
+      records = self._GetRecords()
+      if records.get(os_type, {}).get(package_name) == record._asdict():
+        return
+      # Keep records written by concurrent runs.
+      for other_os_type, other_records in self._Load().iteritems():
+        for other_name, other_record in other_records.iteritems():
+          records.setdefault(other_os_type, {}).setdefault(other_name,
+                                                           other_record)
+      records.setdefault(os_type, {})[package_name] = record._asdict()
+      directory = os.path.dirname(self.path)
+      try:
+        os.makedirs(directory)
+      except OSError:
+        if not os.path.isdir(directory):
+          raise
+      fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.plans-')
+      with os.fdopen(fd, 'w') as tmp_file:
+        json.dump(records, tmp_file, indent=2, sort_keys=True)
+      os.rename(tmp_path, self.path)
+
+  def Plan(self, os_type, package_names):
+    """Plans the installation of packages and their recorded dependencies.
+
+    Args:
+      os_type: string. OS type of the VM.
+      package_names: iterable of strings. PerfKit packages to install.
+
+    Returns:
+      InstallPlan.
+    """
+    packages = []
+    os_packages = collections.OrderedDict()
+    unplanned = []
+    visited = set()
+
+    def Visit(package_name):
+      if package_name in visited:
+        return
+      visited.add(package_name)
+      record = self.GetRecord(os_type, package_name)
+      if record is None:
+        unplanned.append(package_name)
+      else:
+        for dependency in record.packages:
+          Visit(dependency)
+        os_packages.update((p, None) for p in record.os_packages)
+      packages.append(package_name)
+
+    for package_name in package_names:
+      Visit(package_name)
+    return InstallPlan(packages, list(os_packages), unplanned)
+
+  def GroupIndependent(self, os_type, package_names):
+    """Groups packages that share no recorded dependencies.
+
+    Packages in different groups can be installed in parallel. Packages
+    without a record are put in a group of their own, since their
+    dependencies are unknown, and installed one after another.
+
+    Args:
+      os_type: string. OS type of the VM.
+      package_names: iterable of strings. PerfKit packages to install.
+
+    Returns:
+      List of lists of package names.
+    """
+    groups = []  # List of (closure, package names) tuples.
+    unplanned = []
+    for package_name in package_names:
+      plan = self.Plan(os_type, [package_name])
+      if plan.unplanned:
+        unplanned.append(package_name)
+        continue
+      closure = set(plan.packages)
+      overlapping = [g for g in groups if g[0] & closure]
+      for group in overlapping:
+        groups.remove(group)
+        closure |= group[0]
+      groups.append((closure, [name for group in overlapping
+                               for name in group[1]] + [package_name]))
+    result = [names for _, names in groups]
+    if unplanned:
+      result.append(unplanned)
+    return result
+
+
+_planner = None
+_planner_lock = threading.Lock()
+
+
+def GetPlanner():
+  """Returns the InstallPlanner of the current PKB version."""
+  global _planner
+  with _planner_lock:
+    if _planner is None:
+      _planner = InstallPlanner(
+          os.path.join(temp_dir.GetVersionDirPath(), _PLANS_FILE))
+      logging.info('Using package install plans in %s.', _planner.path)
+    return _planner
@@ -0,0 +1,175 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batching of the cloud CLI calls that create, describe and delete VMs.
+
+Each VM normally issues its own CLI calls while it is provisioned, e.g. one
+call to create its instance and one call to describe it each time its
+readiness is polled. With --batch_vm_lifecycle_calls, the VMs of a group share
+a LifecycleGroup instead. Calls that the VMs make concurrently are combined
+into one CLI call for the whole batch, e.g. one "instances create" call with
+the names of all the VMs, and its result is passed back to each VM.
+
+Providers decide which calls can be batched and how. See the uses of
+BaseVirtualMachine.lifecycle_group.
+"""
+
+import sys
+import threading
+import time
+
+from perfkitbenchmarker import flags
+
+flags.DEFINE_boolean('batch_vm_lifecycle_calls', False,
+                     'Whether the VMs of a group combine their cloud CLI calls '
+                     'to create, describe and delete instances into calls for '
+                     'the whole group. Supported on GCP, AWS and Kubernetes.')
+flags.DEFINE_float('vm_lifecycle_batch_window', 2.0,
+                   'Maximum number of seconds that a batched cloud CLI call '
+                   'waits for the other VMs of its group to make the same '
+                   'call before it is issued.', lower_bound=0)
+
+FLAGS = flags.FLAGS
+
+
+class _Batch(object):
+  """Calls that are issued together."""
+
+  def __init__(self):
+    self.items = []
+    self.done = False
+    self.results = None
+    self.exc_info = None
+
+
+class CallBatcher(object):
+  """Combines calls made concurrently from several threads into one call.
+
+  The first thread to call Call starts a batch, which it issues once
+  batch_size items were added or window seconds have passed. Threads that call
+  Call meanwhile add their item to the batch and wait for its result. Calls
+  made while a batch is issued start the next batch.
+  """
+
+  def __init__(self, function, batch_size, window):
+    """Initializes the batcher.
+
+    Args:
+      function: callable. Called with the list of items of a batch. Returns a
+          dict mapping each item to its result.
+      batch_size: int. Number of items after which a batch is issued without
+          waiting for the rest of the window.
+      window: float. Maximum number of seconds that a batch waits for items.
+    """
+    self._function = function
+    self._batch_size = batch_size
+    self._window = window
+    self._condition = threading.Condition()
+    self._batch = None
+
+  def Call(self, item):
+    """Adds an item to the current batch and returns its result.
+
+    Args:
+      item: hashable object. The item to call the function for.
+
+    Returns:
+      The result of the function for item.
+
+    Raises:
+      Exception: The exception raised by the function for the batch.
+    """
+    with self._condition:
+      batch = self._batch
+      leader = batch is None
+      if leader:
+        batch = self._batch = _Batch()
+      batch.items.append(item)
+      if len(batch.items) >= self._batch_size:
+        self._batch = None
+        self._condition.notify_all()
+      if leader:
+        deadline = time.time() + self._window
+        while self._batch is batch and time.time() < deadline:
+          self._condition.wait(deadline - time.time())
+        if self._batch is batch:
+          self._batch = None
+      else:
+        while not batch.done:
+          self._condition.wait()
+    if leader:
+      try:
+        results = self._function(list(batch.items))
+      except Exception:
+        exc_info = sys.exc_info()
+        results = None
+      else:
+        exc_info = None
+      with self._condition:
+        batch.results = results
+        batch.exc_info = exc_info
+        batch.done = True
+        self._condition.notify_all()
+    if batch.exc_info:
+      raise batch.exc_info[0], batch.exc_info[1], batch.exc_info[2]
+    return batch.results[item]
+
+
+class LifecycleGroup(object):
+  """Batches the cloud CLI calls of the VMs in one group.
+
+  Attributes:
+    name: string. Name of the VM group.
+    members: list. The VMs in the group.
+  """
+
+  def __init__(self, name, members):
+    self.name = name
+    self.members = list(members)
+    self._lock = threading.Lock()
+    self._batchers = {}
+
+  def __getstate__(self):
+    return {'name': self.name, 'members': self.members}
+
+  def __setstate__(self, state):
+    self.__init__(state['name'], state['members'])
+
+  def Call(self, get_key, function, member):
+    """Makes a call together with the concurrent calls of other VMs.
+
+    A batch is issued once every member of the group with the same key as
+    member has joined it, or when the batch window has passed.
+
+    Args:
+      get_key: function. Called with a member, returns a hashable object that
+          identifies its CLI call, including everything that the members of a
+          batch must have in common, e.g. the operation and the zone of the
+          instances.
+      function: callable. Issues the CLI call for a list of members and
+          returns a dict mapping each member to its result. Calls with the same
+          key must pass the same function.
+      member: hashable object. The VM making the call.
+
+    Returns:
+      The result of function for member.
+    """
+    key = get_key(member)
+    with self._lock:
+      batcher = self._batchers.get(key)
+      if batcher is None:
+        batch_size = sum(1 for other in self.members if get_key(other) == key)
+        batcher = self._batchers[key] = CallBatcher(
+            function, max(batch_size, 1), FLAGS.vm_lifecycle_batch_window)
+    return batcher.Call(member)
@@ -17,13 +17,21 @@ All modules within this package are considered benchmarks, and are loaded
 dynamically. Add non-benchmark code to other packages.
 """
 
+from perfkitbenchmarker import configs
 from perfkitbenchmarker import import_util
 
 
-def _LoadBenchmarks():
-  return list(import_util.LoadModulesForPath(__path__, __name__))
+def _GetEntries(module):
+  return [(module.BENCHMARK_NAME, module)]
 
-BENCHMARKS = _LoadBenchmarks()
 
-VALID_BENCHMARKS = {module.BENCHMARK_NAME: module
-                    for module in BENCHMARKS}
+def _GetMetadata(module):
+  return configs.GetConfigSummary(module.BENCHMARK_CONFIG,
+                                  module.BENCHMARK_NAME)
+
+
+# Benchmark modules are imported on first use, see module_index.
+VALID_BENCHMARKS = import_util.LazyModuleDict(__path__, __name__, _GetEntries,
+                                              _GetMetadata)
+
+BENCHMARKS = import_util.LazyModuleList(VALID_BENCHMARKS)
@@ -513,8 +513,12 @@ def Run(benchmark_spec):
       bin_vals += [fio.ComputeHistogramBinVals(
           vm, '%s_clat_hist.%s.log' % (
               log_file_base, idx + 1)) for idx in range(num_logs)]
+  steady_state_interval_ms = None
+  if FLAGS.fio_bw_log and FLAGS.steady_state_detection:
+    steady_state_interval_ms = FLAGS.fio_log_avg_msec
   samples = fio.ParseResults(job_file_string, json.loads(stdout),
-                             log_file_base=log_file_base, bin_vals=bin_vals)
+                             log_file_base=log_file_base, bin_vals=bin_vals,
+                             steady_state_interval_ms=steady_state_interval_ms)
 
   return samples
 
@@ -51,8 +51,10 @@ import uuid
 
 from perfkitbenchmarker import providers
 from perfkitbenchmarker import configs
+from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import sample
+from perfkitbenchmarker import steady_state
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.providers.aws import aws_network
 from perfkitbenchmarker.providers.aws import util
@@ -80,6 +82,12 @@ flags.DEFINE_integer('sysbench_latency_percentile', 99,
 flags.DEFINE_integer('sysbench_report_interval', 2,
                      'The interval, in seconds, we ask sysbench to report '
                      'results.')
+flags.DEFINE_integer('sysbench_steady_state_stop_seconds', None,
+                     'If set, the run is stopped early once tps has been '
+                     'steady (see --steady_state_window and '
+                     '--steady_state_max_cv) for this many seconds. The '
+                     'summary latency samples are not reported for runs '
+                     'that are stopped early.', lower_bound=1)
 flags.DEFINE_integer('storage_size', 100,
                      'Storage size for SQL instance in GB.')
 
@@ -151,6 +159,10 @@ class DBStatusQueryError(Exception):
   pass
 
 
+class SysbenchOutputError(Exception):
+  pass
+
+
 def _GenerateRandomPassword():
   """Generates a random password to be used by the DB instance.
   Args:
@@ -161,7 +173,8 @@ def _GenerateRandomPassword():
   return '%s%s' % (MYSQL_ROOT_PASSWORD_PREFIX, str(uuid.uuid4())[-8:])
 
 
-def ParseSysbenchOutput(sysbench_output, results, metadata):
+def ParseSysbenchOutput(sysbench_output, results, metadata,
+                        allow_missing_latency=False):
   """Parses sysbench output.
 
   Extract relevant TPS and latency numbers, and populate the final result
@@ -198,6 +211,9 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
     sysbench_output: The output from sysbench.
     results: The dictionary to store results based on sysbench output.
     metadata: The metadata to be passed along to the Samples class.
+    allow_missing_latency: boolean. Whether the summary response times may be
+        missing, e.g. because the run was stopped early. Missing response
+        times are then not reported, instead of raising SysbenchOutputError.
   """
   all_tps = []
   seen_general_statistics = False
@@ -208,8 +224,7 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
   sysbench_output_io = StringIO.StringIO(sysbench_output)
   for line in sysbench_output_io.readlines():
     if re.match('^\[', line):
-      tps = re.findall('tps: (.*?),', line)
-      all_tps.append(float(tps[0]))
+      all_tps.append(_ParseIntervalTps(line))
       continue
 
     if line.startswith('General statistics:'):
@@ -232,6 +247,18 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
   # percentiles of these tps data in the final result set.
   logging.info('All TPS numbers: \n %s', tps_line)
 
+  tps_metadata = metadata
+  if FLAGS.steady_state_detection:
+    tps_steady_state = steady_state.FindSteadyStateFromFlags(all_tps)
+    results.extend(steady_state.CreateSamples(
+        SYSBENCH_RESULT_NAME_TPS, tps_steady_state, len(all_tps),
+        FLAGS.sysbench_report_interval, NA_UNIT, metadata))
+    if tps_steady_state:
+      # Report percentiles of the steady state only.
+      all_tps = all_tps[tps_steady_state.start:tps_steady_state.end]
+      tps_metadata = metadata.copy()
+      tps_metadata['tps_steady_state_only'] = True
+
   tps_percentile = sample.PercentileCalculator(all_tps)
   for percentile in sample.PERCENTILES_LIST:
     percentile_string = 'p%s' % str(percentile)
@@ -242,7 +269,7 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
         metric_name,
         tps_percentile[percentile_string],
         NA_UNIT,
-        metadata))
+        tps_metadata))
 
   # Also report average, stddev, and coefficient of variation
   for token in ['average', 'stddev']:
@@ -252,7 +279,7 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
         metric_name,
         tps_percentile[token],
         NA_UNIT,
-        metadata))
+        tps_metadata))
 
   if tps_percentile['average'] > 0:
     cv = tps_percentile['stddev'] / tps_percentile['average']
@@ -262,10 +289,17 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
         metric_name,
         cv,
         NA_UNIT,
-        metadata))
+        tps_metadata))
 
   # Now, report the latency numbers.
   for token in RESPONSE_TIME_TOKENS:
+    if token not in response_times:
+      if allow_missing_latency:
+        logging.info('No %s response time in the sysbench output, the run '
+                     'was likely stopped early.', token)
+        continue
+      raise SysbenchOutputError(
+          'No %s response time in the sysbench output.' % token)
     logging.info('%s_response_time is %f', token, response_times[token])
     metric_name = '%s %s' % (SYSBENCH_RESULT_NAME_LATENCY, token)
 
@@ -279,7 +313,49 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
         metadata))
 
 
-def _IssueSysbenchCommand(vm, duration):
+def _ParseIntervalTps(line):
+  """Returns the tps of a sysbench per-interval report line."""
+  return float(re.findall('tps: (.*?),', line)[0])
+
+
+def _RunSysbenchUntilSteady(vm, run_cmd):
+  """Runs sysbench, stopping it once its tps has been steady long enough.
+
+  Args:
+    vm: The test VM to issue command to.
+    run_cmd: The sysbench run command.
+
+  Returns:
+    stdout, stderr: the result of the command. stderr is empty.
+  """
+  monitor = steady_state.SteadyStateMonitor(
+      FLAGS.sysbench_steady_state_stop_seconds //
+      FLAGS.sysbench_report_interval,
+      window=FLAGS.steady_state_window, max_cv=FLAGS.steady_state_max_cv)
+  lines = []
+  stopped = []
+
+  def OnLine(line):
+    lines.append(line)
+    if not stopped and re.match('^\[', line):
+      if monitor.Add(_ParseIntervalTps(line)):
+        logging.info('Sysbench tps steady for %d intervals, stopping.',
+                     monitor.steady_length)
+        stopped.append(True)
+        vm.RemoteCommand('pkill -INT -f %s' %
+                         sysbench05plus.SYSBENCH05PLUS_PATH,
+                         ignore_failure=True)
+
+  try:
+    vm.RobustRemoteCommand(run_cmd, line_callback=OnLine)
+  except errors.VirtualMachine.RemoteCommandError:
+    # Sysbench exits with an error when interrupted.
+    if not stopped:
+      raise
+  return ''.join(lines), ''
+
+
+def _IssueSysbenchCommand(vm, duration, stop_when_steady=False):
   """Issues a sysbench run command given a vm and a duration.
 
       Does nothing if duration is <= 0
@@ -287,6 +363,9 @@ def _IssueSysbenchCommand(vm, duration):
   Args:
     vm: The test VM to issue command to.
     duration: the duration of the sysbench run.
+    stop_when_steady: boolean. If True and
+        --sysbench_steady_state_stop_seconds is set, the run is stopped once
+        its tps has been steady for that long.
 
   Returns:
     stdout, stderr: the result of the command.
@@ -317,7 +396,10 @@ def _IssueSysbenchCommand(vm, duration):
                       '--mysql-host=%s' % vm.db_instance_address,
                       'run']
     run_cmd = ' '.join(run_cmd_tokens)
-    stdout, stderr = vm.RobustRemoteCommand(run_cmd)
+    if stop_when_steady and FLAGS.sysbench_steady_state_stop_seconds:
+      stdout, stderr = _RunSysbenchUntilSteady(vm, run_cmd)
+    else:
+      stdout, stderr = vm.RobustRemoteCommand(run_cmd)
     logging.info('Sysbench results: \n stdout is:\n%s\nstderr is\n%s',
                  stdout, stderr)
 
@@ -402,12 +484,15 @@ def _RunSysbench(vm, metadata):
       duration = FLAGS.sysbench_run_seconds
       logging.info('Sysbench real run, duration is %d', duration)
 
-    stdout, stderr = _IssueSysbenchCommand(vm, duration)
+    stdout, stderr = _IssueSysbenchCommand(vm, duration,
+                                           stop_when_steady=phase == 'run')
 
     if phase == 'run':
       # We only need to parse the results for the "real" run.
       logging.info('\n Parsing Sysbench Results...\n')
-      ParseSysbenchOutput(stdout, results, metadata)
+      ParseSysbenchOutput(
+          stdout, results, metadata,
+          allow_missing_latency=bool(FLAGS.sysbench_steady_state_stop_seconds))
 
   return results
 
@@ -865,7 +950,9 @@ def Run(benchmark_spec):
       'sysbench_run_seconds': FLAGS.sysbench_run_seconds,
       'sysbench_thread_count': FLAGS.sysbench_thread_count,
       'sysbench_latency_percentile': FLAGS.sysbench_latency_percentile,
-      'sysbench_report_interval': FLAGS.sysbench_report_interval
+      'sysbench_report_interval': FLAGS.sysbench_report_interval,
+      'sysbench_steady_state_stop_seconds':
+          FLAGS.sysbench_steady_state_stop_seconds
   }
 
   # The run phase is common across providers. The VMs[0] object contains all
@@ -28,12 +28,11 @@ import io
 import json
 import logging
 
-from collections import Counter
-
 from perfkitbenchmarker import configs
 from perfkitbenchmarker import data
 from perfkitbenchmarker import flag_util
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.linux_packages import netperf
@@ -133,44 +132,23 @@ def Prepare(benchmark_spec):
   vms[0].RemoteCommand('sudo chmod 777 %s' % REMOTE_SCRIPT)
 
 
-def _HistogramStatsCalculator(histogram, percentiles=PERCENTILES):
+def _HistogramStatsCalculator(hist, percentiles=PERCENTILES):
   """ Computes values at percentiles in a distribution as well as stddev.
 
   Args:
-    histogram: A dict mapping values to the number of samples with that value.
+    hist: A histogram.Histogram, or a dict mapping values to the number of
+      samples with that value.
 
   Returns:
     A dict mapping stat names to their values.
   """
-  stats = {}
-
-  # Histogram data in list form sorted by key
-  by_value = sorted([(value, count) for value, count in histogram.items()],
-                    key=lambda x: x[0])
-  total_count = sum(histogram.values())
-
-  cur_value_index = 0  # Current index in by_value
-  cur_index = 0  # Number of values we've passed so far
-  for p in percentiles:
-    index = int(float(total_count) * float(p) / 100.0)
-    index = min(index, total_count - 1)  # Handle 100th percentile
-    for value, count in by_value[cur_value_index:]:
-      if cur_index + count > index:
-        stats['p%s' % str(p)] = by_value[cur_value_index][0]
-        break
-      else:
-        cur_index += count
-        cur_value_index += 1
-
-  # Compute stddev
-  value_sum = float(sum([value * count for value, count in histogram.items()]))
-  average = value_sum / float(total_count)
-  if total_count > 1:
-    total_of_squares = sum([(value - average) ** 2 * count
-                            for value, count in histogram.items()])
-    stats['stddev'] = (total_of_squares / (total_count - 1)) ** 0.5
-  else:
-    stats['stddev'] = 0
+  if not isinstance(hist, histogram.Histogram):
+    hist = histogram.Histogram.FromDict(hist)
+  # netperf has always published the measurement at 0-based rank
+  # int(N * p / 100), so results stay comparable with earlier runs.
+  values = hist.Percentiles(percentiles, rank=histogram.FLOOR_RANK)
+  stats = {'p%s' % str(p): value for p, value in zip(percentiles, values)}
+  stats['stddev'] = hist.Stddev()
   return stats
 
 
@@ -241,8 +219,8 @@ def _ParseNetperfOutput(stdout, metadata, benchmark_name,
     # Parse the latency histogram. {latency: count} where "latency" is the
     # latency in microseconds with only 2 significant figures and "count" is the
     # number of response times that fell in that latency range.
-    latency_hist = netperf.ParseHistogram(stdout)
-    hist_metadata = {'histogram': json.dumps(latency_hist)}
+    latency_hist = histogram.Histogram.FromDict(netperf.ParseHistogram(stdout))
+    hist_metadata = {'histogram': latency_hist.ToJson()}
     hist_metadata.update(metadata)
     latency_samples.append(sample.Sample(
         '%s_Latency_Histogram' % benchmark_name, 0, 'us', hist_metadata))
@@ -364,12 +342,12 @@ def RunNetperf(vm, benchmark_name, server_ip, num_streams):
                         float(value),
                         throughput_unit, metadata))
     if enable_latency_histograms:
-      # Combine all of the latency histogram dictionaries
-      latency_histogram = Counter()
-      for histogram in latency_histograms:
-        latency_histogram.update(histogram)
+      # Combine all of the latency histograms
+      latency_histogram = histogram.Histogram()
+      for hist in latency_histograms:
+        latency_histogram.Merge(hist)
       # Create a sample for the aggregate latency histogram
-      hist_metadata = {'histogram': json.dumps(latency_histogram)}
+      hist_metadata = {'histogram': latency_histogram.ToJson()}
       hist_metadata.update(metadata)
       samples.append(sample.Sample(
           '%s_Latency_Histogram' % benchmark_name, 0, 'us', hist_metadata))
@@ -36,6 +36,7 @@ import logging
 import os
 import posixpath
 import re
+import struct
 import threading
 import time
 
@@ -106,6 +107,19 @@ flags.DEFINE_integer('object_storage_streams_per_vm', 10,
                      'Number of independent streams per VM. Only applies to '
                      'the api_multistream scenario.',
                      lower_bound=1)
+flags.DEFINE_integer('object_storage_streams_per_process', None,
+                     'If set, the number of streams that each worker process '
+                     'on a VM runs as threads, sharing the process\'s '
+                     'connections to the storage service. By default each '
+                     'stream has its own process. Only applies to the '
+                     'api_multistream scenarios.', lower_bound=1)
+flags.DEFINE_integer('object_storage_parallel_part_size', None,
+                     'If set, objects larger than this many bytes are '
+                     'uploaded in parts of this size and downloaded in ranges '
+                     'of this size, transferring the parts of an object in '
+                     'parallel. Only applies to the api_multistream '
+                     'scenarios on AWS, and to downloads on GCP.',
+                     lower_bound=1)
 
 flags.DEFINE_integer('object_storage_list_consistency_iterations', 200,
                      'Number of iterations to perform for the api_namespace '
@@ -144,8 +158,10 @@ flags.DEFINE_boolean('object_storage_dont_delete_bucket', False,
                      'times against the same objects.')
 
 flags.DEFINE_string('object_storage_worker_output', None,
-                    'If set, the worker threads\' output will be written to the'
-                    'path provided.')
+                    'If set, the worker results file of each VM will be '
+                    'written to the path provided, suffixed with -vm<index>. '
+                    'The files can be plotted with '
+                    'tools/object_storage_timeline.py.')
 flags.DEFINE_float('object_storage_latency_histogram_interval', None,
                    'If set, a latency histogram sample will be created with '
                    'buckets of the specified interval in seconds. Individual '
@@ -254,6 +270,14 @@ MULTISTREAM_DELAY_CONSTANT = 10.0 * units.second
 # benchmark. This is the filename.
 OBJECTS_WRITTEN_FILE = 'pkb-objects-written'
 
+# The multistream benchmarks write their per-operation results to this file
+# in the VM's /tmp, in the columnar format read by LoadColumnarWorkerOutput.
+MULTISTREAM_RESULTS_FILE = 'pkb-multistream-results'
+
+# Must match COLUMNAR_RESULTS_MAGIC in the API test script.
+COLUMNAR_RESULTS_MAGIC = 'PKBOSC01'
+COLUMNAR_RESULTS_HEADER = struct.Struct('<8sQ')
+
 # If the gap between different stream starts and ends is above a
 # certain proportion of the total time, we log a warning because we
 # are throwing out a lot of information. We also put the warning in
@@ -371,6 +395,10 @@ def _ProcessMultiStreamResults(start_times, latencies, sizes, operation,
   metadata['objects_per_stream'] = (
       FLAGS.object_storage_multistream_objects_per_stream)
   metadata['object_naming'] = FLAGS.object_storage_object_naming_scheme
+  if FLAGS.object_storage_streams_per_process:
+    metadata['streams_per_process'] = FLAGS.object_storage_streams_per_process
+  if FLAGS.object_storage_parallel_part_size:
+    metadata['parallel_part_size'] = FLAGS.object_storage_parallel_part_size
 
   num_records = sum((len(start_time) for start_time in start_times))
   logging.info('Processing %s total operation records', num_records)
@@ -401,19 +429,15 @@ def _ProcessMultiStreamResults(start_times, latencies, sizes, operation,
     metadata['stream_gap_above_threshold'] = True
 
   # Find the indexes in each stream where all streams are active,
-  # following Python's [inclusive, exclusive) index convention.
-  active_start_indexes = []
-  for start_time in start_times:
-    for i in xrange(len(start_time)):
-      if start_time[i] >= last_start_time:
-        active_start_indexes.append(i)
-        break
-  active_stop_indexes = []
-  for stop_time in stop_times:
-    for i in xrange(len(stop_time) - 1, -1, -1):
-      if stop_time[i] <= first_stop_time:
-        active_stop_indexes.append(i + 1)
-        break
+  # following Python's [inclusive, exclusive) index convention. Each
+  # stream's operations are sequential, so its start and stop times are
+  # sorted and can be binary searched.
+  active_start_indexes = [
+      np.searchsorted(start_time, last_start_time, side='left')
+      for start_time in start_times]
+  active_stop_indexes = [
+      np.searchsorted(stop_time, first_stop_time, side='right')
+      for stop_time in stop_times]
   active_latencies = [
       latencies[i][active_start_indexes[i]:active_stop_indexes[i]]
       for i in xrange(num_streams)]
@@ -436,6 +460,27 @@ def _ProcessMultiStreamResults(start_times, latencies, sizes, operation,
   else:
     distribution_metadata['object_size_B'] = 'distribution'
 
+  # Group the latencies by object size with one stable sort, so that each
+  # size's latencies are a contiguous slice rather than a boolean mask over
+  # all of them.
+  active_order = np.argsort(all_active_sizes, kind='mergesort')
+  sorted_active_sizes = all_active_sizes[active_order]
+  sorted_active_latencies = all_active_latencies[active_order]
+  active_size_starts = np.searchsorted(sorted_active_sizes, all_sizes,
+                                       side='left')
+  active_size_stops = np.searchsorted(sorted_active_sizes, all_sizes,
+                                      side='right')
+  if FLAGS.object_storage_latency_histogram_interval:
+    histogram_interval = FLAGS.object_storage_latency_histogram_interval
+    all_sizes_array = np.concatenate(sizes)
+    order = np.argsort(all_sizes_array, kind='mergesort')
+    sorted_sizes = all_sizes_array[order]
+    # Note that astype() floors for us
+    sorted_buckets = (np.concatenate(latencies)[order] /
+                      histogram_interval).astype(np.int64)
+    size_starts = np.searchsorted(sorted_sizes, all_sizes, side='left')
+    size_stops = np.searchsorted(sorted_sizes, all_sizes, side='right')
+
   latency_prefix = 'Multi-stream %s latency' % operation
   logging.info('Processing %s multi-stream %s results for the full '
                'distribution.', len(all_active_latencies), operation)
@@ -449,30 +494,22 @@ def _ProcessMultiStreamResults(start_times, latencies, sizes, operation,
   # Publish by-size and full-distribution stats even if there's only
   # one size in the distribution, because it simplifies postprocessing
   # of results.
-  for size in all_sizes:
+  for size_index, size in enumerate(all_sizes):
     this_size_metadata = metadata.copy()
     this_size_metadata['object_size_B'] = size
     logging.info('Processing multi-stream %s results for object size %s',
                  operation, size)
     _AppendPercentilesToResults(
         results,
-        all_active_latencies[all_active_sizes == size],
+        sorted_active_latencies[active_size_starts[size_index]:
+                                active_size_stops[size_index]],
         latency_prefix,
         LATENCY_UNIT,
         this_size_metadata)
     # Build the object latency histogram if user requested it
     if FLAGS.object_storage_latency_histogram_interval:
-      histogram_interval = FLAGS.object_storage_latency_histogram_interval
-      hist_latencies = [[l for l, s in zip(*w_l_s) if s == size]
-                        for w_l_s in zip(latencies, sizes)]
-      max_latency = max([max(l) for l in hist_latencies])
-      # Note that int() floors for us
-      num_histogram_buckets = int(max_latency / histogram_interval) + 1
-      histogram_buckets = [0 for _ in range(num_histogram_buckets)]
-      for worker_latencies in hist_latencies:
-        for latency in worker_latencies:
-          # Note that int() floors for us
-          histogram_buckets[int(latency / histogram_interval)] += 1
+      histogram_buckets = np.bincount(
+          sorted_buckets[size_starts[size_index]:size_stops[size_index]])
       histogram_str = ','.join([str(c) for c in histogram_buckets])
       histogram_metadata = this_size_metadata.copy()
       histogram_metadata['interval'] = histogram_interval
@@ -776,18 +813,22 @@ def ListConsistencyBenchmark(results, metadata, vm, command_builder,
                                    metadata)
 
 
-def LoadWorkerOutput(output):
-  """Load output from worker processes to our internal format.
+def LoadColumnarWorkerOutput(paths):
+  """Load worker results files written with --results_file.
+
+  The files are memory-mapped rather than parsed, so loading takes time
+  proportional to the number of streams, not the number of operations. See
+  WriteColumnarResults in the API test script for the file format.
 
   Args:
-    output: list of strings. The stdouts of all worker processes.
+    paths: list of strings. The results files of all worker processes.
 
   Returns:
     A tuple of start_time, latency, size. Each of these is a list of
-    numpy arrays, one array per worker process. start_time[i],
-    latency[i], and size[i] together form a table giving the start
-    time, latency, and size (bytes transmitted or received) of all
-    send/receive operations for worker i.
+    numpy arrays, one array per stream. start_time[i], latency[i], and
+    size[i] together form a table giving the start time, latency, and
+    size (bytes transmitted or received) of all send/receive operations
+    for stream i. The arrays are read-only views of the files.
 
     start_time holds POSIX timestamps, stored as np.float64. latency
     holds times in seconds, stored as np.float64. size holds sizes in
@@ -801,25 +842,42 @@ def LoadWorkerOutput(output):
                2.3         0.3      100
 
   Raises:
-    AssertionError, if an individual worker's input includes
-    overlapping operations, or operations that don't move forward in
-    time, or if the input list isn't in stream number order.
+    ValueError, if a file is not a columnar results file.
   """
 
   start_times = []
   latencies = []
   sizes = []
 
-  for worker_out in output:
-    json_out = json.loads(worker_out)
+  for path in paths:
+    with open(path, 'rb') as results_file:
+      magic, num_streams = COLUMNAR_RESULTS_HEADER.unpack(
+          results_file.read(COLUMNAR_RESULTS_HEADER.size))
+    if magic != COLUMNAR_RESULTS_MAGIC:
+      raise ValueError('%s is not a columnar results file.' % path)
+    if not num_streams:
+      continue
 
-    for stream in json_out:
-      assert len(stream['start_times']) == len(stream['latencies'])
-      assert len(stream['latencies']) == len(stream['sizes'])
+    offset = COLUMNAR_RESULTS_HEADER.size
+    stream_table = np.memmap(path, dtype='<i8', mode='r', offset=offset,
+                             shape=(num_streams, 2))
+    bounds = np.concatenate(([0], np.cumsum(stream_table[:, 1])))
+    num_records = bounds[-1]
+    offset += stream_table.nbytes
+    if num_records:
+      times = np.memmap(path, dtype='<f8', mode='r', offset=offset,
+                        shape=(2, num_records))
+      size_column = np.memmap(path, dtype='<i8', mode='r',
+                              offset=offset + times.nbytes,
+                              shape=(num_records,))
+    else:
+      times = np.empty((2, 0), dtype=np.float64)
+      size_column = np.empty(0, dtype=np.int64)
 
-      start_times.append(np.asarray(stream['start_times'], dtype=np.float64))
-      latencies.append(np.asarray(stream['latencies'], dtype=np.float64))
-      sizes.append(np.asarray(stream['sizes'], dtype=np.int64))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+      start_times.append(times[0, start:stop])
+      latencies.append(times[1, start:stop])
+      sizes.append(size_column[start:stop])
 
   return start_times, latencies, sizes
 
@@ -878,6 +936,7 @@ def _MultiStreamOneWay(results, metadata, vms, command_builder,
 
   objects_written_file = posixpath.join(vm_util.VM_TMP_DIR,
                                         OBJECTS_WRITTEN_FILE)
+  results_file = posixpath.join(vm_util.VM_TMP_DIR, MULTISTREAM_RESULTS_FILE)
 
   size_distribution = _DistributionToBackendFormat(
       FLAGS.object_storage_object_sizes)
@@ -898,7 +957,14 @@ def _MultiStreamOneWay(results, metadata, vms, command_builder,
           FLAGS.object_storage_multistream_objects_per_stream),
       '--num_streams=%s' % streams_per_vm,
       '--start_time=%s' % start_time,
-      '--objects_written_file=%s' % objects_written_file]
+      '--objects_written_file=%s' % objects_written_file,
+      '--results_file=%s' % results_file]
+  if FLAGS.object_storage_streams_per_process:
+    cmd_args.append('--streams_per_process=%s' %
+                    FLAGS.object_storage_streams_per_process)
+  if FLAGS.object_storage_parallel_part_size:
+    cmd_args.append('--parallel_part_size=%s' %
+                    FLAGS.object_storage_parallel_part_size)
 
   if operation == 'upload':
     cmd_args += [
@@ -911,12 +977,25 @@ def _MultiStreamOneWay(results, metadata, vms, command_builder,
     raise Exception('Value of operation must be \'upload\' or \'download\'.'
                     'Value is: \'' + operation + '\'')
 
-  output = _RunMultiStreamProcesses(vms, command_builder, cmd_args,
-                                    streams_per_vm)
-  start_times, latencies, sizes = LoadWorkerOutput(output)
+  _RunMultiStreamProcesses(vms, command_builder, cmd_args, streams_per_vm)
+
+  # The results are binary, so they are copied rather than sent over the
+  # remote command's stdout.
   if FLAGS.object_storage_worker_output:
-    with open(FLAGS.object_storage_worker_output, 'w') as out_file:
-      out_file.write(json.dumps(output))
+    local_results_files = [
+        '%s-vm%s' % (FLAGS.object_storage_worker_output, vm_idx)
+        for vm_idx in xrange(len(vms))]
+  else:
+    local_results_files = [
+        vm_util.PrependTempDir(
+            '%s-%s-vm%s' % (MULTISTREAM_RESULTS_FILE, operation, vm_idx))
+        for vm_idx in xrange(len(vms))]
+  vm_util.RunThreaded(
+      lambda vm, local_path: vm.PullFile(local_path, results_file),
+      [((vm, local_path), {})
+       for vm, local_path in zip(vms, local_results_files)])
+  start_times, latencies, sizes = LoadColumnarWorkerOutput(
+      local_results_files)
   _ProcessMultiStreamResults(start_times, latencies, sizes, operation,
                              list(size_distribution.iterkeys()), results,
                              metadata=metadata)
@@ -27,6 +27,7 @@ import logging
 from perfkitbenchmarker import configs
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import load_search
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.linux_packages import redis_server
@@ -37,6 +38,14 @@ flags.DEFINE_integer('redis_clients', 5, 'Number of redis loadgen clients')
 flags.DEFINE_string('redis_setgetratio', '1:0', 'Ratio of reads to write '
                     'performed by the memtier benchmark, default is '
                     '\'1:0\', ie: writes only.')
+flags.DEFINE_float('redis_latency_slo_ms', None,
+                   'If set, rather than adding threads until latency is 20 '
+                   'times the single-thread latency, search for the thread '
+                   'count with the highest throughput whose average latency, '
+                   'in milliseconds, is at most this value.')
+flags.DEFINE_integer('redis_max_threads', 1024,
+                     'The most threads to try when searching with '
+                     '--redis_latency_slo_ms.', lower_bound=1)
 
 MEMTIER_COMMIT = '1.2.0'
 FIRST_PORT = 6379
@@ -140,6 +149,63 @@ def RunLoad(redis_vm, load_vm, threads, port, test_id):
   return RedisResult(throughput, latency)
 
 
+def _RunThreads(redis_vm, load_vms, threads, num_servers):
+  """Runs memtier_benchmark with a total number of threads.
+
+  The threads are spread across the load VMs and Redis servers.
+
+  Returns:
+    A tuple of throughput, in requests per second, and latency, averaged
+    across clients and weighted by throughput, in milliseconds.
+  """
+  num_loaders = len(load_vms) * num_servers
+  args = [((redis_vm, load_vms[i % len(load_vms)], threads / num_loaders +
+            (0 if (i + 1) > threads % num_loaders else 1),
+            FIRST_PORT + i % num_servers, i),
+           {}) for i in range(num_loaders)]
+  client_results = [i for i in vm_util.RunThreaded(RunLoad, args)
+                    if i is not None]
+  logging.info('Redis results by client: %s', client_results)
+  throughput = sum(r.throughput for r in client_results)
+
+  if not throughput:
+    raise errors.Benchmarks.RunError(
+        'Zero throughput for {} threads: {}'.format(threads, client_results))
+
+  # Average latency across clients
+  latency = (sum(client_latency * client_throughput
+                 for client_latency, client_throughput in client_results) /
+             throughput)
+  return throughput, latency
+
+
+def _SearchSaturation(redis_vm, load_vms, num_servers):
+  """Searches for the highest throughput within --redis_latency_slo_ms.
+
+  Returns:
+    A list of (throughput, latency, threads) tuples, in the order they were
+    measured, and a sample.Sample of the highest throughput within the SLO, or
+    None if no thread count met it.
+  """
+  def Measure(threads):
+    throughput, latency = _RunThreads(redis_vm, load_vms, threads, num_servers)
+    return load_search.LoadMeasurement(threads, throughput, latency, None,
+                                       None)
+
+  search = load_search.SaturationSearch(
+      Measure, max_load=FLAGS.redis_max_threads,
+      latency_slo=FLAGS.redis_latency_slo_ms)
+  best = search.Run()
+  measurements = [(m.throughput, m.latency, m.load)
+                  for m in search.measurements]
+  if best is None:
+    return measurements, None
+  return measurements, sample.Sample(
+      'max_throughput_under_latency_slo', best.throughput, 'req/s',
+      {'latency': best.latency, 'threads': best.load,
+       'latency_slo_ms': FLAGS.redis_latency_slo_ms})
+
+
 def Run(benchmark_spec):
   """Run memtier_benchmark against Redis.
 
@@ -158,44 +224,36 @@ def Run(benchmark_spec):
   threads = 0
   results = []
   num_servers = redis_vm.num_cpus * FLAGS.redis_numprocesses
-  max_throughput_for_completion_latency_under_1ms = 0.0
 
-  while latency < latency_threshold:
-    threads += max(1, int(threads * .15))
-    num_loaders = len(load_vms) * num_servers
-    args = [((redis_vm, load_vms[i % len(load_vms)], threads / num_loaders +
-              (0 if (i + 1) > threads % num_loaders else 1),
-              FIRST_PORT + i % num_servers, i),
-             {}) for i in range(num_loaders)]
-    client_results = [i for i in vm_util.RunThreaded(RunLoad, args)
-                      if i is not None]
-    logging.info('Redis results by client: %s', client_results)
-    throughput = sum(r.throughput for r in client_results)
-
-    if not throughput:
-      raise errors.Benchmarks.RunError(
-          'Zero throughput for {} threads: {}'.format(threads, client_results))
-
-    # Average latency across clients
-    latency = (sum(client_latency * client_throughput
-                   for client_latency, client_throughput in client_results) /
-               throughput)
+  if FLAGS.redis_latency_slo_ms is not None:
+    measurements, best = _SearchSaturation(redis_vm, load_vms, num_servers)
+  else:
+    measurements, best = [], None
+    while latency < latency_threshold:
+      threads += max(1, int(threads * .15))
+      throughput, latency = _RunThreads(redis_vm, load_vms, threads,
+                                        num_servers)
+      measurements.append((throughput, latency, threads))
+      logging.info('Threads : %d  (%f, %f) < %f', threads, throughput,
+                   latency, latency_threshold)
+      if threads == 1:
+        latency_threshold = latency * 20
 
+  max_throughput_for_completion_latency_under_1ms = 0.0
+  for throughput, latency, threads in measurements:
     if latency < 1.0:
         max_throughput_for_completion_latency_under_1ms = max(
             max_throughput_for_completion_latency_under_1ms,
             throughput)
     results.append(sample.Sample('throughput', throughput, 'req/s',
                                  {'latency': latency, 'threads': threads}))
-    logging.info('Threads : %d  (%f, %f) < %f', threads, throughput, latency,
-                 latency_threshold)
-    if threads == 1:
-      latency_threshold = latency * 20
 
   results.append(sample.Sample(
                  'max_throughput_for_completion_latency_under_1ms',
                  max_throughput_for_completion_latency_under_1ms,
                  'req/s'))
+  if best is not None:
+    results.append(best)
 
   return results
 
@@ -233,12 +233,11 @@ def Prepare(benchmark_spec):
   vm = benchmark_spec.vms[0]
   speccpu_vm_state = _SpecCpu2006SpecificState()
   setattr(vm, _BENCHMARK_SPECIFIC_VM_STATE_ATTR, speccpu_vm_state)
-  vm.Install('wget')
-  vm.Install('build_tools')
-  vm.Install('fortran')
+  packages = ['wget', 'build_tools', 'fortran']
   if FLAGS.runspec_enable_32bit:
-    vm.Install('multilib')
-  vm.Install('numactl')
+    packages.append('multilib')
+  packages.append('numactl')
+  vm.InstallAll(packages)
   scratch_dir = vm.GetScratchDir()
   vm.RemoteCommand('chmod 777 {0}'.format(scratch_dir))
   speccpu_vm_state.spec_dir = posixpath.join(scratch_dir, _SPECCPU2006_DIR)
@@ -20,7 +20,8 @@ This is close to HTTP-RR:
   * The server does very little work.
 
 Doubles connections up to a fixed count, reports single connection latency and
-maximum error-free throughput.
+maximum error-free throughput. With --tomcat_wrk_saturation_search, connections
+are instead searched for the saturation point (see load_search).
 
 `wrk` is a scalable web load generator.
 `tomcat` is a popular Java web server.
@@ -33,6 +34,7 @@ import urlparse
 
 from perfkitbenchmarker import configs
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import load_search
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.linux_packages import tomcat
 from perfkitbenchmarker.linux_packages import wrk
@@ -49,6 +51,16 @@ flags.DEFINE_boolean('tomcat_wrk_report_all_samples', False,
                      'counts. If false (the default), report only the '
                      'connection counts with lowest p50 latency and highest '
                      'throughput.')
+flags.DEFINE_boolean('tomcat_wrk_saturation_search', False,
+                     'If true, rather than doubling connections up to '
+                     '--tomcat_wrk_max_connections, double them only until '
+                     'throughput stops increasing or an SLO is violated, then '
+                     'bisect towards the highest connection count that meets '
+                     'the SLOs.')
+flags.DEFINE_float('tomcat_wrk_latency_slo_ms', None,
+                   'p99 latency SLO, in milliseconds, for '
+                   '--tomcat_wrk_saturation_search. The error rate SLO is '
+                   'always 1%.')
 
 # Stop when >= 1% of requests have errors
 MAX_ERROR_RATE = 0.01
@@ -97,8 +109,7 @@ def _PrepareServer(vm):
 def _PrepareClient(vm):
   """Install wrk on the client VM."""
   _IncreaseMaxOpenFiles(vm)
-  vm.Install('curl')
-  vm.Install('wrk')
+  vm.InstallAll(['curl', 'wrk'])
 
 
 def Prepare(benchmark_spec):
@@ -118,6 +129,31 @@ def Prepare(benchmark_spec):
                        functools.partial(_PrepareClient, wrk_vm)])
 
 
+def _RunWrk(wrk_vm, target, connections, duration):
+  """Runs wrk with a number of connections.
+
+  Returns:
+    A tuple of a dict mapping metric name to sample, and the error rate.
+  """
+  run_samples = list(wrk.Run(wrk_vm, connections=connections, target=target,
+                             duration=duration))
+
+  by_metric = {i.metric: i for i in run_samples}
+  errors = by_metric['errors'].value
+  requests = by_metric['requests'].value
+  throughput = by_metric['throughput'].value
+  if requests < 1:
+    logging.warn('No requests issued for %d connections.',
+                 connections)
+    error_rate = 1.0
+  else:
+    error_rate = float(errors) / requests
+
+  logging.info('Ran with %d connections; %.2f%% errors, %.2f req/s',
+               connections, error_rate, throughput)
+  return by_metric, error_rate
+
+
 def Run(benchmark_spec):
   """Run wrk against tomcat.
 
@@ -132,7 +168,6 @@ def Run(benchmark_spec):
   wrk_vm = benchmark_spec.vm_groups['client'][0]
 
   samples = []
-  errors = 0
   connections = 1
   duration = FLAGS.tomcat_wrk_test_length
   max_connections = FLAGS.tomcat_wrk_max_connections
@@ -144,34 +179,31 @@ def Run(benchmark_spec):
   logging.info('Warming up for %ds', WARM_UP_DURATION)
   list(wrk.Run(wrk_vm, connections=1, target=target, duration=WARM_UP_DURATION))
 
-  all_by_metric = []
-
-  while connections <= max_connections:
-    run_samples = list(wrk.Run(wrk_vm, connections=connections, target=target,
-                               duration=duration))
-
-    by_metric = {i.metric: i for i in run_samples}
-    errors = by_metric['errors'].value
-    requests = by_metric['requests'].value
-    throughput = by_metric['throughput'].value
-    if requests < 1:
-      logging.warn('No requests issued for %d connections.',
-                   connections)
-      error_rate = 1.0
-    else:
-      error_rate = float(errors) / requests
-
-    if error_rate <= MAX_ERROR_RATE:
-      all_by_metric.append(by_metric)
-    else:
-      logging.warn('Error rate exceeded maximum (%g > %g)', error_rate,
-                   MAX_ERROR_RATE)
-
-    logging.info('Ran with %d connections; %.2f%% errors, %.2f req/s',
-                 connections, error_rate, throughput)
-
-    # Retry with double the connections
-    connections *= 2
+  if FLAGS.tomcat_wrk_saturation_search:
+    def Measure(connections):
+      by_metric, error_rate = _RunWrk(wrk_vm, target, connections, duration)
+      return load_search.LoadMeasurement(
+          connections, by_metric['throughput'].value,
+          by_metric['p99 latency'].value, error_rate, by_metric)
+    search = load_search.SaturationSearch(
+        Measure, max_load=max_connections,
+        latency_slo=FLAGS.tomcat_wrk_latency_slo_ms,
+        max_error_rate=MAX_ERROR_RATE)
+    search.Run()
+    all_by_metric = [m.result for m in search.measurements
+                     if search.MeetsSlo(m)]
+  else:
+    all_by_metric = []
+    while connections <= max_connections:
+      by_metric, error_rate = _RunWrk(wrk_vm, target, connections, duration)
+      if error_rate <= MAX_ERROR_RATE:
+        all_by_metric.append(by_metric)
+      else:
+        logging.warn('Error rate exceeded maximum (%g > %g)', error_rate,
+                     MAX_ERROR_RATE)
+
+      # Retry with double the connections
+      connections *= 2
 
   if not all_by_metric:
     raise ValueError('No requests succeeded.')
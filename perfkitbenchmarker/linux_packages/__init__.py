@@ -43,14 +43,16 @@ from perfkitbenchmarker import import_util
 INSTALL_DIR = '/opt/pkb'
 
 
-def _LoadPackages():
-  packages = dict([(module.__name__.split('.')[-1], module) for module in
-                   import_util.LoadModulesForPath(__path__, __name__)])
-  packages.update(packages['docker'].CreateImagePackages())
-  return packages
+def _GetEntries(module):
+  """Returns the packages a module registers: itself, and any it creates."""
+  entries = [(module.__name__.split('.')[-1], module)]
+  if hasattr(module, 'CreateImagePackages'):
+    entries.extend(module.CreateImagePackages())
+  return entries
 
 
-PACKAGES = _LoadPackages()
+# Package modules are imported on first use, see module_index.
+PACKAGES = import_util.LazyModuleDict(__path__, __name__, _GetEntries)
 
 
 def GetPipPackageVersion(vm, package_name):
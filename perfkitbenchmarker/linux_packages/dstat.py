@@ -20,16 +20,15 @@ import itertools
 import numpy as np
 
 
-def ParseCsvFile(fp):
-  """Parse dstat results file in csv format.
+def _ParseCsvHeader(reader):
+  """Parses the header lines of a dstat csv file.
 
   Args:
-    file: string. Name of the file.
+    reader: csv.reader positioned at the start of the file.
 
   Returns:
-    A tuple of list of dstat labels and ndarray containing parsed data.
+    A list of dstat labels, one per column.
   """
-  reader = csv.reader(fp)
   headers = list(itertools.islice(reader, 5))
   if len(headers) != 5:
     raise ValueError(
@@ -58,9 +57,11 @@ def ParseCsvFile(fp):
             len(categories), len(labels), categories, labels))
 
   # Generate new column names
-  labels = ['%s__%s' % x for x in zip(labels, categories)]
+  return ['%s__%s' % x for x in zip(labels, categories)]
+
 
-  data = []
+def _ParseCsvRows(reader, labels):
+  """Yields the data rows of a dstat csv file as lists of strings."""
   for i, row in enumerate(reader):
     # Remove the trailing comma
     if len(row) == len(labels) + 1:
@@ -73,8 +74,39 @@ def ParseCsvFile(fp):
       raise ValueError(('Number of labels ({}) does not match number of '
                         'columns ({}) in row {}:\n{}').format(
                             len(labels), len(row), i, row))
-    data.append(row)
-  return labels, np.array(data, dtype=float)
+    yield row
+
+
+def ParseCsvFile(fp):
+  """Parse dstat results file in csv format.
+
+  Args:
+    file: string. Name of the file.
+
+  Returns:
+    A tuple of list of dstat labels and ndarray containing parsed data.
+  """
+  reader = csv.reader(fp)
+  labels = _ParseCsvHeader(reader)
+  return labels, np.array(list(_ParseCsvRows(reader, labels)), dtype=float)
+
+
+def IterCsvFile(fp):
+  """Parse dstat results file in csv format one row at a time.
+
+  Unlike ParseCsvFile, only one row is held in memory at a time.
+
+  Args:
+    fp: file object or iterator of lines.
+
+  Returns:
+    A tuple of list of dstat labels and an iterator of 1-dimensional ndarrays,
+    one per row. The header is parsed, and validated, before returning.
+  """
+  reader = csv.reader(fp)
+  labels = _ParseCsvHeader(reader)
+  return labels, (np.array(row, dtype=float)
+                  for row in _ParseCsvRows(reader, labels))
 
 
 def _Install(vm):
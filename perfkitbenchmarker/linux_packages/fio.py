@@ -13,16 +13,19 @@
 # limitations under the License.
 
 """Module containing fio installation, cleanup, parsing functions."""
+import collections
 import csv
 import ConfigParser
 import io
-import json
 import time
 
-from collections import Counter
+import numpy as np
+
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import regex_util
 from perfkitbenchmarker import sample
+from perfkitbenchmarker import steady_state
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.linux_packages import INSTALL_DIR
 
@@ -139,7 +142,7 @@ def FioParametersToJob(fio_parameters):
 
 
 def ParseResults(job_file, fio_json_result, base_metadata=None,
-                 log_file_base='', bin_vals=[]):
+                 log_file_base='', bin_vals=[], steady_state_interval_ms=None):
   """Parse fio json output into samples.
 
   Args:
@@ -150,6 +153,9 @@ def ParseResults(job_file, fio_json_result, base_metadata=None,
     bin_vals: A 2-D list of int. Each list represents a list of
       bin values in histgram log. Calculated from remote VM using
       fio/tools/hist/fiologparser_hist.py
+    steady_state_interval_ms: None, or int. If set, the bandwidth log of each
+      job, averaged over intervals of this many milliseconds, is searched for
+      a steady state.
 
   Returns:
     A list of sample.Sample objects.
@@ -234,6 +240,11 @@ def ParseResults(job_file, fio_json_result, base_metadata=None,
           '%s_clat_hist.%s.log' % (log_file_base, str(idx + 1)))
       samples += _ParseHistogram(
           hist_file_path, bin_vals[idx], job_name, parameters)
+    if log_file_base and steady_state_interval_ms:
+      bw_file_path = vm_util.PrependTempDir(
+          '%s_bw.%s.log' % (log_file_base, str(idx + 1)))
+      samples += _ParseBandwidthSteadyState(
+          bw_file_path, steady_state_interval_ms, job_name, parameters)
   return samples
 
 
@@ -289,20 +300,48 @@ def _ParseHistogram(hist, mean_bin_vals, metric_prefix='',
       # Use (data direction, block size) as key
       key = (DATA_DIRECTION[int(r[1])], int(r[2]))
 
-      hist_list = []
-      for idx, v in enumerate(r[HIST_BUCKET_START_IDX:]):
-        if int(v):
-          hist_list.append((mean_bin_vals[idx], int(v)))
-      todict = dict(hist_list)
+      # Every row has the same bins, so merging is a vector addition.
+      row = histogram.Histogram(
+          mean_bin_vals, np.array(r[HIST_BUCKET_START_IDX:], dtype=np.int64))
       if key not in aggregates:
-        aggregates[key] = Counter()
-      aggregates[key].update(todict)
+        aggregates[key] = row
+      else:
+        aggregates[key].Merge(row)
   samples = []
   for (rw, bs) in aggregates.keys():
-    metadata = {'histogram': json.dumps(aggregates[(rw, bs)])}
+    metadata = {'histogram': aggregates[(rw, bs)].ToJson()}
     metadata.update(additional_metadata)
     samples.append(
         sample.Sample(
             ':'.join([metric_prefix, str(bs), rw, 'histogram']),
             0, 'us', metadata))
   return samples
+
+
+def _ParseBandwidthSteadyState(bw_log, interval_ms, metric_prefix='',
+                               additional_metadata={}):
+  """Finds the steady state of the bandwidth logged by fio.
+
+  Args:
+    bw_log: String. File name of fio bandwidth log. Format:
+      time (msec), bandwidth (KB/s), data direction (0: read, 1: write,
+      2: trim), block size
+    interval_ms: int. Interval at which fio logged the bandwidth.
+    metric_prefix: String. Prefix of the metric name to use.
+    additional_metadata: dict. Additional metadata attaching to Sample.
+
+  Returns:
+    List of sample.Sample objects, describing the steady state of each data
+    direction.
+  """
+  bandwidths = collections.defaultdict(list)
+  with open(bw_log) as f:
+    for r in csv.reader(f, delimiter=','):
+      bandwidths[DATA_DIRECTION[int(r[2])]].append(float(r[1]))
+  samples = []
+  for rw, values in sorted(bandwidths.items()):
+    samples += steady_state.CreateSamples(
+        ':'.join([metric_prefix, rw, 'bandwidth']),
+        steady_state.FindSteadyStateFromFlags(values), len(values),
+        interval_ms / 1000.0, 'KB/s', additional_metadata)
+  return samples
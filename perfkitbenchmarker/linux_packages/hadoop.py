@@ -23,6 +23,7 @@ import posixpath
 import re
 import time
 
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import data
 from perfkitbenchmarker import regex_util
 from perfkitbenchmarker import vm_util
@@ -57,9 +58,7 @@ def CheckPrerequisites():
 def _Install(vm):
   vm.Install('openjdk')
   vm.Install('curl')
-  vm.RemoteCommand(('mkdir {0} && curl -L {1} | '
-                    'tar -C {0} --strip-components=1 -xzf -').format(
-                        HADOOP_DIR, HADOOP_URL))
+  artifact_cache.InstallTarball(vm, HADOOP_URL, HADOOP_DIR)
 
 
 def YumInstall(vm):
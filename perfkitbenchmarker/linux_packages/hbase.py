@@ -23,6 +23,7 @@ import posixpath
 import re
 import urllib2
 
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import data
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.linux_packages import hadoop
@@ -62,9 +63,7 @@ def _Install(vm):
   vm.Install('hadoop')
   vm.Install('curl')
   hbase_url = _GetHBaseURL()
-  vm.RemoteCommand(('mkdir {0} && curl -L {1} | '
-                    'tar -C {0} --strip-components=1 -xzf -').format(
-                        HBASE_DIR, hbase_url))
+  artifact_cache.InstallTarball(vm, hbase_url, HBASE_DIR)
 
 
 def YumInstall(vm):
@@ -23,6 +23,7 @@ Installing Tomcat via this module makes some changes to the default settings:
 https://tomcat.apache.org/
 """
 import posixpath
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import flags
 from perfkitbenchmarker.linux_packages import INSTALL_DIR
 
@@ -49,10 +50,7 @@ _TOMCAT_PROTOCOL = 'org.apache.coyote.http11.Http11Nio2Protocol'
 def _Install(vm):
   vm.Install('openjdk')
   vm.Install('curl')
-  vm.RemoteCommand(
-      ('mkdir -p {0} && curl -L {1} | '
-       'tar -C {0} --strip-components 1 -xzf -').format(TOMCAT_DIR,
-                                                        FLAGS.tomcat_url))
+  artifact_cache.InstallTarball(vm, FLAGS.tomcat_url, TOMCAT_DIR)
 
   # Use a non-blocking protocool, and disable access logging (which isn't very
   # helpful during load tests).
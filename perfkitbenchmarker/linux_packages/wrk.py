@@ -23,6 +23,7 @@ import csv
 import io
 import posixpath
 
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import sample
 from perfkitbenchmarker.linux_packages import INSTALL_DIR
 
@@ -48,10 +49,7 @@ def _Install(vm):
   vm.Install('curl')
   vm.Install('openssl')
 
-  vm.RemoteCommand(('mkdir -p {0} && curl -L {1} '
-                    '| tar --strip-components=1 -C {0} -xzf -').format(
-                        WRK_DIR,
-                        WRK_URL))
+  artifact_cache.InstallTarball(vm, WRK_URL, WRK_DIR)
   vm.RemoteCommand('cd {} && make'.format(WRK_DIR))
   vm.PushDataFile(_LUA_SCRIPT_NAME, _LUA_SCRIPT_PATH)
 
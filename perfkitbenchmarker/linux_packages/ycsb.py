@@ -35,12 +35,11 @@ By default, this runs YCSB workloads A and B against the database, 32 threads
 per client VM, with an initial database size of 1GB (1k records).
 Each workload runs for at most 30 minutes.
 """
-import bisect
 import collections
 import copy
 import csv
+import functools
 import io
-import itertools
 import math
 import re
 import logging
@@ -49,10 +48,14 @@ import os
 import posixpath
 import time
 
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import data
 from perfkitbenchmarker import events
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import load_search
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import sample
+from perfkitbenchmarker import steady_state
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.linux_packages import INSTALL_DIR
 
@@ -122,6 +125,17 @@ flags.DEFINE_integer('ycsb_operation_count', 1000000, 'Number of operations '
 flags.DEFINE_integer('ycsb_timelimit', 1800, 'Maximum amount of time to run '
                      'each workload / client count combination. Set to 0 for '
                      'unlimited time.')
+flags.DEFINE_integer('ycsb_status_interval', 0, 'If non-zero, the interval, in '
+                     'seconds, at which each client VM reports throughput '
+                     'and latency while a workload runs. Each report becomes '
+                     'a rolling sample.', lower_bound=0)
+flags.DEFINE_float('ycsb_latency_slo_ms', None, 'If set, rather than running '
+                   'each of --ycsb_threads_per_client, search between the '
+                   'lowest and highest of them for the thread count with the '
+                   'highest throughput whose p99 latency, for every '
+                   'operation, is at most this many milliseconds. Runs are '
+                   'reported as usual, plus an "overall max sustainable '
+                   'Throughput" sample for each workload.')
 
 # Default loading thread count for non-batching backends.
 DEFAULT_PRELOAD_THREADS = 32
@@ -154,9 +168,7 @@ def _Install(vm):
   """Installs the YCSB package on the VM."""
   vm.Install('openjdk')
   vm.Install('curl')
-  vm.RemoteCommand(('mkdir -p {0} && curl -L {1} | '
-                    'tar -C {0} --strip-components=1 -xzf -').format(
-                        YCSB_DIR, YCSB_TAR_URL))
+  artifact_cache.InstallTarball(vm, YCSB_TAR_URL, YCSB_DIR)
 
 
 def YumInstall(vm):
@@ -201,148 +213,195 @@ def ParseResults(ycsb_result_string, data_type='histogram'):
       groups: list of operation group descriptions, each with schema:
         group: group name (e.g., update, insert, overall)
         statistics: dict mapping from statistic name to value
-        histogram: list of (ms_lower_bound, count) tuples, e.g.:
+        histogram: histogram.Histogram. Equal to a list of (ms_lower_bound,
+          count) tuples such as:
           [(0, 530), (19, 1)]
         indicates that 530 ops took between 0ms and 1ms, and 1 took between
         19ms and 20ms. Empty bins are not reported.
+        timeseries: list of (ms_since_start, value) tuples, if data_type is
+          'timeseries'.
   """
+  parser = IncrementalResultParser(data_type)
+  for line in io.BytesIO(ycsb_result_string):
+    parser.Feed(line)
+  return parser.GetResult()
 
-  # TODO: YCSB 0.9.0 output client and command line string to stderr, so
-  # we need to support it in the future.
-  lines = []
-  client_string = 'YCSB'
-  command_line = 'unknown'
-  fp = io.BytesIO(ycsb_result_string)
-  result_string = next(fp).strip()
-
-  def IsHeadOfResults(line):
-      return line.startswith('YCSB Client 0.') or line.startswith('[OVERALL]')
-
-  while not IsHeadOfResults(result_string):
-    result_string = next(fp).strip()
-
-  if result_string.startswith('YCSB Client 0.'):
-    client_string = result_string
-    command_line = next(fp).strip()
-    if not command_line.startswith('Command line:'):
-      raise IOError('Unexpected second line: {0}'.format(command_line))
-  elif result_string.startswith('[OVERALL]'):  # YCSB > 0.7.0.
-    lines.append(result_string)
-  else:
-    # Received unexpected header
-    raise IOError('Unexpected header: {0}'.format(client_string))
-
-  # Some databases print additional output to stdout.
-  # YCSB results start with [<OPERATION_NAME>];
-  # filter to just those lines.
-  def LineFilter(line):
-    return re.search(r'^\[[A-Z]+\]', line) is not None
-  lines = itertools.chain(lines, itertools.ifilter(LineFilter, fp))
-
-  r = csv.reader(lines)
-
-  by_operation = itertools.groupby(r, operator.itemgetter(0))
-
-  result = collections.OrderedDict([
-      ('client', client_string),
-      ('command_line', command_line),
-      ('groups', collections.OrderedDict())])
-
-  for operation, lines in by_operation:
+
+class IncrementalResultParser(object):
+  """Parses YCSB output one line at a time.
+
+  Feeding the lines of YCSB's output to Feed and then calling GetResult is
+  equivalent to calling ParseResults on the whole output, but only the parsed
+  statistics and histogram buckets are held in memory, so the parser can
+  consume the output of a remote command while it is still running.
+
+  Status lines, which YCSB prints every status.interval seconds when run with
+  '-s', are parsed as they arrive and passed to status_callback.
+
+  Attributes:
+    data_type: Either 'histogram' or 'timeseries'.
+    status_callback: None, or a function called with a YcsbStatus for each
+        status line.
+  """
+
+  def __init__(self, data_type='histogram', status_callback=None):
+    self.data_type = data_type
+    self.status_callback = status_callback
+    self._client_string = 'YCSB'
+    self._command_line = 'unknown'
+    # One of 'header', 'command_line' or 'results': the part of the output
+    # the next line is expected to belong to.
+    self._state = 'header'
+    self._groups = collections.OrderedDict()
+
+  def Feed(self, line):
+    """Parses a single line of YCSB output.
+
+    Raises:
+      IOError: If the output does not have the expected format.
+    """
+    status = _ParseStatusLine(line)
+    if status:
+      if self.status_callback:
+        self.status_callback(status)
+      return
+
+    stripped = line.strip()
+    if self._state == 'header':
+      if stripped.startswith('YCSB Client 0.'):
+        self._client_string = stripped
+        self._state = 'command_line'
+      elif stripped.startswith('[OVERALL]'):  # YCSB > 0.7.0.
+        self._state = 'results'
+        self._ParseResultLine(stripped)
+    elif self._state == 'command_line':
+      if not stripped.startswith('Command line:'):
+        raise IOError('Unexpected second line: {0}'.format(stripped))
+      self._command_line = stripped
+      self._state = 'results'
+    # Some databases print additional output to stdout.
+    # YCSB results start with [<OPERATION_NAME>];
+    # filter to just those lines.
+    elif re.search(r'^\[[A-Z]+\]', line) is not None:
+      self._ParseResultLine(line)
+
+  def _ParseResultLine(self, line):
+    (operation, name, val), = csv.reader([line])
     operation = operation[1:-1].lower()
 
     if operation == 'cleanup':
-      continue
-
-    op_result = {
-        'group': operation,
-        data_type: [],
-        'statistics': {}
-    }
-    for _, name, val in lines:
-      name = name.strip()
-      val = val.strip()
-      # Drop ">" from ">1000"
-      if name.startswith('>'):
-        name = name[1:]
-      val = float(val) if '.' in val or 'nan' in val.lower() else int(val)
-      if name.isdigit():
-        if val:
-          op_result[data_type].append((int(name), val))
-      else:
-        if '(us)' in name:
-          name = name.replace('(us)', '(ms)')
-          val /= 1000.0
-        op_result['statistics'][name] = val
+      return
+
+    if operation not in self._groups:
+      self._groups[operation] = {'statistics': {}, 'buckets': [], 'counts': []}
+    group = self._groups[operation]
+
+    name = name.strip()
+    val = val.strip()
+    # Drop ">" from ">1000"
+    if name.startswith('>'):
+      name = name[1:]
+    val = float(val) if '.' in val or 'nan' in val.lower() else int(val)
+    if name.isdigit():
+      if val:
+        group['buckets'].append(int(name))
+        group['counts'].append(val)
+    else:
+      if '(us)' in name:
+        name = name.replace('(us)', '(ms)')
+        val /= 1000.0
+      group['statistics'][name] = val
 
-    result['groups'][operation] = op_result
-  return result
+  def GetResult(self):
+    """Returns the results parsed so far, in the format of ParseResults.
+
+    Raises:
+      IOError: If no YCSB results have been parsed.
+    """
+    if self._state != 'results':
+      raise IOError('No YCSB results found.')
+    result = collections.OrderedDict([
+        ('client', self._client_string),
+        ('command_line', self._command_line),
+        ('groups', collections.OrderedDict())])
+    for operation, group in self._groups.iteritems():
+      pairs = zip(group['buckets'], group['counts'])
+      result['groups'][operation] = {
+          'group': operation,
+          'statistics': group['statistics'].copy(),
+          self.data_type: (histogram.Histogram.FromPairs(pairs)
+                           if self.data_type == 'histogram' else pairs)}
+    return result
 
 
-def _CumulativeSum(xs):
-  total = 0
-  for x in xs:
-    total += x
-    yield total
+# A status line printed by YCSB when run with '-s'.
+YcsbStatus = collections.namedtuple(
+    'YcsbStatus', ['elapsed_sec', 'operations', 'throughput', 'latencies'])
 
+_STATUS_RE = re.compile(r' (\d+) sec: (\d+) operations;'
+                        r'(?: ([\d.]+) current ops/sec;)?')
+# YCSB < 0.10 reports '[READ AverageLatency(us)=431.06]', later versions
+# '[READ: Count=100, Max=..., Min=..., Avg=431.06, ...]'.
+_STATUS_LATENCY_RE = re.compile(
+    r'\[([A-Z-]+)(?: AverageLatency\(us\)=|:[^\]]*\bAvg=)([\d.]+)')
 
-def _WeightedQuantile(x, weights, p):
-  """Weighted quantile measurement for an ordered list.
 
-  This method interpolates to the higher value when the quantile is not a direct
-  member of the list. This works well for YCSB, since latencies are floored.
+def _ParseStatusLine(line):
+  """Parses a YCSB status line.
+
+  Example input:
+
+    2016-09-29 10:53:57:447 10 sec: 11634 operations; 1163.28 current ops/sec;
+    est completion in 14 minutes [READ AverageLatency(us)=431.06]
+    [UPDATE AverageLatency(us)=410.5]
+
+  (on a single line).
 
   Args:
-    x: List of values.
-    weights: List of numeric weights.
-    p: float. Desired quantile in the interval [0, 1].
+    line: str. A line of YCSB output.
 
   Returns:
-    float.
-
-  Raises:
-    ValueError: When 'x' and 'weights' are not the same length, or 'p' is not in
-      the interval [0, 1].
+    A YcsbStatus with latencies as a dict mapping from lowercase operation name
+    to average latency in ms since the previous status line, or None if line is
+    not a status line.
   """
-  if len(x) != len(weights):
-    raise ValueError('Lengths do not match: {0} != {1}'.format(
-        len(x), len(weights)))
-  if p < 0 or p > 1:
-    raise ValueError('Invalid quantile: {0}'.format(p))
-  n = sum(weights)
-  target = n * float(p)
-  cumulative = list(_CumulativeSum(weights))
-
-  # Find the first cumulative weight >= target
-  i = bisect.bisect_left(cumulative, target)
-  if i == len(x):
-    return x[-1]
-  else:
-    return x[i]
+  match = _STATUS_RE.search(line)
+  if not match:
+    return None
+  elapsed_sec, operations, throughput = match.groups()
+  latencies = {}
+  for operation, latency in _STATUS_LATENCY_RE.findall(line):
+    if operation != 'CLEANUP':
+      latencies[operation.lower()] = float(latency) / 1000.0
+  return YcsbStatus(int(elapsed_sec), int(operations),
+                    float(throughput) if throughput else 0.0, latencies)
 
 
 def _PercentilesFromHistogram(ycsb_histogram, percentiles=_DEFAULT_PERCENTILES):
   """Calculate percentiles for from a YCSB histogram.
 
+  All percentiles are computed in a single pass over the histogram.
+
   Args:
-    ycsb_histogram: List of (time_ms, frequency) tuples.
+    ycsb_histogram: histogram.Histogram, or list of (time_ms, frequency)
+      tuples.
     percentiles: iterable of floats, in the interval [0, 100].
 
   Returns:
     dict, mapping from percentile to value.
   """
-  result = collections.OrderedDict()
-  histogram = sorted(ycsb_histogram)
+  if not isinstance(ycsb_histogram, histogram.Histogram):
+    ycsb_histogram = histogram.Histogram.FromPairs(ycsb_histogram)
+  labels = []
   for percentile in percentiles:
     if percentile < 0 or percentile > 100:
       raise ValueError('Invalid percentile: {0}'.format(percentile))
     if math.modf(percentile)[0] < 1e-7:
       percentile = int(percentile)
-    label = 'p{0}'.format(percentile)
-    latencies, freqs = zip(*histogram)
-    time_ms = _WeightedQuantile(latencies, freqs, percentile * 0.01)
-    result[label] = time_ms
-  return result
+    labels.append('p{0}'.format(percentile))
+  values = ycsb_histogram.Percentiles(percentiles)
+  return collections.OrderedDict(
+      (label, int(value)) for label, value in zip(labels, values))
 
 
 def _CombineResults(result_list, combine_histograms=True):
@@ -367,13 +426,11 @@ def _CombineResults(result_list, combine_histograms=True):
         group['statistics'].pop(k, None)
 
   def CombineHistograms(hist1, hist2):
-    h1 = dict(hist1)
-    h2 = dict(hist2)
-    keys = sorted(frozenset(h1) | frozenset(h2))
-    result = []
-    for k in keys:
-      result.append((k, h1.get(k, 0) + h2.get(k, 0)))
-    return result
+    if not isinstance(hist1, histogram.Histogram):
+      hist1 = histogram.Histogram.FromPairs(hist1)
+    if not isinstance(hist2, histogram.Histogram):
+      hist2 = histogram.Histogram.FromPairs(hist2)
+    return hist1.Merge(hist2)
 
   result = copy.deepcopy(result_list[0])
   DropUnaggregated(result)
@@ -485,12 +542,104 @@ def _CreateSamples(ycsb_result, include_histogram=True, **kwargs):
                             value, 'ms', meta)
 
     if include_histogram:
+      # Iterating a Histogram yields only its non-empty buckets.
       for time_ms, count in group['histogram']:
         yield sample.Sample(
             '{0}_latency_histogram_{1}_ms'.format(group_name, time_ms),
             count, 'count', meta)
 
 
+def _CreateStatusSamples(status, **kwargs):
+  """Create rolling PKB samples from a YCSB status report.
+
+  Args:
+    status: YcsbStatus.
+    **kwargs: Base metadata for each sample.
+
+  Returns:
+    List of sample.Sample objects.
+  """
+  meta = kwargs.copy()
+  meta.update(elapsed_sec=status.elapsed_sec,
+              operations=status.operations)
+  samples = [sample.Sample('overall rolling Throughput', status.throughput,
+                           'ops/sec', meta)]
+  for operation, latency in sorted(status.latencies.iteritems()):
+    samples.append(sample.Sample(
+        ' '.join([operation, 'rolling AverageLatency']), latency, 'ms', meta))
+  return samples
+
+
+def _CreateSteadyStateSamples(statuses, **kwargs):
+  """Create steady-state PKB samples from the YCSB status reports of a run.
+
+  Args:
+    statuses: list of YcsbStatus, from any number of client VMs.
+    **kwargs: Base metadata for each sample.
+
+  Returns:
+    List of sample.Sample objects.
+  """
+  throughputs = collections.defaultdict(float)
+  for status in statuses:
+    if status.throughput is not None:
+      throughputs[status.elapsed_sec] += status.throughput
+  series = [throughputs[elapsed] for elapsed in sorted(throughputs)]
+  return steady_state.CreateSamples(
+      'overall rolling Throughput',
+      steady_state.FindSteadyStateFromFlags(series), len(series),
+      FLAGS.ycsb_status_interval, 'ops/sec', kwargs)
+
+
+def _GetP99LatencyMs(ycsb_result):
+  """Returns the highest p99 latency of any operation in a YCSB result.
+
+  Returns:
+    The latency in milliseconds, or None if the result has no histograms.
+  """
+  latencies = [_PercentilesFromHistogram(group['histogram'], [99])['p99']
+               for group in ycsb_result['groups'].itervalues()
+               if group.get('histogram')]
+  return max(latencies) if latencies else None
+
+
+def _SearchSaturation(run_with_threads, num_vms, workload_meta):
+  """Searches for the highest throughput within --ycsb_latency_slo_ms.
+
+  Args:
+    run_with_threads: function. Runs the workload with a number of threads per
+      client VM and returns the combined result.
+    num_vms: int. Number of client VMs.
+    workload_meta: dict. Metadata of the workload.
+
+  Returns:
+    List of sample.Sample objects. Empty if no thread count met the SLO.
+  """
+  def Measure(client_count):
+    combined = run_with_threads(client_count)
+    throughput = combined['groups']['overall']['statistics'][
+        'Throughput(ops/sec)']
+    return load_search.LoadMeasurement(
+        client_count, throughput, _GetP99LatencyMs(combined), None, combined)
+
+  thread_counts = _GetThreadsPerLoaderList()
+  search = load_search.SaturationSearch(
+      Measure, min_load=min(thread_counts), max_load=max(thread_counts),
+      latency_slo=FLAGS.ycsb_latency_slo_ms)
+  best = search.Run()
+  if best is None:
+    return []
+  metadata = workload_meta.copy()
+  metadata.update(clients=num_vms * best.load,
+                  threads_per_client_vm=best.load,
+                  p99_latency_ms=best.latency,
+                  latency_slo_ms=FLAGS.ycsb_latency_slo_ms,
+                  result_type='saturation_search',
+                  search_runs=len(search.measurements))
+  return [sample.Sample('overall max sustainable Throughput', best.throughput,
+                        'ops/sec', metadata)]
+
+
 class YCSBExecutor(object):
   """Load data and run benchmarks using YCSB.
 
@@ -649,20 +798,50 @@ class YCSBExecutor(object):
 
     return samples
 
-  def _Run(self, vm, **kwargs):
-    """Run a single workload from a client vm."""
+  def _Run(self, vm, status_callback=None, **kwargs):
+    """Run a single workload from a client vm.
+
+    YCSB's output is parsed line by line as it is streamed from the VM, so it
+    is never held in memory as a whole.
+
+    Args:
+      vm: VirtualMachine. The client VM.
+      status_callback: None, or a function called with a YcsbStatus each time
+        the client reports its progress. Progress is only reported if
+        --ycsb_status_interval is non-zero.
+      **kwargs: Additional parameters to pass to YCSB.
+
+    Returns:
+      dict. The result, as returned by ParseResults.
+    """
     for pv in FLAGS.ycsb_run_parameters:
       param, value = pv.split('=', 1)
       kwargs[param] = value
+    report_status = status_callback and FLAGS.ycsb_status_interval
+    if report_status:
+      kwargs['status.interval'] = FLAGS.ycsb_status_interval
     command = self._BuildCommand('run', **kwargs)
+    if report_status:
+      command += ' -s'
     # YCSB version greater than 0.7.0 output some of the
     # info we need to stderr. So we have to combine these 2
     # output to get expected results.
-    stdout, stderr = vm.RobustRemoteCommand(command)
-    return ParseResults(str(stderr + stdout))
+    parser = IncrementalResultParser(status_callback=status_callback)
+    vm.RobustRemoteCommand(command + ' 2>&1', line_callback=parser.Feed)
+    return parser.GetResult()
+
+  def _RunThreaded(self, vms, status_callback=None, **kwargs):
+    """Run a single workload using `vms`.
+
+    Args:
+      vms: List of VirtualMachine objects to generate load from.
+      status_callback: None, or a function called with the index of the VM in
+        'vms' and a YcsbStatus each time a client reports its progress.
+      **kwargs: Additional parameters to pass to each run.
 
-  def _RunThreaded(self, vms, **kwargs):
-    """Run a single workload using `vms`."""
+    Returns:
+      List of results, as returned by ParseResults.
+    """
     target = kwargs.pop('target', None)
     if target is not None:
       target_per_client = target // len(vms)
@@ -692,6 +871,9 @@ class YCSBExecutor(object):
         end = start + loader_counts[loader_index]
         params.update(insertstart=start,
                       recordcount=end)
+      if status_callback:
+        params['status_callback'] = functools.partial(status_callback,
+                                                      loader_index)
       results.append(self._Run(vm, **params))
       logging.info('VM %d (%s) finished', loader_index, vm)
     vm_util.RunThreaded(_Run, range(len(vms)))
@@ -706,7 +888,8 @@ class YCSBExecutor(object):
     """Run each workload in 'workloads' in succession.
 
     A staircase load is applied for each workload file, for each entry in
-    ycsb_threads_per_client.
+    ycsb_threads_per_client. With --ycsb_latency_slo_ms, thread counts are
+    instead searched for the highest throughput within the SLO.
 
     Args:
       vms: List of VirtualMachine objects to generate load from.
@@ -738,16 +921,33 @@ class YCSBExecutor(object):
       vm_util.RunThreaded(PushWorkload, vms)
 
       parameters['parameter_files'] = [remote_path]
-      for client_count in _GetThreadsPerLoaderList():
+
+      def RunWithThreads(client_count):
+        """Runs the workload and returns the combined result."""
         parameters['threads'] = client_count
+        client_meta = workload_meta.copy()
+        client_meta.update(clients=len(vms) * client_count,
+                           threads_per_client_vm=client_count)
+
+        statuses = []
+
+        def RecordStatus(loader_index, status):
+          logging.info('VM %d (%s): %s', loader_index, vms[loader_index],
+                       status)
+          statuses.append(status)
+          all_results.extend(_CreateStatusSamples(
+              status, result_type='status', result_index=loader_index,
+              **client_meta))
+
         start = time.time()
-        results = self._RunThreaded(vms, **parameters)
+        results = self._RunThreaded(vms, status_callback=RecordStatus,
+                                    **parameters)
         events.record_event.send(
             type(self).__name__, event='run', start_timestamp=start,
             end_timestamp=time.time(), metadata=copy.deepcopy(parameters))
-        client_meta = workload_meta.copy()
-        client_meta.update(clients=len(vms) * client_count,
-                           threads_per_client_vm=client_count)
+        if FLAGS.steady_state_detection:
+          all_results.extend(_CreateSteadyStateSamples(statuses,
+                                                       **client_meta))
 
         if FLAGS.ycsb_include_individual_results and len(results) > 1:
           for i, result in enumerate(results):
@@ -763,6 +963,14 @@ class YCSBExecutor(object):
             combined, result_type='combined',
             include_histogram=FLAGS.ycsb_histogram,
             **client_meta))
+        return combined
+
+      if FLAGS.ycsb_latency_slo_ms is None:
+        for client_count in _GetThreadsPerLoaderList():
+          RunWithThreads(client_count)
+      else:
+        all_results.extend(_SearchSaturation(RunWithThreads, len(vms),
+                                             workload_meta))
 
     return all_results
 
@@ -26,6 +26,7 @@ file name minus .py). The framework will take care of all cleanup
 for you.
 """
 
+import collections
 import logging
 import os
 import pipes
@@ -36,11 +37,15 @@ import time
 import uuid
 import yaml
 
+from perfkitbenchmarker import data
 from perfkitbenchmarker import disk
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import install_planner
 from perfkitbenchmarker import linux_packages
 from perfkitbenchmarker import os_types
+from perfkitbenchmarker import remote_agent
+from perfkitbenchmarker import sample
 from perfkitbenchmarker import virtual_machine
 from perfkitbenchmarker import vm_util
 
@@ -68,6 +73,10 @@ EXECUTE_COMMAND = 'execute_command.py'
 # then copies the stdout and stderr, exiting with the status of the command run
 # by EXECUTE_COMMAND.
 WAIT_FOR_COMMAND = 'wait_for_command.py'
+# With --follow, WAIT_FOR_COMMAND prints this line before copying the command's
+# stdout as it is written. It marks where the output of each attempt starts
+# when the wait is retried after an SSH failure.
+FOLLOW_START_MARKER = '--- wait_for_command follow start ---\n'
 
 flags.DEFINE_bool('setup_remote_firewall', False,
                   'Whether PKB should configure the firewall of each remote'
@@ -91,6 +100,29 @@ flags.DEFINE_list('set_files', [],
                   'the benchmark.')
 
 
+class _FollowedLineFilter(object):
+  """Drops lines replayed when a followed WAIT_FOR_COMMAND is retried.
+
+  Every attempt starts with FOLLOW_START_MARKER and then replays the command's
+  stdout from the beginning, so only lines past those already delivered by an
+  earlier attempt are passed on.
+  """
+
+  def __init__(self, line_callback):
+    self._line_callback = line_callback
+    self._delivered = 0
+    self._position = 0
+
+  def __call__(self, line):
+    if line == FOLLOW_START_MARKER:
+      self._position = 0
+      return
+    self._position += 1
+    if self._position > self._delivered:
+      self._delivered = self._position
+      self._line_callback(line)
+
+
 class BaseLinuxMixin(virtual_machine.BaseOsMixin):
   """Class that holds Linux related VM methods and attributes."""
 
@@ -107,6 +139,24 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
 
     self._remote_command_script_upload_lock = threading.Lock()
     self._has_remote_command_script = False
+    # Runs commands with --remote_command_backend=agent. Guarded by
+    # _remote_command_script_upload_lock.
+    self._remote_agent = None
+
+    # Bookkeeping for SSH connection reuse (see --ssh_reuse_connections).
+    self._ssh_connection_lock = threading.Lock()
+    self._ssh_connection_open = False
+    self.ssh_connection_setup_times = []
+    self.num_multiplexed_ssh_commands = 0
+    self._min_multiplexed_ssh_latency = None
+
+    # Bookkeeping for package installs (see --batch_package_installs).
+    self._install_locks = collections.defaultdict(threading.Lock)
+    self._install_locks_lock = threading.Lock()
+    self._install_recorder = install_planner.InstallRecorder()
+    self._package_manager_lock = threading.Lock()
+    self._installed_os_packages = set()
+    self.package_install_times = collections.OrderedDict()
 
   def _CreateVmTmpDir(self):
         self.RemoteCommand('mkdir -p %s' % vm_util.VM_TMP_DIR)
@@ -123,7 +173,7 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
                                             os.path.basename(f)))
         self._has_remote_command_script = True
 
-  def RobustRemoteCommand(self, command, should_log=False):
+  def RobustRemoteCommand(self, command, should_log=False, line_callback=None):
     """Runs a command on the VM in a more robust way than RemoteCommand.
 
     Executes a command via a pair of scripts on the VM:
@@ -138,7 +188,18 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
 
     If should_log is True, log the command's output at the info
     level. If False, log the command's output at the debug level.
+
+    If line_callback is provided, it is called with each line of the command's
+    stdout while the command is running, exactly once per line even if the wait
+    is retried, and the returned stdout is empty.
+
+    With --remote_command_backend=agent, RemoteCommand already survives SSH
+    failures, so the command is simply run with it.
     """
+    if remote_agent.AgentEnabled():
+      return self.RemoteCommand(command, should_log=should_log,
+                                line_callback=line_callback)
+
     self._PushRobustCommandScripts()
 
     execute_path = os.path.join(vm_util.VM_TMP_DIR,
@@ -170,8 +231,12 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
                     '--stderr', stderr_file,
                     '--status', status_file,
                     '--delete']
+    if line_callback:
+      wait_command.append('--follow')
+      line_callback = _FollowedLineFilter(line_callback)
     try:
-      return self.RemoteCommand(' '.join(wait_command), should_log=should_log)
+      return self.RemoteCommand(' '.join(wait_command), should_log=should_log,
+                                line_callback=line_callback)
     except errors.VirtualMachine.RemoteCommandError:
       # In case the error was with the wrapper script itself, print the log.
       stdout, _ = self.RemoteCommand('cat %s' % wrapper_log, should_log=False)
@@ -257,6 +322,130 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
     """Restores the currently installed packages to those snapshotted."""
     pass
 
+  def _InstallPerfKitPackage(self, package_name, install_function):
+    """Installs a PerfKit package once, recording what it installs.
+
+    Args:
+      package_name: string. Name of the package in linux_packages.PACKAGES.
+      install_function: function. Installs the package module passed to it.
+    """
+    if package_name in self._installed_packages:
+      self._install_recorder.AddDependency(package_name)
+      return
+    top_level = not self._install_recorder.IsNested()
+    with self._install_locks_lock:
+      install_lock = self._install_locks[package_name]
+    with install_lock:
+      if package_name in self._installed_packages:
+        self._install_recorder.AddDependency(package_name)
+        return
+      if FLAGS.batch_package_installs and top_level:
+        self._InstallPlannedOsPackages([package_name])
+      self._install_recorder.Start(package_name)
+      start_time = time.time()
+      try:
+        install_function(linux_packages.PACKAGES[package_name])
+      finally:
+        _, record = self._install_recorder.Finish()
+      self.package_install_times[package_name] = time.time() - start_time
+      self._installed_packages.add(package_name)
+    if FLAGS.batch_package_installs:
+      install_planner.GetPlanner().Record(self.OS_TYPE, package_name, record)
+
+  def InstallAll(self, package_names):
+    """Installs several PerfKit packages on the VM.
+
+    With --batch_package_installs, the OS packages that the packages and their
+    dependencies installed in earlier runs are installed in one transaction,
+    and packages that share no dependencies are installed in parallel.
+
+    Args:
+      package_names: list of strings. Names of the packages to install.
+    """
+    if not self.install_packages or not package_names:
+      return
+    if not FLAGS.batch_package_installs:
+      for package_name in package_names:
+        self.Install(package_name)
+      return
+    self._InstallPlannedOsPackages(package_names)
+    groups = install_planner.GetPlanner().GroupIndependent(self.OS_TYPE,
+                                                           package_names)
+
+    def InstallGroup(group):
+      for package_name in group:
+        self.Install(package_name)
+
+    if len(groups) == 1:
+      InstallGroup(groups[0])
+    else:
+      vm_util.RunThreaded(InstallGroup, groups)
+
+  def _InstallPlannedOsPackages(self, package_names):
+    """Installs the OS packages of some PerfKit packages in one transaction.
+
+    Only the OS packages recorded by earlier installs are known. A failure is
+    logged and otherwise ignored, since the install steps of the PerfKit
+    packages install the OS packages they need anyway.
+
+    Args:
+      package_names: list of strings. Names of PerfKit packages.
+    """
+    plan = install_planner.GetPlanner().Plan(self.OS_TYPE, package_names)
+    os_packages = [p for p in plan.os_packages
+                   if p not in self._installed_os_packages]
+    if not os_packages:
+      return
+    logging.info('Installing %d OS packages for %s on %s in one transaction.',
+                 len(os_packages), ', '.join(package_names), self)
+    try:
+      with self._package_manager_lock:
+        self._InstallOsPackagesOnce(' '.join(os_packages))
+    except errors.VirtualMachine.RemoteCommandError as e:
+      logging.warning('Batched install of OS packages on %s failed, they will '
+                      'be installed one package at a time: %s', self, e)
+      return
+    self._installed_os_packages.update(os_packages)
+
+  def _InstallOsPackagesOnce(self, packages):
+    """Installs OS packages with a single package manager transaction."""
+    raise NotImplementedError()
+
+  def _FilterInstalledOsPackages(self, packages):
+    """Records OS packages about to be installed, and drops installed ones.
+
+    Args:
+      packages: string. Space separated OS packages, possibly with options
+          for the package manager.
+
+    Returns:
+      string. The packages still to be installed, or '' if there are none.
+      Unless --batch_package_installs is set, or if the packages include
+      options, all packages are returned.
+    """
+    names = packages.split()
+    if any(name.startswith('-') for name in names):
+      return packages
+    self._install_recorder.AddOsPackages(names)
+    if not FLAGS.batch_package_installs:
+      return packages
+    return ' '.join(name for name in names
+                    if name not in self._installed_os_packages)
+
+  def GetPackageInstallSamples(self):
+    """Returns Samples with the install time of each PerfKit package.
+
+    The install time of a package includes installing its dependencies,
+    unless they were already installed.
+    """
+    return [
+        sample.Sample('Package Install Time', install_time, 'seconds',
+                      {'vm_name': self.name, 'package': package_name,
+                       'batch_package_installs':
+                           FLAGS.batch_package_installs})
+        for package_name, install_time in
+        self.package_install_times.iteritems()]
+
   def PackageCleanup(self):
     """Cleans up all installed packages.
 
@@ -332,7 +521,10 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
     else:
       scp_cmd.extend([remote_location, file_path])
 
+    start_time = time.time()
     stdout, stderr, retcode = vm_util.IssueCommand(scp_cmd, timeout=None)
+    if retcode != 255:
+      self._RecordSshCommand(time.time() - start_time)
 
     if retcode:
       full_cmd = ' '.join(scp_cmd)
@@ -344,15 +536,17 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
   def RemoteCommand(self, command,
                     should_log=False, retries=SSH_RETRIES,
                     ignore_failure=False, login_shell=False,
-                    suppress_warning=False, timeout=None):
+                    suppress_warning=False, timeout=None, line_callback=None):
     return self.RemoteHostCommand(command, should_log, retries,
                                   ignore_failure, login_shell,
-                                  suppress_warning, timeout)
+                                  suppress_warning, timeout,
+                                  line_callback=line_callback)
 
   def RemoteHostCommand(self, command,
                         should_log=False, retries=SSH_RETRIES,
                         ignore_failure=False, login_shell=False,
-                        suppress_warning=False, timeout=None):
+                        suppress_warning=False, timeout=None,
+                        line_callback=None):
     """Runs a command on the VM.
 
     This is guaranteed to run on the host VM, whereas RemoteCommand might run
@@ -369,6 +563,10 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
       login_shell: Run command in a login shell.
       suppress_warning: Suppress the result logging from IssueCommand when the
           return code is non-zero.
+      line_callback: If provided, a function called with each line of stdout
+          as it is received. Stdout is then not buffered and the returned
+          stdout is empty. If the command is retried, the callback receives
+          the retried command's output as well.
 
     Returns:
       A tuple of stdout and stderr from running the command.
@@ -376,14 +574,36 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
     Raises:
       RemoteCommandError: If there was a problem establishing the connection.
     """
+    if remote_agent.AgentEnabled() and not login_shell:
+      if not isinstance(command, basestring):
+        command = ' '.join(command)
+      stdout, stderr, retcode = self._GetRemoteAgent().Run(
+          command, should_log=should_log, suppress_warning=suppress_warning,
+          timeout=timeout, line_callback=line_callback)
+      if retcode and not ignore_failure:
+        error_text = ('Got non-zero return code (%s) executing %s\n'
+                      'Through the remote agent on %s\nSTDOUT: %sSTDERR: %s' %
+                      (retcode, command, self.name, stdout, stderr))
+        raise errors.VirtualMachine.RemoteCommandError(error_text)
+      return stdout, stderr
+    return self._RemoteHostCommandOverSsh(
+        command, should_log, retries, ignore_failure, login_shell,
+        suppress_warning, timeout, line_callback)
+
+  def _RemoteHostCommandOverSsh(self, command, should_log=False,
+                                retries=SSH_RETRIES, ignore_failure=False,
+                                login_shell=False, suppress_warning=False,
+                                timeout=None, line_callback=None):
+    """Runs a command on the VM in its own SSH session.
+
+    See RemoteHostCommand.
+    """
     if vm_util.RunningOnWindows():
       # Multi-line commands passed to ssh won't work on Windows unless the
       # newlines are escaped.
       command = command.replace('\n', '\\n')
 
-    user_host = '%s@%s' % (self.user_name, self.ip_address)
-    ssh_cmd = ['ssh', '-A', '-p', str(self.ssh_port), user_host]
-    ssh_cmd.extend(vm_util.GetSshOptions(self.ssh_private_key))
+    ssh_cmd = self._GetSshCommand()
     try:
       if login_shell:
         ssh_cmd.extend(['-t', '-t', 'bash -l -c "%s"' % command])
@@ -392,11 +612,13 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
         ssh_cmd.append(command)
 
       for _ in range(retries):
+        start_time = time.time()
         stdout, stderr, retcode = vm_util.IssueCommand(
             ssh_cmd, force_info_log=should_log,
             suppress_warning=suppress_warning,
-            timeout=timeout)
+            timeout=timeout, line_callback=line_callback)
         if retcode != 255:  # Retry on 255 because this indicates an SSH failure
+          self._RecordSshCommand(time.time() - start_time)
           break
     finally:
       if login_shell:
@@ -412,9 +634,101 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
 
     return stdout, stderr
 
+  def _GetSshCommand(self):
+    """Returns the ssh command line to the VM, without a remote command."""
+    user_host = '%s@%s' % (self.user_name, self.ip_address)
+    ssh_cmd = ['ssh', '-A', '-p', str(self.ssh_port), user_host]
+    ssh_cmd.extend(vm_util.GetSshOptions(self.ssh_private_key))
+    return ssh_cmd
+
+  def _GetRemoteAgent(self):
+    """Returns the client of the remote agent, pushing the agent if needed."""
+    with self._remote_command_script_upload_lock:
+      if self._remote_agent is None:
+        self._RemoteHostCommandOverSsh('mkdir -p %s' % vm_util.VM_TMP_DIR)
+        self.RemoteHostCopy(
+            data.ResourcePath(remote_agent.AGENT_SCRIPT),
+            posixpath.join(vm_util.VM_TMP_DIR, remote_agent.AGENT_SCRIPT))
+        connect_command = ' '.join(remote_agent.GetConnectCommand())
+        self._remote_agent = remote_agent.RemoteAgentClient(
+            self.name, self._GetSshCommand() + [connect_command])
+      return self._remote_agent
+
+  def _RecordSshCommand(self, latency):
+    """Records the latency of an ssh or scp command that reached the VM.
+
+    When connections are reused, the first command after the master connection
+    is (re)established pays for the TCP and SSH handshakes and every later
+    command is multiplexed over the existing connection.
+
+    Args:
+      latency: float. Wall time in seconds taken by the command.
+    """
+    if not vm_util.SshConnectionReuseEnabled():
+      return
+    with self._ssh_connection_lock:
+      if not self._ssh_connection_open:
+        self._ssh_connection_open = True
+        self.ssh_connection_setup_times.append(latency)
+        return
+      self.num_multiplexed_ssh_commands += 1
+      if (self._min_multiplexed_ssh_latency is None or
+          latency < self._min_multiplexed_ssh_latency):
+        self._min_multiplexed_ssh_latency = latency
+
+  def CloseRemoteConnection(self):
+    """Closes the master SSH connection to the VM, if there is one.
+
+    Also closes the connection to the remote agent. The agent is pushed
+    again before the next command, since e.g. a reboot deletes it.
+    """
+    with self._remote_command_script_upload_lock:
+      agent, self._remote_agent = self._remote_agent, None
+    if agent:
+      agent.Close()
+    with self._ssh_connection_lock:
+      if not self._ssh_connection_open:
+        return
+      self._ssh_connection_open = False
+    user_host = '%s@%s' % (self.user_name, self.ip_address)
+    ssh_cmd = ['ssh', '-O', 'exit', '-p', str(self.ssh_port), user_host]
+    ssh_cmd.extend(vm_util.GetSshOptions(self.ssh_private_key))
+    vm_util.IssueCommand(ssh_cmd, suppress_warning=True)
+
+  def GetRemoteConnectionSamples(self):
+    """Returns Samples describing the SSH handshake time saved by reuse.
+
+    The handshake time is estimated as the latency of the command that opened
+    the master connection minus the fastest multiplexed command, and is saved
+    once for every multiplexed command.
+    """
+    if not self.ssh_connection_setup_times:
+      return []
+    metadata = {'vm_name': self.name,
+                'ssh_connections': len(self.ssh_connection_setup_times)}
+    setup_time = (sum(self.ssh_connection_setup_times) /
+                  len(self.ssh_connection_setup_times))
+    handshake_time = max(
+        0, setup_time - (self._min_multiplexed_ssh_latency or setup_time))
+    return [
+        sample.Sample('SSH Connection Setup Time', setup_time, 'seconds',
+                      metadata),
+        sample.Sample('SSH Multiplexed Commands',
+                      self.num_multiplexed_ssh_commands, 'count', metadata),
+        sample.Sample('SSH Handshake Time Saved',
+                      handshake_time * self.num_multiplexed_ssh_commands,
+                      'seconds', metadata)]
+
   def _Reboot(self):
     """OS-specific implementation of reboot command"""
-    self.RemoteCommand('sudo reboot', ignore_failure=True)
+    if remote_agent.AgentEnabled():
+      # The agent dies with the VM, so it can't report the command's exit.
+      self._RemoteHostCommandOverSsh('sudo reboot', ignore_failure=True)
+    else:
+      self.RemoteCommand('sudo reboot', ignore_failure=True)
+    # The master connection dies with the VM; drop it so the next command
+    # establishes a new one instead of waiting for the keepalive to expire.
+    self.CloseRemoteConnection()
 
   def _AfterReboot(self):
     """Performs any OS-specific setup on the VM following reboot.
@@ -676,6 +990,15 @@ class RhelMixin(BaseLinuxMixin):
 
   def InstallPackages(self, packages):
     """Installs packages using the yum package manager."""
+    packages = self._FilterInstalledOsPackages(packages)
+    if not packages:
+      return
+    with self._package_manager_lock:
+      self._InstallOsPackagesOnce(packages)
+    self._installed_os_packages.update(packages.split())
+
+  def _InstallOsPackagesOnce(self, packages):
+    """Installs OS packages with a single package manager transaction."""
     self.RemoteCommand('sudo yum install -y %s' % packages)
 
   def InstallPackageGroup(self, package_group):
@@ -686,8 +1009,8 @@ class RhelMixin(BaseLinuxMixin):
     """Installs a PerfKit package on the VM."""
     if not self.install_packages:
       return
-    if package_name not in self._installed_packages:
-      package = linux_packages.PACKAGES[package_name]
+
+    def YumInstall(package):
       if hasattr(package, 'YumInstall'):
         package.YumInstall(self)
       elif hasattr(package, 'Install'):
@@ -695,7 +1018,8 @@ class RhelMixin(BaseLinuxMixin):
       else:
         raise KeyError('Package %s has no install method for RHEL.' %
                        package_name)
-      self._installed_packages.add(package_name)
+
+    self._InstallPerfKitPackage(package_name, YumInstall)
 
   def Uninstall(self, package_name):
     """Uninstalls a PerfKit package on the VM."""
@@ -783,16 +1107,36 @@ class DebianMixin(BaseLinuxMixin):
     return self.TryRemoteCommand('apt-get install --just-print %s' % package,
                                  suppress_warning=True)
 
-  @vm_util.Retry()
-  def InstallPackages(self, packages):
-    """Installs packages using the apt package manager."""
+  def _AptUpdateOnce(self):
+    """Runs AptUpdate, unless it has already been run."""
+    with self._package_manager_lock:
+      if not self._apt_updated:
+        self.AptUpdate()
+        self._apt_updated = True
+
+  def _InstallOsPackagesOnce(self, packages):
+    """Installs OS packages with a single package manager transaction."""
     if not self._apt_updated:
       self.AptUpdate()
       self._apt_updated = True
+    install_command = ('sudo DEBIAN_FRONTEND=\'noninteractive\' '
+                       '/usr/bin/apt-get -y install %s' % (packages))
+    self.RemoteCommand(install_command)
+
+  def InstallPackages(self, packages):
+    """Installs packages using the apt package manager."""
+    packages = self._FilterInstalledOsPackages(packages)
+    if not packages:
+      return
+    self._InstallPackagesWithRetries(packages)
+    self._installed_os_packages.update(packages.split())
+
+  @vm_util.Retry()
+  def _InstallPackagesWithRetries(self, packages):
+    """Installs OS packages, updating the package lists after failures."""
     try:
-      install_command = ('sudo DEBIAN_FRONTEND=\'noninteractive\' '
-                         '/usr/bin/apt-get -y install %s' % (packages))
-      self.RemoteCommand(install_command)
+      with self._package_manager_lock:
+        self._InstallOsPackagesOnce(packages)
     except errors.VirtualMachine.RemoteCommandError as e:
       # TODO(user): Remove code below after Azure fix their package repository,
       # or add code to recover the sources.list
@@ -801,7 +1145,8 @@ class DebianMixin(BaseLinuxMixin):
           '/etc/apt/sources.list')
       logging.info('Installing "%s" failed on %s. This may be transient. '
                    'Updating package list.', packages, self)
-      self.AptUpdate()
+      with self._package_manager_lock:
+        self.AptUpdate()
       raise e
 
   def Install(self, package_name):
@@ -809,12 +1154,9 @@ class DebianMixin(BaseLinuxMixin):
     if not self.install_packages:
       return
 
-    if not self._apt_updated:
-      self.AptUpdate()
-      self._apt_updated = True
+    self._AptUpdateOnce()
 
-    if package_name not in self._installed_packages:
-      package = linux_packages.PACKAGES[package_name]
+    def AptInstall(package):
       if hasattr(package, 'AptInstall'):
         package.AptInstall(self)
       elif hasattr(package, 'Install'):
@@ -822,7 +1164,8 @@ class DebianMixin(BaseLinuxMixin):
       else:
         raise KeyError('Package %s has no install method for Debian.' %
                        package_name)
-      self._installed_packages.add(package_name)
+
+    self._InstallPerfKitPackage(package_name, AptInstall)
 
   def Uninstall(self, package_name):
     """Uninstalls a PerfKit package on the VM."""
@@ -931,7 +1274,7 @@ class ContainerizedDebianMixin(DebianMixin):
   def RemoteCommand(self, command,
                     should_log=False, retries=SSH_RETRIES,
                     ignore_failure=False, login_shell=False,
-                    suppress_warning=False, timeout=None):
+                    suppress_warning=False, timeout=None, line_callback=None):
     """Runs a command inside the container.
 
     Args:
@@ -945,6 +1288,8 @@ class ContainerizedDebianMixin(DebianMixin):
       login_shell: Run command in a login shell.
       suppress_warning: Suppress the result logging from IssueCommand when the
           return code is non-zero.
+      line_callback: If provided, a function called with each line of stdout
+          as it is received. See RemoteHostCommand.
 
     Returns:
       A tuple of stdout and stderr from running the command.
@@ -955,7 +1300,8 @@ class ContainerizedDebianMixin(DebianMixin):
     logging.info('Docker running: %s' % command)
     command = "sudo docker exec %s bash -c '%s'" % (self.docker_id, command)
     return self.RemoteHostCommand(command, should_log, retries,
-                                  ignore_failure, login_shell, suppress_warning)
+                                  ignore_failure, login_shell, suppress_warning,
+                                  line_callback=line_callback)
 
   def ContainerCopy(self, file_name, container_path='', copy_to=True):
     """Copies a file to and from container_path to the host's vm_util.VM_TMP_DIR.
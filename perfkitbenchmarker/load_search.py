@@ -0,0 +1,179 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Searches for the saturation point of closed-loop load benchmarks.
+
+Closed-loop benchmarks such as wrk, memtier and YCSB control load with a
+number of concurrent connections or threads. Sweeping every load level spends
+most runs far from the interesting region, where throughput stops increasing
+or latency exceeds a service level objective (SLO). SaturationSearch instead
+grows the load geometrically until it brackets that point, and then bisects
+the bracket, so the maximum sustainable throughput is found in a logarithmic
+number of runs.
+
+Example:
+  def Measure(threads):
+    result = RunMyBenchmark(threads)
+    return load_search.LoadMeasurement(threads, result.throughput,
+                                       result.p99_latency, None, result)
+
+  search = load_search.SaturationSearch(Measure, max_load=1024,
+                                        latency_slo=10.0)
+  best = search.Run()
+"""
+
+import collections
+import logging
+
+
+class LoadMeasurement(collections.namedtuple(
+    'LoadMeasurement',
+    ['load', 'throughput', 'latency', 'error_rate', 'result'])):
+  """The outcome of running a benchmark at one load level.
+
+  Attributes:
+    load: int. The load level, e.g. a number of connections.
+    throughput: float. Operations per unit of time.
+    latency: float or None. The latency compared with the latency SLO, in the
+        same unit as the SLO.
+    error_rate: float or None. The fraction of failed operations.
+    result: Any benchmark-specific result, such as a list of samples.
+  """
+
+
+class SaturationSearch(object):
+  """Finds the highest throughput a benchmark sustains within its SLOs.
+
+  The search has two phases:
+
+    1. Bracketing: starting at min_load, the load is multiplied by
+       growth_factor until a measurement violates an SLO, throughput grows by
+       less than min_throughput_gain, or max_load is reached. An SLO violation
+       ends bracketing immediately, since higher loads will only violate it by
+       more.
+    2. Bisection: if an SLO was violated, the interval between the highest
+       load that met the SLOs and the load that violated them is bisected
+       until it is narrower than 'tolerance' (relative to its lower end).
+
+  Attributes:
+    measurements: list of LoadMeasurements, in the order they were made.
+  """
+
+  def __init__(self, measure, min_load=1, max_load=None, latency_slo=None,
+               max_error_rate=None, min_throughput_gain=0.05,
+               growth_factor=2, tolerance=0.1):
+    """Initializes the search.
+
+    Args:
+      measure: function. Called with an int load level; runs the benchmark at
+          that load and returns a LoadMeasurement.
+      min_load: int. The first load level to measure.
+      max_load: int. The highest load level to measure.
+      latency_slo: float or None. The highest acceptable latency.
+      max_error_rate: float or None. The highest acceptable error rate.
+      min_throughput_gain: float or None. During bracketing, the load stops
+          growing once throughput increases by less than this fraction. None
+          disables the check.
+      growth_factor: number greater than 1. The load multiplier used during
+          bracketing.
+      tolerance: float. Bisection stops once the bracket is narrower than
+          this fraction of its lower end, or is one load level wide.
+
+    Raises:
+      ValueError: If the load bounds or the growth factor are invalid.
+    """
+    if max_load is None or not 1 <= min_load <= max_load:
+      raise ValueError(
+          'Invalid load bounds: [{0}, {1}].'.format(min_load, max_load))
+    if growth_factor <= 1:
+      raise ValueError('growth_factor must be greater than 1, got {0}.'.format(
+          growth_factor))
+    self.measure = measure
+    self.min_load = min_load
+    self.max_load = max_load
+    self.latency_slo = latency_slo
+    self.max_error_rate = max_error_rate
+    self.min_throughput_gain = min_throughput_gain
+    self.growth_factor = growth_factor
+    self.tolerance = tolerance
+    self.measurements = []
+
+  def MeetsSlo(self, measurement):
+    """Returns whether a LoadMeasurement meets the latency and error SLOs."""
+    if (self.latency_slo is not None and
+        (measurement.latency is None or
+         measurement.latency > self.latency_slo)):
+      return False
+    if (self.max_error_rate is not None and
+        (measurement.error_rate is None or
+         measurement.error_rate > self.max_error_rate)):
+      return False
+    return True
+
+  def _Measure(self, load):
+    measurement = self.measure(load)
+    self.measurements.append(measurement)
+    logging.info('Load %d: throughput %s, latency %s, error rate %s (%s).',
+                 load, measurement.throughput, measurement.latency,
+                 measurement.error_rate,
+                 'meets SLO' if self.MeetsSlo(measurement) else
+                 'violates SLO')
+    return measurement
+
+  def Run(self):
+    """Runs the search.
+
+    Returns:
+      The LoadMeasurement with the highest throughput among those that met the
+      SLOs, or None if none did.
+    """
+    highest_good = None
+    lowest_bad = None
+    previous = None
+    load = self.min_load
+    while True:
+      measurement = self._Measure(load)
+      if not self.MeetsSlo(measurement):
+        lowest_bad = load
+        break
+      highest_good = load
+      if (previous is not None and self.min_throughput_gain is not None and
+          measurement.throughput <
+          previous.throughput * (1 + self.min_throughput_gain)):
+        logging.info('Throughput saturated between loads %d and %d.',
+                     previous.load, load)
+        break
+      if load >= self.max_load:
+        break
+      previous = measurement
+      load = min(self.max_load,
+                 max(load + 1, int(load * self.growth_factor)))
+
+    if highest_good is not None and lowest_bad is not None:
+      while (lowest_bad - highest_good >
+             max(1, int(highest_good * self.tolerance))):
+        load = (highest_good + lowest_bad) // 2
+        if self.MeetsSlo(self._Measure(load)):
+          highest_good = load
+        else:
+          lowest_bad = load
+
+    good = [m for m in self.measurements if self.MeetsSlo(m)]
+    if not good:
+      logging.warning('No load level met the SLO.')
+      return None
+    best = max(good, key=lambda m: m.throughput)
+    logging.info('Maximum sustainable throughput %s at load %d, found in %d '
+                 'runs.', best.throughput, best.load, len(self.measurements))
+    return best
@@ -0,0 +1,190 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Index of the modules that PKB imports on demand.
+
+The benchmark and package registries (linux_benchmarks, windows_benchmarks,
+linux_packages and windows_packages) contain hundreds of modules, which pull
+in most of PKB's dependencies. The index records the names each module
+registers and the flags each module defines, so that:
+
+  - registries import a module only when one of its entries is used (see
+    import_util.LazyModuleDict), and
+  - pkb imports the modules that define the flags on its command line, or in
+    benchmark configs, before parsing them.
+
+The index is generated from the source tree. After adding, removing or
+renaming a benchmark, package or flag, regenerate it with:
+
+  python -m perfkitbenchmarker.module_index
+
+tests/module_index_test.py fails while the index is out of date. Without an
+index, registries import all their modules, as they used to.
+"""
+
+import importlib
+import json
+import logging
+import os
+import pkgutil
+import re
+import sys
+
+from perfkitbenchmarker import flags
+
+INDEX_FILE = 'module_index.json'
+
+# Maps the package of each registry to the name of its LazyModuleDict.
+REGISTRIES = {
+    'perfkitbenchmarker.linux_benchmarks': 'VALID_BENCHMARKS',
+    'perfkitbenchmarker.linux_packages': 'PACKAGES',
+    'perfkitbenchmarker.windows_benchmarks': 'VALID_BENCHMARKS',
+    'perfkitbenchmarker.windows_packages': 'PACKAGES',
+}
+
+_FLAG_MODULE_PREFIX = 'perfkitbenchmarker.'
+
+_index = None
+
+
+def GetIndex():
+  """Returns the module index, or an empty dict if there is none.
+
+  The index has two keys:
+    registries: dict mapping a registry package name to a dict that maps each
+        of its module names to the module's entry, see
+        import_util.LazyModuleDict.GetIndexEntries.
+    flags: dict mapping each flag name to the module that defines it.
+  """
+  global _index
+  if _index is None:
+    try:
+      # pkgutil.get_data also reads the index when PKB runs from a zip file.
+      _index = json.loads(pkgutil.get_data('perfkitbenchmarker', INDEX_FILE))
+    except (IOError, TypeError, ValueError) as e:
+      logging.debug('No module index, modules are imported eagerly: %s', e)
+      _index = {}
+  return _index
+
+
+def GetIndexedModules(package_name):
+  """Returns the index entries of a registry's modules, or None."""
+  return GetIndex().get('registries', {}).get(package_name)
+
+
+def _GetFlagModule(flag_name):
+  """Returns the name of the module that defines a flag, or None."""
+  flag_modules = GetIndex().get('flags', {})
+  if flag_name in flag_modules:
+    return flag_modules[flag_name]
+  # Boolean flags can be negated with a 'no' prefix.
+  if flag_name.startswith('no'):
+    return flag_modules.get(flag_name[2:])
+  return None
+
+
+def LoadFlagModules(flag_names, flag_values=flags.FLAGS):
+  """Imports the modules that define flags not defined yet.
+
+  Args:
+    flag_names: iterable of strings. Flag names, possibly negated boolean flag
+        names such as 'nodstat'.
+    flag_values: flags.FlagValues. The flags that are already defined.
+  """
+  for flag_name in flag_names:
+    if flag_name in flag_values:
+      continue
+    module_name = _GetFlagModule(flag_name)
+    if module_name:
+      logging.debug('Importing %s, which defines --%s.', module_name,
+                    flag_name)
+      importlib.import_module(module_name)
+
+
+def LoadModulesForArgv(argv, flag_values=flags.FLAGS):
+  """Imports the modules that define the flags in a command line.
+
+  Must be called before parsing the command line, since flags defined by
+  modules that have not been imported are unknown.
+
+  Args:
+    argv: list of strings. The command line, including the program name.
+    flag_values: flags.FlagValues. The flags that are already defined.
+  """
+  if any(re.match(r'--?flagfile(=|$)', arg) for arg in argv):
+    argv = argv[:1] + flag_values.ReadFlagsFromFiles(argv[1:])
+  flag_names = []
+  for arg in argv[1:]:
+    if arg == '--':
+      break
+    if arg.startswith('-'):
+      flag_names.append(arg.lstrip('-').split('=', 1)[0])
+  LoadFlagModules(flag_names, flag_values)
+
+
+def LoadModules(pattern=None):
+  """Imports every indexed module whose name matches a regex.
+
+  Args:
+    pattern: string or None. Regex searched for in the full module names. If
+        None, all indexed modules are imported.
+  """
+  index = GetIndex()
+  module_names = set(index.get('flags', {}).itervalues())
+  for package_name, modules in index.get('registries', {}).iteritems():
+    module_names.update(package_name + '.' + module_name
+                        for module_name in modules)
+  regex = re.compile(pattern or '')
+  for module_name in sorted(module_names):
+    if regex.search(module_name):
+      importlib.import_module(module_name)
+  for package_name, registry_name in REGISTRIES.iteritems():
+    if regex.search(package_name):
+      getattr(importlib.import_module(package_name), registry_name).LoadAll()
+
+
+def BuildIndex():
+  """Builds the module index by importing every module of the registries.
+
+  Returns:
+    dict. See GetIndex.
+  """
+  registries = {}
+  for package_name, registry_name in sorted(REGISTRIES.iteritems()):
+    registry = getattr(importlib.import_module(package_name), registry_name)
+    registries[package_name] = registry.GetIndexEntries()
+  flag_modules = {}
+  flags_by_module = flags.FLAGS.FlagsByModuleDict()
+  for module_name, module_flags in flags_by_module.iteritems():
+    if module_name.startswith(_FLAG_MODULE_PREFIX):
+      for flag in module_flags:
+        flag_modules[flag.name] = module_name
+  return {'registries': registries, 'flags': flag_modules}
+
+
+def WriteIndex(index, path=None):
+  """Writes a module index to a file, by default the one PKB reads."""
+  path = path or os.path.join(os.path.dirname(__file__), INDEX_FILE)
+  with open(path, 'w') as index_file:
+    json.dump(index, index_file, indent=1, sort_keys=True,
+              separators=(',', ': '))
+    index_file.write('\n')
+
+
+def main():
+  WriteIndex(BuildIndex())
+
+
+if __name__ == '__main__':
+  sys.exit(main())
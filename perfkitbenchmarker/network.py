@@ -123,6 +123,13 @@ class BaseNetwork(object):
         benchmark_spec.networks[key] = cls(spec)
       return benchmark_spec.networks[key]
 
+  def GetProvisioningDependencies(self):
+    """Returns the networks that must be created before this one.
+
+    See resource.BaseResource.GetProvisioningDependencies.
+    """
+    return []
+
   def Create(self):
     """Creates the actual network."""
     pass
@@ -71,7 +71,6 @@ from perfkitbenchmarker import background_tasks
 from perfkitbenchmarker import benchmark_sets
 from perfkitbenchmarker import benchmark_spec
 from perfkitbenchmarker import benchmark_status
-from perfkitbenchmarker import configs
 from perfkitbenchmarker import context
 from perfkitbenchmarker import disk
 from perfkitbenchmarker import errors
@@ -80,7 +79,9 @@ from perfkitbenchmarker import flags
 from perfkitbenchmarker import flag_util
 from perfkitbenchmarker import linux_benchmarks
 from perfkitbenchmarker import log_util
+from perfkitbenchmarker import module_index
 from perfkitbenchmarker import os_types
+from perfkitbenchmarker import poll_coordinator
 from perfkitbenchmarker import requirements
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import spark_service
@@ -224,6 +225,14 @@ flags.DEFINE_string(
     'object per line, each with the following format:\n'
     '{ "name": <benchmark name>, "flags": <flags dictionary>, '
     '"status": <completion status> }')
+flags.DEFINE_boolean(
+    'pickle_spec_snapshots', True,
+    'If true, PKB pickles the whole benchmark spec after provisioning and '
+    'at the end of each invocation. Resource changes are journaled as they '
+    'happen either way, so that cleanup and teardown can find every resource '
+    'from the snapshot pickled before provisioning plus the journal. If '
+    'false, later invocations (e.g. with --run_stage) lose state that is not '
+    'part of a resource change, such as what the prepare stage installed.')
 flags.DEFINE_string(
     'helpmatch', '',
     'Shows only flags defined in a module whose name matches the given regex.')
@@ -424,10 +433,11 @@ def DoProvisionPhase(spec, timer):
     with timer.Measure('Resource Provisioning'):
       spec.Provision()
   finally:
-    # Also pickle the spec after the resources are created so that
-    # we have a record of things like AWS ids. Otherwise we won't
-    # be able to clean them up on a subsequent run.
-    spec.Pickle()
+    # Also pickle the spec after the resources are created, so that later
+    # invocations start from it. Things like AWS ids are already in the
+    # resource journal, so cleanup works without it.
+    if FLAGS.pickle_spec_snapshots:
+      spec.Pickle()
 
 
 def DoPreparePhase(spec, timer):
@@ -540,6 +550,8 @@ def RunBenchmark(spec, collector):
     with spec.RedirectGlobalFlags():
       end_to_end_timer = timing_util.IntervalTimer()
       detailed_timer = timing_util.IntervalTimer()
+      background_tasks.ResetWorkerPoolStatistics()
+      poll_coordinator.ResetPollStatistics()
       try:
         with end_to_end_timer.Measure('End to End'):
           if stages.PROVISION in FLAGS.run_stage:
@@ -569,6 +581,16 @@ def RunBenchmark(spec, collector):
         if timing_util.RuntimeMeasurementsEnabled():
           collector.AddSamples(
               detailed_timer.GenerateSamples(), spec.name, spec)
+          collector.AddSamples(
+              spec.GetResourceTimingSamples(), spec.name, spec)
+          collector.AddSamples(
+              spec.GetRemoteConnectionSamples(), spec.name, spec)
+          collector.AddSamples(
+              spec.GetPackageInstallSamples(), spec.name, spec)
+          collector.AddSamples(
+              background_tasks.GetWorkerPoolSamples(), spec.name, spec)
+          collector.AddSamples(
+              poll_coordinator.GetPollSamples(), spec.name, spec)
 
       except Exception as e:
         # Resource cleanup (below) can take a long time. Log the error to give
@@ -589,7 +611,8 @@ def RunBenchmark(spec, collector):
           spec.Delete()
         events.benchmark_end.send(benchmark_spec=spec)
         # Pickle spec to save final resource state.
-        spec.Pickle()
+        if FLAGS.pickle_spec_snapshots:
+          spec.Pickle()
   spec.status = benchmark_status.SUCCEEDED
 
 
@@ -655,6 +678,9 @@ def RunBenchmarkTask(spec):
     else:
       logging.error('%s Execution will continue.', msg)
   finally:
+    # Samples published with --publish_after_run may still be queued by
+    # asynchronous publishers, which stop when this process exits.
+    collector.Close()
     # We need to return both the spec and samples so that we know
     # the status of the test and can publish any samples that
     # haven't yet been published.
@@ -743,6 +769,7 @@ def RunBenchmarks():
   finally:
     if collector.samples:
       collector.PublishSamples()
+    collector.Close()
 
     if benchmark_specs:
       logging.info(benchmark_status.CreateSummary(benchmark_specs))
@@ -779,39 +806,28 @@ def RunBenchmarks():
 def _GenerateBenchmarkDocumentation():
   """Generates benchmark documentation to show in --help."""
   benchmark_docs = []
-  for benchmark_module in (linux_benchmarks.BENCHMARKS +
-                           windows_benchmarks.BENCHMARKS):
-    benchmark_config = configs.LoadMinimalConfig(
-        benchmark_module.BENCHMARK_CONFIG, benchmark_module.BENCHMARK_NAME)
-    vm_groups = benchmark_config.get('vm_groups', {})
-    total_vm_count = 0
-    vm_str = ''
-    scratch_disk_str = ''
-    for group in vm_groups.itervalues():
-      group_vm_count = group.get('vm_count', 1)
-      if group_vm_count is None:
-        vm_str = 'variable'
-      else:
-        total_vm_count += group_vm_count
-      if group.get('disk_spec'):
-        scratch_disk_str = ' with scratch volume(s)'
-
-    name = benchmark_module.BENCHMARK_NAME
-    if benchmark_module in windows_benchmarks.BENCHMARKS:
-      name += ' (Windows)'
-    benchmark_docs.append('%s: %s (%s VMs%s)' %
-                          (name,
-                           benchmark_config['description'],
-                           vm_str or total_vm_count,
-                           scratch_disk_str))
+  # The summaries come from the module index, so that benchmark modules need
+  # not be imported.
+  for registry, suffix in ((linux_benchmarks.VALID_BENCHMARKS, ''),
+                           (windows_benchmarks.VALID_BENCHMARKS,
+                            ' (Windows)')):
+    for name in sorted(registry):
+      summary = registry.GetMetadata(name)
+      vm_count = summary['vm_count']
+      benchmark_docs.append('%s%s: %s (%s VMs%s)' % (
+          name, suffix, summary['description'],
+          'variable' if vm_count is None else vm_count,
+          ' with scratch volume(s)' if summary['scratch_disk'] else ''))
   return '\n\t'.join(benchmark_docs)
 
 
 def Main():
   log_util.ConfigureBasicLogging()
   _InjectBenchmarkInfoIntoDocumentation()
+  module_index.LoadModulesForArgv(sys.argv)
   _ParseFlags()
   if FLAGS.helpmatch:
+    module_index.LoadModules(FLAGS.helpmatch)
     _PrintHelp(FLAGS.helpmatch)
     return 0
   CheckVersionFlag()
@@ -0,0 +1,291 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process-wide coordinator of readiness polls.
+
+Threads that wait for something to become ready, e.g. resource.BaseResource
+.Create, register it with the coordinator instead of polling on their own.
+Items that can be checked together share a key, and each poll checks every
+waiting item of a key with one call. Each item is polled with exponential
+backoff and jitter, starting at --readiness_poll_min_interval, so that items
+that become ready quickly are detected quickly and items that take long cost
+few checks. Waiters return as soon as a poll reports their item ready. A check
+that raises one of RETRYABLE_CHECK_ERRORS counts as finding its items not
+ready, so that a transient failure, e.g. of a CLI call, doesn't fail every
+item of the key. Any other exception is raised right away to the waiters of
+the items that were checked.
+
+There is no polling thread. Polls are made by the waiting threads, by
+whichever thread finds a poll of its key due first.
+"""
+
+import logging
+import random
+import sys
+import threading
+import time
+
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import histogram
+from perfkitbenchmarker import sample
+from perfkitbenchmarker import vm_util
+
+flags.DEFINE_float('readiness_poll_min_interval', 1.0,
+                   'Seconds between the first readiness polls of a resource.',
+                   lower_bound=0)
+flags.DEFINE_float('readiness_poll_max_interval', 30.0,
+                   'Maximum number of seconds between readiness polls of a '
+                   'resource.', lower_bound=0)
+flags.DEFINE_float('readiness_poll_backoff', 2.0,
+                   'Factor by which the interval between readiness polls of a '
+                   'resource grows after each poll that finds it not ready.',
+                   lower_bound=1)
+
+FLAGS = flags.FLAGS
+
+# Intervals are randomly scaled by up to this fraction, so that items that
+# started waiting at the same time don't keep polling at the same time.
+_JITTER = 0.2
+
+# Exceptions of a check that count as finding its items not ready.
+RETRYABLE_CHECK_ERRORS = (errors.Resource.RetryableCreationError,
+                          errors.VirtualMachine.RemoteCommandError,
+                          errors.VmUtil.CalledProcessException,
+                          errors.VmUtil.RestConnectionError)
+
+# Number of consecutive checks of an item that raised one of
+# RETRYABLE_CHECK_ERRORS after which waiting for it raises the exception of
+# the last check.
+_MAX_CHECK_FAILURES = 100
+
+# Percentiles of the latency histograms that are added to sample metadata.
+_PERCENTILES = (50, 90, 99)
+
+
+class _Waiter(object):
+  """An item being waited for.
+
+  Attributes:
+    item: object. The item.
+    start_time: float. When waiting started.
+    interval: float. Seconds until the next poll of the item.
+    due_time: float. When the item is to be polled next.
+    last_poll_time: float. When the last poll of the item ended.
+    done: bool. Whether the item is ready, or polling it failed.
+    check_failures: int. Number of consecutive checks of the item that raised
+        one of RETRYABLE_CHECK_ERRORS.
+    exc_info: tuple or None. The exception that failed waiting, if any.
+  """
+
+  def __init__(self, item, now):
+    self.item = item
+    self.start_time = now
+    self.interval = FLAGS.readiness_poll_min_interval
+    self.due_time = now
+    self.last_poll_time = now
+    self.done = False
+    self.check_failures = 0
+    self.exc_info = None
+
+
+class _PollGroup(object):
+  """The items waited for with the same key."""
+
+  def __init__(self, check, kind):
+    self.check = check
+    self.kind = kind
+    self.waiters = []
+    self.polling = False
+
+
+class _PollStatistics(object):
+  """Statistics of the polls made by a PollCoordinator, by kind of item."""
+
+  def __init__(self):
+    self.Reset()
+
+  def Reset(self):
+    """Starts a new measurement interval."""
+    self.polls = {}
+    self.checks = {}
+    self.wait_times = {}
+    self.detection_latencies = {}
+
+  def AddPoll(self, kind, num_items):
+    self.polls[kind] = self.polls.get(kind, 0) + 1
+    self.checks[kind] = self.checks.get(kind, 0) + num_items
+
+  def AddReady(self, kind, wait_time, detection_latency):
+    self.wait_times.setdefault(kind, []).append(wait_time)
+    self.detection_latencies.setdefault(kind, []).append(detection_latency)
+
+  def GetSamples(self):
+    """Returns Samples describing the interval, or [] if nothing was polled."""
+    samples = []
+    for kind in sorted(self.polls):
+      metadata = {'kind': kind, 'num_item_checks': self.checks[kind],
+                  'num_ready': len(self.wait_times.get(kind, []))}
+      samples.append(sample.Sample('Readiness Polls', self.polls[kind],
+                                   'count', metadata))
+      for metric, values in (
+          ('Readiness Wait Time', self.wait_times.get(kind)),
+          ('Readiness Detection Latency', self.detection_latencies.get(kind))):
+        if not values:
+          continue
+        hist = histogram.Histogram.FromValues(values)
+        hist_metadata = metadata.copy()
+        hist_metadata['histogram'] = hist.ToJson()
+        for percentile, value in zip(_PERCENTILES,
+                                     hist.Percentiles(_PERCENTILES)):
+          hist_metadata['p{0}'.format(percentile)] = value
+        samples.append(sample.Sample(metric, sum(values) / len(values),
+                                     'seconds', hist_metadata))
+    return samples
+
+
+class PollCoordinator(object):
+  """Polls for the readiness of items, checking items of a key together.
+
+  Attributes:
+    statistics: _PollStatistics. Statistics of the polls.
+  """
+
+  def __init__(self):
+    self._condition = threading.Condition()
+    self._groups = {}
+    self.statistics = _PollStatistics()
+
+  def WaitUntilReady(self, item, key, check, kind, timeout=vm_util.TIMEOUT):
+    """Blocks until a poll reports that an item is ready.
+
+    Args:
+      item: hashable object. The item to wait for.
+      key: hashable object. Items with the same key are checked together.
+      check: callable. Called with a list of items with the same key. Returns
+          the ones that are ready. Calls with the same key must pass the same
+          check.
+      kind: string. The kind of the item, e.g. its class name, by which the
+          statistics are grouped.
+      timeout: float. Maximum number of seconds to wait.
+
+    Raises:
+      errors.Resource.RetryableCreationError: If the item isn't ready after
+          timeout seconds.
+      Exception: The exception raised by a check of the item, if it isn't one
+          of RETRYABLE_CHECK_ERRORS, or if the item was checked
+          _MAX_CHECK_FAILURES times in a row and each check raised one.
+    """
+    now = time.time()
+    deadline = now + timeout
+    waiter = _Waiter(item, now)
+    with self._condition:
+      group = self._groups.get(key)
+      if group is None:
+        group = self._groups[key] = _PollGroup(check, kind)
+      group.waiters.append(waiter)
+      try:
+        while not waiter.done:
+          now = time.time()
+          if now >= deadline:
+            raise errors.Resource.RetryableCreationError(
+                '%s was not ready after %d seconds.' % (kind, timeout))
+          due_time = min(w.due_time for w in group.waiters)
+          if not group.polling and now >= due_time:
+            self._Poll(group)
+          elif group.polling:
+            self._condition.wait(deadline - now)
+          else:
+            self._condition.wait(min(due_time, deadline) - now)
+      finally:
+        if waiter in group.waiters:
+          group.waiters.remove(waiter)
+        if not group.waiters and self._groups.get(key) is group:
+          del self._groups[key]
+    if waiter.exc_info:
+      raise waiter.exc_info[0], waiter.exc_info[1], waiter.exc_info[2]
+
+  def _Poll(self, group):
+    """Checks all waiting items of a group. Called with the lock held."""
+    group.polling = True
+    waiters = list(group.waiters)
+    self._condition.release()
+    try:
+      ready = set()
+      exc_info = None
+      retryable = False
+      try:
+        ready = set(group.check([waiter.item for waiter in waiters]))
+      except RETRYABLE_CHECK_ERRORS:
+        exc_info = sys.exc_info()
+        retryable = True
+      except Exception:
+        exc_info = sys.exc_info()
+      end_time = time.time()
+    finally:
+      self._condition.acquire()
+    group.polling = False
+    self.statistics.AddPoll(group.kind, len(waiters))
+    if retryable:
+      logging.warning('Checking whether %d %s items are ready failed, will '
+                      'check again: %s', len(waiters), group.kind,
+                      exc_info[1])
+    for waiter in waiters:
+      waiter.check_failures = waiter.check_failures + 1 if exc_info else 0
+      if exc_info and (not retryable or
+                       waiter.check_failures >= _MAX_CHECK_FAILURES):
+        waiter.exc_info = exc_info
+        waiter.done = True
+      elif waiter.item in ready:
+        waiter.done = True
+        # The item became ready some time after the previous poll.
+        self.statistics.AddReady(group.kind, end_time - waiter.start_time,
+                                 end_time - waiter.last_poll_time)
+      else:
+        waiter.last_poll_time = end_time
+        waiter.due_time = end_time + waiter.interval * random.uniform(
+            1 - _JITTER, 1 + _JITTER)
+        waiter.interval = min(waiter.interval * FLAGS.readiness_poll_backoff,
+                              FLAGS.readiness_poll_max_interval)
+      if waiter.done:
+        group.waiters.remove(waiter)
+    self._condition.notify_all()
+
+
+_coordinator = PollCoordinator()
+
+
+def WaitUntilReady(item, key, check, kind, timeout=vm_util.TIMEOUT):
+  """Waits for an item with the process-wide coordinator.
+
+  See PollCoordinator.WaitUntilReady.
+  """
+  _coordinator.WaitUntilReady(item, key, check, kind, timeout=timeout)
+
+
+def ResetPollStatistics():
+  """Starts a new interval for GetPollSamples."""
+  _coordinator.statistics.Reset()
+
+
+def GetPollSamples():
+  """Returns Samples describing the readiness polls since the last reset.
+
+  For each kind of item, the samples are the number of polls, and the averages
+  and histograms of the time waited for items to become ready and of the
+  detection latency. The detection latency is the time from the last poll that
+  found an item not ready to the poll that found it ready, which bounds how
+  long the item was ready before it was detected.
+  """
+  return _coordinator.statistics.GetSamples()
@@ -547,6 +547,10 @@ class AwsNetwork(network.BaseNetwork):
     self.subnet = None
     self.placement_group = AwsPlacementGroup(self.region)
 
+  def GetProvisioningDependencies(self):
+    """Returns the regional network containing this network's subnet."""
+    return [self.regional_network]
+
   def Create(self):
     """Creates the network."""
     self.regional_network.Create()
@@ -85,6 +85,8 @@ SPOT_INSTANCE_REQUEST_TERMINAL_STATUSES = frozenset(
      'instance-terminated-by-user', 'instance-terminated-no-capacity',
      'instance-terminated-capacity-oversubscribed',
      'instance-terminated-launch-group-constraint'])
+# The most values that an EC2 describe filter accepts.
+MAX_FILTER_VALUES = 200
 
 
 def GetRootBlockDeviceSpecForImage(image_id, region):
@@ -170,6 +172,55 @@ def IsPlacementGroupCompatible(machine_type):
   return prefix in PLACEMENT_GROUP_PREFIXES
 
 
+def _DescribeInstances(vms):
+  """Describes the instances of VMs in the same region with one call.
+
+  Instances are found by the client tokens they were created with. A filter
+  accepts at most MAX_FILTER_VALUES tokens, so larger batches are described
+  with one call per chunk of tokens.
+
+  Args:
+    vms: list of AwsVirtualMachine.
+
+  Returns:
+    dict mapping each VM to the dict describing its instance, or to None if the
+    instance was not found.
+  """
+  instances = {}
+  for start in xrange(0, len(vms), MAX_FILTER_VALUES):
+    describe_cmd = util.AWS_PREFIX + [
+        'ec2',
+        'describe-instances',
+        '--region=%s' % vms[0].region,
+        '--filter=Name=client-token,Values=%s' % ','.join(
+            vm.client_token for vm in vms[start:start + MAX_FILTER_VALUES])]
+    stdout, _ = util.IssueRetryableCommand(describe_cmd)
+    response = json.loads(stdout)
+    for reservation in response['Reservations']:
+      for instance in reservation['Instances']:
+        assert instance['ClientToken'] not in instances, 'Too many instances.'
+        instances[instance['ClientToken']] = instance
+  return {vm: instances.get(vm.client_token) for vm in vms}
+
+
+def _TerminateInstances(vms):
+  """Terminates the instances of VMs in the same region with one call.
+
+  Args:
+    vms: list of AwsVirtualMachine.
+
+  Returns:
+    dict mapping each VM to the (stdout, stderr, retcode) of the call.
+  """
+  delete_cmd = util.AWS_PREFIX + [
+      'ec2',
+      'terminate-instances',
+      '--region=%s' % vms[0].region,
+      '--instance-ids'] + [vm.id for vm in vms]
+  result = vm_util.IssueCommand(delete_cmd)
+  return {vm: result for vm in vms}
+
+
 class AwsDedicatedHost(resource.BaseResource):
   """Object representing an AWS host.
 
@@ -405,16 +456,23 @@ class AwsVirtualMachine(virtual_machine.BaseVirtualMachine):
   @vm_util.Retry()
   def _PostCreate(self):
     """Get the instance's data and tag it."""
-    describe_cmd = util.AWS_PREFIX + [
-        'ec2',
-        'describe-instances',
-        '--region=%s' % self.region,
-        '--instance-ids=%s' % self.id]
     logging.info('Getting instance %s public IP. This will fail until '
                  'a public IP is available, but will be retried.', self.id)
-    stdout, _ = util.IssueRetryableCommand(describe_cmd)
-    response = json.loads(stdout)
-    instance = response['Reservations'][0]['Instances'][0]
+    if self._BatchesDescribe():
+      instance = self.lifecycle_group.Call(
+          lambda vm: ('describe', vm.region), _DescribeInstances, self)
+      if instance is None:
+        raise errors.VirtualMachine.VmStateError(
+            'Instance %s was not found.' % self.id)
+    else:
+      describe_cmd = util.AWS_PREFIX + [
+          'ec2',
+          'describe-instances',
+          '--region=%s' % self.region,
+          '--instance-ids=%s' % self.id]
+      stdout, _ = util.IssueRetryableCommand(describe_cmd)
+      response = json.loads(stdout)
+      instance = response['Reservations'][0]['Instances'][0]
     self.ip_address = instance['PublicIpAddress']
     self.internal_ip = instance['PrivateIpAddress']
     if util.IsRegion(self.zone):
@@ -570,7 +628,10 @@ class AwsVirtualMachine(virtual_machine.BaseVirtualMachine):
 
   def _Delete(self):
     """Delete a VM instance."""
-    if self.id:
+    if self.id and self.lifecycle_group:
+      self.lifecycle_group.Call(lambda vm: ('terminate', vm.region),
+                                _TerminateInstances, self)
+    elif self.id:
       delete_cmd = util.AWS_PREFIX + [
           'ec2',
           'terminate-instances',
@@ -586,32 +647,44 @@ class AwsVirtualMachine(virtual_machine.BaseVirtualMachine):
       vm_util.IssueCommand(cancel_cmd)
 
 
+  def _BatchesDescribe(self):
+    """Returns whether the VM's instance is described with its group's."""
+    # Spot instances aren't created with the VM's client token.
+    return bool(self.lifecycle_group) and not self.use_spot_instance
+
   def _Exists(self):
     """Returns true if the VM exists."""
-    describe_cmd = util.AWS_PREFIX + [
-        'ec2',
-        'describe-instances',
-        '--region=%s' % self.region]
-
-    if self.use_spot_instance:
-      if self.id:
-        describe_cmd.append('--instance-id=%s' % self.id)
-      else:
+    if self._BatchesDescribe():
+      instance = self.lifecycle_group.Call(
+          lambda vm: ('describe', vm.region), _DescribeInstances, self)
+      if instance is None:
         return False
     else:
-      describe_cmd.append(
-          '--filter=Name=client-token,Values=%s' % self.client_token)
-
-    stdout, _ = util.IssueRetryableCommand(describe_cmd)
-    response = json.loads(stdout)
-    reservations = response['Reservations']
-    assert len(reservations) < 2, 'Too many reservations.'
-    if not reservations:
-      return False
-    instances = reservations[0]['Instances']
-    assert len(instances) == 1, 'Wrong number of instances.'
-    status = instances[0]['State']['Name']
-    self.id = instances[0]['InstanceId']
+      describe_cmd = util.AWS_PREFIX + [
+          'ec2',
+          'describe-instances',
+          '--region=%s' % self.region]
+
+      if self.use_spot_instance:
+        if self.id:
+          describe_cmd.append('--instance-id=%s' % self.id)
+        else:
+          return False
+      else:
+        describe_cmd.append(
+            '--filter=Name=client-token,Values=%s' % self.client_token)
+
+      stdout, _ = util.IssueRetryableCommand(describe_cmd)
+      response = json.loads(stdout)
+      reservations = response['Reservations']
+      assert len(reservations) < 2, 'Too many reservations.'
+      if not reservations:
+        return False
+      instances = reservations[0]['Instances']
+      assert len(instances) == 1, 'Wrong number of instances.'
+      instance = instances[0]
+    status = instance['State']['Name']
+    self.id = instance['InstanceId']
     assert status in INSTANCE_KNOWN_STATUSES, status
     return status in INSTANCE_EXISTS_STATUSES
 
@@ -297,6 +297,86 @@ class GceSoleTenantHost(resource.BaseResource):
     cmd.Issue()
 
 
+def _CreateInstances(vms):
+  """Creates the instances of VMs that only differ in name with one call.
+
+  Args:
+    vms: list of GceVirtualMachine. VMs whose create commands are the same
+        except for the instance name.
+
+  Returns:
+    dict mapping each VM to the (stdout, stderr, retcode) of creating its
+    instance. The stdout of a created instance lists only that instance, and
+    the stderr of an instance that failed omits the errors of the others.
+  """
+  first_vm = vms[0]
+  with open(first_vm.ssh_public_key) as f:
+    public_key = f.read().rstrip('\n')
+  with vm_util.NamedTemporaryFile(dir=vm_util.GetTempDir(),
+                                  prefix='key-metadata') as tf:
+    tf.write('%s:%s\n' % (first_vm.user_name, public_key))
+    tf.close()
+    create_cmd = first_vm._GenerateCreateCommand(tf.name)
+    create_cmd.args[-1:] = [vm.name for vm in vms]
+    stdout, stderr, retcode = create_cmd.Issue()
+  try:
+    instances = {instance['name']: instance for instance in json.loads(stdout)}
+  except (ValueError, TypeError, KeyError):
+    instances = {}
+  name_patterns = {vm: re.compile(r'\b%s\b' % re.escape(vm.name))
+                   for vm in vms}
+  results = {}
+  for vm in vms:
+    if vm.name in instances:
+      results[vm] = json.dumps([instances[vm.name]]), '', 0
+      continue
+    # gcloud lists the errors on lines starting with " - ". Those naming only
+    # other instances are dropped.
+    error_lines = [
+        line for line in stderr.splitlines(True)
+        if not line.startswith(' - ') or name_patterns[vm].search(line) or
+        not any(pattern.search(line) for pattern in name_patterns.values())]
+    results[vm] = '', ''.join(error_lines), retcode or 1
+  return results
+
+
+def _DescribeInstances(vms):
+  """Describes the instances of VMs in the same project with one call.
+
+  Args:
+    vms: list of GceVirtualMachine.
+
+  Returns:
+    dict mapping each VM to the dict describing its instance, or to None if the
+    instance was not found.
+  """
+  list_cmd = util.GcloudCommand(vms[0], 'compute', 'instances', 'list')
+  list_cmd.flags.pop('zone', None)
+  list_cmd.flags['zones'] = ','.join(sorted(set(vm.zone for vm in vms)))
+  list_cmd.flags['filter'] = 'name=( %s )' % ' '.join(vm.name for vm in vms)
+  stdout, _, _ = list_cmd.Issue(suppress_warning=True)
+  try:
+    instances = {instance['name']: instance for instance in json.loads(stdout)}
+  except ValueError:
+    instances = {}
+  return {vm: instances.get(vm.name) for vm in vms}
+
+
+def _DeleteInstances(vms):
+  """Deletes the instances of VMs in the same zone with one call.
+
+  Args:
+    vms: list of GceVirtualMachine.
+
+  Returns:
+    dict mapping each VM to the (stdout, stderr, retcode) of the call.
+  """
+  delete_cmd = util.GcloudCommand(vms[0], 'compute', 'instances', 'delete',
+                                  *[vm.name for vm in vms])
+  result = delete_cmd.Issue()
+  return {vm: result for vm in vms}
+
+
 class GceVirtualMachine(virtual_machine.BaseVirtualMachine):
   """Object representing a Google Compute Engine Virtual Machine."""
 
@@ -419,17 +499,24 @@ class GceVirtualMachine(virtual_machine.BaseVirtualMachine):
       cmd.flags['preemptible'] = True
     return cmd
 
+  def _GetCreateBatchKey(self):
+    """Returns the key of the VMs that can be created with one call.
+
+    Their create commands only differ in the instance name.
+    """
+    command = self._GenerateCreateCommand('ssh-keys')._GetCommand()
+    command.remove(self.name)
+    return ('create', tuple(command), self.user_name, self.ssh_public_key)
+
   def _Create(self):
     """Create a GCE VM instance."""
     num_hosts = len(self.host_list)
-    with open(self.ssh_public_key) as f:
-      public_key = f.read().rstrip('\n')
-    with vm_util.NamedTemporaryFile(dir=vm_util.GetTempDir(),
-                                    prefix='key-metadata') as tf:
-      tf.write('%s:%s\n' % (self.user_name, public_key))
-      tf.close()
-      create_cmd = self._GenerateCreateCommand(tf.name)
-      _, stderr, retcode = create_cmd.Issue()
+    # Creation on dedicated hosts is retried per VM when a host is full.
+    if self.lifecycle_group and not self.use_dedicated_host:
+      _, stderr, retcode = self.lifecycle_group.Call(
+          GceVirtualMachine._GetCreateBatchKey, _CreateInstances, self)
+    else:
+      _, stderr, retcode = _CreateInstances([self])[self]
 
     if (self.use_dedicated_host and retcode and
         _INSUFFICIENT_HOST_CAPACITY in stderr and not self.num_vms_per_host):
@@ -471,13 +558,31 @@ class GceVirtualMachine(virtual_machine.BaseVirtualMachine):
           self.host.Delete()
           self.deleted_hosts.add(self.host)
 
+  def _DescribeInstance(self, **kwargs):
+    """Returns the dict describing the instance, or None if it wasn't found.
+
+    Args:
+      **kwargs: Keyword arguments to forward to vm_util.IssueCommand when the
+          instance is described by itself.
+    """
+    if self.lifecycle_group:
+      return self.lifecycle_group.Call(lambda vm: ('describe', vm.project),
+                                       _DescribeInstances, self)
+    getinstance_cmd = util.GcloudCommand(self, 'compute', 'instances',
+                                         'describe', self.name)
+    stdout, _, _ = getinstance_cmd.Issue(**kwargs)
+    try:
+      return json.loads(stdout)
+    except ValueError:
+      return None
+
   @vm_util.Retry()
   def _PostCreate(self):
     """Get the instance's data."""
-    getinstance_cmd = util.GcloudCommand(self, 'compute', 'instances',
-                                         'describe', self.name)
-    stdout, _, _ = getinstance_cmd.Issue()
-    response = json.loads(stdout)
+    response = self._DescribeInstance()
+    if response is None:
+      raise errors.VirtualMachine.VmStateError(
+          'Instance %s was not found.' % self.name)
     self.id = response['id']
     network_interface = response['networkInterfaces'][0]
     self.internal_ip = network_interface['networkIP']
@@ -485,20 +590,15 @@ class GceVirtualMachine(virtual_machine.BaseVirtualMachine):
 
   def _Delete(self):
     """Delete a GCE VM instance."""
-    delete_cmd = util.GcloudCommand(self, 'compute', 'instances', 'delete',
-                                    self.name)
-    delete_cmd.Issue()
+    if self.lifecycle_group:
+      self.lifecycle_group.Call(lambda vm: ('delete', vm.project, vm.zone),
+                                _DeleteInstances, self)
+    else:
+      _DeleteInstances([self])
 
   def _Exists(self):
     """Returns true if the VM exists."""
-    getinstance_cmd = util.GcloudCommand(self, 'compute', 'instances',
-                                         'describe', self.name)
-    stdout, _, _ = getinstance_cmd.Issue(suppress_warning=True)
-    try:
-      json.loads(stdout)
-    except ValueError:
-      return False
-    return True
+    return self._DescribeInstance(suppress_warning=True) is not None
 
   def CreateScratchDisk(self, disk_spec):
     """Create a VM's scratch disk.
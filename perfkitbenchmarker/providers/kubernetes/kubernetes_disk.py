@@ -14,6 +14,7 @@
 
 import abc
 import copy
+import functools32
 import logging
 import re
 
@@ -59,6 +60,24 @@ class KubernetesDiskSpec(disk.BaseDiskSpec):
     return result
 
 
+@functools32.lru_cache()
+def _GetGceNodeLocation(kubectl, kubeconfig):
+  """
+  Returns the (project, zone) of the cluster's GCE nodes. They are looked up
+  once, not once per disk.
+  """
+  stdout, _, _ = vm_util.IssueCommand([
+      kubectl, '--kubeconfig=%s' % kubeconfig, 'get',
+      'nodes', '-o=jsonpath={.items[].spec.providerID}'])
+  try:
+    m = re.match('gce://(?P<project>[^/]*)/(?P<zone>[^/]*)/.*', stdout)
+    return m.group('project'), m.group('zone')
+  except:
+    logging.exception(
+        'Node ProviderID (%s) does not match expected GCE format.', stdout)
+    raise
+
+
 def GetKubernetesDiskClass(volume_type):
   return _K8S_VOLUME_REGISTRY[volume_type]
 
@@ -226,17 +245,8 @@ class GcePersistentDisk(KubernetesDisk):
     super(GcePersistentDisk, self).__init__(disk_num, spec, name)
     spec = copy.deepcopy(spec)
     spec.disk_type = spec.backing_store_disk_type or gce_disk.PD_STANDARD
-    stdout, _, _ = vm_util.IssueCommand([
-        FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig, 'get',
-        'nodes', '-o=jsonpath={.items[].spec.providerID}'])
-    try:
-      m = re.match('gce://(?P<project>[^/]*)/(?P<zone>[^/]*)/.*', stdout)
-      self.project = m.group('project')
-      self.zone = m.group('zone')
-    except:
-      logging.exception(
-          'Node ProviderID (%s) does not match expected GCE format.', stdout)
-      raise
+    self.project, self.zone = _GetGceNodeLocation(FLAGS.kubectl,
+                                                  FLAGS.kubeconfig)
 
     self.pd = gce_disk.GceDisk(
         spec, self.name, self.zone, self.project)
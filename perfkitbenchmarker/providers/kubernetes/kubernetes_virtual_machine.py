@@ -14,6 +14,7 @@
 
 import json
 import logging
+import re
 
 from perfkitbenchmarker import disk
 from perfkitbenchmarker import errors
@@ -29,6 +30,8 @@ FLAGS = flags.FLAGS
 
 UBUNTU_IMAGE = 'ubuntu-upstart'
 SELECTOR_PREFIX = 'pkb'
+# Label of the PODs of VMs in a lifecycle group, see lifecycle_batch.
+GROUP_LABEL = 'pkb_group'
 
 
 def CreateResource(resource_body):
@@ -40,6 +43,51 @@ def CreateResource(resource_body):
     return vm_util.IssueCommand(create_cmd)
 
 
+def _GetPods(args):
+  """
+  Returns the PODs printed by 'kubectl get pod' for the given POD names or
+  label selector args.
+  """
+  get_cmd = [FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig, 'get',
+             'pod', '-o=json'] + args
+  pod_info, _, _ = vm_util.IssueCommand(get_cmd, suppress_warning=True)
+  if not pod_info:
+    return []
+  pod_info = json.loads(pod_info)
+  # A single POD is printed by itself, several PODs as a list.
+  return pod_info.get('items', [pod_info])
+
+
+def _CreateGroupPods(vms):
+  """
+  Creates the PODs of VMs in a lifecycle group with one multi-document
+  manifest.
+  """
+  output = CreateResource('\n---\n'.join(vm._BuildPodBody() for vm in vms))
+  return {vm: output for vm in vms}
+
+
+def _GetGroupPods(vms):
+  """
+  Gets the PODs of VMs in a lifecycle group with one call. Maps each VM to
+  its POD, or to None if the POD was not found.
+  """
+  pods = _GetPods(['-l', '%s=%s' % (GROUP_LABEL, vms[0]._GetGroupLabel())])
+  pods = {pod['metadata']['name']: pod for pod in pods}
+  return {vm: pods.get(vm.name) for vm in vms}
+
+
+def _DeleteGroupPods(vms):
+  """
+  Deletes the PODs of VMs in a lifecycle group with one call.
+  """
+  delete_cmd = [FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig,
+                'delete', 'pod', '-l',
+                '%s=%s' % (GROUP_LABEL, vms[0]._GetGroupLabel())]
+  output = vm_util.IssueCommand(delete_cmd)
+  return {vm: output for vm in vms}
+
+
 class KubernetesVirtualMachine(virtual_machine.BaseVirtualMachine):
   """
   Object representing a Kubernetes POD.
@@ -67,7 +115,9 @@ class KubernetesVirtualMachine(virtual_machine.BaseVirtualMachine):
 
   def _Create(self):
     self._CreatePod()
-    self._WaitForPodBootCompletion()
+
+  def _IsReady(self):
+    return bool(self._AreReady([self]))
 
   @vm_util.Retry()
   def _PostCreate(self):
@@ -97,40 +147,57 @@ class KubernetesVirtualMachine(virtual_machine.BaseVirtualMachine):
     """
     Creates a POD (Docker container with optional volumes).
     """
-    create_rc_body = self._BuildPodBody()
-    output = CreateResource(create_rc_body)
+    if self.lifecycle_group:
+      output = self.lifecycle_group.Call(lambda vm: 'create',
+                                         _CreateGroupPods, self)
+    else:
+      create_rc_body = self._BuildPodBody()
+      output = CreateResource(create_rc_body)
     if output[EXIT_CODE]:
       raise Exception("Creating POD failed: %s" % output[STDERR])
     logging.info(output[STDOUT].rstrip())
 
-  @vm_util.Retry(poll_interval=10, max_retries=100, log_errors=False)
-  def _WaitForPodBootCompletion(self):
+  def _GetGroupLabel(self):
     """
-    Need to wait for the PODs to get up  - PODs are created with a little delay.
+    Returns the value of the label of the PODs in the VM's lifecycle group.
     """
-    exists_cmd = [FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig, 'get',
-                  'pod', '-o=json', self.name]
-    logging.info("Waiting for POD %s" % self.name)
-    pod_info, _, _ = vm_util.IssueCommand(exists_cmd, suppress_warning=True)
-    if pod_info:
-      pod_info = json.loads(pod_info)
-      containers = pod_info['spec']['containers']
-      if len(containers) == 1:
-        pod_status = pod_info['status']['phase']
-        if (containers[0]['name'].startswith(self.name)
-            and pod_status == "Running"):
-          logging.info("POD is up and running.")
-          return
-    raise Exception("POD %s is not running. Retrying to check status." %
-                    self.name)
+    label = '%s-%s' % (FLAGS.run_uri, self.lifecycle_group.name)
+    return re.sub(r'[^-_.a-zA-Z0-9]', '-', label)[:63]
+
+  @classmethod
+  def _AreReady(cls, vms):
+    """
+    Returns the VMs whose PODs are up and running. PODs are created with a
+    little delay. The PODs of all VMs are checked with one call, which lists
+    the PODs of their lifecycle groups if they are all in one.
+    """
+    names = [vm.name for vm in vms]
+    logging.info("Waiting for PODs %s" % ', '.join(names))
+    if all(vm.lifecycle_group for vm in vms):
+      labels = sorted(set(vm._GetGroupLabel() for vm in vms))
+      pods = _GetPods(['-l', '%s in (%s)' % (GROUP_LABEL, ','.join(labels))])
+    else:
+      pods = _GetPods(names)
+    running = set()
+    for pod in pods:
+      name = pod['metadata']['name']
+      containers = pod['spec']['containers']
+      if (len(containers) == 1 and containers[0]['name'].startswith(name) and
+          pod['status']['phase'] == "Running"):
+        running.add(name)
+    return [vm for vm in vms if vm.name in running]
 
   def _DeletePod(self):
     """
     Deletes a POD.
     """
-    delete_pod = [FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig,
-                  'delete', 'pod', self.name]
-    output = vm_util.IssueCommand(delete_pod)
+    if self.lifecycle_group:
+      output = self.lifecycle_group.Call(lambda vm: 'delete',
+                                         _DeleteGroupPods, self)
+    else:
+      delete_pod = [FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig,
+                    'delete', 'pod', self.name]
+      output = vm_util.IssueCommand(delete_pod)
     logging.info(output[STDOUT].rstrip())
 
   @vm_util.Retry(poll_interval=10, max_retries=20)
@@ -138,6 +205,9 @@ class KubernetesVirtualMachine(virtual_machine.BaseVirtualMachine):
     """
     POD should have been already created but this is a double check.
     """
+    if self.lifecycle_group:
+      pod = self.lifecycle_group.Call(lambda vm: 'get', _GetGroupPods, self)
+      return pod is not None
     exists_cmd = [FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig, 'get',
                   'pod', '-o=json', self.name]
     pod_info, _, _ = vm_util.IssueCommand(exists_cmd, suppress_warning=True)
@@ -169,10 +239,14 @@ class KubernetesVirtualMachine(virtual_machine.BaseVirtualMachine):
     """
     Get's the POD's internal ip address.
     """
-    get_pod_cmd = [FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig,
-                   'get', 'pod', self.name, '-o', 'json']
-    stdout, _, _ = vm_util.IssueCommand(get_pod_cmd, suppress_warning=True)
-    pod = json.loads(stdout)
+    if self.lifecycle_group:
+      pod = self.lifecycle_group.Call(lambda vm: 'get', _GetGroupPods,
+                                      self) or {}
+    else:
+      get_pod_cmd = [FLAGS.kubectl, '--kubeconfig=%s' % FLAGS.kubeconfig,
+                     'get', 'pod', self.name, '-o', 'json']
+      stdout, _, _ = vm_util.IssueCommand(get_pod_cmd, suppress_warning=True)
+      pod = json.loads(stdout)
     pod_ip = pod.get('status', {}).get('podIP', None)
 
     if not pod_ip:
@@ -230,6 +304,8 @@ class KubernetesVirtualMachine(virtual_machine.BaseVirtualMachine):
             "dnsPolicy": "ClusterFirst",
         }
     }
+    if self.lifecycle_group:
+      template["metadata"]["labels"][GROUP_LABEL] = self._GetGroupLabel()
     if FLAGS.kubernetes_anti_affinity:
       template["spec"]["affinity"] = {
           "podAntiAffinity": {
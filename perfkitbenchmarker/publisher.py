@@ -29,7 +29,9 @@ import logging
 import math
 import operator
 import pprint
+import Queue
 import sys
+import threading
 import time
 import urllib
 import uuid
@@ -38,6 +40,7 @@ from perfkitbenchmarker import disk
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import flag_util
 from perfkitbenchmarker import log_util
+from perfkitbenchmarker import results_warehouse
 from perfkitbenchmarker import version
 from perfkitbenchmarker import vm_util
 
@@ -80,6 +83,13 @@ flags.DEFINE_string(
     None,
     'A path to write CSV-format results')
 
+flags.DEFINE_string(
+    'sqlite_path',
+    None,
+    'A path to a SQLite results warehouse to add results to. It is created '
+    'if needed, and indexed for queries across runs with '
+    '"python -m perfkitbenchmarker.results_warehouse".')
+
 flags.DEFINE_string(
     'bigquery_table',
     None,
@@ -127,6 +137,26 @@ flags.DEFINE_string(
     'influx_db_name', 'perfkit',
     'Name of Influx DB database that you wish to publish to or create')
 
+flags.DEFINE_boolean(
+    'publish_async', False,
+    'If true, each publisher publishes samples on its own background thread, '
+    'so that slow publishers such as BigQuery or Elasticsearch do not block '
+    'the benchmark, e.g. between runs with --publish_after_run. All queued '
+    'samples are published before PKB exits.')
+flags.DEFINE_integer(
+    'publish_async_queue_size', 16,
+    'The maximum number of sample batches waiting to be published by each '
+    'asynchronous publisher. Publishing blocks while the queue is full.',
+    lower_bound=1)
+flags.DEFINE_integer(
+    'publish_async_retries', 3,
+    'The number of times an asynchronous publisher retries a failed batch of '
+    'samples, with exponential backoff, before dropping it. Only publishers '
+    'that can safely publish the same samples twice, such as the Cloud '
+    'Storage publisher, are retried. Failed batches of all other publishers '
+    'are dropped at once.',
+    lower_bound=0)
+
 DEFAULT_JSON_OUTPUT_NAME = 'perfkitbenchmarker_results.json'
 DEFAULT_CREDENTIALS_JSON = 'credentials.json'
 GCS_OBJECT_NAME_LENGTH = 20
@@ -234,10 +264,19 @@ DEFAULT_METADATA_PROVIDERS = [DefaultMetadataProvider()]
 
 
 class SamplePublisher(object):
-  """An object that can publish performance samples."""
+  """An object that can publish performance samples.
+
+  Attributes:
+    RETRYABLE: bool. True if a failed call to PublishSamples can be retried
+      with the same samples without duplicating the ones that were already
+      published, e.g. because each call writes a single new object. Local
+      files and appending remote loads are not retryable.
+  """
 
   __metaclass__ = abc.ABCMeta
 
+  RETRYABLE = False
+
   @abc.abstractmethod
   def PublishSamples(self, samples):
     """Publishes 'samples'.
@@ -469,6 +508,31 @@ class NewlineDelimitedJSONPublisher(SamplePublisher):
         fp.write(json.dumps(sample) + '\n')
 
 
+class SQLitePublisher(SamplePublisher):
+  """Adds samples to a SQLite results warehouse.
+
+  See results_warehouse.ResultsWarehouse. Samples already in the warehouse,
+  by sample_uri, are skipped, so republishing a JSON file is idempotent.
+
+  Attributes:
+    path: string. Path of the SQLite database.
+  """
+
+  def __init__(self, path):
+    self.path = path
+
+  def __repr__(self):
+    return '<{0} path="{1}">'.format(type(self).__name__, self.path)
+
+  def PublishSamples(self, samples):
+    logging.info('Adding %d samples to %s', len(samples), self.path)
+    warehouse = results_warehouse.ResultsWarehouse(self.path)
+    try:
+      warehouse.AddSamples(samples)
+    finally:
+      warehouse.Close()
+
+
 class BigQueryPublisher(SamplePublisher):
   """Publishes samples to BigQuery.
 
@@ -547,6 +611,9 @@ class CloudStoragePublisher(SamplePublisher):
     gsutil_path: string. The path to the 'gsutil' tool.
   """
 
+  # Each call uploads a new object, so a failed upload leaves nothing behind.
+  RETRYABLE = True
+
   def __init__(self, bucket, gsutil_path='gsutil'):
     self.bucket = bucket
     self.gsutil_path = gsutil_path
@@ -760,6 +827,88 @@ class InfluxDBPublisher(SamplePublisher):
       raise httplib.HTTPException
 
 
+class AsyncPublisher(SamplePublisher):
+  """Publishes samples with another publisher on a background thread.
+
+  PublishSamples only adds the samples to a bounded queue. A worker thread
+  takes them off the queue, combines batches that were queued while the
+  previous batch was being published, and publishes them with the wrapped
+  publisher, retrying failures with exponential backoff.
+
+  Attributes:
+    publisher: SamplePublisher. The publisher to publish samples with.
+    max_retries: int. The number of times to retry a failed batch before
+      dropping it.
+    retry_interval: float. Seconds to wait before the first retry. The wait
+      doubles after each failure.
+  """
+
+  # Queued by Close to stop the worker thread.
+  _CLOSE = object()
+
+  def __init__(self, publisher, max_queued_batches=16, max_retries=3,
+               retry_interval=1.0):
+    self.publisher = publisher
+    self.max_retries = max_retries
+    self.retry_interval = retry_interval
+    self._queue = Queue.Queue(maxsize=max_queued_batches)
+    self._thread = threading.Thread(target=self._PublishQueuedSamples,
+                                    name='AsyncPublisher')
+    self._thread.daemon = True
+    self._thread.start()
+
+  def __repr__(self):
+    return '<{0} publisher={1!r}>'.format(type(self).__name__, self.publisher)
+
+  def PublishSamples(self, samples):
+    """Queues samples to be published, blocking while the queue is full."""
+    if samples:
+      self._queue.put(list(samples))
+
+  def Flush(self):
+    """Waits until all queued samples have been published or dropped."""
+    self._queue.join()
+
+  def Close(self):
+    """Publishes all queued samples and stops the worker thread."""
+    if self._thread.is_alive():
+      self._queue.put(self._CLOSE)
+      self._thread.join()
+
+  def _PublishQueuedSamples(self):
+    while True:
+      batches = [self._queue.get()]
+      while batches[-1] is not self._CLOSE:
+        try:
+          batches.append(self._queue.get_nowait())
+        except Queue.Empty:
+          break
+      samples = [sample for batch in batches if batch is not self._CLOSE
+                 for sample in batch]
+      if samples:
+        self._PublishWithRetries(samples)
+      for _ in batches:
+        self._queue.task_done()
+      if batches[-1] is self._CLOSE:
+        return
+
+  def _PublishWithRetries(self, samples):
+    for retry in xrange(self.max_retries + 1):
+      try:
+        self.publisher.PublishSamples(samples)
+        return
+      except Exception:
+        if retry == self.max_retries:
+          logging.exception('%r failed to publish %d samples. Dropping them.',
+                            self.publisher, len(samples))
+          return
+        sleep_time = self.retry_interval * 2 ** retry
+        logging.warning('%r failed to publish %d samples. Retrying in %s '
+                        'seconds.', self.publisher, len(samples), sleep_time,
+                        exc_info=True)
+        time.sleep(sleep_time)
+
+
 class SampleCollector(object):
   """A performance sample collector.
 
@@ -792,6 +941,13 @@ class SampleCollector(object):
       self.publishers.extend(SampleCollector._PublishersFromFlags())
     if add_default_publishers:
       self.publishers.extend(SampleCollector._DefaultPublishers())
+    if FLAGS.publish_async:
+      self.publishers = [
+          AsyncPublisher(p,
+                         max_queued_batches=FLAGS.publish_async_queue_size,
+                         max_retries=(FLAGS.publish_async_retries
+                                      if p.RETRYABLE else 0))
+          for p in self.publishers]
 
     logging.debug('Using publishers: {0}'.format(self.publishers))
 
@@ -834,6 +990,9 @@ class SampleCollector(object):
     if FLAGS.csv_path:
       publishers.append(CSVPublisher(FLAGS.csv_path))
 
+    if FLAGS.sqlite_path:
+      publishers.append(SQLitePublisher(FLAGS.sqlite_path))
+
     if FLAGS.es_uri:
       publishers.append(ElasticsearchPublisher(es_uri=FLAGS.es_uri,
                                                es_index=FLAGS.es_index,
@@ -869,27 +1028,48 @@ class SampleCollector(object):
       self.samples.append(sample)
 
   def PublishSamples(self):
-    """Publish samples via all registered publishers."""
+    """Publish samples via all registered publishers.
+
+    With --publish_async, this only queues the samples. Call Flush or Close
+    to wait until they have been published.
+    """
     for publisher in self.publishers:
       publisher.PublishSamples(self.samples)
     self.samples = []
 
+  def Flush(self):
+    """Waits until all asynchronous publishers have published their samples."""
+    for publisher in self.publishers:
+      if isinstance(publisher, AsyncPublisher):
+        publisher.Flush()
+
+  def Close(self):
+    """Flushes and stops all asynchronous publishers.
+
+    The collector must not publish samples after it is closed.
+    """
+    for publisher in self.publishers:
+      if isinstance(publisher, AsyncPublisher):
+        publisher.Close()
+
 
 def RepublishJSONSamples(path):
   """Read samples from a JSON file and re-export them.
 
   Args:
-    path: the path to the JSON file.
+    path: the path to the JSON file, or a list of paths. The samples of all
+        the files are published as one batch.
   """
-
-  with open(path, 'r') as file:
-    samples = [json.loads(s) for s in file if s]
+  paths = [path] if isinstance(path, basestring) else path
+  samples = []
+  for path in paths:
+    with open(path, 'r') as file:
+      samples.extend(json.loads(s) for s in file if s.strip())
   for sample in samples:
-    # Chop '|' at the beginning and end of labels and split labels by '|,|'
-    fields = sample.pop('labels')[1:-1].split('|,|')
-    # Turn the fields into [[key, value], ...]
-    key_values = [field.split(':', 1) for field in fields]
-    sample['metadata'] = {k: v for k, v in key_values}
+    # Files written with --nocollapse_labels already have metadata.
+    if 'labels' in sample:
+      sample['metadata'] = results_warehouse.ParseLabels(
+          sample.pop('labels'))
 
   # We can't use a SampleCollector because SampleCollector.AddSamples depends on
   # having a benchmark and a benchmark_spec.
@@ -905,14 +1085,13 @@ if __name__ == '__main__':
     argv = FLAGS(sys.argv)
   except flags.FlagsError as e:
     logging.error(e)
-    logging.info('Flag error. Usage: publisher.py <flags> path-to-json-file')
+    logging.info('Flag error. Usage: publisher.py <flags> path-to-json-file '
+                 '[path-to-json-file ...]')
     sys.exit(1)
 
-  if len(argv) != 2:
+  if len(argv) < 2:
     logging.info('Argument number error. Usage: publisher.py <flags> '
-                 'path-to-json-file')
+                 'path-to-json-file [path-to-json-file ...]')
     sys.exit(1)
 
-  json_path = argv[1]
-
-  RepublishJSONSamples(json_path)
+  RepublishJSONSamples(argv[1:])
@@ -0,0 +1,396 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Client of the resident agent that runs commands on a VM.
+
+With --remote_command_backend=agent, Linux VMs run remote commands through
+scripts/remote_agent.py instead of an SSH session per command. The agent is
+started on the VM by the first command and keeps running between commands.
+Each VM has one SSH session to it, over which all of its commands are sent
+and their output is streamed back as it is written.
+
+Commands keep running on the VM while the SSH session is down. The client
+opens a new session and asks the agent to resume sending each command's
+output from where it left off, so commands survive dropped connections
+without the polling of RobustRemoteCommand.
+"""
+
+import collections
+import json
+import logging
+import posixpath
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from perfkitbenchmarker import command_engine
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import vm_util
+
+flags.DEFINE_enum('remote_command_backend', 'ssh', ['ssh', 'agent'],
+                  'How Linux VMs run remote commands. "ssh" runs each command '
+                  'in its own SSH session. "agent" runs commands through a '
+                  'resident agent on the VM, over one SSH session per VM, '
+                  'which survives dropped connections. Commands run in a '
+                  'login shell always use "ssh".')
+flags.DEFINE_integer('remote_agent_reconnect_attempts', 5,
+                     'Number of times to reopen a dropped connection to the '
+                     'remote agent of a VM before failing its commands.',
+                     lower_bound=0)
+
+FLAGS = flags.FLAGS
+
+AGENT_SCRIPT = 'remote_agent.py'
+AGENT_SOCKET = posixpath.join(vm_util.VM_TMP_DIR, 'pkb-agent.sock')
+AGENT_DIR = posixpath.join(vm_util.VM_TMP_DIR, 'agent')
+
+_STREAMS = ('stdout', 'stderr')
+_RECONNECT_SLEEP_IN_SEC = 1.0
+
+
+def AgentEnabled():
+  """Returns whether remote commands run through the agent."""
+  return FLAGS.remote_command_backend == 'agent'
+
+
+def GetConnectCommand(python='python'):
+  """Returns the command that connects to the agent, starting it if needed.
+
+  Args:
+    python: string. The Python interpreter on the VM.
+
+  Returns:
+    list of strings. Run on the VM, e.g. over SSH.
+  """
+  return [python, posixpath.join(vm_util.VM_TMP_DIR, AGENT_SCRIPT), 'connect',
+          '--socket', AGENT_SOCKET, '--directory', AGENT_DIR]
+
+
+class _RemoteCommand(object):
+  """A command sent to the agent.
+
+  Attributes:
+    id: string. Identifies the command to the agent.
+    command: string. The shell command.
+    offsets: dict mapping 'stdout' and 'stderr' to the number of bytes of
+        each received so far.
+    returncode: int or None. The exit status, once the command is done. -9 if
+        the command was killed.
+    timed_out: bool. Whether the command was killed because of its timeout.
+    killed: bool. Whether the command was killed.
+    error: string or None. Why the command was lost, if it was.
+    agent_id: string or None. The agent the command was sent to.
+  """
+
+  def __init__(self, command, stream_stdout, max_output_bytes):
+    self.id = uuid.uuid4().hex
+    self.command = command
+    self.offsets = dict.fromkeys(_STREAMS, 0)
+    self.returncode = None
+    self.timed_out = False
+    self.killed = False
+    self.error = None
+    self.agent_id = None
+    self.lines = collections.deque() if stream_stdout else None
+    self.outputs = {
+        'stdout': command_engine.OutputStream(max_output_bytes, self.lines),
+        'stderr': command_engine.OutputStream(max_output_bytes)}
+    self.waiter = command_engine.Waiter()
+
+  @property
+  def done(self):
+    return self.returncode is not None or self.error is not None
+
+  def GetRunRequest(self):
+    request = {'type': 'run', 'id': self.id, 'command': self.command}
+    request.update(self.offsets)
+    return request
+
+  def AddOutput(self, stream, offset, data):
+    """Adds output, skipping any part of it that was already received."""
+    skip = self.offsets[stream] - offset
+    if skip >= len(data) or skip < 0:
+      return
+    self.outputs[stream].Append(data[skip:])
+    self.offsets[stream] += len(data) - skip
+    self.waiter.Notify()
+
+  def Finish(self, returncode=None, error=None):
+    self.returncode = returncode
+    self.error = error
+    self.outputs['stdout'].Close()
+    self.waiter.Notify()
+
+
+class RemoteAgentClient(object):
+  """Runs commands through the agent on a VM.
+
+  The SSH session to the agent is opened by the first command, and reopened
+  whenever it drops while commands are running. Commands are resumed on the
+  new session if the agent is the same one, and fail otherwise, since a new
+  agent has lost them.
+  """
+
+  def __init__(self, name, connect_command):
+    """Initializes the client.
+
+    Args:
+      name: string. Name of the VM, for logging.
+      connect_command: list of strings. Command run locally to connect to the
+          agent, e.g. ssh running GetConnectCommand() on the VM.
+    """
+    self.name = name
+    self.connect_command = connect_command
+    self.num_connections = 0
+    self._Reset()
+
+  def _Reset(self):
+    self._lock = threading.Lock()
+    self._commands = {}
+    self._channel = None
+    self._channel_thread = None
+    self._ready = False
+    self._agent_id = None
+    self._closed = False
+
+  def __getstate__(self):
+    """Drops the connection and commands, which only this process can use."""
+    return {'name': self.name, 'connect_command': self.connect_command,
+            'num_connections': self.num_connections}
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._Reset()
+
+  def Run(self, command, should_log=False, suppress_warning=False,
+          timeout=None, line_callback=None):
+    """Runs a command on the VM.
+
+    Args:
+      command: string. A valid bash command.
+      should_log: bool. Whether to log the result at the info level.
+      suppress_warning: bool. Whether to log a non-zero return code at the
+          debug level, unless should_log is set.
+      timeout: float or None. Seconds after which the command is killed.
+      line_callback: function or None. If provided, called with each line of
+          stdout as it is received, in this thread. Stdout is then not kept
+          and the returned stdout is empty.
+
+    Returns:
+      A tuple of stdout, stderr and return code.
+
+    Raises:
+      RemoteCommandError: If the agent could not be reached, or lost the
+          command.
+    """
+    logging.info('Running on %s (agent): %s', self.name, command)
+    cmd = _RemoteCommand(command, line_callback is not None,
+                         FLAGS.command_output_max_bytes)
+    with self._lock:
+      self._commands[cmd.id] = cmd
+      if self._ready:
+        cmd.agent_id = self._agent_id
+        self._Send(cmd.GetRunRequest())
+      self._StartChannelThread()
+    deadline = time.time() + timeout if timeout else None
+    try:
+      while True:
+        done = cmd.done
+        while cmd.lines:
+          line = cmd.lines.popleft()
+          line_callback(line.decode('ascii', 'ignore'))
+        if done:
+          break
+        if deadline is None:
+          cmd.waiter.Wait()
+          continue
+        remaining = deadline - time.time()
+        if remaining > 0:
+          cmd.waiter.Wait(remaining)
+        else:
+          # The agent answers the kill with the command's exit status.
+          self._Timeout(cmd, timeout)
+          deadline = None
+    except:
+      self._Kill(cmd)
+      raise
+    finally:
+      with self._lock:
+        self._commands.pop(cmd.id, None)
+        if self._ready:
+          self._Send({'type': 'release', 'id': cmd.id})
+    if cmd.error:
+      raise errors.VirtualMachine.RemoteCommandError(
+          'Lost command %s on %s: %s' % (command, self.name, cmd.error))
+    stdout, stderr = [bytes(cmd.outputs[stream].data).decode('ascii', 'ignore')
+                      for stream in _STREAMS]
+    debug_text = ('Ran %s on %s (agent). Got return code (%s).\n'
+                  'STDOUT: %s\nSTDERR: %s' %
+                  (command, self.name, cmd.returncode, stdout, stderr))
+    if should_log or (cmd.returncode and not suppress_warning):
+      logging.info(debug_text)
+    else:
+      logging.debug(debug_text)
+    return stdout, stderr, cmd.returncode
+
+  def Close(self):
+    """Closes the connection to the agent, failing running commands.
+
+    The agent keeps running on the VM until it has been idle for a while. A
+    later command opens a new connection.
+    """
+    with self._lock:
+      self._closed = True
+      channel = self._channel
+      thread = self._channel_thread
+    if channel:
+      try:
+        channel.stdin.close()
+      except IOError:
+        pass
+    if thread:
+      thread.join()
+    with self._lock:
+      self._closed = False
+
+  def _Timeout(self, cmd, timeout):
+    logging.error('Command on %s timed out after %s seconds. Killing command '
+                  '"%s".', self.name, timeout, cmd.command)
+    cmd.timed_out = True
+    self._Kill(cmd)
+
+  def _Kill(self, cmd):
+    with self._lock:
+      cmd.killed = True
+      if self._ready:
+        self._Send({'type': 'kill', 'id': cmd.id})
+
+  def _Send(self, message):
+    """Sends a request to the agent. Must hold self._lock.
+
+    A request that can't be sent is resent, or made moot, once the channel is
+    reopened.
+    """
+    try:
+      self._channel.stdin.write(json.dumps(message) + '\n')
+      self._channel.stdin.flush()
+    except (IOError, ValueError):
+      # The channel thread finds out that the channel is down.
+      pass
+
+  def _StartChannelThread(self):
+    """Starts the thread that owns the channel, if needed. Holds self._lock."""
+    if self._channel_thread:
+      return
+    self._channel_thread = threading.Thread(
+        target=self._RunChannels, name='agent-%s' % self.name)
+    self._channel_thread.daemon = True
+    self._channel_thread.start()
+
+  def _RunChannels(self):
+    """Opens channels to the agent while there are commands to run."""
+    failures = 0
+    while True:
+      with self._lock:
+        if self._closed:
+          self._FailCommands('The agent connection was closed.')
+        if not self._commands:
+          self._channel_thread = None
+          return
+      if failures:
+        time.sleep(_RECONNECT_SLEEP_IN_SEC)
+      connected, error = self._RunChannel()
+      # A channel that reached the agent resets the count.
+      failures = 0 if connected else failures + 1
+      if failures > FLAGS.remote_agent_reconnect_attempts:
+        with self._lock:
+          self._FailCommands('Could not connect to the agent: %s' % error)
+
+  def _RunChannel(self):
+    """Reads responses from a new channel until it closes.
+
+    Returns:
+      A tuple of whether the channel reached the agent, and why the channel
+      could not be opened or closed with an error, or None.
+    """
+    with tempfile.TemporaryFile() as stderr:
+      channel = subprocess.Popen(
+          self.connect_command, stdin=subprocess.PIPE,
+          stdout=subprocess.PIPE, stderr=stderr, close_fds=True)
+      with self._lock:
+        self._channel = channel
+        self.num_connections += 1
+      connected = False
+      try:
+        for line in iter(channel.stdout.readline, b''):
+          self._HandleResponse(json.loads(line))
+          connected = True
+      except ValueError as e:
+        logging.warning('Bad response from the agent on %s: %s', self.name, e)
+      finally:
+        with self._lock:
+          self._ready = False
+          self._channel = None
+        try:
+          channel.stdin.close()
+        except IOError:
+          pass
+        channel.wait()
+        stderr.seek(0)
+        error_text = stderr.read()
+    error = None
+    if channel.returncode or not connected:
+      error = 'exit status %s, %s' % (channel.returncode, error_text.strip())
+      with self._lock:
+        should_warn = self._commands and not self._closed
+      if should_warn:
+        logging.warning('Connection to the agent on %s failed: %s', self.name,
+                        error)
+    return connected, error
+
+  def _HandleResponse(self, response):
+    with self._lock:
+      if response['type'] == 'hello':
+        self._agent_id = response['agent']
+        self._ready = True
+        for cmd in self._commands.values():
+          if cmd.agent_id not in (None, self._agent_id):
+            # A new agent, e.g. after a reboot, doesn't know the command.
+            cmd.Finish(error='The agent restarted.')
+            del self._commands[cmd.id]
+            continue
+          cmd.agent_id = self._agent_id
+          self._Send(cmd.GetRunRequest())
+          if cmd.killed:
+            self._Send({'type': 'kill', 'id': cmd.id})
+        return
+      cmd = self._commands.get(response['id'])
+    if not cmd:
+      return
+    if response['type'] == 'output':
+      cmd.AddOutput(response['stream'], response['offset'],
+                    response['data'].encode('latin-1'))
+    elif response['type'] == 'exit':
+      cmd.Finish(returncode=response['status'])
+    elif response['type'] == 'error':
+      cmd.Finish(error=response['error'])
+
+  def _FailCommands(self, error):
+    """Fails the running commands. Must hold self._lock."""
+    for cmd in self._commands.values():
+      cmd.Finish(error=error)
+    self._commands.clear()
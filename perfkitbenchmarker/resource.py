@@ -21,8 +21,11 @@ reliably.
 
 import abc
 import time
+import uuid
 
 from perfkitbenchmarker import errors
+from perfkitbenchmarker import poll_coordinator
+from perfkitbenchmarker import resource_journal
 from perfkitbenchmarker import vm_util
 
 
@@ -32,6 +35,7 @@ class BaseResource(object):
   Attributes:
     created: True if the resource has been created.
     pkb_managed: Whether the resource is managed (created and deleted) by PKB.
+    journal_key: string. Identifies the resource in resource journals.
   """
 
   __metaclass__ = abc.ABCMeta
@@ -40,6 +44,7 @@ class BaseResource(object):
     super(BaseResource, self).__init__()
     self.created = user_managed
     self.user_managed = user_managed
+    self.journal_key = uuid.uuid4().hex
 
     # Creation and deletion time information
     # that we may make use of later.
@@ -85,6 +90,31 @@ class BaseResource(object):
     """
     return True
 
+  @classmethod
+  def _AreReady(cls, resources):
+    """Returns which of the given resources of this class are ready.
+
+    Supplying this method is optional. Use it when the readiness of many
+    resources can be checked with one call, e.g. one that lists them. The
+    resources of the class that supplies it are then polled together. If the
+    subclass does not implement it then each resource is checked with
+    _IsReady.
+
+    Args:
+      resources: list of resources of this class.
+
+    Returns:
+      iterable of the resources that are ready.
+    """
+    ready = []
+    for resource in resources:
+      try:
+        if resource._IsReady():
+          ready.append(resource)
+      except errors.Resource.RetryableCreationError:
+        pass
+    return ready
+
   def _PostCreate(self):
     """Method that will be called once after _CreateReource is called.
 
@@ -94,6 +124,21 @@ class BaseResource(object):
     """
     pass
 
+  def GetProvisioningDependencies(self):
+    """Returns the objects that must be created before this resource.
+
+    BenchmarkSpec.Provision creates each resource once all of the objects
+    returned here have been created, and BenchmarkSpec.Delete deletes it
+    before any of them are deleted. Objects that are not managed by the
+    BenchmarkSpec are ignored. Unlike _CreateDependencies, which creates
+    resources owned by this one, this declares resources shared with others
+    (e.g. the network a VM is attached to).
+
+    Returns:
+      A list of resource.BaseResource or network.BaseNetwork objects.
+    """
+    return []
+
   def _CreateDependencies(self):
     """Method that will be called once before _CreateResource() is called.
 
@@ -117,6 +162,8 @@ class BaseResource(object):
       return
     if not self.create_start_time:
       self.create_start_time = time.time()
+      # Lets cleanup delete the resource even if PKB dies while creating it.
+      resource_journal.Record(self, resource_journal.CREATING)
     self._Create()
     try:
       if not self._Exists():
@@ -127,6 +174,7 @@ class BaseResource(object):
     self.created = True
     if not self.create_end_time:
       self.create_end_time = time.time()
+    resource_journal.Record(self, resource_journal.CREATED)
 
   @vm_util.Retry(retryable_exceptions=(errors.Resource.RetryableDeletionError,))
   def _DeleteResource(self):
@@ -142,27 +190,31 @@ class BaseResource(object):
       pass
     if not self.delete_end_time:
       self.delete_end_time = time.time()
+    resource_journal.Record(self, resource_journal.DELETED)
 
   def Create(self):
     """Creates a resource and its dependencies."""
-
-    # A more general solution would allow the retry interval to be set as a
-    # property of the class.  We don't currently need that.
-    @vm_util.Retry(poll_interval=5, fuzz=0,
-                   retryable_exceptions=(
-                       errors.Resource.RetryableCreationError,))
-    def WaitUntilReady():
-      if not self._IsReady():
-        raise errors.Resource.RetryableCreationError('Not yet ready')
-
     if self.user_managed:
       return
     self._CreateDependencies()
     self._CreateResource()
-    WaitUntilReady()
+    cls = type(self)
+    if (cls._IsReady.im_func is not BaseResource._IsReady.im_func or
+        cls._AreReady.im_func is not BaseResource._AreReady.im_func):
+      # Resources are polled together by the class that supplies _AreReady.
+      poll_class = next(c for c in cls.__mro__ if '_AreReady' in vars(c))
+      if poll_class is BaseResource:
+        poll_coordinator.WaitUntilReady(self, self, cls._AreReady,
+                                        cls.__name__)
+      else:
+        poll_coordinator.WaitUntilReady(self, poll_class,
+                                        poll_class._AreReady,
+                                        poll_class.__name__)
     if not self.resource_ready_time:
       self.resource_ready_time = time.time()
     self._PostCreate()
+    # _PostCreate often records e.g. IP addresses.
+    resource_journal.Record(self, resource_journal.CREATED)
 
   def Delete(self):
     """Deletes a resource and its dependencies."""
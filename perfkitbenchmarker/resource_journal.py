@@ -0,0 +1,229 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Append-only journal of resource state changes.
+
+BenchmarkSpec.Pickle writes a snapshot of the whole spec. Between snapshots,
+each resource appends its state to the spec's journal whenever it is being
+created, has been created or has been deleted. The state of one resource is
+small and quick to write, so a crash mid-provisioning loses at most the
+resource being written. BenchmarkSpec.GetBenchmarkSpec replays the journal on
+top of the last snapshot, so that e.g. teardown can delete everything that
+was created.
+
+Each record is the resource's key, the event, the resource's class and the
+pickled __dict__ of the resource. Other resources that the state refers to
+are pickled as references to their keys, so that they are not duplicated.
+"""
+
+import cPickle
+import cStringIO
+import logging
+import struct
+import threading
+import uuid
+
+from perfkitbenchmarker import context
+
+CREATING = 'creating'
+CREATED = 'created'
+DELETED = 'deleted'
+
+_LENGTH = struct.Struct('>I')
+
+
+def GetKey(resource):
+  """Returns the key that identifies a resource in snapshots and journals."""
+  # Resources unpickled from specs older than the journal have no key.
+  return resource.__dict__.setdefault('journal_key', uuid.uuid4().hex)
+
+
+def Record(resource, event):
+  """Appends a resource's state to the current spec's journal, if any.
+
+  Args:
+    resource: resource.BaseResource. The resource that changed.
+    event: string. CREATING, CREATED or DELETED.
+  """
+  spec = context.GetThreadBenchmarkSpec()
+  journal = getattr(spec, 'resource_journal', None)
+  if journal:
+    journal.Append(resource, event)
+
+
+def _IsResource(obj):
+  """Returns whether obj is a resource, network or firewall.
+
+  Networks and firewalls aren't resources, but are shared by resources, so
+  they are journaled by reference as well.
+  """
+  # Imported here since resource.py records its changes with this module.
+  from perfkitbenchmarker import network
+  from perfkitbenchmarker import resource
+  return isinstance(obj, (resource.BaseResource, network.BaseNetwork,
+                          network.BaseFirewall))
+
+
+def AssignKeys(root):
+  """Assigns keys to the resources reachable from root that have none.
+
+  Must be called before root is pickled as a snapshot, so that the journal's
+  references to the snapshot's resources can be resolved.
+  """
+  _FindResources(root)
+
+
+def _FindResources(root):
+  """Returns a dict mapping key to each resource reachable from root.
+
+  Resources include networks and firewalls, see _IsResource.
+
+  Follows containers and the attributes of root, resources and other PKB
+  objects only.
+  """
+  resources = {}
+  seen = set()
+  stack = [root]
+  while stack:
+    obj = stack.pop()
+    if id(obj) in seen:
+      continue
+    seen.add(id(obj))
+    if isinstance(obj, dict):
+      stack.extend(obj.itervalues())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+      stack.extend(obj)
+    elif obj is root or _IsResource(obj) or (
+            hasattr(obj, '__dict__') and
+            type(obj).__module__.startswith('perfkitbenchmarker')):
+      if _IsResource(obj):
+        resources[GetKey(obj)] = obj
+      stack.extend(obj.__dict__.itervalues())
+  return resources
+
+
+class ResourceJournal(object):
+  """A journal file that resources append their state to.
+
+  Attributes:
+    path: string. Path of the journal file.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._lock = threading.Lock()
+
+  def __getstate__(self):
+    return {'path': self.path}
+
+  def __setstate__(self, state):
+    self.__init__(state['path'])
+
+  def Truncate(self):
+    """Drops all records, e.g. once a snapshot includes their changes."""
+    with self._lock:
+      open(self.path, 'wb').close()
+
+  def Append(self, resource, event):
+    """Appends a resource's state.
+
+    Failures are logged rather than raised, so that they don't fail the
+    resource's creation or deletion.
+    """
+    key = GetKey(resource)
+    try:
+      record = cPickle.dumps((key, event, type(resource)), 2)
+      data = _Dumps(dict(resource.__dict__))
+      with self._lock:
+        with open(self.path, 'ab') as journal_file:
+          journal_file.write(_LENGTH.pack(len(record)) + record +
+                             _LENGTH.pack(len(data)) + data)
+    except Exception:  # pylint: disable=broad-except
+      logging.exception('Could not journal that %s %s is %s.',
+                        type(resource).__name__, key, event)
+
+  def _ReadRecords(self):
+    """Yields (key, event, resource class, pickled state) tuples."""
+    try:
+      journal_file = open(self.path, 'rb')
+    except IOError:
+      return
+    with journal_file:
+      while True:
+        parts = []
+        for _ in range(2):
+          header = journal_file.read(_LENGTH.size)
+          if len(header) < _LENGTH.size:
+            break
+          length, = _LENGTH.unpack(header)
+          part = journal_file.read(length)
+          if len(part) < length:
+            break
+          parts.append(part)
+        if len(parts) < 2:
+          # The end of the journal, or a record cut short by a crash.
+          return
+        key, event, cls = cPickle.loads(parts[0])
+        yield key, event, cls, parts[1]
+
+  def Replay(self, root):
+    """Applies the journal to the resources reachable from root.
+
+    Args:
+      root: object. Usually the BenchmarkSpec unpickled from the snapshot that
+          the journal was started from.
+
+    Returns:
+      list of resource.BaseResource. Resources created after the snapshot and
+      not reachable from root, e.g. scratch disks, whose last record is not a
+      deletion. Their creation may have been interrupted.
+    """
+    records = list(self._ReadRecords())
+    if not records:
+      return []
+    resources = _FindResources(root)
+    new_keys = []
+    for key, _, cls, _ in records:
+      if key not in resources:
+        resources[key] = cls.__new__(cls)
+        new_keys.append(key)
+    events = {}
+    for key, event, _, data in records:
+      events[key] = event
+      resources[key].__dict__.update(_Loads(data, resources))
+    logging.info('Replayed %d resource journal records from %s.',
+                 len(records), self.path)
+    return [resources[key] for key in new_keys if events[key] != DELETED]
+
+
+def _PersistentId(obj):
+  return GetKey(obj) if _IsResource(obj) else None
+
+
+def _Dumps(obj):
+  data = cStringIO.StringIO()
+  pickler = cPickle.Pickler(data, 2)
+  pickler.persistent_id = _PersistentId
+  pickler.dump(obj)
+  return data.getvalue()
+
+
+def _Loads(data, resources):
+  def _PersistentLoad(key):
+    if key not in resources:
+      logging.warning('Resource journal refers to unknown resource %s.', key)
+    return resources.get(key)
+  unpickler = cPickle.Unpickler(cStringIO.StringIO(data))
+  unpickler.persistent_load = _PersistentLoad
+  return unpickler.load()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local SQLite warehouse of published samples, and queries across runs.
+
+publisher.SQLitePublisher adds the samples of each run to the warehouse
+(see --sqlite_path). Samples are indexed by metric, benchmark, run_uri and
+timestamp, and their metadata is stored as one indexed row per label, so that
+queries across hundreds of runs read only the matching samples.
+
+Usage:
+
+  # Import existing newline-delimited JSON results.
+  python -m perfkitbenchmarker.results_warehouse results.db import \\
+      perfkitbenchmarker_results.json ...
+  # Mean throughput per machine type since the start of 2017.
+  python -m perfkitbenchmarker.results_warehouse results.db query \\
+      --metric=Throughput --start=2017-01-01 --group_by=label:machine_type
+"""
+
+import argparse
+import calendar
+import json
+import logging
+import sqlite3
+import sys
+import time
+
+# Metadata values are stored as the strings of publisher.GetLabelsFromDict.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+  id INTEGER PRIMARY KEY,
+  sample_uri TEXT UNIQUE,
+  timestamp REAL,
+  test TEXT,
+  metric TEXT,
+  value REAL,
+  unit TEXT,
+  run_uri TEXT,
+  product_name TEXT,
+  official INTEGER,
+  owner TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_by_metric
+    ON samples (metric, timestamp);
+CREATE INDEX IF NOT EXISTS samples_by_test
+    ON samples (test, metric, timestamp);
+CREATE INDEX IF NOT EXISTS samples_by_run ON samples (run_uri);
+CREATE INDEX IF NOT EXISTS samples_by_timestamp ON samples (timestamp);
+CREATE TABLE IF NOT EXISTS labels (
+  sample_id INTEGER NOT NULL REFERENCES samples (id),
+  key TEXT NOT NULL,
+  value TEXT,
+  PRIMARY KEY (sample_id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS labels_by_value ON labels (key, value, sample_id);
+"""
+
+_SAMPLE_COLUMNS = ('sample_uri', 'timestamp', 'test', 'metric', 'value',
+                   'unit', 'run_uri', 'product_name', 'official', 'owner')
+
+# Columns that queries can filter and group by, besides labels.
+GROUP_BY_COLUMNS = ('test', 'metric', 'unit', 'run_uri', 'product_name',
+                    'official', 'owner')
+LABEL_PREFIX = 'label:'
+
+AGGREGATES = {
+    'count': 'COUNT(s.value)',
+    'mean': 'AVG(s.value)',
+    'min': 'MIN(s.value)',
+    'max': 'MAX(s.value)',
+    'sum': 'SUM(s.value)',
+    'first_timestamp': 'MIN(s.timestamp)',
+    'last_timestamp': 'MAX(s.timestamp)',
+}
+
+_BUSY_TIMEOUT_IN_SEC = 60
+
+
+def ParseLabels(labels):
+  """Parses the labels string of publisher.GetLabelsFromDict into a dict."""
+  if not labels:
+    return {}
+  # Chop '|' at the beginning and end of labels and split labels by '|,|'.
+  fields = labels[1:-1].split('|,|')
+  return dict(field.split(':', 1) for field in fields)
+
+
+class ResultsWarehouse(object):
+  """A SQLite database of samples.
+
+  Attributes:
+    path: string. Path of the database file.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    # Other PKB processes may publish to the same database.
+    self._connection = sqlite3.connect(path, timeout=_BUSY_TIMEOUT_IN_SEC)
+    self._connection.execute('PRAGMA journal_mode=WAL')
+    # With WAL, a crash can only lose the last transactions, not corrupt it.
+    self._connection.execute('PRAGMA synchronous=NORMAL')
+    self._connection.executescript(_SCHEMA)
+
+  def Close(self):
+    self._connection.close()
+
+  def AddSamples(self, samples):
+    """Adds samples in one transaction, skipping ones already added.
+
+    Args:
+      samples: iterable of sample dicts, as published by SampleCollector. The
+          metadata is either a dict under 'metadata', or a string under
+          'labels' (see publisher.GetLabelsFromDict).
+
+    Returns:
+      int. The number of samples added.
+    """
+    added = 0
+    with self._connection:
+      cursor = self._connection.cursor()
+      for sample in samples:
+        cursor.execute(
+            'INSERT OR IGNORE INTO samples (%s) VALUES (%s)' %
+            (', '.join(_SAMPLE_COLUMNS), ', '.join('?' * len(_SAMPLE_COLUMNS))),
+            [sample.get(column) for column in _SAMPLE_COLUMNS])
+        if not cursor.rowcount:
+          continue
+        added += 1
+        if 'metadata' in sample:
+          metadata = sample['metadata']
+        else:
+          metadata = ParseLabels(sample.get('labels'))
+        sample_id = cursor.lastrowid
+        cursor.executemany(
+            'INSERT INTO labels (sample_id, key, value) VALUES (?, ?, ?)',
+            [(sample_id, key, unicode(value))
+             for key, value in metadata.iteritems()])
+    return added
+
+  def _BuildQuery(self, select, group_by, metric, test, run_uri, start_time,
+                  end_time, labels):
+    """Returns a query of the matching samples, and its parameters."""
+    joins = []
+    join_params = []
+    group_expressions = []
+    for index, column in enumerate(group_by):
+      if column.startswith(LABEL_PREFIX):
+        alias = 'g%d' % index
+        joins.append('LEFT JOIN labels %s ON %s.sample_id = s.id AND '
+                     '%s.key = ?' % (alias, alias, alias))
+        join_params.append(column[len(LABEL_PREFIX):])
+        group_expressions.append('%s.value' % alias)
+      elif column in GROUP_BY_COLUMNS:
+        group_expressions.append('s.' + column)
+      else:
+        raise ValueError('Cannot group by %r. Use one of %s, or label:KEY.' %
+                         (column, ', '.join(GROUP_BY_COLUMNS)))
+    conditions = []
+    params = []
+    for column, value in (('metric', metric), ('test', test),
+                          ('run_uri', run_uri)):
+      if value is not None:
+        conditions.append('s.%s = ?' % column)
+        params.append(value)
+    if start_time is not None:
+      conditions.append('s.timestamp >= ?')
+      params.append(start_time)
+    if end_time is not None:
+      conditions.append('s.timestamp < ?')
+      params.append(end_time)
+    for key, value in sorted((labels or {}).iteritems()):
+      conditions.append('EXISTS (SELECT 1 FROM labels l WHERE '
+                        'l.sample_id = s.id AND l.key = ? AND l.value = ?)')
+      params.extend((key, unicode(value)))
+    query = 'SELECT %s FROM samples s %s' % (
+        ', '.join(group_expressions + select), ' '.join(joins))
+    if conditions:
+      query += ' WHERE ' + ' AND '.join(conditions)
+    if group_expressions:
+      group_by = ', '.join(group_expressions)
+      query += ' GROUP BY %s ORDER BY %s' % (group_by, group_by)
+    return query, join_params + params
+
+  def Aggregate(self, aggregates=('count', 'mean', 'min', 'max'),
+                group_by=(), metric=None, test=None, run_uri=None,
+                start_time=None, end_time=None, labels=None):
+    """Aggregates the values of the matching samples.
+
+    Args:
+      aggregates: sequence of keys of AGGREGATES.
+      group_by: sequence of strings. Columns in GROUP_BY_COLUMNS, or
+          'label:KEY' to group by the value of label KEY, which is None for
+          samples without it.
+      metric: string or None. Only aggregate samples of this metric.
+      test: string or None. Only aggregate samples of this benchmark.
+      run_uri: string or None. Only aggregate samples of this run.
+      start_time: float or None. Only aggregate samples at or after this
+          timestamp, in seconds since the epoch.
+      end_time: float or None. Only aggregate samples before this timestamp.
+      labels: dict or None. Only aggregate samples with these label values.
+
+    Returns:
+      list of dicts, one per group, mapping each group_by column and
+      aggregate to its value.
+    """
+    for aggregate in aggregates:
+      if aggregate not in AGGREGATES:
+        raise ValueError('Unknown aggregate %r. Use one of %s.' %
+                         (aggregate, ', '.join(sorted(AGGREGATES))))
+    query, params = self._BuildQuery(
+        [AGGREGATES[a] for a in aggregates], group_by, metric, test, run_uri,
+        start_time, end_time, labels)
+    keys = list(group_by) + list(aggregates)
+    return [dict(zip(keys, row))
+            for row in self._connection.execute(query, params)]
+
+  def GetSamples(self, metric=None, test=None, run_uri=None, start_time=None,
+                 end_time=None, labels=None):
+    """Returns the matching samples, ordered by timestamp.
+
+    Args:
+      See Aggregate.
+
+    Returns:
+      list of sample dicts, with their labels as a dict under 'metadata'.
+    """
+    query, params = self._BuildQuery(
+        ['s.id'] + ['s.' + column for column in _SAMPLE_COLUMNS], (), metric,
+        test, run_uri, start_time, end_time, labels)
+    samples = {}
+    ordered = []
+    for row in self._connection.execute(query + ' ORDER BY s.timestamp',
+                                        params):
+      sample = dict(zip(_SAMPLE_COLUMNS, row[1:]))
+      sample['metadata'] = {}
+      samples[row[0]] = sample
+      ordered.append(sample)
+    # Looked up in chunks, since SQLite limits the number of parameters.
+    ids = list(samples)
+    for start in xrange(0, len(ids), 500):
+      chunk = ids[start:start + 500]
+      for sample_id, key, value in self._connection.execute(
+          'SELECT sample_id, key, value FROM labels WHERE sample_id IN (%s)' %
+          ', '.join('?' * len(chunk)), chunk):
+        samples[sample_id]['metadata'][key] = value
+    return ordered
+
+
+def _ParseTime(value):
+  """Parses seconds since the epoch, or a UTC date like 2017-01-31[T12:00]."""
+  if value is None:
+    return None
+  try:
+    return float(value)
+  except ValueError:
+    pass
+  for time_format in ('%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S'):
+    try:
+      return calendar.timegm(time.strptime(value, time_format))
+    except ValueError:
+      pass
+  raise argparse.ArgumentTypeError('Invalid time: %r' % value)
+
+
+def _ParseLabel(value):
+  if '=' not in value:
+    raise argparse.ArgumentTypeError('Expected KEY=VALUE, got %r' % value)
+  return value.split('=', 1)
+
+
+def _ImportJSONFiles(warehouse, paths):
+  """Adds the samples in newline-delimited JSON files to the warehouse."""
+  for path in paths:
+    with open(path) as json_file:
+      samples = [json.loads(line) for line in json_file if line.strip()]
+    added = warehouse.AddSamples(samples)
+    logging.info('Added %d of the %d samples in %s.', added, len(samples),
+                 path)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Imports samples into, and queries, a results warehouse.')
+  parser.add_argument('database', help='Path of the SQLite database.')
+  subparsers = parser.add_subparsers(dest='command')
+  import_parser = subparsers.add_parser(
+      'import', help='Import newline-delimited JSON results files.')
+  import_parser.add_argument('paths', nargs='+')
+  query_parser = subparsers.add_parser(
+      'query', help='Print aggregates of the values of matching samples.')
+  query_parser.add_argument('--metric')
+  query_parser.add_argument('--test')
+  query_parser.add_argument('--run_uri')
+  query_parser.add_argument('--start', type=_ParseTime,
+                            help='Seconds since the epoch, or a UTC date.')
+  query_parser.add_argument('--end', type=_ParseTime,
+                            help='Seconds since the epoch, or a UTC date.')
+  query_parser.add_argument('--label', type=_ParseLabel, action='append',
+                            default=[], metavar='KEY=VALUE')
+  query_parser.add_argument(
+      '--group_by', default='test,metric,unit',
+      help='Comma-separated columns, from %s, or label:KEY.' %
+      ', '.join(GROUP_BY_COLUMNS))
+  query_parser.add_argument(
+      '--aggregates', default='count,mean,min,max',
+      help='Comma-separated aggregates, from %s.' %
+      ', '.join(sorted(AGGREGATES)))
+  args = parser.parse_args(argv)
+
+  logging.basicConfig(level=logging.INFO)
+  warehouse = ResultsWarehouse(args.database)
+  try:
+    if args.command == 'import':
+      _ImportJSONFiles(warehouse, args.paths)
+      return 0
+    group_by = [c for c in args.group_by.split(',') if c]
+    aggregates = [a for a in args.aggregates.split(',') if a]
+    try:
+      rows = warehouse.Aggregate(
+          aggregates, group_by, metric=args.metric, test=args.test,
+          run_uri=args.run_uri, start_time=args.start, end_time=args.end,
+          labels=dict(args.label))
+    except ValueError as e:
+      parser.error(str(e))
+    columns = group_by + aggregates
+    print('\t'.join(columns))
+    for row in rows:
+      print('\t'.join(str(row[column]) for column in columns))
+    return 0
+  finally:
+    warehouse.Close()
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -15,6 +15,9 @@
 
 import collections
 import time
+
+import numpy as np
+
 PERCENTILES_LIST = [0.1, 1, 5, 10, 50, 90, 95, 99, 99.9]
 
 _SAMPLE_FIELDS = 'metric', 'value', 'unit', 'metadata', 'timestamp'
@@ -23,8 +26,12 @@ _SAMPLE_FIELDS = 'metric', 'value', 'unit', 'metadata', 'timestamp'
 def PercentileCalculator(numbers, percentiles=PERCENTILES_LIST):
   """Computes percentiles, stddev and mean on a set of numbers.
 
+  All percentiles are found with a single partial sort of the numbers, and the
+  mean and stddev are computed with NumPy, so large inputs are best passed as
+  NumPy arrays to avoid converting them.
+
   Args:
-    numbers: A sequence of numbers to compute percentiles for.
+    numbers: A sequence or NumPy array of numbers to compute percentiles for.
     percentiles: If given, a list of percentiles to compute. Can be
       floats, ints or longs.
 
@@ -40,24 +47,26 @@ def PercentileCalculator(numbers, percentiles=PERCENTILES_LIST):
   if not len(numbers):  # 'if not numbers' will fail if numbers is a pd.Series.
     raise ValueError("Can't compute percentiles of empty list.")
 
-  numbers_sorted = sorted(numbers)
-  count = len(numbers_sorted)
-  total = sum(numbers_sorted)
-  result = {}
   for percentile in percentiles:
     if percentile < 0.0 or percentile > 100.0:
       raise ValueError('Invalid percentile %s' % percentile)
 
+  numbers = np.asarray(numbers)
+  count = len(numbers)
+  # min() is a correction to handle the 100th percentile.
+  indices = [min(int(count * float(percentile) / 100.0), count - 1)
+             for percentile in percentiles]
+  # Partitioning around every index at once puts each of them in its sorted
+  # position without sorting the rest of the array.
+  partitioned = np.partition(numbers, sorted(set(indices))) if indices else None
+  result = {}
+  for percentile, index in zip(percentiles, indices):
     percentile_string = 'p%s' % str(percentile)
-    index = int(count * float(percentile) / 100.0)
-    index = min(index, count - 1)  # Correction to handle 100th percentile.
-    result[percentile_string] = numbers_sorted[index]
+    result[percentile_string] = partitioned[index].item()
 
-  average = total / float(count)
-  result['average'] = average
+  result['average'] = numbers.mean().item()
   if count > 1:
-    total_of_squares = sum([(i - average) ** 2 for i in numbers])
-    result['stddev'] = (total_of_squares / (count - 1)) ** 0.5
+    result['stddev'] = numbers.std(ddof=1).item()
   else:
     result['stddev'] = 0
 
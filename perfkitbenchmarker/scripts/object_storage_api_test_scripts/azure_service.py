@@ -55,7 +55,7 @@ class AzureService(object_storage_interface.ObjectStorageServiceBase):
     latency = time.time() - start_time
     return start_time, latency
 
-  def ReadObject(self, bucket, object):
+  def ReadObject(self, bucket, object, size=None):
     start_time = time.time()
     self.blobService.get_blob_to_bytes(bucket, object)
     latency = time.time() - start_time
@@ -15,17 +15,63 @@
 """An interface to boto-based object storage APIs."""
 
 import logging
+import sys
+import threading
 import time
 
 import boto
+import gflags as flags
 
 import object_storage_interface
 
+FLAGS = flags.FLAGS
+
+
+def RunInParallel(function, args_list, concurrency):
+  """Call a function for each item of a list from several threads.
+
+  Args:
+    function: the function to call. It is passed one item at a time.
+    args_list: the items to call function for.
+    concurrency: the maximum number of concurrent calls.
+
+  Raises:
+    The first exception raised by function, once all calls have finished.
+  """
+
+  items = list(args_list)
+  items.reverse()
+  lock = threading.Lock()
+  exc_infos = []
+
+  def _Work():
+    while True:
+      with lock:
+        if not items or exc_infos:
+          return
+        item = items.pop()
+      try:
+        function(item)
+      except Exception:
+        with lock:
+          exc_infos.append(sys.exc_info())
+
+  threads = [threading.Thread(target=_Work)
+             for _ in xrange(min(concurrency, len(items)))]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  if exc_infos:
+    raise exc_infos[0][0], exc_infos[0][1], exc_infos[0][2]
+
 
 class BotoService(object_storage_interface.ObjectStorageServiceBase):
-  def __init__(self, storage_schema, host_to_connect=None):
+  def __init__(self, storage_schema, host_to_connect=None,
+               connection_args=None):
     self.storage_schema = storage_schema
     self.host_to_connect = host_to_connect
+    self.connection_args = connection_args or {}
 
   def _StorageURI(self, bucket, object=None):
     """Return a storage_uri for the given resource.
@@ -44,8 +90,14 @@ class BotoService(object_storage_interface.ObjectStorageServiceBase):
     else:
       path = bucket
     storage_uri = boto.storage_uri(path, self.storage_schema)
+    connection_args = dict(self.connection_args)
     if self.host_to_connect is not None:
-      storage_uri.connect(host=self.host_to_connect)
+      connection_args['host'] = self.host_to_connect
+    if connection_args:
+      # boto shares the connection of a scheme between all storage_uris, and
+      # its connection keeps a pool of HTTP connections alive, so only the
+      # first call creates a connection.
+      storage_uri.connect(**connection_args)
     return storage_uri
 
   def ListObjects(self, bucket, prefix):
@@ -66,9 +118,20 @@ class BotoService(object_storage_interface.ObjectStorageServiceBase):
   # Not implementing WriteObjectFromBuffer because the implementation
   # is different for GCS and S3.
 
-  def ReadObject(self, bucket, object):
+  def ReadObject(self, bucket, object, size=None):
     start_time = time.time()
-    object_uri = self._StorageURI(bucket, object)
-    object_uri.new_key().get_contents_as_string()
+    part_size = FLAGS.parallel_part_size
+    if part_size and size is not None and size > part_size:
+      # Read the object in ranges of part_size bytes, several at a time.
+      def _ReadRange(offset):
+        end = min(offset + part_size, size) - 1
+        object_uri = self._StorageURI(bucket, object)
+        object_uri.new_key().get_contents_as_string(
+            headers={'Range': 'bytes=%d-%d' % (offset, end)})
+      RunInParallel(_ReadRange, xrange(0, size, part_size),
+                    FLAGS.parallel_part_concurrency)
+    else:
+      object_uri = self._StorageURI(bucket, object)
+      object_uri.new_key().get_contents_as_string()
     latency = time.time() - start_time
     return start_time, latency
@@ -22,15 +22,18 @@
    run this script.
 """
 
+import array
 import cStringIO
 import json
 import logging
 import os
 import sys
 import multiprocessing as mp
+from threading import Lock
 from threading import Thread
 import string
 import random
+import struct
 import time
 
 import yaml
@@ -80,6 +83,11 @@ flags.DEFINE_string('object_sizes', "{1024: 100.0}", 'The size of the objects '
 flags.DEFINE_integer('num_streams', 10, 'The number of streams to use. Only '
                      'applies to the MultiStreamThroughput scenario.',
                      lower_bound=1)
+flags.DEFINE_integer('streams_per_process', 1, 'The number of streams that '
+                     'each worker process runs, each in its own thread. The '
+                     'streams of a process share its connections to the '
+                     'storage service. Only applies to the MultiStreamRead '
+                     'and MultiStreamWrite scenarios.', lower_bound=1)
 flags.DEFINE_integer('stream_num_start', 1, 'The number of the first thread in '
                      'this process.')
 flags.DEFINE_string('objects_written_file', None, 'The path where the '
@@ -89,6 +97,12 @@ flags.DEFINE_string('objects_written_file', None, 'The path where the '
                     'MultiStreamWrite and this file exists, it will be '
                     'deleted.')
 
+flags.DEFINE_string('results_file', None, 'If given, the MultiStreamRead and '
+                    'MultiStreamWrite scenarios write their per-operation '
+                    'results to this path in a compact binary columnar '
+                    'format (see WriteColumnarResults) instead of writing '
+                    'them to stdout as JSON.')
+
 flags.DEFINE_float('start_time', None, 'The time (as a POSIX timestamp) '
                    'to start the operation. Only applies to the '
                    'MultiStreamRead and MultiStreamWrite scenarios.')
@@ -98,6 +112,16 @@ flags.DEFINE_string('object_storage_class', None, 'The storage class to use '
                     'providers, storage class is determined by the bucket, '
                     'which is passed in by the --bucket parameter.')
 
+flags.DEFINE_integer('parallel_part_size', None, 'If given, objects larger '
+                     'than this many bytes are written with multipart uploads '
+                     'of parts of this size, and read in ranges of this size. '
+                     'The parts of an object are transferred in parallel. '
+                     'Currently only applicable to S3 for writes, and to S3 '
+                     'and GCS for reads.', lower_bound=1)
+flags.DEFINE_integer('parallel_part_concurrency', 8, 'The maximum number of '
+                     'parts of an object that are transferred at the same '
+                     'time. See --parallel_part_size.', lower_bound=1)
+
 flags.DEFINE_enum('object_naming_scheme', 'sequential_by_stream',
                   ['sequential_by_stream',
                    'approximately_sequential'],
@@ -163,6 +187,21 @@ BYTES_PER_KILOBYTE = 1024
 THREAD_STATUS_LOG_INTERVAL = 10
 
 
+# The first bytes of a file written by WriteColumnarResults. The controller
+# checks them before memory-mapping the file, so the version number must change
+# whenever the layout does.
+COLUMNAR_RESULTS_MAGIC = 'PKBOSC01'
+
+# array typecodes of the 8-byte columns, and struct codes to fall back to where
+# the array typecode has a different size ('l' is 4 bytes on some platforms).
+COLUMNAR_RESULTS_CODES = {'start_times': ('d', 'd'),
+                          'latencies': ('d', 'd'),
+                          'sizes': ('l', 'q')}
+
+# Number of values packed at a time by the struct fallback.
+COLUMNAR_RESULTS_CHUNK_SIZE = 65536
+
+
 # When a storage provider fails more than a threshold number of requests, we
 # stop the benchmarking tests and raise a low availability error back to the
 # caller.
@@ -321,6 +360,80 @@ def CleanupBucket(service):
     objects_to_cleanup = service.ListObjects(FLAGS.bucket, prefix=None)
 
 
+# Write payloads are built from blocks of this many random bytes.
+PAYLOAD_BLOCK_SIZE = 1024 * 1024
+
+# Maps each byte value to a letter, so that payloads consist of letters like
+# they did when they were generated one letter at a time.
+_PAYLOAD_TRANSLATION = ''.join(string.letters[i % len(string.letters)]
+                               for i in xrange(256))
+
+
+def GenerateRandomBlock(size):
+  """Generate a block of random letters in bulk.
+
+  Args:
+    size: the length of the block, in bytes.
+
+  Returns:
+    A string of the length requested, filled with random letters.
+  """
+
+  return os.urandom(size).translate(_PAYLOAD_TRANSLATION)
+
+
+class PayloadPool(object):
+  """Random data for use with WriteObjectFromBuffer.
+
+  The data is generated once, block by block, and only grows when a payload
+  larger than all previous ones is requested. Payloads are memoryview slices
+  of the data, so requesting one doesn't copy anything, and every write of a
+  process shares the same data.
+  """
+
+  def __init__(self, block_size=PAYLOAD_BLOCK_SIZE):
+    self._block_size = block_size
+    self._data = ''
+    self._lock = Lock()
+
+  def GetPayload(self, size):
+    """Get a payload of random data.
+
+    Args:
+      size: the amount of data needed, in bytes.
+
+    Returns:
+      A read-only memoryview of the length requested.
+    """
+
+    with self._lock:
+      missing = size - len(self._data)
+      if missing > 0:
+        num_blocks = (missing + self._block_size - 1) // self._block_size
+        # The data is a string rather than a bytearray because a bytearray
+        # can't be resized while payloads refer to it.
+        self._data = ''.join(
+            [self._data] + [GenerateRandomBlock(self._block_size)
+                            for _ in xrange(num_blocks)])
+      data = self._data
+    return memoryview(data)[:size]
+
+  def GetPayloadHandle(self, size):
+    """Get a read()-able and seek()-able stream over a payload.
+
+    Args:
+      size: the amount of data needed, in bytes.
+
+    Returns:
+      A cStringIO stream that reads the payload without copying it.
+    """
+
+    return cStringIO.StringIO(self.GetPayload(size))
+
+
+_payload_pool = PayloadPool()
+
+
 def GenerateWritePayload(size):
   """Generate random data for use with WriteObjectFromBuffer.
 
@@ -328,17 +441,25 @@ def GenerateWritePayload(size):
     size: the amount of data needed, in bytes.
 
   Returns:
-    A string of the length requested, filled with random data.
+    A read-only memoryview of the length requested, filled with random data.
+    Payloads come from a pool shared by the whole process, so this is cheap
+    for any size that was requested before.
   """
 
-  payload_bytes = bytearray(size)
-  # don't use a for...range(100M), range(100M) will create a list of 100mm items
-  # with each item being the default object size of 30 bytes or so, it will lead
-  # to out of memory error.
-  for i in xrange(size):
-    payload_bytes[i] = ord(random.choice(string.letters))
+  return _payload_pool.GetPayload(size)
 
-  return payload_bytes.decode('ascii')
+
+def GetWritePayloadHandle(size):
+  """Get a stream over random data for use with WriteObjectFromBuffer.
+
+  Args:
+    size: the amount of data needed, in bytes.
+
+  Returns:
+    A read()-able and seek()-able stream over a payload from the pool.
+  """
+
+  return _payload_pool.GetPayloadHandle(size)
 
 
 def WriteObjects(service, bucket, object_prefix, count,
@@ -363,8 +484,7 @@ def WriteObjects(service, bucket, object_prefix, count,
         successfully written.
   """
 
-  payload = GenerateWritePayload(size)
-  handle = cStringIO.StringIO(payload)
+  handle = GetWritePayloadHandle(size)
 
   for i in xrange(count):
     object_name = '%s_%d' % (object_prefix, i)
@@ -400,7 +520,8 @@ def ReadObjects(service, bucket, objects_to_read, latency_results=None,
 
   for object_name in objects_to_read:
     try:
-      start_time, latency = service.ReadObject(bucket, object_name)
+      start_time, latency = service.ReadObject(bucket, object_name,
+                                               object_size)
 
       if start_times is not None:
         start_times.append(start_time)
@@ -574,14 +695,17 @@ def SingleStreamThroughputBenchmark(service):
 
 
 def RunWorkerProcesses(worker, worker_args, per_process_args=None):
-  """Run a worker function in many processes, then gather and return the results
+  """Run a worker function in many streams, then gather and return the results
+
+  The streams are spread over processes, FLAGS.streams_per_process
+  streams per process, and each stream runs in its own thread.
 
   Args:
     worker: either WriteWorker or ReadWorker. The worker function to call.
     worker_args: a tuple. The arguments to pass to the worker function. The
       result queue and stream number will be appended as the last two arguments.
     per_process_args: if given, an array with length equal to the
-      number of processes. Process number i will be passed
+      number of streams. Stream number i will be passed
       per_process_args[i] after its regular arguments and before the
       result queue and stream number.
 
@@ -591,19 +715,21 @@ def RunWorkerProcesses(worker, worker_args, per_process_args=None):
 
   result_queue = mp.Queue()
   num_streams = FLAGS.num_streams
-
-  logging.info('Creating %s processes', FLAGS.num_streams)
-  if per_process_args is None:
-    processes = [mp.Process(target=worker,
-                            args=worker_args + (result_queue, i))
-                 for i in xrange(num_streams)]
-  else:
-    processes = [mp.Process(target=worker,
-                            args=worker_args +
-                            (per_process_args[i],) +
-                            (result_queue, i))
-                 for i in xrange(num_streams)]
-  logging.info('Processes created. Starting processes.')
+  streams_per_process = FLAGS.streams_per_process
+
+  def StreamArgs(i):
+    if per_process_args is None:
+      return worker_args + (result_queue, i)
+    return worker_args + (per_process_args[i],) + (result_queue, i)
+
+  logging.info('Creating processes for %s streams', num_streams)
+  processes = [mp.Process(target=RunStreams,
+                          args=(worker,
+                                [StreamArgs(i) for i in xrange(
+                                    first, min(first + streams_per_process,
+                                               num_streams))]))
+               for first in xrange(0, num_streams, streams_per_process)]
+  logging.info('%s processes created. Starting processes.', len(processes))
   for process in processes:
     process.start()
   logging.info('Processes started.')
@@ -614,6 +740,93 @@ def RunWorkerProcesses(worker, worker_args, per_process_args=None):
   return results
 
 
+def RunStreams(worker, per_stream_args):
+  """Run the streams of one worker process.
+
+  Args:
+    worker: the worker function to call.
+    per_stream_args: a list of tuples. The arguments to call worker with,
+      one tuple per stream.
+  """
+
+  if len(per_stream_args) == 1:
+    worker(*per_stream_args[0])
+    return
+  threads = [Thread(target=worker, args=args) for args in per_stream_args]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+
+def WriteColumnarResults(streams, path):
+  """Writes multi-stream results to a file in a binary columnar format.
+
+  Parsing a JSON list of every operation is slow and memory hungry when a run
+  has millions of operations, so the controller can instead memory-map this
+  file and use its columns as NumPy arrays without parsing. All values are
+  little-endian and 8-byte aligned. The layout is:
+
+    magic: 8 bytes, COLUMNAR_RESULTS_MAGIC.
+    num_streams: uint64.
+    for each stream: stream_num (int64) and num_operations (int64).
+    start_times: float64 per operation.
+    latencies: float64 per operation.
+    sizes: int64 per operation.
+
+  Each column holds the operations of every stream, in the same order as the
+  stream table.
+
+  Args:
+    streams: list of dicts with keys 'stream_num', 'start_times', 'latencies'
+      and 'sizes', as built by MultiStreamWrites and MultiStreamReads.
+    path: string. The file to write.
+  """
+  with open(path, 'wb') as out:
+    out.write(struct.pack('<8sQ', COLUMNAR_RESULTS_MAGIC, len(streams)))
+    for stream in streams:
+      out.write(struct.pack('<qq', stream['stream_num'],
+                            len(stream['start_times'])))
+    for key in ('start_times', 'latencies', 'sizes'):
+      for stream in streams:
+        _WriteColumn(out, stream[key], *COLUMNAR_RESULTS_CODES[key])
+
+
+def _WriteColumn(out, column, typecode, struct_code):
+  """Writes a list of numbers as little-endian 8-byte values.
+
+  Args:
+    out: file object to write to.
+    column: list of numbers.
+    typecode: string. The array typecode of the values.
+    struct_code: string. The struct format character of the values, used if
+      the array typecode isn't 8 bytes on this platform.
+  """
+  if array.array(typecode).itemsize == 8:
+    column_array = array.array(typecode, column)
+    if sys.byteorder != 'little':
+      column_array.byteswap()
+    column_array.tofile(out)
+    return
+  for start in xrange(0, len(column), COLUMNAR_RESULTS_CHUNK_SIZE):
+    chunk = column[start:start + COLUMNAR_RESULTS_CHUNK_SIZE]
+    out.write(struct.pack('<%d%s' % (len(chunk), struct_code), *chunk))
+
+
+def OutputStreams(streams):
+  """Outputs multi-stream results for the controller.
+
+  Args:
+    streams: list of dicts with keys 'stream_num', 'start_times', 'latencies'
+      and 'sizes'. Written to FLAGS.results_file with WriteColumnarResults if
+      it is set, and to sys.stdout as JSON otherwise.
+  """
+  if FLAGS.results_file is not None:
+    WriteColumnarResults(streams, FLAGS.results_file)
+  else:
+    json.dump(streams, sys.stdout, indent=0)
+
+
 def MultiStreamWrites(service):
   """Run multi-stream write benchmark.
 
@@ -633,7 +846,7 @@ def MultiStreamWrites(service):
    ...]
 
   Second, it writes records of the objects it wrote, along with timing
-  information, to sys.stdout. The format is
+  information, with OutputStreams. The JSON format is
 
   [{"operation": "upload", "start_time": start_time_1,
     "latency": latency_1, "size": size_1, "stream_num": stream_num_1},
@@ -648,12 +861,15 @@ def MultiStreamWrites(service):
 
   size_distribution = yaml.load(FLAGS.object_sizes)
 
-  payload = GenerateWritePayload(MaxSizeInDistribution(size_distribution))
+  # Fill the payload pool before forking, so that the workers share its data
+  # instead of each generating their own.
+  payload_size = MaxSizeInDistribution(size_distribution)
+  GenerateWritePayload(payload_size)
 
   results = RunWorkerProcesses(
       WriteWorker,
       (service,
-       payload,
+       payload_size,
        size_distribution,
        FLAGS.objects_per_stream,
        FLAGS.start_time,
@@ -694,7 +910,7 @@ def MultiStreamWrites(service):
         'Wrote %s objects out of %s requested (%s requred)' %
         (num_writes, num_writes_requested, min_writes_required))
 
-  json.dump(streams, sys.stdout, indent=0)
+  OutputStreams(streams)
 
 
 def MultiStreamReads(service):
@@ -708,8 +924,8 @@ def MultiStreamReads(service):
   MultiStreamWrites and then reads the objects from the storage
   service, potentially using multiple threads.
 
-  It doesn't directly return anything, but it writes its results to
-  sys.stdout in the following format:
+  It doesn't directly return anything, but it writes its results with
+  OutputStreams. The JSON format is
 
   [{"operation": "download", "start_time": start_time_1,
     "latency": latency_1, "size": size_1, "stream_num": stream_num_1},
@@ -751,7 +967,7 @@ def MultiStreamReads(service):
         'Read %s objects out of %s requested (%s requred)' %
         (num_reads, num_reads_requested, min_reads_required))
 
-  json.dump(streams, sys.stdout, indent=0)
+  OutputStreams(streams)
 
 
 def SleepUntilTime(when):
@@ -771,14 +987,15 @@ def SleepUntilTime(when):
     logging.info('Sleep time %s was too small', sleep_time)
 
 
-def WriteWorker(service, payload,
+def WriteWorker(service, payload_size,
                 size_distribution, num_objects,
                 start_time, naming_scheme, result_queue, worker_num):
   """Upload objects for the multi-stream writes benchmark.
 
   Args:
     service: the ObjectStorageServiceBase object to use.
-    payload: a string. The bytes to upload.
+    payload_size: the size of the payload to take objects from, in bytes. At
+      least the largest size in size_distribution.
     size_distribution: the distribution of object sizes to use.
     num_objects: the number of objects to upload.
     start_time: a POSIX timestamp. When to start uploading.
@@ -801,7 +1018,7 @@ def WriteWorker(service, payload,
         '%s' % worker_num)
   size_iterator = SizeDistributionIterator(size_distribution)
 
-  payload_handle = cStringIO.StringIO(payload)
+  payload_handle = GetWritePayloadHandle(payload_size)
 
   if start_time is not None:
     SleepUntilTime(start_time)
@@ -844,7 +1061,7 @@ def ReadWorker(service, start_time, object_records,
 
   for name, size in object_records:
     try:
-      start_time, latency = service.ReadObject(FLAGS.bucket, name)
+      start_time, latency = service.ReadObject(FLAGS.bucket, name, size)
 
       start_times.append(start_time)
       latencies.append(latency)
@@ -86,7 +86,7 @@ class ObjectStorageServiceBase(object):
 
 
   @abc.abstractmethod
-  def ReadObject(self, bucket, object):
+  def ReadObject(self, bucket, object, size=None):
     """Read an object.
 
     Exceptions are propagated to the caller, which can decide whether
@@ -95,6 +95,8 @@ class ObjectStorageServiceBase(object):
     Args:
       bucket: the name of the bucket.
       object: the name of the object.
+      size: the size of the object in bytes, if known. Services may
+        use it to read large objects in parallel ranges.
 
     Returns:
       A tuple of (start_time, latency)
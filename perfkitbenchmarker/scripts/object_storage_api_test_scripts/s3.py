@@ -14,9 +14,12 @@
 
 """An interface to S3, using the boto library."""
 
+import cStringIO
 import logging
+import threading
 import time
 
+from boto.s3 import connection
 import gflags as flags
 
 import boto_service
@@ -28,11 +31,24 @@ class S3Service(boto_service.BotoService):
   def __init__(self):
     if FLAGS.host is not None:
       logging.info('Will use user-specified host endpoint: %s', FLAGS.host)
-    super(S3Service, self).__init__('s3', host_to_connect=FLAGS.host)
+    connection_args = {}
+    if not FLAGS.is_secure:
+      connection_args['is_secure'] = False
+    if FLAGS.port is not None:
+      connection_args['port'] = FLAGS.port
+    if FLAGS.calling_format == 'path':
+      connection_args['calling_format'] = connection.OrdinaryCallingFormat()
+    super(S3Service, self).__init__('s3', host_to_connect=FLAGS.host,
+                                    connection_args=connection_args)
 
   def WriteObjectFromBuffer(self, bucket, object, stream, size):
     stream.seek(0)
     start_time = time.time()
+    part_size = FLAGS.parallel_part_size
+    if part_size and size > part_size:
+      self._WriteObjectInParts(bucket, object, stream, size, part_size)
+      latency = time.time() - start_time
+      return start_time, latency
     object_uri = self._StorageURI(bucket, object)
     # We need to access the raw key object so we can set its storage
     # class
@@ -42,3 +58,39 @@ class S3Service(boto_service.BotoService):
     key.set_contents_from_file(stream, size=size)
     latency = time.time() - start_time
     return start_time, latency
+
+  def _WriteObjectInParts(self, bucket, object, stream, size, part_size):
+    """Write an object with a multipart upload of parallel parts.
+
+    Args:
+      bucket: the name of the bucket to write to.
+      object: the name of the object.
+      stream: a read()-able and seek()-able stream to transfer.
+      size: the number of bytes to transfer.
+      part_size: the number of bytes in each part but the last.
+    """
+
+    headers = {}
+    if FLAGS.object_storage_class is not None:
+      headers['x-amz-storage-class'] = FLAGS.object_storage_class
+    bucket_uri = self._StorageURI(bucket)
+    upload = bucket_uri.get_bucket(validate=False).initiate_multipart_upload(
+        object, headers=headers)
+    # The parts share the stream, so only one of them reads at a time, and
+    # only the parts being uploaded are held in memory.
+    stream_lock = threading.Lock()
+
+    def _UploadPart(offset):
+      with stream_lock:
+        stream.seek(offset)
+        part = stream.read(min(part_size, size - offset))
+      upload.upload_part_from_file(cStringIO.StringIO(part),
+                                   offset // part_size + 1, size=len(part))
+
+    try:
+      boto_service.RunInParallel(_UploadPart, xrange(0, size, part_size),
+                                 FLAGS.parallel_part_concurrency)
+      upload.complete_upload()
+    except:
+      upload.cancel_upload()
+      raise
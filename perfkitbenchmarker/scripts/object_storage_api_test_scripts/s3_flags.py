@@ -17,3 +17,13 @@
 import gflags as flags
 
 flags.DEFINE_string('host', None, 'The hostname of the storage endpoint.')
+flags.DEFINE_integer('port', None, 'The port of the storage endpoint. Defaults '
+                     'to the standard port for HTTP or HTTPS.')
+flags.DEFINE_boolean('is_secure', True, 'Whether to connect to the storage '
+                     'endpoint with HTTPS.')
+flags.DEFINE_enum('calling_format', 'subdomain', ['subdomain', 'path'],
+                  'How buckets are addressed. subdomain: as a subdomain of '
+                  'the host, e.g. bucket.host/object. path: as the first '
+                  'component of the path, e.g. host/bucket/object, which '
+                  'endpoints without DNS for buckets, like s3_stub_server.py, '
+                  'need.')
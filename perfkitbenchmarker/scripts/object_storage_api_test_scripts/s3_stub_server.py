@@ -0,0 +1,310 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A local, in-memory stand-in for an S3-compatible object storage service.
+
+The server implements the part of the S3 REST API that the object storage API
+tests use, with path-style addressing: putting, getting (including ranges),
+heading, deleting and listing objects, and multipart uploads. Requests aren't
+authenticated, so any credentials work. Objects are kept in memory and are
+lost when the server exits.
+
+It lets the API tests be run and benchmarked without a cloud account, e.g.
+
+  python s3_stub_server.py --stub_server_port=8000 &
+  AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x python \
+      object_storage_api_tests.py --storage_provider=S3 --bucket=pkb \
+      --host=localhost --port=8000 --nois_secure --calling_format=path \
+      --scenario=MultiStreamWrite
+
+The server keeps connections alive, like the real services, so that clients
+which reuse their connections can be measured.
+"""
+
+import BaseHTTPServer
+import hashlib
+import itertools
+import logging
+import SocketServer
+import sys
+import threading
+import time
+import urlparse
+from xml.sax import saxutils
+
+import gflags as flags
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer('stub_server_port', 8000,
+                     'The port the S3 stub server listens on.')
+flags.DEFINE_float('stub_server_latency', 0.0,
+                   'Seconds the S3 stub server waits before answering each '
+                   'request, to emulate the latency of a remote service.')
+
+# The most keys returned by one list request, as in S3.
+MAX_KEYS = 1000
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+_XML_NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+_LAST_MODIFIED = '2017-01-01T00:00:00.000Z'
+
+
+def _Element(name, value):
+  return '<%s>%s</%s>' % (name, saxutils.escape(str(value)), name)
+
+
+def _Document(root, elements):
+  return '%s<%s xmlns="%s">%s</%s>' % (_XML_HEADER, root, _XML_NAMESPACE,
+                                       ''.join(elements), root)
+
+
+def _ETag(data):
+  return '"%s"' % hashlib.md5(data).hexdigest()
+
+
+class S3StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  """Serves the S3 REST API from memory, one thread per connection.
+
+  Attributes:
+    buckets: dict mapping bucket names to dicts mapping object names to
+      their data. Buckets are created on first use.
+    num_connections: the number of connections accepted so far.
+    num_requests: the number of requests answered so far.
+  """
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, address=('localhost', 0), latency=0.0):
+    BaseHTTPServer.HTTPServer.__init__(self, address, _S3StubRequestHandler)
+    self.latency = latency
+    self.lock = threading.Lock()
+    self.buckets = {}
+    # Maps upload ids to tuples of (bucket, object, dict mapping part numbers
+    # to data).
+    self.uploads = {}
+    self.upload_ids = itertools.count(1)
+    self.num_connections = 0
+    self.num_requests = 0
+
+  @property
+  def port(self):
+    return self.server_address[1]
+
+  def Start(self):
+    """Serve requests from a background thread until Stop is called."""
+
+    thread = threading.Thread(target=self.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+  def Stop(self):
+    self.shutdown()
+    self.server_close()
+
+
+class _S3StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Handles the requests of one connection to an S3StubServer."""
+
+  protocol_version = 'HTTP/1.1'
+
+  def setup(self):
+    BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+    with self.server.lock:
+      self.server.num_connections += 1
+
+  def log_message(self, format, *args):
+    logging.debug(format, *args)
+
+  def _ParsePath(self):
+    """Split the request path into the bucket, object and query."""
+
+    url = urlparse.urlparse(self.path)
+    bucket, _, object_name = url.path.lstrip('/').partition('/')
+    query = dict(urlparse.parse_qsl(url.query, keep_blank_values=True))
+    return bucket, urlparse.unquote(object_name), query
+
+  def _ReadBody(self):
+    return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+  def _Respond(self, status, body='', headers=None, send_body=True):
+    self.send_response(status)
+    for name, value in sorted((headers or {}).items()):
+      self.send_header(name, value)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    if send_body:
+      self.wfile.write(body)
+
+  def _RespondError(self, status, code):
+    body = _XML_HEADER + '<Error>%s%s</Error>' % (
+        _Element('Code', code), _Element('Resource', self.path))
+    self._Respond(status, body, {'Content-Type': 'application/xml'},
+                  send_body=self.command != 'HEAD')
+
+  def _Handle(self, handler):
+    if self.server.latency:
+      time.sleep(self.server.latency)
+    with self.server.lock:
+      self.server.num_requests += 1
+    bucket, object_name, query = self._ParsePath()
+    if not bucket:
+      self._RespondError(400, 'InvalidBucketName')
+    else:
+      handler(bucket, object_name, query)
+
+  def do_GET(self):
+    self._Handle(self._Get)
+
+  def do_HEAD(self):
+    self._Handle(self._Get)
+
+  def do_PUT(self):
+    self._Handle(self._Put)
+
+  def do_POST(self):
+    self._Handle(self._Post)
+
+  def do_DELETE(self):
+    self._Handle(self._Delete)
+
+  def _Get(self, bucket, object_name, query):
+    if not object_name:
+      self._RespondList(bucket, query)
+      return
+    with self.server.lock:
+      data = self.server.buckets.get(bucket, {}).get(object_name)
+    if data is None:
+      self._RespondError(404, 'NoSuchKey')
+      return
+    headers = {'ETag': _ETag(data), 'Last-Modified': _LAST_MODIFIED,
+               'Accept-Ranges': 'bytes'}
+    status = 200
+    byte_range = self.headers.get('Range')
+    if byte_range:
+      start, _, end = byte_range.partition('=')[2].partition('-')
+      start = int(start)
+      end = min(int(end), len(data) - 1) if end else len(data) - 1
+      if start >= len(data) or start > end:
+        self._RespondError(416, 'InvalidRange')
+        return
+      headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, len(data))
+      data = data[start:end + 1]
+      status = 206
+    self._Respond(status, data, headers, send_body=self.command != 'HEAD')
+
+  def _RespondList(self, bucket, query):
+    prefix = query.get('prefix', '')
+    marker = query.get('marker', '')
+    max_keys = min(int(query.get('max-keys', MAX_KEYS)), MAX_KEYS)
+    with self.server.lock:
+      objects = dict(self.server.buckets.get(bucket, {}))
+    names = sorted(name for name in objects
+                   if name.startswith(prefix) and name > marker)
+    elements = [_Element('Name', bucket), _Element('Prefix', prefix),
+                _Element('Marker', marker), _Element('MaxKeys', max_keys),
+                _Element('IsTruncated',
+                         'true' if len(names) > max_keys else 'false')]
+    for name in names[:max_keys]:
+      elements.append('<Contents>%s</Contents>' % ''.join([
+          _Element('Key', name), _Element('LastModified', _LAST_MODIFIED),
+          _Element('ETag', _ETag(objects[name])),
+          _Element('Size', len(objects[name])),
+          _Element('StorageClass', 'STANDARD')]))
+    self._Respond(200, _Document('ListBucketResult', elements),
+                  {'Content-Type': 'application/xml'})
+
+  def _Put(self, bucket, object_name, query):
+    data = self._ReadBody()
+    with self.server.lock:
+      objects = self.server.buckets.setdefault(bucket, {})
+      if not object_name:
+        pass
+      elif 'uploadId' in query:
+        upload = self.server.uploads.get(query['uploadId'])
+        if upload is None:
+          data = None
+        else:
+          upload[2][int(query['partNumber'])] = data
+      else:
+        objects[object_name] = data
+    if data is None:
+      self._RespondError(404, 'NoSuchUpload')
+    else:
+      self._Respond(200, headers={'ETag': _ETag(data)})
+
+  def _Post(self, bucket, object_name, query):
+    self._ReadBody()
+    if 'uploads' in query:
+      with self.server.lock:
+        upload_id = str(next(self.server.upload_ids))
+        self.server.uploads[upload_id] = (bucket, object_name, {})
+      body = _Document('InitiateMultipartUploadResult', [
+          _Element('Bucket', bucket), _Element('Key', object_name),
+          _Element('UploadId', upload_id)])
+      self._Respond(200, body, {'Content-Type': 'application/xml'})
+    elif 'uploadId' in query:
+      with self.server.lock:
+        upload = self.server.uploads.pop(query['uploadId'], None)
+        if upload is not None:
+          parts = upload[2]
+          data = ''.join(parts[part_num] for part_num in sorted(parts))
+          self.server.buckets.setdefault(bucket, {})[object_name] = data
+      if upload is None:
+        self._RespondError(404, 'NoSuchUpload')
+        return
+      body = _Document('CompleteMultipartUploadResult', [
+          _Element('Location',
+                   'http://localhost/%s/%s' % (bucket, object_name)),
+          _Element('Bucket', bucket), _Element('Key', object_name),
+          _Element('ETag', _ETag(data))])
+      self._Respond(200, body, {'Content-Type': 'application/xml'})
+    else:
+      self._RespondError(400, 'InvalidRequest')
+
+  def _Delete(self, bucket, object_name, query):
+    with self.server.lock:
+      if 'uploadId' in query:
+        self.server.uploads.pop(query['uploadId'], None)
+      elif object_name:
+        self.server.buckets.get(bucket, {}).pop(object_name, None)
+      else:
+        self.server.buckets.pop(bucket, None)
+    self._Respond(204)
+
+
+def Main(argv=sys.argv):
+  logging.basicConfig(level=logging.INFO)
+
+  try:
+    argv = FLAGS(argv)  # parse flags
+  except flags.FlagsError as e:
+    logging.error(
+        '%s\nUsage: %s ARGS\n%s', e, sys.argv[0], FLAGS)
+    sys.exit(1)
+
+  server = S3StubServer(('', FLAGS.stub_server_port),
+                        latency=FLAGS.stub_server_latency)
+  logging.info('S3 stub server listening on port %s.', server.port)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+
+if __name__ == '__main__':
+  sys.exit(Main())
@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+#
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# -*- coding: utf-8 -*-
+
+"""Resident agent that runs commands for PKB.
+
+The agent has two modes:
+
+  serve: Runs in the background, listening on a Unix socket. Runs the
+      commands it is sent, spooling their output to files, so that commands
+      keep running, and their output is kept, while no controller is
+      connected. Exits once it has been idle for --idle_timeout seconds.
+  connect: Relays stdin to the socket and the socket to stdout, so that PKB
+      can talk to the agent over a single SSH session. Starts the agent if it
+      is not running.
+
+The protocol is one JSON object per line. Requests:
+
+  {"type": "run", "id": ID, "command": COMMAND, "stdout": N, "stderr": M}
+      Runs COMMAND with bash, unless a command with that ID is running or
+      done, and sends its output from byte offsets N and M on, then its exit
+      status. Controllers that reconnect send "run" again to resume.
+  {"type": "kill", "id": ID}
+      Kills the command's process group.
+  {"type": "release", "id": ID}
+      Deletes the command's output once the controller has received it.
+
+Responses:
+
+  {"type": "hello", "agent": AGENT_ID}
+      Sent on each connection. AGENT_ID changes when the agent restarts, which
+      loses all commands.
+  {"type": "output", "id": ID, "stream": "stdout", "offset": N, "data": DATA}
+      DATA is the output from byte offset N on, decoded as Latin-1.
+  {"type": "exit", "id": ID, "status": STATUS}
+      STATUS is the return code, negative if the process was killed.
+  {"type": "error", "id": ID, "error": MESSAGE}
+      The command could not be started, e.g. because the VM is out of memory.
+
+*Runs on the guest VM. Supports Python 2.6, 2.7, and 3.x.*
+"""
+
+import errno
+import fcntl
+import json
+import optparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+# Exit status of "connect" when it could not reach or start the agent.
+CONNECT_FAILED = 3
+_READ_SIZE = 64 * 1024
+_STREAMS = ('stdout', 'stderr')
+_CONNECT_TIMEOUT_IN_SEC = 30.0
+_CONNECT_SLEEP_IN_SEC = 0.1
+
+
+class Command(object):
+  """A command run by the agent, with its output spooled to files."""
+
+  def __init__(self, command_id, command, directory):
+    self.id = command_id
+    self.command = command
+    self.paths = {}
+    self.sizes = {}
+    for stream in _STREAMS:
+      self.paths[stream] = os.path.join(directory,
+                                        '%s.%s' % (command_id, stream))
+      self.sizes[stream] = 0
+    self.status = None
+    self.condition = threading.Condition()
+    self._process = None
+
+  def Start(self):
+    devnull = open(os.devnull)
+    try:
+      # A session of its own, so that Kill reaches the command's children.
+      # Commands are bash commands, e.g. "cmd &> /dev/null &" only detaches
+      # cmd from the output pipes under bash.
+      self._process = subprocess.Popen(
+          ['/bin/bash', '-c', self.command], stdin=devnull,
+          stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True,
+          preexec_fn=os.setsid)
+    finally:
+      devnull.close()
+    copiers = []
+    for stream in _STREAMS:
+      copier = threading.Thread(target=self._Copy, args=(stream,))
+      copier.daemon = True
+      copier.start()
+      copiers.append(copier)
+    waiter = threading.Thread(target=self._Wait, args=(copiers,))
+    waiter.daemon = True
+    waiter.start()
+
+  def _Copy(self, stream):
+    pipe = getattr(self._process, stream)
+    spool = open(self.paths[stream], 'ab')
+    try:
+      while True:
+        data = os.read(pipe.fileno(), _READ_SIZE)
+        if not data:
+          break
+        spool.write(data)
+        spool.flush()
+        self.condition.acquire()
+        try:
+          self.sizes[stream] += len(data)
+          self.condition.notifyAll()
+        finally:
+          self.condition.release()
+    finally:
+      spool.close()
+      pipe.close()
+
+  def _Wait(self, copiers):
+    status = self._process.wait()
+    for copier in copiers:
+      copier.join()
+    self.condition.acquire()
+    try:
+      self.status = status
+      self.condition.notifyAll()
+    finally:
+      self.condition.release()
+
+  def Kill(self):
+    try:
+      os.killpg(self._process.pid, signal.SIGKILL)
+    except OSError:
+      # The process group is gone.
+      pass
+
+  def Delete(self):
+    for path in self.paths.values():
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+
+
+class Agent(object):
+  """Runs commands, and serves connections from controllers."""
+
+  def __init__(self, directory):
+    self.id = str(uuid.uuid4())
+    self.directory = directory
+    self.last_active = time.time()
+    self._commands = {}
+    self._lock = threading.Lock()
+    self._num_connections = 0
+
+  def GetOrStart(self, command_id, command):
+    self._lock.acquire()
+    try:
+      if command_id not in self._commands:
+        new_command = Command(command_id, command, self.directory)
+        # Raises OSError if the command can't be started, in which case it
+        # isn't kept.
+        new_command.Start()
+        self._commands[command_id] = new_command
+      return self._commands[command_id]
+    finally:
+      self._lock.release()
+
+  def Get(self, command_id):
+    self._lock.acquire()
+    try:
+      return self._commands.get(command_id)
+    finally:
+      self._lock.release()
+
+  def Release(self, command_id):
+    self._lock.acquire()
+    try:
+      command = self._commands.pop(command_id, None)
+    finally:
+      self._lock.release()
+    if command:
+      command.Delete()
+
+  def IsIdle(self, idle_timeout):
+    self._lock.acquire()
+    try:
+      busy = self._num_connections or any(
+          command.status is None for command in self._commands.values())
+      if busy:
+        self.last_active = time.time()
+      return time.time() - self.last_active > idle_timeout
+    finally:
+      self._lock.release()
+
+  def Serve(self, connection):
+    self._lock.acquire()
+    self._num_connections += 1
+    self._lock.release()
+    try:
+      Connection(self, connection).Serve()
+    finally:
+      self._lock.acquire()
+      self._num_connections -= 1
+      self.last_active = time.time()
+      self._lock.release()
+
+
+class Connection(object):
+  """A connection from a controller."""
+
+  def __init__(self, agent, sock):
+    self._agent = agent
+    self._socket = sock
+    self._send_lock = threading.Lock()
+    self._closed = False
+
+  def Send(self, message):
+    data = (json.dumps(message) + '\n').encode('ascii')
+    self._send_lock.acquire()
+    try:
+      if self._closed:
+        raise IOError(errno.EPIPE, 'Connection closed.')
+      self._socket.sendall(data)
+    finally:
+      self._send_lock.release()
+
+  def Serve(self):
+    reader = self._socket.makefile('rb')
+    try:
+      self.Send({'type': 'hello', 'agent': self._agent.id})
+      for line in iter(reader.readline, b''):
+        request = json.loads(line.decode('ascii'))
+        if request['type'] == 'run':
+          try:
+            command = self._agent.GetOrStart(request['id'], request['command'])
+          except OSError as e:
+            self.Send({'type': 'error', 'id': request['id'],
+                       'error': 'Could not start the command: %s' % e})
+            continue
+          follower = threading.Thread(
+              target=self._Follow,
+              args=(command, request.get('stdout', 0),
+                    request.get('stderr', 0)))
+          follower.daemon = True
+          follower.start()
+        elif request['type'] == 'kill':
+          command = self._agent.Get(request['id'])
+          if command:
+            command.Kill()
+        elif request['type'] == 'release':
+          self._agent.Release(request['id'])
+    except (IOError, socket.error, ValueError):
+      pass
+    finally:
+      self._send_lock.acquire()
+      self._closed = True
+      self._send_lock.release()
+      reader.close()
+      self._socket.close()
+
+  def _Follow(self, command, stdout_offset, stderr_offset):
+    """Sends a command's output from the given offsets on, then its status."""
+    offsets = {'stdout': stdout_offset, 'stderr': stderr_offset}
+    try:
+      while True:
+        command.condition.acquire()
+        try:
+          while (command.status is None and
+                 all(command.sizes[s] == offsets[s] for s in _STREAMS)):
+            command.condition.wait(1.0)
+          sizes = dict(command.sizes)
+          status = command.status
+        finally:
+          command.condition.release()
+        for stream in _STREAMS:
+          if sizes[stream] > offsets[stream]:
+            self._SendOutput(command, stream, offsets[stream], sizes[stream])
+            offsets[stream] = sizes[stream]
+        if status is not None:
+          self.Send({'type': 'exit', 'id': command.id, 'status': status})
+          return
+    except (IOError, socket.error):
+      # The controller is gone; it resumes with a new "run" request.
+      return
+
+  def _SendOutput(self, command, stream, start, end):
+    spool = open(command.paths[stream], 'rb')
+    try:
+      spool.seek(start)
+      while start < end:
+        data = spool.read(min(_READ_SIZE, end - start))
+        if not data:
+          break
+        self.Send({'type': 'output', 'id': command.id, 'stream': stream,
+                   'offset': start, 'data': data.decode('latin-1')})
+        start += len(data)
+    finally:
+      spool.close()
+
+
+def Serve(options):
+  """Runs the agent until it has been idle for options.idle_timeout."""
+  if not os.path.isdir(options.directory):
+    os.makedirs(options.directory)
+  lock_file = open(options.socket + '.lock', 'w')
+  try:
+    fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+  except IOError:
+    sys.stderr.write('Another agent is running.\n')
+    return 1
+  if os.path.exists(options.socket):
+    os.remove(options.socket)
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  server.bind(options.socket)
+  server.listen(64)
+  server.settimeout(10.0)
+  agent = Agent(options.directory)
+  while not agent.IsIdle(options.idle_timeout):
+    try:
+      connection, _ = server.accept()
+    except socket.timeout:
+      continue
+    connection.settimeout(None)
+    thread = threading.Thread(target=agent.Serve, args=(connection,))
+    thread.daemon = True
+    thread.start()
+  server.close()
+  try:
+    os.remove(options.socket)
+  except OSError:
+    pass
+  return 0
+
+
+def _StartAgent(options):
+  """Starts "serve" in a session of its own, so that it outlives SSH."""
+  log = open(options.socket + '.log', 'a')
+  devnull = open(os.devnull)
+  try:
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), 'serve',
+         '--socket', options.socket, '--directory', options.directory,
+         '--idle_timeout', str(options.idle_timeout)],
+        stdin=devnull, stdout=log, stderr=log, close_fds=True,
+        preexec_fn=os.setsid)
+  finally:
+    log.close()
+    devnull.close()
+
+
+def _Connect(options):
+  """Returns a socket connected to the agent, starting it if needed."""
+  started = False
+  deadline = time.time() + _CONNECT_TIMEOUT_IN_SEC
+  while True:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      sock.connect(options.socket)
+      return sock
+    except socket.error:
+      sock.close()
+      if time.time() > deadline:
+        return None
+      if not started:
+        _StartAgent(options)
+        started = True
+      time.sleep(_CONNECT_SLEEP_IN_SEC)
+
+
+def _CopyToStdout(sock):
+  while True:
+    data = sock.recv(_READ_SIZE)
+    if not data:
+      break
+    os.write(sys.stdout.fileno(), data)
+  # The agent closed the connection.
+  os._exit(0)
+
+
+def Connect(options):
+  """Relays stdin to the agent and the agent's responses to stdout."""
+  sock = _Connect(options)
+  if not sock:
+    sys.stderr.write('Could not connect to the agent at %s.\n' %
+                     options.socket)
+    return CONNECT_FAILED
+  copier = threading.Thread(target=_CopyToStdout, args=(sock,))
+  copier.daemon = True
+  copier.start()
+  while True:
+    data = os.read(sys.stdin.fileno(), _READ_SIZE)
+    if not data:
+      break
+    sock.sendall(data)
+  sock.close()
+  return 0
+
+
+def main():
+  parser = optparse.OptionParser(usage='%prog serve|connect [options]')
+  parser.add_option('--socket', dest='socket', metavar='PATH',
+                    help='Path of the Unix socket of the agent. Required.')
+  parser.add_option('--directory', dest='directory', metavar='DIR',
+                    help='Directory to spool command output to. Required.')
+  parser.add_option('--idle_timeout', dest='idle_timeout', type='float',
+                    default=3600.0,
+                    help='Seconds without connections or running commands '
+                    'after which the agent exits.')
+  options, args = parser.parse_args()
+  if len(args) != 1 or args[0] not in ('serve', 'connect'):
+    parser.print_usage()
+    return 1
+  if options.socket is None or options.directory is None:
+    parser.print_usage()
+    sys.stderr.write('Missing required flag(s): --socket, --directory\n')
+    return 1
+  if args[0] == 'serve':
+    return Serve(options)
+  return Connect(options)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -35,6 +35,41 @@ import time
 
 WAIT_TIMEOUT_IN_SEC = 120.0
 WAIT_SLEEP_IN_SEC = 5.0
+FOLLOW_SLEEP_IN_SEC = 1.0
+# Printed before any output in --follow mode. Must match FOLLOW_START_MARKER in
+# linux_virtual_machine.py.
+FOLLOW_START_MARKER = '--- wait_for_command follow start ---\n'
+
+
+def _FollowStdout(stdout, status):
+  """Copies lines of stdout to this process' stdout until the command exits.
+
+  Only complete lines are copied while the command is running.
+
+  Args:
+    stdout: file. The wrapped command's stdout.
+    status: file. The wrapped command's status file. A shared lock is held on
+        it when this function returns.
+  """
+  sys.stdout.write(FOLLOW_START_MARKER)
+  partial_line = ''
+  while True:
+    try:
+      fcntl.lockf(status, fcntl.LOCK_SH | fcntl.LOCK_NB)
+      finished = True
+    except IOError:
+      finished = False
+    for line in iter(stdout.readline, ''):
+      line = partial_line + line
+      partial_line = ''
+      if not line.endswith('\n') and not finished:
+        partial_line = line
+        break
+      sys.stdout.write(line)
+    sys.stdout.flush()
+    if finished:
+      return
+    time.sleep(FOLLOW_SLEEP_IN_SEC)
 
 
 def main():
@@ -48,6 +83,9 @@ def main():
                'Will block until a shared lock is acquired on FILE.')
   p.add_option('-d', '--delete', dest='delete', action='store_true',
                help='Delete stdout, stderr, and status files when finished.')
+  p.add_option('-f', '--follow', dest='follow', action='store_true',
+               help='Copy stdout while the command is running, rather than '
+               'after it completes.')
   options, args = p.parse_args()
   if args:
     sys.stderr.write('Unexpected arguments: {0}\n'.format(args))
@@ -69,10 +107,13 @@ def main():
   return_code_str = None
   while (time.time() < WAIT_TIMEOUT_IN_SEC + start):
     try:
-      with open(options.stdout, 'r'):
+      with open(options.stdout, 'r') as stdout:
         with open(options.stderr, 'r'):
           with open(options.status, 'r') as status:
-            fcntl.lockf(status, fcntl.LOCK_SH)
+            if options.follow:
+              _FollowStdout(stdout, status)
+            else:
+              fcntl.lockf(status, fcntl.LOCK_SH)
             return_code_str = status.read()
             break
     except IOError:
@@ -93,7 +134,8 @@ def main():
       stderr_copier.daemon = True
       stderr_copier.start()
       try:
-        shutil.copyfileobj(stdout, sys.stdout)
+        if not options.follow:
+          shutil.copyfileobj(stdout, sys.stdout)
       finally:
         stderr_copier.join()
 
@@ -0,0 +1,288 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Detects the steady state of benchmark time series.
+
+Benchmarks such as sysbench, YCSB and fio report a throughput for every
+interval of a run. The first intervals are usually a warm-up, while caches
+fill and connections are established, and the last ones may tail off as
+clients finish, so statistics over the whole series are skewed.
+
+FindSteadyState locates the stable part of a series in two steps:
+
+  1. Change-point detection: the series is split wherever a CUSUM test finds a
+     significant shift of its mean (binary segmentation), and the longest
+     segment is kept. This removes warm-up ramps even when the series is too
+     noisy for step 2 alone.
+  2. Rolling coefficient of variation (CV): within that segment, the longest
+     run of intervals whose rolling CV is at most max_cv is the steady state.
+
+SteadyStateMonitor applies step 2 to a series as it is produced, so that a
+benchmark can stop once it has measured its steady state for long enough.
+"""
+
+import collections
+import logging
+
+import numpy as np
+
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import sample
+
+flags.DEFINE_boolean('steady_state_detection', False,
+                     'If true, benchmarks that report a throughput per '
+                     'interval (sysbench, YCSB with --ycsb_status_interval, '
+                     'fio with --fio_bw_log) locate the steady state of the '
+                     'series, trim the warm-up and tail-off from it and '
+                     'report steady-state samples.')
+flags.DEFINE_integer('steady_state_window', 10,
+                     'The number of consecutive intervals over which the '
+                     'coefficient of variation is computed during steady-state '
+                     'detection.', lower_bound=2)
+flags.DEFINE_float('steady_state_max_cv', 0.05,
+                   'The highest coefficient of variation of a window of '
+                   'intervals that is considered steady.', lower_bound=0)
+
+FLAGS = flags.FLAGS
+
+# The 95th percentile of the supremum of a Brownian bridge, which the
+# normalized CUSUM statistic of a series without a change point converges to.
+DEFAULT_CUSUM_THRESHOLD = 1.36
+
+# Converts the median absolute difference of successive values to the
+# standard deviation of normally distributed noise.
+_MEDIAN_DIFF_TO_STDDEV = 1 / (0.6745 * np.sqrt(2))
+
+
+class SteadyState(collections.namedtuple(
+        'SteadyState', ['start', 'end', 'mean', 'stddev', 'cv'])):
+  """The steady part of a time series.
+
+  Attributes:
+    start: int. Index of the first steady value.
+    end: int. Index after the last steady value.
+    mean: float. Mean of the steady values.
+    stddev: float. Sample standard deviation of the steady values.
+    cv: float. Coefficient of variation of the steady values.
+  """
+
+
+def RollingCv(values, window):
+  """Returns the coefficient of variation of each window of values.
+
+  Args:
+    values: Sequence or NumPy array of numbers.
+    window: int. Number of values per window, at least 2.
+
+  Returns:
+    NumPy float64 array with one element per window, i.e. len(values) - window
+    + 1 elements. Windows whose mean is 0 have an infinite CV.
+  """
+  values = np.asarray(values, dtype=np.float64)
+  if len(values) < window:
+    return np.array([])
+  # Centering does not change the variances, but keeps the cumulative sums of
+  # squares small enough not to lose precision.
+  centered = values - values.mean()
+  sums = np.concatenate(([0.0], np.cumsum(centered)))
+  squares = np.concatenate(([0.0], np.cumsum(centered ** 2)))
+  window_sums = sums[window:] - sums[:-window]
+  window_squares = squares[window:] - squares[:-window]
+  variances = np.maximum(
+      (window_squares - window_sums ** 2 / window) / (window - 1), 0)
+  means = np.abs(window_sums / window + values.mean())
+  cvs = np.full(len(means), np.inf)
+  nonzero = means > 0
+  cvs[nonzero] = np.sqrt(variances[nonzero]) / means[nonzero]
+  return cvs
+
+
+def _CusumChangePoint(segment, noise_stddev, min_segment, min_shift,
+                      threshold):
+  """Returns where a segment's mean shifts, or None if it does not."""
+  n = len(segment)
+  if n < 2 * min_segment:
+    return None
+  cusum = np.cumsum(segment - segment.mean())
+  # cusum[k - 1] compares segment[:k] with the mean; both sides of a split
+  # must have at least min_segment values.
+  candidates = np.abs(cusum[min_segment - 1:n - min_segment])
+  split = int(np.argmax(candidates)) + min_segment
+  left, right = segment[:split].mean(), segment[split:].mean()
+  if abs(left - right) <= min_shift * max(abs(left), abs(right)):
+    return None
+  if (noise_stddev > 0 and
+      candidates.max() / (noise_stddev * np.sqrt(n)) < threshold):
+    return None
+  return split
+
+
+def FindChangePoints(values, min_segment=10, min_shift=0.05,
+                     threshold=DEFAULT_CUSUM_THRESHOLD):
+  """Finds the indices at which the mean of a series shifts.
+
+  Uses binary segmentation: the normalized CUSUM statistic of each segment is
+  compared with 'threshold', and segments with a significant change point are
+  split there and tested again. The noise level is estimated once, from the
+  differences of successive values, so that it is not inflated by the shifts
+  themselves.
+
+  Args:
+    values: Sequence or NumPy array of numbers.
+    min_segment: int. The fewest values a segment may have.
+    min_shift: float. Shifts of the mean smaller than this fraction of the
+        mean are ignored, however significant.
+    threshold: float. The normalized CUSUM statistic above which a shift is
+        significant.
+
+  Returns:
+    Sorted list of ints. Each is the index of the first value after a shift.
+  """
+  values = np.asarray(values, dtype=np.float64)
+  if len(values) < 2:
+    return []
+  noise_stddev = (np.median(np.abs(np.diff(values))) *
+                  _MEDIAN_DIFF_TO_STDDEV)
+  change_points = []
+  segments = [(0, len(values))]
+  while segments:
+    start, end = segments.pop()
+    split = _CusumChangePoint(values[start:end], noise_stddev, min_segment,
+                              min_shift, threshold)
+    if split is not None:
+      change_points.append(start + split)
+      segments.extend([(start, start + split), (start + split, end)])
+  return sorted(change_points)
+
+
+def _LongestRun(mask):
+  """Returns the start and length of the longest run of True in a mask."""
+  edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+  starts = np.flatnonzero(edges == 1)
+  if not len(starts):
+    return 0, 0
+  lengths = np.flatnonzero(edges == -1) - starts
+  longest = int(np.argmax(lengths))
+  return int(starts[longest]), int(lengths[longest])
+
+
+def FindSteadyState(values, window=10, max_cv=0.05,
+                    threshold=DEFAULT_CUSUM_THRESHOLD):
+  """Finds the steady part of a time series.
+
+  Args:
+    values: Sequence or NumPy array of numbers, one per interval.
+    window: int. Number of intervals per rolling CV window. Also the shortest
+        segment FindChangePoints may split off.
+    max_cv: float. The highest CV of a steady window. Also the smallest
+        relative shift FindChangePoints reports.
+    threshold: float. See FindChangePoints.
+
+  Returns:
+    SteadyState, or None if no window of values is steady.
+  """
+  values = np.asarray(values, dtype=np.float64)
+  if len(values) < window:
+    return None
+  bounds = ([0] + FindChangePoints(values, window, max_cv, threshold) +
+            [len(values)])
+  # Prefer the latest of equally long segments, since warm-up comes first.
+  start, end = max(zip(bounds[:-1], bounds[1:]),
+                   key=lambda segment: (segment[1] - segment[0], segment[0]))
+  run_start, run_length = _LongestRun(
+      RollingCv(values[start:end], window) <= max_cv)
+  if not run_length:
+    return None
+  start += run_start
+  end = start + run_length + window - 1
+  steady = values[start:end]
+  mean = steady.mean()
+  stddev = steady.std(ddof=1)
+  return SteadyState(start, end, mean, stddev,
+                     stddev / abs(mean) if mean else float('inf'))
+
+
+def FindSteadyStateFromFlags(values):
+  """Calls FindSteadyState with the window and CV set by flags."""
+  return FindSteadyState(values, window=FLAGS.steady_state_window,
+                         max_cv=FLAGS.steady_state_max_cv)
+
+
+class SteadyStateMonitor(object):
+  """Tells whether a series being produced has been steady for long enough.
+
+  Attributes:
+    required_length: int. Number of steady intervals needed.
+    steady_length: int. Number of intervals the series has been steady for.
+  """
+
+  def __init__(self, required_length, window=10, max_cv=0.05):
+    self.window = window
+    self.max_cv = max_cv
+    self.required_length = max(required_length, window)
+    self.steady_length = 0
+    self._values = collections.deque(maxlen=window)
+
+  def Add(self, value):
+    """Adds the value of the next interval.
+
+    Returns:
+      True if the last required_length values are steady.
+    """
+    self._values.append(value)
+    if len(self._values) < self.window:
+      return False
+    if RollingCv(self._values, self.window)[0] <= self.max_cv:
+      self.steady_length = (self.steady_length + 1 if self.steady_length
+                            else self.window)
+    else:
+      self.steady_length = 0
+    return self.steady_length >= self.required_length
+
+
+def CreateSamples(metric, steady_state, num_values, interval_sec, unit,
+                  metadata):
+  """Creates samples describing the steady state of a series.
+
+  Args:
+    metric: string. Name of the series, used as the prefix of each metric.
+    steady_state: SteadyState, or None if the series never became steady.
+    num_values: int. Length of the series.
+    interval_sec: float. Duration of each interval of the series.
+    unit: string. Unit of the values of the series.
+    metadata: dict. Base metadata of each sample.
+
+  Returns:
+    List of sample.Sample objects.
+  """
+  if steady_state is None:
+    logging.warning('%s never reached a steady state.', metric)
+    return []
+  metadata = metadata.copy()
+  metadata.update(steady_state_start_index=steady_state.start,
+                  steady_state_end_index=steady_state.end,
+                  num_intervals=num_values,
+                  interval_sec=interval_sec)
+  return [
+      sample.Sample(metric + ' steady state average', steady_state.mean,
+                    unit, metadata),
+      sample.Sample(metric + ' steady state stddev', steady_state.stddev,
+                    unit, metadata),
+      sample.Sample(metric + ' steady state cv', steady_state.cv, '',
+                    metadata),
+      sample.Sample(metric + ' steady state start',
+                    steady_state.start * interval_sec, 'seconds', metadata),
+      sample.Sample(metric + ' steady state duration',
+                    (steady_state.end - steady_state.start) * interval_sec,
+                    'seconds', metadata)]
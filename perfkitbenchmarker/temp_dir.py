@@ -26,7 +26,9 @@ from perfkitbenchmarker import version
 
 
 _PERFKITBENCHMARKER = 'perfkitbenchmarker'
+_ARTIFACTS = 'artifacts'
 _RUNS = 'runs'
+_SSH_CONNECTIONS = 'ssh'
 _VERSIONS = 'versions'
 
 _TEMP_DIR = os.path.join(tempfile.gettempdir(), _PERFKITBENCHMARKER)
@@ -46,14 +48,25 @@ def GetRunDirPath(run_uri=None):
       FLAGS.temp_dir, _RUNS, run_uri or str(flags.FLAGS.run_uri))
 
 
+def GetSshConnectionsDir():
+  """Returns the directory for SSH ControlPath files of the current run."""
+  return os.path.join(GetRunDirPath(), _SSH_CONNECTIONS)
+
+
 def GetVersionDirPath(version=version.VERSION):
   """Gets path to the directory containing files specific to a PKB version."""
   return os.path.join(FLAGS.temp_dir, _VERSIONS, version)
 
 
+def GetArtifactCacheDirPath():
+  """Gets path to the directory of the artifact cache shared by all runs."""
+  return os.path.join(FLAGS.temp_dir, _ARTIFACTS)
+
+
 def CreateTemporaryDirectories():
   """Creates the temporary sub-directories needed by the current run."""
-  for path in (GetRunDirPath(), GetVersionDirPath()):
+  for path in (GetRunDirPath(), GetVersionDirPath(),
+               GetSshConnectionsDir()):
     try:
       os.makedirs(path)
     except OSError:
@@ -22,12 +22,14 @@ import logging
 import numpy as np
 import os
 import posixpath
+import re
 import time
 import threading
 import uuid
 
 from perfkitbenchmarker import events
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.linux_packages import dstat
@@ -45,6 +47,200 @@ flags.DEFINE_string('dstat_output', None,
                     'Default: run temporary directory.')
 flags.DEFINE_boolean('dstat_publish', False,
                      'Whether or not publish dstat statistics.')
+flags.DEFINE_boolean('dstat_stream', False,
+                     'Stream dstat rows back from each VM while the benchmark '
+                     'runs, rather than copying the dstat output when it '
+                     'stops. Rows are appended to the output file in '
+                     '--dstat_output as they arrive, so nothing needs to be '
+                     'copied at the end of the run. If a stream fails, its '
+                     'output is copied instead. Only applicable when --dstat '
+                     'is specified.')
+
+_PERCENTILE_STATISTIC_RE = re.compile(r'^p(\d+(\.\d+)?)$')
+
+
+def _IsValidStatistic(statistic):
+  match = _PERCENTILE_STATISTIC_RE.match(statistic)
+  return (statistic in ('min', 'max') or
+          (match is not None and float(match.group(1)) <= 100))
+
+
+flags.DEFINE_list('dstat_publish_stats', [],
+                  'Statistics of each dstat column to publish for each event '
+                  'in addition to its average, when --dstat_publish is set. '
+                  'Each is "min", "max" or a percentile such as "p99", and is '
+                  'published as a sample named "<column> <statistic>". '
+                  'Percentiles are accurate to 3 significant figures.')
+flags.register_validator(
+    'dstat_publish_stats',
+    lambda statistics: all(_IsValidStatistic(s) for s in statistics))
+
+# Significant figures kept by the histograms used to compute percentiles.
+_PERCENTILE_SIGNIFICANT_FIGURES = 3
+
+
+class _EventStatistics(object):
+  """Statistics of the dstat rows recorded during a TracingEvent.
+
+  Rows are buffered and folded into running statistics in blocks, so memory
+  use does not depend on the number of rows. Percentiles are computed from
+  log-linear histograms (see histogram.Histogram.FromValues); dstat values
+  are never negative.
+
+  Attributes:
+    event: TracingEvent.
+    count: int. Number of rows added.
+  """
+
+  # Number of rows to buffer before folding them into the statistics.
+  _BLOCK_ROWS = 256
+
+  def __init__(self, event, num_columns, keep_histograms=False):
+    self.event = event
+    self.count = 0
+    self._sums = np.zeros(num_columns)
+    self._mins = np.full(num_columns, np.inf)
+    self._maxs = np.full(num_columns, -np.inf)
+    self._histograms = ([histogram.Histogram() for _ in xrange(num_columns)]
+                        if keep_histograms else None)
+    self._rows = []
+
+  def Add(self, row):
+    """Adds a row of column values."""
+    self._rows.append(row)
+    self.count += 1
+    if len(self._rows) >= self._BLOCK_ROWS:
+      self._Fold()
+
+  def _Fold(self):
+    if not self._rows:
+      return
+    block = np.array(self._rows)
+    self._rows = []
+    self._sums += block.sum(axis=0)
+    np.minimum(self._mins, block.min(axis=0), out=self._mins)
+    np.maximum(self._maxs, block.max(axis=0), out=self._maxs)
+    if self._histograms is not None:
+      for column, hist in zip(block.T, self._histograms):
+        hist.Merge(histogram.Histogram.FromValues(
+            column, _PERCENTILE_SIGNIFICANT_FIGURES))
+
+  def GetStatistics(self, statistics):
+    """Returns the average and the requested statistics of each column.
+
+    Args:
+      statistics: list of strings. Each is 'min', 'max' or 'p<percentile>'.
+
+    Returns:
+      A dict mapping 'average' and each of 'statistics' to an array with one
+      value per column.
+    """
+    self._Fold()
+    result = {'average': self._sums / self.count}
+    percentiles = []
+    for statistic in statistics:
+      if statistic == 'min':
+        result[statistic] = self._mins
+      elif statistic == 'max':
+        result[statistic] = self._maxs
+      else:
+        percentiles.append(statistic)
+    if percentiles:
+      values = np.array([
+          hist.Percentiles(float(p[1:]) for p in percentiles)
+          for hist in self._histograms])
+      for i, percentile in enumerate(percentiles):
+        result[percentile] = values[:, i]
+    return result
+
+
+def _AccumulateEventStatistics(rows, tracing_events, num_columns,
+                               keep_histograms=False):
+  """Accumulates statistics for each event in a single pass over the rows.
+
+  A row belongs to an event if its timestamp is strictly between the event's
+  start and end timestamps.
+
+  Args:
+    rows: iterable of 1-dimensional ndarrays, sorted by their first column,
+      the epoch timestamp.
+    tracing_events: list of TracingEvents.
+    num_columns: int. Number of columns in each row, excluding the timestamp.
+    keep_histograms: boolean. Whether percentiles will be requested.
+
+  Returns:
+    A list of _EventStatistics, one per event, sorted by event start time.
+  """
+  event_statistics = [
+      _EventStatistics(event, num_columns, keep_histograms)
+      for event in sorted(tracing_events, key=lambda e: e.start_timestamp)]
+  next_event = 0
+  active = []
+  for row in rows:
+    timestamp = row[0]
+    while (next_event < len(event_statistics) and
+           event_statistics[next_event].event.start_timestamp < timestamp):
+      active.append(event_statistics[next_event])
+      next_event += 1
+    active = [s for s in active if s.event.end_timestamp > timestamp]
+    for statistics in active:
+      statistics.Add(row[1:])
+  return event_statistics
+
+
+class _DStatStream(object):
+  """Copies a VM's dstat output to a local file while dstat writes it.
+
+  A thread follows the output file with tail over a long-lived remote command
+  and appends each line to the local file as it arrives, so only one line is
+  held in memory at a time. tail exits, ending the stream, once the dstat
+  process exits.
+
+  Attributes:
+    failed: boolean. Whether the remote command failed, in which case the
+        local file may be incomplete.
+  """
+
+  def __init__(self, vm, dstat_file, pid, local_path):
+    self.failed = False
+    self._file = open(local_path, 'w')
+    self._lock = threading.Lock()
+    self._thread = threading.Thread(target=self._Follow,
+                                    args=(vm, dstat_file, pid),
+                                    name='dstat-stream-%s' % vm.name)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _Follow(self, vm, dstat_file, pid):
+    # dstat may not have created the file yet, hence --retry. The command is
+    # not retried, since tail would replay the file from the start.
+    cmd = 'tail -n +1 --follow=name --retry --pid={0} {1}'.format(
+        pid, dstat_file)
+    try:
+      vm.RemoteCommand(cmd, retries=1, timeout=None,
+                       line_callback=self._AddLine)
+    except Exception:
+      logging.exception('Streaming dstat output from %s failed.', vm.name)
+      self.failed = True
+    finally:
+      self.Close()
+
+  def _AddLine(self, line):
+    with self._lock:
+      if self._file.closed:
+        return
+      self._file.write(line if line.endswith('\n') else line + '\n')
+      self._file.flush()
+
+  def Join(self, timeout=None):
+    """Waits for the stream to end. Returns whether it has ended."""
+    self._thread.join(timeout)
+    return not self._thread.is_alive()
+
+  def Close(self):
+    """Closes the local file. Lines received afterwards are discarded."""
+    with self._lock:
+      self._file.close()
 
 
 class _DStatCollector(object):
@@ -53,20 +249,31 @@ class _DStatCollector(object):
   Installs and runs dstat on a collection of VMs.
   """
 
-  def __init__(self, interval=None, output_directory=None):
+  # Seconds to wait for a stream to end after its dstat process is killed.
+  _STREAM_JOIN_TIMEOUT = 60
+
+  def __init__(self, interval=None, output_directory=None, statistics=(),
+               stream=False):
     """Runs dstat on 'vms'.
 
     Start dstat collection via `Start`. Stop via `Stop`.
 
     Args:
       interval: Optional int. Interval in seconds in which to collect samples.
+      statistics: Sequence of statistics to publish in addition to averages.
+          See --dstat_publish_stats.
+      stream: boolean. Whether to stream dstat rows back to the output
+          directory while dstat runs. See --dstat_stream.
     """
     self.interval = interval
+    self.statistics = list(statistics)
+    self.stream = stream
     self.output_directory = output_directory or vm_util.GetTempDir()
     self._lock = threading.Lock()
     self._pids = {}
     self._file_names = {}
     self._role_mapping = {}  # mapping vm role to dstat file
+    self._streams = {}
     self._start_time = 0
 
     if not os.path.isdir(self.output_directory):
@@ -95,24 +302,41 @@ class _DStatCollector(object):
                output=dstat_file,
                dstat_interval=self.interval or '')
     stdout, _ = vm.RemoteCommand(cmd)
+    pid = stdout.strip()
     with self._lock:
-      self._pids[vm.name] = stdout.strip()
+      self._pids[vm.name] = pid
       self._file_names[vm.name] = dstat_file
+      if self.stream:
+        self._streams[vm.name] = _DStatStream(
+            vm, dstat_file, pid, self._GetLocalPath(dstat_file))
+
+  def _GetLocalPath(self, dstat_file):
+    return os.path.join(self.output_directory, os.path.basename(dstat_file))
 
   def _StopOnVm(self, vm, vm_role):
     """Stop dstat on 'vm', copy the results to the run temporary directory."""
-    if vm.name not in self._pids:
-      logging.warn('No dstat PID for %s', vm.name)
-      return
-    else:
-      with self._lock:
-        pid = self._pids.pop(vm.name)
-        file_name = self._file_names.pop(vm.name)
+    with self._lock:
+      if vm.name not in self._pids:
+        logging.warn('No dstat PID for %s', vm.name)
+        return
+      pid = self._pids.pop(vm.name)
+      file_name = self._file_names.pop(vm.name)
+      stream = self._streams.pop(vm.name, None)
     cmd = 'kill {0} || true'.format(pid)
     vm.RemoteCommand(cmd)
+    if stream is not None:
+      if not stream.Join(self._STREAM_JOIN_TIMEOUT):
+        logging.warning('dstat stream from %s did not end.', vm.name)
+        # Stop appending to the file before it is replaced by PullFile.
+        stream.Close()
+      elif not stream.failed:
+        with self._lock:
+          self._role_mapping[vm_role] = file_name
+        return
     try:
       vm.PullFile(self.output_directory, file_name)
-      self._role_mapping[vm_role] = file_name
+      with self._lock:
+        self._role_mapping[vm_role] = file_name
     except Exception:
       logging.exception('Failed fetching dstat result from %s.', vm.name)
 
@@ -137,37 +361,44 @@ class _DStatCollector(object):
     vm_util.RunThreaded(self._StopOnVm, args)
 
   def Analyze(self, sender, benchmark_spec, samples):
-    """Analyze dstat file and record samples."""
-
-    def _AnalyzeEvent(role, labels, out, event):
-      # Find out index of rows belong to event according to timestamp.
-      cond = (out[:, 0] > event.start_timestamp) & (
-          out[:, 0] < event.end_timestamp)
-      # Skip analyzing event if none of rows falling into time range.
-      if not cond.any():
-        return
-      # Calculate mean of each column.
-      avg = np.average(out[:, 1:], weights=cond, axis=0)
-      metadata = copy.deepcopy(event.metadata)
-      metadata['event'] = event.event
-      metadata['sender'] = event.sender
-      metadata['vm_role'] = role
+    """Analyze dstat file and record samples.
 
-      samples.extend([
-          sample.Sample(label, avg[idx], '', metadata)
-          for idx, label in enumerate(labels[1:])])
+    Each file is read once, one row at a time, accumulating the statistics of
+    every event that the row falls into.
+    """
+    keep_histograms = any(s.startswith('p') for s in self.statistics)
+
+    def _AnalyzeRows(role, labels, rows):
+      event_statistics = _AccumulateEventStatistics(
+          rows, events.TracingEvent.events, len(labels) - 1, keep_histograms)
+      for statistics in event_statistics:
+        # Skip analyzing event if none of rows falling into time range.
+        if not statistics.count:
+          continue
+        event = statistics.event
+        metadata = copy.deepcopy(event.metadata)
+        metadata['event'] = event.event
+        metadata['sender'] = event.sender
+        metadata['vm_role'] = role
+
+        values = statistics.GetStatistics(self.statistics)
+        samples.extend([
+            sample.Sample(label, values['average'][idx], '', metadata)
+            for idx, label in enumerate(labels[1:])])
+        for statistic in self.statistics:
+          samples.extend([
+              sample.Sample('%s %s' % (label, statistic),
+                            values[statistic][idx], '', metadata)
+              for idx, label in enumerate(labels[1:])])
 
     def _Analyze(role, file):
-      with open(os.path.join(self.output_directory,
-                             os.path.basename(file)), 'r') as f:
-        fp = iter(f)
-        labels, out = dstat.ParseCsvFile(fp)
-        vm_util.RunThreaded(
-            _AnalyzeEvent,
-            [((role, labels, out, e), {}) for e in events.TracingEvent.events])
+      with open(self._GetLocalPath(file), 'r') as f:
+        labels, rows = dstat.IterCsvFile(f)
+        _AnalyzeRows(role, labels, rows)
 
-    vm_util.RunThreaded(
-        _Analyze, [((k, w), {}) for k, w in self._role_mapping.iteritems()])
+    with self._lock:
+      role_mapping = self._role_mapping.items()
+    vm_util.RunThreaded(_Analyze, [((k, w), {}) for k, w in role_mapping])
 
 
 def Register(parsed_flags):
@@ -185,7 +416,9 @@ def Register(parsed_flags):
   if not os.path.isdir(output_directory):
     os.makedirs(output_directory)
   collector = _DStatCollector(interval=parsed_flags.dstat_interval,
-                              output_directory=output_directory)
+                              output_directory=output_directory,
+                              statistics=parsed_flags.dstat_publish_stats,
+                              stream=parsed_flags.dstat_stream)
   events.before_phase.connect(collector.Start, events.RUN_PHASE, weak=False)
   events.after_phase.connect(collector.Stop, events.RUN_PHASE, weak=False)
   if parsed_flags.dstat_publish:
@@ -205,6 +205,8 @@ class BaseVirtualMachine(resource.BaseResource):
       usage while running the benchmark.
     background_network_ip_type: Type of IP address to use for generating
       background network workload
+    lifecycle_group: lifecycle_batch.LifecycleGroup or None. Batches the cloud
+      CLI calls of the VMs in the VM's group, if set.
   """
 
   __metaclass__ = AutoRegisterVmMeta
@@ -245,6 +247,7 @@ class BaseVirtualMachine(resource.BaseResource):
         vm_spec.background_network_mbits_per_sec)
     self.background_network_ip_type = vm_spec.background_network_ip_type
     self.use_dedicated_host = None
+    self.lifecycle_group = None
 
     self.network = None
     self.firewall = None
@@ -258,6 +261,10 @@ class BaseVirtualMachine(resource.BaseResource):
       return self.ip_address
     return super(BaseVirtualMachine, self).__str__()
 
+  def GetProvisioningDependencies(self):
+    """Returns the network the VM is attached to, if any."""
+    return [self.network] if self.network else []
+
   def CreateScratchDisk(self, disk_spec):
     """Create a VM's scratch disk.
 
@@ -413,6 +420,22 @@ class BaseOsMixin(object):
     """
     pass
 
+  def CloseRemoteConnection(self):
+    """Closes any persistent connection used to issue remote commands.
+
+    OS mixins that keep a connection to the VM open between remote commands
+    should override this. It is called before the VM is deleted or rebooted.
+    """
+    pass
+
+  def GetRemoteConnectionSamples(self):
+    """Returns a list of Samples describing remote connection reuse."""
+    return []
+
+  def GetPackageInstallSamples(self):
+    """Returns a list of Samples with the install time of each package."""
+    return []
+
   @abc.abstractmethod
   def RemoteCopy(self, file_path, remote_path='', copy_to=True):
     """Copies a file to or from the VM.
@@ -455,6 +478,11 @@ class BaseOsMixin(object):
     """Installs a PerfKit package on the VM."""
     raise NotImplementedError()
 
+  def InstallAll(self, package_names):
+    """Installs several PerfKit packages on the VM."""
+    for package_name in package_names:
+      self.Install(package_name)
+
   @abc.abstractmethod
   def Uninstall(self, package_name):
     """Uninstalls a PerfKit package on the VM."""
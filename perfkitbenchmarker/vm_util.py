@@ -29,6 +29,7 @@ import time
 import jinja2
 
 from perfkitbenchmarker import background_tasks
+from perfkitbenchmarker import command_engine
 from perfkitbenchmarker import data
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
@@ -63,6 +64,15 @@ OUTPUT_EXIT_CODE = 2
 
 flags.DEFINE_integer('default_timeout', TIMEOUT, 'The default timeout for '
                      'retryable commands in seconds.')
+flags.DEFINE_boolean('ssh_reuse_connections', True,
+                     'Whether to multiplex SSH and SCP commands to a VM over a '
+                     'single persistent connection (OpenSSH ControlMaster) '
+                     'rather than establishing a new connection for each '
+                     'remote command. Ignored when running on Windows.')
+flags.DEFINE_integer('ssh_control_persist', 30,
+                     'When --ssh_reuse_connections is set, the number of '
+                     'minutes an idle master SSH connection is kept open.',
+                     lower_bound=1)
 flags.DEFINE_integer('burn_cpu_seconds', 0,
                      'Amount of time in seconds to burn cpu on vm before '
                      'starting benchmark')
@@ -168,6 +178,29 @@ def GetCertPath():
   return PrependTempDir(CERT_FILE)
 
 
+def SshConnectionReuseEnabled():
+  """Returns whether SSH commands should share a persistent connection."""
+  return FLAGS.ssh_reuse_connections and not RunningOnWindows()
+
+
+def GetSshControlOptions():
+  """Returns the SSH options that control connection multiplexing.
+
+  All ssh and scp invocations targeting the same user, host and port share a
+  single master connection whose control socket lives in the run's temp
+  directory. The first command establishes the master connection, subsequent
+  commands reuse it and skip the TCP and SSH handshakes.
+  """
+  if not SshConnectionReuseEnabled():
+    return []
+  control_path = os.path.join(temp_dir.GetSshConnectionsDir(), '%C')
+  return [
+      '-o', 'ControlMaster=auto',
+      '-o', 'ControlPath=%s' % control_path,
+      '-o', 'ControlPersist=%dm' % FLAGS.ssh_control_persist
+  ]
+
+
 def GetSshOptions(ssh_key_filename):
   """Return common set of SSH and SCP options."""
   options = [
@@ -183,6 +216,7 @@ def GetSshOptions(ssh_key_filename):
       '-o', 'ServerAliveCountMax=10',
       '-i', ssh_key_filename
   ]
+  options.extend(GetSshControlOptions())
   options.extend(FLAGS.ssh_options)
 
   return options
@@ -256,7 +290,8 @@ def Retry(poll_interval=POLL_INTERVAL, max_retries=MAX_RETRIES,
 
 
 def IssueCommand(cmd, force_info_log=False, suppress_warning=False,
-                 env=None, timeout=DEFAULT_TIMEOUT, cwd=None):
+                 env=None, timeout=DEFAULT_TIMEOUT, cwd=None,
+                 line_callback=None):
   """Tries running the provided command once.
 
   Args:
@@ -278,6 +313,9 @@ def IssueCommand(cmd, force_info_log=False, suppress_warning=False,
         contain what had already been written to them before the process was
         killed.
     cwd: Directory in which to execute the command.
+    line_callback: If provided, a function called with each line of stdout
+        as soon as it is read. Stdout is then not buffered, and the returned
+        stdout is empty.
 
   Returns:
     A tuple of stdout, stderr, and retcode from running the provided command.
@@ -287,11 +325,35 @@ def IssueCommand(cmd, force_info_log=False, suppress_warning=False,
   full_cmd = ' '.join(cmd)
   logging.info('Running: %s', full_cmd)
 
-  shell_value = RunningOnWindows()
+  if RunningOnWindows():
+    stdout, stderr, retcode = _IssueCommandWithTimer(
+        cmd, env, timeout, cwd, line_callback)
+  else:
+    stdout, stderr, retcode = command_engine.GetEngine().Run(
+        cmd, env=env, cwd=cwd, timeout=timeout, line_callback=line_callback)
+
+  debug_text = ('Ran %s. Got return code (%s).\nSTDOUT: %s\nSTDERR: %s' %
+                (full_cmd, retcode, stdout, stderr))
+  if force_info_log or (retcode and not suppress_warning):
+    logging.info(debug_text)
+  else:
+    logging.debug(debug_text)
+
+  return stdout, stderr, retcode
+
+
+def _IssueCommandWithTimer(cmd, env, timeout, cwd, line_callback):
+  """Runs a command with a timer thread for its timeout.
+
+  Used on Windows, where command_engine can't poll pipes. See IssueCommand.
+  """
+  full_cmd = ' '.join(cmd)
+  shell_value = True
   with tempfile.TemporaryFile() as tf_out, tempfile.TemporaryFile() as tf_err:
-    process = subprocess.Popen(cmd, env=env, shell=shell_value,
-                               stdin=subprocess.PIPE, stdout=tf_out,
-                               stderr=tf_err, cwd=cwd)
+    process = subprocess.Popen(
+        cmd, env=env, shell=shell_value, stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE if line_callback else tf_out,
+        stderr=tf_err, cwd=cwd)
 
     def _KillProcess():
       logging.error('IssueCommand timed out after %d seconds. '
@@ -302,6 +364,13 @@ def IssueCommand(cmd, force_info_log=False, suppress_warning=False,
     timer.start()
 
     try:
+      if line_callback:
+        try:
+          for line in iter(process.stdout.readline, b''):
+            line_callback(line.decode('ascii', 'ignore'))
+        except Exception:
+          process.kill()
+          raise
       process.wait()
     finally:
       timer.cancel()
@@ -311,13 +380,6 @@ def IssueCommand(cmd, force_info_log=False, suppress_warning=False,
     tf_err.seek(0)
     stderr = tf_err.read().decode('ascii', 'ignore')
 
-  debug_text = ('Ran %s. Got return code (%s).\nSTDOUT: %s\nSTDERR: %s' %
-                (full_cmd, process.returncode, stdout, stderr))
-  if force_info_log or (process.returncode and not suppress_warning):
-    logging.info(debug_text)
-  else:
-    logging.debug(debug_text)
-
   return stdout, stderr, process.returncode
 
 
@@ -14,11 +14,15 @@
 
 """Integration tests for the object_storage_service benchmark worker process."""
 
+import os
 import time
 import unittest
 
+import mock
+
 import object_storage_interface
 import object_storage_api_tests  # noqa: importing for flags
+import s3_stub_server
 
 import validate_service
 
@@ -69,7 +73,7 @@ class MockObjectStorageService(object_storage_interface.ObjectStorageServiceBase
 
     return time.time(), 0.001
 
-  def ReadObject(self, bucket, object):
+  def ReadObject(self, bucket, object, size=None):
     self._CheckBucket(bucket)
 
     self.objects[object]
@@ -131,6 +135,43 @@ class TestValidateService(unittest.TestCase):
     validate_service.ValidateService(MockObjectStorageService())
 
 
+class TestS3StubServer(unittest.TestCase):
+  """Run the multi-stream scenarios with S3Service against the S3 stub."""
+
+  def setUp(self):
+    self.FLAGS = object_storage_api_tests.FLAGS
+    self.FLAGS([])
+    self.addCleanup(self.FLAGS.Reset)
+    self.server = s3_stub_server.S3StubServer()
+    self.server.Start()
+    self.addCleanup(self.server.Stop)
+    self.FLAGS.host = 'localhost'
+    self.FLAGS.port = self.server.port
+    self.FLAGS.is_secure = False
+    self.FLAGS.calling_format = 'path'
+    self.FLAGS.bucket = 'pkb'
+    self.FLAGS.objects_written_file = '/tmp/objects-written'
+    self.FLAGS.num_streams = 4
+    self.FLAGS.streams_per_process = 2
+    self.FLAGS.objects_per_stream = 5
+    self.FLAGS.object_sizes = '{1000: 50.0, 100000: 50.0}'
+    self.FLAGS.parallel_part_size = 30000
+    credentials = mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'x',
+                                               'AWS_SECRET_ACCESS_KEY': 'x'})
+    credentials.start()
+    self.addCleanup(credentials.stop)
+
+  def testMultiStreamWriteAndRead(self):
+    import s3
+    service = s3.S3Service()
+    object_storage_api_tests.MultiStreamWrites(service)
+    objects = self.server.buckets['pkb']
+    self.assertEqual(len(objects), 20)
+    self.assertTrue(all(len(data) in (1000, 100000)
+                        for data in objects.itervalues()))
+    self.assertEqual(self.server.uploads, {})
+    object_storage_api_tests.MultiStreamReads(service)
+
 
 if __name__ == '__main__':
   unittest.main()
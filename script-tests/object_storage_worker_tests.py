@@ -14,14 +14,20 @@
 
 """Tests for the object_storage_service benchmark worker process."""
 
+import httplib
 import itertools
+import os
 import random
+import shutil
+import struct
+import tempfile
 import time
 import unittest
 
 import mock
 
 import object_storage_api_tests
+import s3_stub_server
 
 
 class TestSizeDistributionIterator(unittest.TestCase):
@@ -88,5 +94,142 @@ class TestPrefixTimestampSuffixIterator(unittest.TestCase):
                               'foo_2.000000_bar'])
 
 
+class TestWriteColumnarResults(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+
+  def _CheckLayout(self):
+    path = os.path.join(self.temp_dir, 'results')
+    streams = [{'stream_num': 3, 'start_times': [1.0, 2.0],
+                'latencies': [0.5, 0.25], 'sizes': [10, 20]},
+               {'stream_num': 4, 'start_times': [1.5],
+                'latencies': [0.75], 'sizes': [30]}]
+    object_storage_api_tests.WriteColumnarResults(streams, path)
+    with open(path, 'rb') as results_file:
+      contents = results_file.read()
+    self.assertEqual(
+        struct.unpack('<8sQqqqq3d3d3q', contents),
+        (object_storage_api_tests.COLUMNAR_RESULTS_MAGIC, 2, 3, 2, 4, 1,
+         1.0, 2.0, 1.5, 0.5, 0.25, 0.75, 10, 20, 30))
+
+  def testLayout(self):
+    self._CheckLayout()
+
+  def testLayoutWithStructFallback(self):
+    # 'i' is 4 bytes, so the sizes are packed with struct in chunks.
+    codes = dict(object_storage_api_tests.COLUMNAR_RESULTS_CODES,
+                 sizes=('i', 'q'))
+    with mock.patch.object(object_storage_api_tests,
+                           'COLUMNAR_RESULTS_CODES', codes), \
+        mock.patch.object(object_storage_api_tests,
+                          'COLUMNAR_RESULTS_CHUNK_SIZE', 1):
+      self._CheckLayout()
+
+
+class TestPayloadPool(unittest.TestCase):
+  def setUp(self):
+    self.pool = object_storage_api_tests.PayloadPool(block_size=16)
+
+  def testPayloadIsRandomLetters(self):
+    payload = self.pool.GetPayload(40)
+    self.assertEqual(len(payload), 40)
+    self.assertTrue(payload.tobytes().isalpha())
+
+  def testPayloadsShareData(self):
+    large = self.pool.GetPayload(40)
+    small = self.pool.GetPayload(10)
+    self.assertEqual(small.tobytes(), large[:10].tobytes())
+
+  def testPoolGrowsByBlocks(self):
+    small = self.pool.GetPayload(10)
+    large = self.pool.GetPayload(40)
+    self.assertEqual(len(self.pool.GetPayload(48)), 48)
+    self.assertEqual(large[:10].tobytes(), small.tobytes())
+
+  def testPayloadHandle(self):
+    handle = self.pool.GetPayloadHandle(20)
+    handle.read(5)
+    handle.seek(0)
+    self.assertEqual(handle.read(), self.pool.GetPayload(20).tobytes())
+
+
+def _RecordStream(tag, per_stream_arg, result_queue, worker_num):
+  result_queue.put((os.getpid(), tag, per_stream_arg, worker_num))
+
+
+class TestRunWorkerProcesses(unittest.TestCase):
+  def setUp(self):
+    self.FLAGS = object_storage_api_tests.FLAGS
+    self.FLAGS([])
+    self.addCleanup(self.FLAGS.Reset)
+
+  def testStreamsPerProcess(self):
+    self.FLAGS.num_streams = 5
+    self.FLAGS.streams_per_process = 2
+    results = object_storage_api_tests.RunWorkerProcesses(
+        _RecordStream, ('tag',), per_process_args=['a', 'b', 'c', 'd', 'e'])
+    self.assertEqual(sorted(result[1:] for result in results),
+                     [('tag', 'a', 0), ('tag', 'b', 1), ('tag', 'c', 2),
+                      ('tag', 'd', 3), ('tag', 'e', 4)])
+    pids = {result[3]: result[0] for result in results}
+    self.assertEqual(pids[0], pids[1])
+    self.assertEqual(pids[2], pids[3])
+    self.assertEqual(len(set(pids.values())), 3)
+
+
+class TestS3StubServer(unittest.TestCase):
+  def setUp(self):
+    self.server = s3_stub_server.S3StubServer()
+    self.server.Start()
+    self.addCleanup(self.server.Stop)
+    self.connection = httplib.HTTPConnection('localhost', self.server.port)
+    self.addCleanup(self.connection.close)
+
+  def _Request(self, method, path, body=None, headers=None):
+    self.connection.request(method, path, body, headers or {})
+    response = self.connection.getresponse()
+    return response.status, response.getheaders(), response.read()
+
+  def testPutAndGet(self):
+    self.assertEqual(self._Request('PUT', '/bucket/a/b', 'abcdef')[0], 200)
+    status, _, body = self._Request('GET', '/bucket/a/b')
+    self.assertEqual((status, body), (200, 'abcdef'))
+    status, headers, body = self._Request('GET', '/bucket/a/b',
+                                          headers={'Range': 'bytes=2-3'})
+    self.assertEqual((status, body), (206, 'cd'))
+    self.assertEqual(dict(headers)['content-range'], 'bytes 2-3/6')
+    self.assertEqual(self._Request('DELETE', '/bucket/a/b')[0], 204)
+    self.assertEqual(self._Request('GET', '/bucket/a/b')[0], 404)
+    # All requests were made over one connection.
+    self.assertEqual(self.server.num_connections, 1)
+    self.assertEqual(self.server.num_requests, 5)
+
+  def testList(self):
+    for name in ['a1', 'a2', 'b1']:
+      self._Request('PUT', '/bucket/' + name, 'x')
+    _, _, body = self._Request('GET', '/bucket?prefix=a&max-keys=1')
+    self.assertIn('<Key>a1</Key>', body)
+    self.assertIn('<IsTruncated>true</IsTruncated>', body)
+    _, _, body = self._Request('GET', '/bucket?prefix=a&marker=a1')
+    self.assertIn('<Key>a2</Key>', body)
+    self.assertNotIn('<Key>b1</Key>', body)
+    self.assertIn('<IsTruncated>false</IsTruncated>', body)
+
+  def testMultipartUpload(self):
+    _, _, body = self._Request('POST', '/bucket/object?uploads')
+    upload_id = body.split('<UploadId>')[1].split('<')[0]
+    for part_num, data in [(2, 'def'), (1, 'abc')]:
+      path = '/bucket/object?partNumber=%d&uploadId=%s' % (
+          part_num, upload_id)
+      status, _, _ = self._Request('PUT', path, data)
+      self.assertEqual(status, 200)
+    self.assertEqual(self._Request('GET', '/bucket/object')[0], 404)
+    status, _, _ = self._Request('POST', '/bucket/object?uploadId=' +
+                                 upload_id, '<CompleteMultipartUpload/>')
+    self.assertEqual(status, 200)
+    self.assertEqual(self._Request('GET', '/bucket/object')[2], 'abcdef')
+
+
 if __name__ == '__main__':
   unittest.main()
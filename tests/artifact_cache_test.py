@@ -0,0 +1,188 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.artifact_cache."""
+
+import BaseHTTPServer
+import hashlib
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib2
+
+import mock
+
+from perfkitbenchmarker import artifact_cache
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import events
+from tests import mock_flags
+
+_CONTENT = b'tarball contents'
+_DIGEST = hashlib.sha256(_CONTENT).hexdigest()
+
+
+class _OriginHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Stands in for the servers packages download artifacts from."""
+
+  requests = []
+
+  def do_GET(self):
+    self.requests.append(self.path)
+    self.send_response(200)
+    self.send_header('Content-Length', str(len(_CONTENT)))
+    self.end_headers()
+    self.wfile.write(_CONTENT)
+
+  def log_message(self, format, *args):
+    pass
+
+
+class _CacheTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.cache_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.cache_dir)
+    _OriginHandler.requests = []
+    self.origin = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _OriginHandler)
+    thread = threading.Thread(target=self.origin.serve_forever,
+                              kwargs={'poll_interval': 0.01})
+    thread.daemon = True
+    thread.start()
+    self.addCleanup(self.origin.server_close)
+    self.addCleanup(self.origin.shutdown)
+    self.url = 'http://127.0.0.1:%d/ycsb.tar.gz' % self.origin.server_port
+
+
+class ArtifactCacheTestCase(_CacheTestCase):
+
+  def testDownloadsOnce(self):
+    cache = artifact_cache.ArtifactCache(self.cache_dir)
+    self.assertEqual(_DIGEST, cache.Fetch(self.url))
+    self.assertEqual(_DIGEST, cache.Fetch(self.url))
+    with open(cache.GetPath(_DIGEST), 'rb') as blob:
+      self.assertEqual(_CONTENT, blob.read())
+    self.assertEqual(['/ycsb.tar.gz'], _OriginHandler.requests)
+
+  def testPersistsAcrossRuns(self):
+    artifact_cache.ArtifactCache(self.cache_dir).Fetch(self.url)
+    cache = artifact_cache.ArtifactCache(self.cache_dir)
+    self.assertEqual(_DIGEST, cache.Lookup(self.url))
+    # A different URL with the same content is found by its checksum.
+    self.assertEqual(_DIGEST, cache.Fetch('http://unreachable.invalid/a',
+                                          sha256=_DIGEST.upper()))
+    self.assertEqual(1, len(_OriginHandler.requests))
+
+  def testConcurrentFetches(self):
+    cache = artifact_cache.ArtifactCache(self.cache_dir)
+    threads = [threading.Thread(target=cache.Fetch, args=(self.url,))
+               for _ in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(1, len(_OriginHandler.requests))
+
+  def testChecksumMismatch(self):
+    cache = artifact_cache.ArtifactCache(self.cache_dir)
+    with self.assertRaises(artifact_cache.ArtifactChecksumError):
+      cache.Fetch(self.url, sha256='0' * 64)
+    self.assertIsNone(cache.Lookup(self.url))
+    self.assertIsNone(cache.Lookup(self.url, sha256=_DIGEST))
+
+
+class ArtifactServerTestCase(_CacheTestCase):
+
+  def testServesArtifactsOnly(self):
+    cache = artifact_cache.ArtifactCache(self.cache_dir)
+    cache.Fetch(self.url)
+    server = artifact_cache.ArtifactServer(cache, address='127.0.0.1')
+    server.Start()
+    self.addCleanup(server.Stop)
+    base_url = 'http://127.0.0.1:%d/' % server.port
+    self.assertEqual(
+        _CONTENT,
+        urllib2.urlopen(base_url + artifact_cache.BlobName(_DIGEST)).read())
+    for path in ['', 'sha256/', 'index.json', 'sha256/../index.json',
+                 artifact_cache.BlobName('0' * 64)]:
+      with self.assertRaises(urllib2.HTTPError) as context:
+        urllib2.urlopen(base_url + path)
+      self.assertEqual(404, context.exception.code)
+
+
+class InstallArtifactTestCase(_CacheTestCase):
+
+  def setUp(self):
+    super(InstallArtifactTestCase, self).setUp()
+    self.flags = mock_flags.PatchTestCaseFlags(self)
+    self.flags.artifact_cache_dir = self.cache_dir
+    self.flags.artifact_cache_port = 0
+    patcher = mock.patch.multiple(artifact_cache, _cache=None, _server=None)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.vm = mock.Mock()
+
+  def testNoCache(self):
+    self.flags.artifact_cache = artifact_cache.NONE
+    artifact_cache.InstallArtifact(self.vm, self.url, '/tmp/a.tgz')
+    self.vm.RemoteCommand.assert_called_once_with(
+        'curl -fL %s -o /tmp/a.tgz' % self.url)
+    self.assertEqual([], _OriginHandler.requests)
+
+  def testPush(self):
+    self.flags.artifact_cache = artifact_cache.PUSH
+    artifact_cache.InstallArtifact(self.vm, self.url, '/tmp/a.tgz')
+    artifact_cache.InstallArtifact(self.vm, self.url, '/tmp/b.tgz')
+    local_path = artifact_cache._GetCache().GetPath(_DIGEST)
+    self.assertEqual([mock.call(local_path, '/tmp/a.tgz'),
+                      mock.call(local_path, '/tmp/b.tgz')],
+                     self.vm.PushFile.call_args_list)
+    self.assertEqual(1, len(_OriginHandler.requests))
+
+  def testMirror(self):
+    self.flags.artifact_cache = artifact_cache.MIRROR
+    self.flags.artifact_cache_host = '10.0.0.2'
+    artifact_cache.InstallArtifact(self.vm, self.url, '/tmp/a.tgz')
+    server = artifact_cache._server
+    self.addCleanup(events.benchmark_end.send, benchmark_spec=None)
+    command = self.vm.RemoteCommand.call_args[0][0]
+    self.assertIn('curl -fL http://10.0.0.2:%d/sha256/%s -o /tmp/a.tgz' %
+                  (server.port, _DIGEST), command)
+    self.assertIn('echo "%s  /tmp/a.tgz" | sha256sum -c -' % _DIGEST, command)
+
+  def testMirrorStopsAtBenchmarkEnd(self):
+    self.flags.artifact_cache = artifact_cache.MIRROR
+    self.flags.artifact_cache_host = '10.0.0.2'
+    artifact_cache.InstallArtifact(self.vm, self.url, '/tmp/a.tgz')
+    with mock.patch.object(artifact_cache._server, 'Stop',
+                           wraps=artifact_cache._server.Stop) as stop:
+      events.benchmark_end.send(benchmark_spec=None)
+    stop.assert_called_once_with()
+    self.assertIsNone(artifact_cache._server)
+
+  def testMirrorRequiresHost(self):
+    self.flags.artifact_cache = artifact_cache.MIRROR
+    with self.assertRaises(errors.Setup.InvalidFlagConfigurationError):
+      artifact_cache.InstallArtifact(self.vm, self.url, '/tmp/a.tgz')
+
+  def testInstallTarball(self):
+    self.flags.artifact_cache = artifact_cache.NONE
+    artifact_cache.InstallTarball(self.vm, self.url, '/opt/pkb/ycsb')
+    self.assertEqual(
+        'mkdir -p /opt/pkb/ycsb && tar -C /opt/pkb/ycsb --strip-components=1 '
+        '-xzf /tmp/pkb/ycsb.tar.gz && rm /tmp/pkb/ycsb.tar.gz',
+        self.vm.RemoteCommand.call_args[0][0])
+
+
+if __name__ == '__main__':
+  unittest.main()
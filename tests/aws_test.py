@@ -16,6 +16,8 @@
 
 import json
 import os.path
+import re
+import threading
 import unittest
 
 import mock
@@ -23,6 +25,7 @@ import mock
 from perfkitbenchmarker import benchmark_spec
 from perfkitbenchmarker import context
 from perfkitbenchmarker import errors
+from perfkitbenchmarker import lifecycle_batch
 from perfkitbenchmarker import os_types
 from perfkitbenchmarker import providers
 from perfkitbenchmarker import vm_util
@@ -214,6 +217,89 @@ class AwsVirtualMachineTestCase(unittest.TestCase):
            '--spot-instance-request-ids=sir-abc'])
 
 
+class AwsLifecycleBatchTestCase(unittest.TestCase):
+
+  def setUp(self):
+    mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    mocked_flags.cloud = providers.AWS
+    mocked_flags.os_type = os_types.DEBIAN
+    mocked_flags.run_uri = 'aaaaaa'
+    mocked_flags.temp_dir = 'tmp'
+    mocked_flags.vm_lifecycle_batch_window = 60
+    self.commands = []
+    self._lock = threading.Lock()
+    for target, function in (
+        (util.__name__ + '.IssueRetryableCommand', self._FakeDescribe),
+        (vm_util.__name__ + '.IssueCommand', self._FakeTerminate),
+        (util.__name__ + '.AddDefaultTags', None)):
+      p = mock.patch(target, side_effect=function)
+      p.start()
+      self.addCleanup(p.stop)
+
+    config_spec = benchmark_config_spec.BenchmarkConfigSpec(
+        _BENCHMARK_NAME, flag_values=mocked_flags, vm_groups={})
+    self.spec = benchmark_spec.BenchmarkSpec(mock.MagicMock(), config_spec,
+                                             _BENCHMARK_UID)
+    self.addCleanup(context.SetThreadBenchmarkSpec, None)
+
+    self.vms = []
+    for i in range(3):
+      vm = aws_virtual_machine.AwsVirtualMachine(
+          aws_virtual_machine.AwsVmSpec('test_vm_spec.AWS', zone='us-east-1a',
+                                        machine_type='c3.large'))
+      vm.client_token = 'token-%d' % i
+      # Mock attributes aren't created thread-safely, so they are set here.
+      vm.network = mock.NonCallableMock(spec=['regional_network'])
+      vm.network.regional_network.vpc.default_security_group_id = 'sg-1'
+      self.vms.append(vm)
+    group = lifecycle_batch.LifecycleGroup('default', self.vms)
+    for vm in self.vms:
+      vm.lifecycle_group = group
+
+  def _FakeDescribe(self, cmd, env=None):
+    tokens = re.match(r'--filter=Name=client-token,Values=(.*)$',
+                      cmd[-1]).group(1).split(',')
+    with self._lock:
+      self.commands.append(cmd)
+    reservations = [{'Instances': [{
+        'ClientToken': token,
+        'InstanceId': 'i-%s' % token,
+        'State': {'Name': 'running'},
+        'PublicIpAddress': '1.2.3.4',
+        'PrivateIpAddress': '10.0.0.1',
+        'Placement': {'AvailabilityZone': 'us-east-1a'},
+        'SecurityGroups': [{'GroupId': 'sg-1'}]}]} for token in tokens]
+    return json.dumps({'Reservations': reservations}), ''
+
+  def _FakeTerminate(self, cmd, **kwargs):
+    with self._lock:
+      self.commands.append(cmd)
+    return '', '', 0
+
+  def testGroupLifecycle(self):
+    self.assertEqual(vm_util.RunThreaded(lambda vm: vm._Exists(), self.vms),
+                     [True] * 3)
+    self.assertEqual([vm.id for vm in self.vms],
+                     ['i-token-0', 'i-token-1', 'i-token-2'])
+    vm_util.RunThreaded(lambda vm: vm._PostCreate(), self.vms)
+    vm_util.RunThreaded(lambda vm: vm._Delete(), self.vms)
+    self.assertEqual([cmd[4] for cmd in self.commands],
+                     ['describe-instances', 'describe-instances',
+                      'terminate-instances'])
+    self.assertItemsEqual(self.commands[2][7:],
+                          ['i-token-0', 'i-token-1', 'i-token-2'])
+
+  def testDescribeIsSplitByFilterLimit(self):
+    with mock.patch.object(aws_virtual_machine, 'MAX_FILTER_VALUES', 2):
+      self.assertEqual(vm_util.RunThreaded(lambda vm: vm._Exists(), self.vms),
+                       [True] * 3)
+    self.assertEqual([cmd[4] for cmd in self.commands],
+                     ['describe-instances'] * 2)
+    self.assertItemsEqual(
+        [len(cmd[-1].split('Values=')[1].split(',')) for cmd in self.commands],
+        [2, 1])
+
+
 class AwsIsRegionTestCase(unittest.TestCase):
 
   def testBadFormat(self):
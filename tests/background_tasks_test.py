@@ -20,6 +20,7 @@ import multiprocessing.managers
 import os
 import signal
 import threading
+import time
 import unittest
 
 from perfkitbenchmarker import background_tasks
@@ -49,6 +50,11 @@ def _WaitAndAppendInt(int_list, int_to_append, event=None, timeout=None):
   int_list.append(int_to_append)
 
 
+def _RunNested(max_concurrency):
+  calls = [(_ReturnArgs, ('a',), {'b': i}) for i in range(2)]
+  return background_tasks.RunParallelThreads(calls, max_concurrency)
+
+
 class GetCallStringTestCase(unittest.TestCase):
 
   def testNoArgs(self):
@@ -126,6 +132,97 @@ class RunParallelThreadsTestCase(unittest.TestCase):
     self.assertEqual(int_list, [1])
 
 
+class RunDependentThreadsTestCase(unittest.TestCase):
+
+  def testDependenciesRespected(self):
+    int_list = []
+    # 0 <- 2 <- 3 and 1 <- 3. Task 0 waits until task 1 has appended.
+    calls = [(_AppendLength, (int_list,), {}),
+             (_AppendLength, (int_list,), {}),
+             (_AppendLength, (int_list,), {}),
+             (_AppendLength, (int_list,), {})]
+    dependencies = [[1], [], [0], [1, 2]]
+    background_tasks.RunDependentThreads(calls, dependencies,
+                                         max_concurrency=4)
+    self.assertEqual(int_list, [0, 1, 2, 3])
+
+  def testResultsInInputOrder(self):
+    calls = [(_ReturnArgs, ('a',), {'b': i}) for i in range(3)]
+    result = background_tasks.RunDependentThreads(
+        calls, [[2], [0], []], max_concurrency=1)
+    self.assertEqual(result, [(0, 'a'), (1, 'a'), (2, 'a')])
+
+  def testDependentsSkippedOnFailure(self):
+    int_list = []
+    calls = [(_RaiseValueError, (), {}),
+             (_AppendLength, (int_list,), {}),
+             (_AppendLength, (int_list,), {})]
+    with self.assertRaises(errors.VmUtil.ThreadException) as cm:
+      background_tasks.RunDependentThreads(calls, [[], [0], []],
+                                           max_concurrency=2)
+    self.assertEqual(int_list, [0])
+    self.assertIn('because a call it depends on failed', str(cm.exception))
+
+  def testDependentsRunOnFailure(self):
+    int_list = []
+    calls = [(_RaiseValueError, (), {}),
+             (_AppendLength, (int_list,), {})]
+    with self.assertRaises(errors.VmUtil.ThreadException):
+      background_tasks.RunDependentThreads(
+          calls, [[], [0]], max_concurrency=2,
+          skip_dependents_on_failure=False)
+    self.assertEqual(int_list, [0])
+
+  def testCycle(self):
+    calls = [(_ReturnArgs, ('a',), {}), (_ReturnArgs, ('b',), {})]
+    with self.assertRaises(ValueError):
+      background_tasks.RunDependentThreads(calls, [[1], [0]],
+                                           max_concurrency=2)
+
+  def testInvalidDependency(self):
+    calls = [(_ReturnArgs, ('a',), {})]
+    with self.assertRaises(ValueError):
+      background_tasks.RunDependentThreads(calls, [[3]], max_concurrency=2)
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+
+  def testWorkersReused(self):
+    pool = background_tasks._GetWorkerPool()
+    calls = [(_ReturnArgs, ('a',), {'b': i}) for i in range(10)]
+    background_tasks.RunParallelThreads(calls, max_concurrency=4)
+    num_workers = len(pool.workers)
+    background_tasks.RunParallelThreads(calls, max_concurrency=4)
+    self.assertEqual(len(pool.workers), num_workers)
+
+  def testNestedCalls(self):
+    calls = [(_RunNested, (2,), {}) for _ in range(3)]
+    result = background_tasks.RunParallelThreads(calls, max_concurrency=3)
+    self.assertEqual(result, [[(0, 'a'), (1, 'a')]] * 3)
+
+  def testSamples(self):
+    background_tasks.ResetWorkerPoolStatistics()
+    calls = [(time.sleep, (0.01,), {}) for _ in range(4)]
+    background_tasks.RunParallelThreads(calls, max_concurrency=2)
+    samples = {s.metric: s for s in background_tasks.GetWorkerPoolSamples()}
+    self.assertItemsEqual(samples, [
+        'Worker Pool Utilization', 'Worker Pool Peak Busy Workers',
+        'Worker Pool Queue Wait', 'Worker Pool Task Duration'])
+    self.assertEqual(samples['Worker Pool Peak Busy Workers'].value, 2)
+    duration = samples['Worker Pool Task Duration']
+    self.assertEqual(duration.metadata['num_tasks'], 4)
+    self.assertGreaterEqual(duration.value, 0.01)
+    self.assertIn('histogram', duration.metadata)
+    # Two of the tasks wait for the first two to complete.
+    self.assertGreaterEqual(duration.metadata['p90'], 0.01)
+    self.assertGreater(samples['Worker Pool Queue Wait'].metadata['p90'],
+                       0.005)
+
+  def testNoSamplesWithoutTasks(self):
+    background_tasks.ResetWorkerPoolStatistics()
+    self.assertEqual(background_tasks.GetWorkerPoolSamples(), [])
+
+
 class RunThreadedTestCase(unittest.TestCase):
 
   def testNonListParams(self):
@@ -14,16 +14,24 @@
 """Tests for perfkitbenchmarker.benchmark_spec."""
 
 import mock
+import shutil
+import tempfile
 import unittest
 
 from perfkitbenchmarker import benchmark_spec
 from perfkitbenchmarker import configs
 from perfkitbenchmarker import context
+from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import linux_benchmarks
+from perfkitbenchmarker import network
 from perfkitbenchmarker import os_types
 from perfkitbenchmarker import providers
+from perfkitbenchmarker import resource_journal
+from perfkitbenchmarker import stages
 from perfkitbenchmarker import static_virtual_machine as static_vm
+from perfkitbenchmarker import virtual_machine
+from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.configs import benchmark_config_spec
 from perfkitbenchmarker.providers.aws import aws_virtual_machine as aws_vm
 from perfkitbenchmarker.providers.gcp import gce_virtual_machine as gce_vm
@@ -186,6 +194,68 @@ class ConstructVmsTestCase(_BenchmarkSpecTestCase):
       self.assertEqual(spec.vm_groups['group2'][0].zone, 'zone2')
 
 
+class ProvisionTestCase(_BenchmarkSpecTestCase):
+
+  def setUp(self):
+    super(ProvisionTestCase, self).setUp()
+    self.spec = self._CreateBenchmarkSpecFromYaml(SIMPLE_CONFIG)
+    self.calls = []
+    self.region = mock.Mock(spec=network.BaseNetwork)
+    self.region.GetProvisioningDependencies.return_value = []
+    self.region.Create.side_effect = lambda: self.calls.append('region')
+    self.region.Delete.side_effect = (
+        lambda: self.calls.append('delete region'))
+    self.zone = mock.Mock(spec=network.BaseNetwork)
+    self.zone.GetProvisioningDependencies.return_value = [self.region]
+    self.zone.Create.side_effect = lambda: self.calls.append('zone')
+    self.zone.Delete.side_effect = lambda: self.calls.append('delete zone')
+    # Keys sort in the opposite order of the dependencies.
+    self.spec.networks = {'a': self.zone, 'b': self.region}
+    self.vm = mock.Mock(spec=virtual_machine.BaseVirtualMachine)
+    self.vm.GetProvisioningDependencies.return_value = [self.zone]
+    self.vm.OS_TYPE = os_types.DEBIAN
+    self.spec.vms = [self.vm]
+    self.firewall = mock.Mock(spec=network.BaseFirewall)
+    self.firewall.DisallowAllPorts.side_effect = (
+        lambda: self.calls.append('firewall'))
+    self.spec.firewalls = {'GCP': self.firewall}
+    p = mock.patch.object(self.spec, 'PrepareVm',
+                          side_effect=lambda vm: self.calls.append('vm'))
+    p.start()
+    self.addCleanup(p.stop)
+    p = mock.patch.object(self.spec, 'DeleteVm',
+                          side_effect=lambda vm: self.calls.append('delete vm'))
+    p.start()
+    self.addCleanup(p.stop)
+    p = mock.patch(vm_util.__name__ + '.GenerateSSHConfig')
+    p.start()
+    self.addCleanup(p.stop)
+
+  def testProvisionOrder(self):
+    self.spec.Provision()
+    self.assertEqual(self.calls, ['region', 'zone', 'vm'])
+    samples = self.spec.GetResourceTimingSamples()
+    self.assertEqual(len(samples), 3)
+    self.assertEqual({s.metric for s in samples}, {'Resource Create Time'})
+
+  def testProvisionFailureSkipsDependents(self):
+    self.zone.Create.side_effect = ValueError()
+    with self.assertRaises(errors.VmUtil.ThreadException):
+      self.spec.Provision()
+    self.assertEqual(self.calls, ['region'])
+
+  def testDeleteOrder(self):
+    self.spec.Delete()
+    self.assertEqual(self.calls, ['delete vm', 'firewall', 'delete zone',
+                                  'delete region'])
+    self.assertTrue(self.spec.deleted)
+
+  def testDeleteContinuesAfterFailure(self):
+    self.spec.DeleteVm.side_effect = ValueError()
+    self.spec.Delete()
+    self.assertEqual(self.calls, ['firewall', 'delete zone', 'delete region'])
+
+
 class BenchmarkSupportTestCase(_BenchmarkSpecTestCase):
 
   def createBenchmarkSpec(self, config, benchmark):
@@ -247,5 +317,51 @@ class RedirectGlobalFlagsTestCase(_BenchmarkSpecTestCase):
     self.assertEqual(FLAGS.benchmark_spec_test_flag, 0)
 
 
+class PickleTestCase(_BenchmarkSpecTestCase):
+
+  def setUp(self):
+    super(PickleTestCase, self).setUp()
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    p = mock.patch(vm_util.__name__ + '.GetTempDir', return_value=temp_dir)
+    p.start()
+    self.addCleanup(p.stop)
+    self.benchmark_module = next(b for b in linux_benchmarks.BENCHMARKS
+                                 if b.BENCHMARK_NAME == NAME)
+
+  def _Unpickle(self):
+    with mock_flags.PatchFlags() as mocked_flags:
+      mocked_flags.run_stage = [stages.CLEANUP, stages.TEARDOWN]
+      return benchmark_spec.BenchmarkSpec.GetBenchmarkSpec(
+          self.benchmark_module, None, UID)
+
+  def testJournalReplayedOnSnapshot(self):
+    spec = self._CreateBenchmarkSpecFromYaml(SIMPLE_CONFIG)
+    spec.ConstructVirtualMachines()
+    spec.Pickle()
+    vm = spec.vms[0]
+    vm.created = True
+    vm.ip_address = '1.2.3.4'
+    resource_journal.Record(vm, resource_journal.CREATED)
+
+    unpickled = self._Unpickle()
+    self.assertTrue(unpickled.vms[0].created)
+    self.assertEqual(unpickled.vms[0].ip_address, '1.2.3.4')
+    # The VM still shares the spec's network.
+    self.assertIs(unpickled.vms[0].network,
+                  unpickled.networks.values()[0])
+    self.assertEqual(unpickled.recovered_resources, [])
+
+  def testSnapshotRestartsJournal(self):
+    spec = self._CreateBenchmarkSpecFromYaml(SIMPLE_CONFIG)
+    spec.ConstructVirtualMachines()
+    spec.Pickle()
+    spec.vms[0].ip_address = '1.2.3.4'
+    resource_journal.Record(spec.vms[0], resource_journal.CREATED)
+    spec.vms[0].ip_address = '5.6.7.8'
+    spec.Pickle()
+    self.assertEqual(self._Unpickle().vms[0].ip_address, '5.6.7.8')
+
+
 if __name__ == '__main__':
   unittest.main()
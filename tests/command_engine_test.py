@@ -0,0 +1,96 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.command_engine."""
+
+import os
+import signal
+import time
+import unittest
+
+from perfkitbenchmarker import command_engine
+
+
+class CommandEngineTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.engine = command_engine.CommandEngine(
+        max_concurrent_commands=2, max_output_bytes=1024)
+
+  def testStdoutAndStderr(self):
+    result = self.engine.Run(['sh', '-c', 'echo out; echo err >&2; exit 3'])
+    self.assertEqual(result, ('out\n', 'err\n', 3))
+
+  def testOutputCap(self):
+    engine = command_engine.CommandEngine(max_concurrent_commands=1,
+                                          max_output_bytes=5)
+    command = engine.Submit(['printf', '0123456789'])
+    self.assertEqual(command.Wait(), ('01234', '', 0))
+    self.assertEqual(command.stdout.dropped, 5)
+
+  def testLargeOutput(self):
+    engine = command_engine.CommandEngine(max_concurrent_commands=1,
+                                          max_output_bytes=1024 * 1024)
+    stdout, _, _ = engine.Run(['head', '-c', '300000', '/dev/zero'])
+    self.assertEqual(len(stdout), 300000)
+
+  def testLineCallback(self):
+    lines = []
+    stdout, _, retcode = self.engine.Run(['printf', 'a\\nbc\\nd'],
+                                         line_callback=lines.append)
+    self.assertEqual(stdout, '')
+    self.assertEqual(retcode, 0)
+    self.assertEqual(lines, ['a\n', 'bc\n', 'd'])
+
+  def testTimeout(self):
+    command = self.engine.Submit(['sleep', '10'], timeout=0.1)
+    _, _, retcode = command.Wait()
+    self.assertEqual(retcode, -9)
+    self.assertTrue(command.timed_out)
+
+  def testStartError(self):
+    with self.assertRaises(OSError):
+      self.engine.Run(['/nonexistent/command'])
+
+  def testBoundedConcurrency(self):
+    sleeps = [self.engine.Submit(['sleep', '10']) for _ in range(2)]
+    echo = self.engine.Submit(['echo', 'done'])
+    time.sleep(0.2)
+    self.assertIsNone(echo.process)
+    sleeps[0].Cancel()
+    self.assertEqual(echo.Wait(), ('done\n', '', 0))
+    self.assertEqual(sleeps[0].Wait()[2], -9)
+    sleeps[1].Cancel()
+    self.assertEqual(sleeps[1].Wait()[2], -9)
+
+  def testCancelPending(self):
+    sleeps = [self.engine.Submit(['sleep', '10']) for _ in range(2)]
+    echo = self.engine.Submit(['echo', 'done'])
+    echo.Cancel()
+    with self.assertRaises(command_engine.CommandCancelledError):
+      echo.Wait()
+    self.assertIsNone(echo.process)
+    for command in sleeps:
+      command.Cancel()
+      command.Wait()
+
+  def testBackgroundChildKeepsPipesOpen(self):
+    start = time.time()
+    stdout, _, retcode = self.engine.Run(['sh', '-c', 'sleep 10 & echo $!'])
+    os.kill(int(stdout), signal.SIGKILL)
+    self.assertEqual(retcode, 0)
+    self.assertLess(time.time() - start, 5)
+
+
+if __name__ == '__main__':
+  unittest.main()
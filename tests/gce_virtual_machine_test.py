@@ -15,13 +15,17 @@
 """Tests for perfkitbenchmarker.providers.gcp.gce_virtual_machine"""
 
 import contextlib
+import json
 import mock
 import re
+import threading
+import time
 import unittest
 
 from perfkitbenchmarker import benchmark_spec
 from perfkitbenchmarker import context
 from perfkitbenchmarker import errors
+from perfkitbenchmarker import lifecycle_batch
 from perfkitbenchmarker import os_types
 from perfkitbenchmarker import providers
 from perfkitbenchmarker import vm_util
@@ -317,5 +321,166 @@ class GCEVMFlagsTestCase(unittest.TestCase):
       self.assertIn('k3=p3', actual_metadata_from_file)
 
 
+class _FakeGcloud(object):
+  """Stands in for the gcloud commands that create, list and delete instances.
+
+  Attributes:
+    commands: list of lists of strings. The commands that were issued.
+    existing_names: set of strings. Names of instances that fail to be
+        created because they already exist.
+  """
+
+  def __init__(self):
+    self.commands = []
+    self.existing_names = set()
+    self._instances = {}
+    self._lock = threading.Lock()
+
+  def __call__(self, cmd, **kwargs):
+    operation = cmd[3]
+    names = []
+    for arg in cmd[4:]:
+      if arg.startswith('--'):
+        break
+      names.append(arg)
+    with self._lock:
+      self.commands.append(cmd)
+      if operation == 'create':
+        created = []
+        error_lines = []
+        for name in names:
+          if name in self.existing_names:
+            error_lines.append(" - The resource 'projects/p/zones/z/instances/"
+                               "%s' already exists\n" % name)
+            continue
+          number = len(self._instances)
+          self._instances[name] = {
+              'name': name, 'id': str(number),
+              'networkInterfaces': [{
+                  'networkIP': '10.0.0.%d' % number,
+                  'accessConfigs': [{'natIP': '1.2.3.%d' % number}]}]}
+          created.append(self._instances[name])
+        if error_lines:
+          return (json.dumps(created), 'ERROR: (gcloud.compute.instances.'
+                  'create) Could not fetch resource:\n' + ''.join(error_lines),
+                  1)
+        return json.dumps(created), '', 0
+      elif operation == 'delete':
+        for name in names:
+          self._instances.pop(name, None)
+      elif operation == 'list':
+        name_filter = cmd[cmd.index('--filter') + 1]
+        names = re.match(r'name=\( (.*) \)$', name_filter).group(1).split()
+        return json.dumps([self._instances[name] for name in names
+                           if name in self._instances]), '', 0
+    return '', '', 0
+
+
+class GceLifecycleBatchTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self._mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self._mocked_flags.cloud = providers.GCP
+    self._mocked_flags.gcloud_path = 'gcloud'
+    self._mocked_flags.os_type = os_types.DEBIAN
+    self._mocked_flags.run_uri = 'aaaaaa'
+    self._mocked_flags.temp_dir = 'tmp'
+    self._mocked_flags.gcp_instance_metadata = []
+    self._mocked_flags.gcp_instance_metadata_from_file = []
+    self._mocked_flags.vm_lifecycle_batch_window = 60
+    self.addCleanup(context.SetThreadBenchmarkSpec, None)
+    config_spec = benchmark_config_spec.BenchmarkConfigSpec(
+        _BENCHMARK_NAME, flag_values=self._mocked_flags, vm_groups={})
+    self._benchmark_spec = benchmark_spec.BenchmarkSpec(
+        mock.MagicMock(), config_spec, _BENCHMARK_UID)
+    self.gcloud = _FakeGcloud()
+    # Mock attributes aren't created thread-safely, so the network has none.
+    network = mock.NonCallableMock(spec=['subnet_resource', 'network_resource'],
+                                   subnet_resource=None)
+    network.network_resource = mock.NonCallableMock(spec=['name'])
+    network.network_resource.name = 'pkb-network'
+    for target, kwargs in (
+        (gce_virtual_machine.__name__ + '.gce_network.GceNetwork.GetNetwork',
+         {'return_value': network}),
+        (gce_virtual_machine.__name__ + '.gce_network.GceFirewall.GetFirewall',
+         {}),
+        (vm_util.__name__ + '.IssueCommand', {'side_effect': self.gcloud}),
+        (vm_util.__name__ + '.NamedTemporaryFile', {}),
+        (gce_virtual_machine.__name__ + '.open',
+         {'new': mock.mock_open(read_data='key'), 'create': True})):
+      p = mock.patch(target, **kwargs)
+      p.start()
+      self.addCleanup(p.stop)
+
+  def _CreateVms(self, zones):
+    vms = []
+    for zone in zones:
+      vm_spec = gce_virtual_machine.GceVmSpec(
+          'test_vm_spec.GCP', self._mocked_flags, image='image',
+          machine_type='n1-standard-1', project='p', zone=zone)
+      vms.append(gce_virtual_machine.GceVirtualMachine(vm_spec))
+    group = lifecycle_batch.LifecycleGroup('default', vms)
+    for vm in vms:
+      vm.lifecycle_group = group
+    return vms
+
+  def _GetOperations(self):
+    return [cmd[3] for cmd in self.gcloud.commands]
+
+  def testGroupLifecycle(self):
+    vms = self._CreateVms(['us-central1-a'] * 3)
+    vm_util.RunThreaded(lambda vm: vm._CreateResource(), vms)
+    self.assertEqual(self._GetOperations(), ['create', 'list'])
+    create_cmd = self.gcloud.commands[0]
+    self.assertItemsEqual(create_cmd[4:7], [vm.name for vm in vms])
+    self.assertTrue(create_cmd[7].startswith('--'))
+
+    vm_util.RunThreaded(lambda vm: vm._PostCreate(), vms)
+    self.assertEqual(self._GetOperations(), ['create', 'list', 'list'])
+    self.assertEqual(len(set(vm.ip_address for vm in vms)), 3)
+    for vm in vms:
+      self.assertEqual(vm.internal_ip, '10.0.0.%s' % vm.id)
+
+    vm_util.RunThreaded(lambda vm: vm._DeleteResource(), vms)
+    self.assertEqual(self._GetOperations(),
+                     ['create', 'list', 'list', 'delete', 'list'])
+    self.assertItemsEqual(self.gcloud.commands[3][4:7], [vm.name for vm in vms])
+
+  def testZonesAreCreatedSeparately(self):
+    vms = self._CreateVms(['us-central1-a', 'us-central1-b'])
+    # Each zone's batch is issued without waiting for the window.
+    start = time.time()
+    vm_util.RunThreaded(lambda vm: vm._CreateResource(), vms)
+    self.assertLess(time.time() - start, 30)
+    self.assertItemsEqual(self._GetOperations(), ['create', 'create', 'list'])
+    list_cmd = self.gcloud.commands[-1]
+    self.assertEqual(list_cmd[list_cmd.index('--zones') + 1],
+                     'us-central1-a,us-central1-b')
+
+  def testCreateResultsArePerInstance(self):
+    vms = self._CreateVms(['us-central1-a'] * 3)
+    self.gcloud.existing_names.add(vms[1].name)
+    results = gce_virtual_machine._CreateInstances(vms)
+    self.assertEqual(len(self.gcloud.commands), 1)
+    for vm in (vms[0], vms[2]):
+      stdout, stderr, retcode = results[vm]
+      self.assertEqual([instance['name'] for instance in json.loads(stdout)],
+                       [vm.name])
+      self.assertEqual((stderr, retcode), ('', 0))
+    _, stderr, retcode = results[vms[1]]
+    self.assertEqual(retcode, 1)
+    self.assertIn('Could not fetch resource', stderr)
+    self.assertIn(vms[1].name, stderr)
+
+  def testCreateErrorsOfOtherInstancesAreDropped(self):
+    vms = self._CreateVms(['us-central1-a'] * 2)
+    self.gcloud.existing_names.update(vm.name for vm in vms)
+    results = gce_virtual_machine._CreateInstances(vms)
+    for vm, other_vm in ((vms[0], vms[1]), (vms[1], vms[0])):
+      _, stderr, _ = results[vm]
+      self.assertIn(vm.name, stderr)
+      self.assertNotIn(other_vm.name, stderr)
+
+
 if __name__ == '__main__':
   unittest.main()
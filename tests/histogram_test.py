@@ -0,0 +1,124 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.histogram."""
+
+import unittest
+
+import numpy as np
+
+from perfkitbenchmarker import histogram
+
+
+class HistogramTestCase(unittest.TestCase):
+
+  def testFromPairs(self):
+    hist = histogram.Histogram.FromPairs([(19, 1), (0, 530), (19, 2)])
+    self.assertEqual(hist, [(0, 530), (19, 3)])
+    self.assertEqual(2, len(hist))
+    self.assertEqual(533, hist.Total())
+    self.assertIs(type(list(hist)[0][0]), int)
+
+  def testEmpty(self):
+    hist = histogram.Histogram.FromPairs([])
+    self.assertFalse(hist)
+    self.assertEqual(hist, [])
+    with self.assertRaises(ValueError):
+      hist.Percentiles([50])
+
+  def testMismatchedLengths(self):
+    with self.assertRaises(ValueError):
+      histogram.Histogram([1, 2], [1])
+
+  def testMergeSameLayout(self):
+    hist = histogram.Histogram([0, 1, 2], [1, 0, 3])
+    hist.Merge(histogram.Histogram([0, 1, 2], [0, 2, 1]))
+    self.assertEqual(hist, [(0, 1), (1, 2), (2, 4)])
+
+  def testMergeDifferentLayouts(self):
+    hist = histogram.Histogram.FromPairs([(0, 1), (2, 3)])
+    hist.Merge(histogram.Histogram.FromPairs([(1, 1), (2, 1), (5, 2)]))
+    self.assertEqual(hist, [(0, 1), (1, 1), (2, 4), (5, 2)])
+    hist.Merge(histogram.Histogram())
+    self.assertEqual(hist, [(0, 1), (1, 1), (2, 4), (5, 2)])
+
+  def testMergeIntoEmpty(self):
+    other = histogram.Histogram.FromPairs([(1, 1)])
+    hist = histogram.Histogram().Merge(other)
+    hist.Merge(other)
+    self.assertEqual(hist, [(1, 2)])
+    self.assertEqual(other, [(1, 1)])
+
+  def testStats(self):
+    hist = histogram.Histogram.FromDict({1: 5, 2: 10, 5: 5})
+    self.assertEqual([1, 1, 2, 2, 5, 5],
+                     hist.Percentiles([0, 20, 30, 74, 80, 100]))
+    self.assertEqual(2.5, hist.Mean())
+    self.assertAlmostEqual(1.539, hist.Stddev(), places=3)
+    self.assertEqual(0, histogram.Histogram([3], [1]).Stddev())
+
+  def testInvalidPercentile(self):
+    with self.assertRaises(ValueError):
+      histogram.Histogram([1], [1]).Percentiles([101])
+
+  def testEvenlyWeightedPercentiles(self):
+    hist = histogram.Histogram(range(1, 101), [1] * 100)
+    self.assertEqual([50, 75, 90, 95, 99, 100],
+                     hist.Percentiles([50, 75, 90, 95, 99, 100]))
+
+  def testLowWeightPercentiles(self):
+    hist = histogram.Histogram([1, 4], [99, 1])
+    self.assertEqual([1] * 100, hist.Percentiles(range(100)))
+    self.assertEqual([4], hist.Percentiles([99.5]))
+
+  def testMidWeightPercentiles(self):
+    hist = histogram.Histogram([0, 1.2, 4], [1, 98, 1])
+    self.assertEqual([1.2] * 97, hist.Percentiles(range(2, 99)))
+    self.assertEqual([4], hist.Percentiles([99.5]))
+
+  def testFloorRankPercentiles(self):
+    hist = histogram.Histogram.FromDict({1: 5, 2: 10, 5: 5})
+    self.assertEqual([1, 2], hist.Percentiles([25, 75]))
+    self.assertEqual([2, 5], hist.Percentiles([25, 75],
+                                              rank=histogram.FLOOR_RANK))
+    self.assertEqual([1, 5], hist.Percentiles([0, 100],
+                                              rank=histogram.FLOOR_RANK))
+    with self.assertRaises(ValueError):
+      hist.Percentiles([50], rank='median')
+
+  def testJsonRoundTrip(self):
+    hist = histogram.Histogram([0.5, 300.0, 7000.0], [2, 0, 1])
+    serialized = hist.ToJson()
+    self.assertEqual('{"0.5":2,"7000.0":1}', serialized)
+    self.assertEqual(hist, histogram.Histogram.FromJson(serialized))
+
+  def testFromValues(self):
+    hist = histogram.Histogram.FromValues(
+        [0, 0.3, 0.34, 1.05, 1.09, 99, 123, 129, 4567], significant_figures=2)
+    self.assertEqual(
+        [(0.0, 1), (0.3, 1), (0.34, 1), (1.0, 2), (99.0, 1), (120.0, 2),
+         (4500.0, 1)],
+        hist)
+
+  def testFromValuesRelativeError(self):
+    values = np.sort(np.random.RandomState(0).lognormal(5, 2, 10000))
+    hist = histogram.Histogram.FromValues(values, significant_figures=3)
+    # Nearest-rank percentiles of the raw values.
+    exact = [values[4999], values[9899]]
+    for exact_value, bucketed in zip(exact, hist.Percentiles([50, 99])):
+      self.assertLessEqual(bucketed, exact_value)
+      self.assertGreater(bucketed, exact_value * 0.99)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,166 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.import_util."""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from perfkitbenchmarker import import_util
+from perfkitbenchmarker import module_index
+
+_PACKAGE = 'pkb_lazy_registry_test'
+
+_MODULES = {
+    'alpha': "NAME = 'a'\nEXTRA = ['a2']\n",
+    'beta': "NAME = 'b'\nEXTRA = []\n",
+    'gamma': "NAME = 'c'\nEXTRA = []\n",
+}
+
+
+def _GetEntries(module):
+  return [(name, module) for name in [module.NAME] + module.EXTRA]
+
+
+def _GetMetadata(module):
+  return {'name': module.NAME}
+
+
+class LazyModuleDictTestCase(unittest.TestCase):
+
+  def setUp(self):
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    package_dir = os.path.join(temp_dir, _PACKAGE)
+    os.mkdir(package_dir)
+    for module_name, source in _MODULES.items() + [('__init__', '')]:
+      with open(os.path.join(package_dir, module_name + '.py'), 'w') as f:
+        f.write(source)
+    sys.path.insert(0, temp_dir)
+    self.addCleanup(sys.path.remove, temp_dir)
+    self.addCleanup(self._UnloadModules)
+    self.path = [package_dir]
+    # gamma is missing from the index, e.g. because it was added since.
+    indexed_modules = {
+        'alpha': {'names': ['a', 'a2'], 'metadata': {'name': 'a'}},
+        'beta': {'names': ['b'], 'metadata': {'name': 'b'}},
+        'deleted': {'names': ['d'], 'metadata': {'name': 'd'}},
+    }
+    p = mock.patch.object(module_index, 'GetIndexedModules',
+                          return_value=indexed_modules)
+    p.start()
+    self.addCleanup(p.stop)
+
+  def _UnloadModules(self):
+    for name in list(sys.modules):
+      if name == _PACKAGE or name.startswith(_PACKAGE + '.'):
+        del sys.modules[name]
+
+  def _IsImported(self, module_name):
+    return _PACKAGE + '.' + module_name in sys.modules
+
+  def _CreateDict(self):
+    return import_util.LazyModuleDict(self.path, _PACKAGE, _GetEntries,
+                                      _GetMetadata)
+
+  def testModulesImportedOnFirstAccess(self):
+    registry = self._CreateDict()
+    self.assertItemsEqual(['a', 'a2', 'b', 'c'], registry)
+    self.assertIn('b', registry)
+    self.assertNotIn('d', registry)
+    self.assertFalse(self._IsImported('alpha'))
+    self.assertFalse(self._IsImported('beta'))
+    # Modules missing from the index are imported right away.
+    self.assertTrue(self._IsImported('gamma'))
+    self.assertEqual('b', registry['b'].NAME)
+    self.assertTrue(self._IsImported('beta'))
+    self.assertFalse(self._IsImported('alpha'))
+    with self.assertRaises(KeyError):
+      registry['d']
+
+  def testAccessLoadsAllEntriesOfModule(self):
+    registry = self._CreateDict()
+    self.assertIs(registry['a2'], registry['a'])
+    self.assertEqual(4, len(registry))
+
+  def testMetadataFromIndex(self):
+    registry = self._CreateDict()
+    self.assertEqual({'name': 'a'}, registry.GetMetadata('a2'))
+    self.assertFalse(self._IsImported('alpha'))
+    self.assertEqual({'name': 'c'}, registry.GetMetadata('c'))
+
+  def testGetIndexEntries(self):
+    registry = self._CreateDict()
+    self.assertEqual({
+        'alpha': {'names': ['a', 'a2'], 'metadata': {'name': 'a'}},
+        'beta': {'names': ['b'], 'metadata': {'name': 'b'}},
+        'gamma': {'names': ['c'], 'metadata': {'name': 'c'}},
+    }, registry.GetIndexEntries())
+    self.assertTrue(self._IsImported('alpha'))
+
+  def testSetAndDelete(self):
+    registry = self._CreateDict()
+    registry['b'] = 'fake'
+    self.assertEqual('fake', registry['b'])
+    self.assertFalse(self._IsImported('beta'))
+    del registry['a']
+    self.assertNotIn('a', registry)
+    with self.assertRaises(KeyError):
+      del registry['d']
+
+  def testImportsWithoutLock(self):
+    results = []
+
+    def GetEntries(module):
+      # Another thread can use the dict while a module is being imported.
+      if module.NAME == 'a':
+        thread = threading.Thread(
+            target=lambda: results.append(registry['c'].NAME))
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+      return _GetEntries(module)
+
+    registry = import_util.LazyModuleDict(self.path, _PACKAGE, GetEntries)
+    self.assertEqual('a', registry['a'].NAME)
+    self.assertEqual(['c'], results)
+
+  def testEagerWithoutIndex(self):
+    with mock.patch.object(module_index, 'GetIndexedModules',
+                           return_value=None):
+      registry = self._CreateDict()
+    for module_name in _MODULES:
+      self.assertTrue(self._IsImported(module_name))
+    self.assertItemsEqual(['a', 'a2', 'b', 'c'], registry)
+
+  def testLazyModuleList(self):
+    registry = import_util.LazyModuleDict(
+        self.path, _PACKAGE, lambda module: [(module.NAME, module)])
+    modules = import_util.LazyModuleList(registry)
+    self.assertEqual(['a', 'b', 'c'], [module.NAME for module in modules])
+    self.assertEqual(3, len(modules))
+    self.assertIn(registry['b'], modules)
+    self.assertEqual(['a', 'b', 'c', 'x'],
+                     [module.NAME for module in modules] + ['x'])
+    self.assertEqual(4, len(modules + [None]))
+    self.assertEqual(4, len([None] + modules))
+
+
+if __name__ == '__main__':
+  unittest.main()
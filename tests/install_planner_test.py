@@ -0,0 +1,130 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.install_planner."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from perfkitbenchmarker import install_planner
+
+_OS_TYPE = 'ubuntu1604'
+
+
+class InstallRecorderTestCase(unittest.TestCase):
+
+  def testNestedInstalls(self):
+    recorder = install_planner.InstallRecorder()
+    self.assertFalse(recorder.IsNested())
+    recorder.Start('ycsb')
+    self.assertTrue(recorder.IsNested())
+    recorder.AddOsPackages(['curl'])
+    recorder.Start('openjdk')
+    recorder.AddOsPackages(['openjdk-7-jdk'])
+    self.assertEqual(
+        ('openjdk', install_planner.PackageRecord([], ['openjdk-7-jdk'])),
+        recorder.Finish())
+    recorder.AddDependency('maven')
+    self.assertEqual(
+        ('ycsb', install_planner.PackageRecord(['openjdk', 'maven'],
+                                               ['curl'])),
+        recorder.Finish())
+    self.assertFalse(recorder.IsNested())
+
+  def testIgnoresOsPackagesOutsideInstalls(self):
+    recorder = install_planner.InstallRecorder()
+    recorder.AddOsPackages(['curl'])
+    recorder.AddDependency('openjdk')
+    self.assertFalse(recorder.IsNested())
+
+
+class InstallPlannerTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+    self.path = os.path.join(self.temp_dir, 'plans', 'install_plans.json')
+    self.planner = install_planner.InstallPlanner(self.path)
+    self.planner.Record(_OS_TYPE, 'ycsb', install_planner.PackageRecord(
+        ['openjdk', 'maven'], ['curl']))
+    self.planner.Record(_OS_TYPE, 'maven', install_planner.PackageRecord(
+        ['openjdk'], ['maven']))
+    self.planner.Record(_OS_TYPE, 'openjdk', install_planner.PackageRecord(
+        [], ['openjdk-7-jdk', 'curl']))
+    self.planner.Record(_OS_TYPE, 'fio', install_planner.PackageRecord(
+        ['build_tools'], ['libaio-dev']))
+    self.planner.Record(_OS_TYPE, 'build_tools',
+                        install_planner.PackageRecord([], ['gcc', 'make']))
+
+  def testPlanResolvesClosure(self):
+    plan = self.planner.Plan(_OS_TYPE, ['ycsb'])
+    self.assertEqual(['openjdk', 'maven', 'ycsb'], plan.packages)
+    self.assertEqual(['openjdk-7-jdk', 'curl', 'maven'], plan.os_packages)
+    self.assertEqual([], plan.unplanned)
+
+  def testPlanReportsUnplannedPackages(self):
+    plan = self.planner.Plan(_OS_TYPE, ['fio', 'iperf'])
+    self.assertEqual(['build_tools', 'fio', 'iperf'], plan.packages)
+    self.assertEqual(['gcc', 'make', 'libaio-dev'], plan.os_packages)
+    self.assertEqual(['iperf'], plan.unplanned)
+
+  def testPlanIsPerOsType(self):
+    plan = self.planner.Plan('rhel', ['ycsb'])
+    self.assertEqual(['ycsb'], plan.unplanned)
+    self.assertEqual([], plan.os_packages)
+
+  def testGroupIndependent(self):
+    self.assertEqual(
+        [['fio'], ['ycsb', 'maven'], ['iperf', 'netperf']],
+        self.planner.GroupIndependent(
+            _OS_TYPE, ['ycsb', 'iperf', 'fio', 'maven', 'netperf']))
+
+  def testGroupMergesSharedDependencies(self):
+    self.planner.Record(_OS_TYPE, 'hadoop', install_planner.PackageRecord(
+        ['openjdk', 'build_tools'], []))
+    self.assertEqual(
+        [['ycsb', 'fio', 'hadoop']],
+        self.planner.GroupIndependent(_OS_TYPE, ['ycsb', 'fio', 'hadoop']))
+
+  def testRecordsPersist(self):
+    planner = install_planner.InstallPlanner(self.path)
+    self.assertEqual(
+        install_planner.PackageRecord(['openjdk'], ['maven']),
+        planner.GetRecord(_OS_TYPE, 'maven'))
+    self.assertIsNone(planner.GetRecord(_OS_TYPE, 'iperf'))
+
+  def testRecordRemovesDuplicates(self):
+    self.planner.Record(_OS_TYPE, 'iperf', install_planner.PackageRecord(
+        ['build_tools', 'build_tools'], ['iperf', 'iperf']))
+    self.assertEqual(
+        install_planner.PackageRecord(['build_tools'], ['iperf']),
+        self.planner.GetRecord(_OS_TYPE, 'iperf'))
+
+  def testRecordKeepsConcurrentRecords(self):
+    other = install_planner.InstallPlanner(self.path)
+    other.Record(_OS_TYPE, 'iperf', install_planner.PackageRecord([],
+                                                                  ['iperf']))
+    other.Record('rhel', 'iperf', install_planner.PackageRecord([],
+                                                                ['iperf3']))
+    self.planner.Record(_OS_TYPE, 'netperf', install_planner.PackageRecord(
+        [], ['netperf']))
+    planner = install_planner.InstallPlanner(self.path)
+    for os_type, package_name in [(_OS_TYPE, 'iperf'), ('rhel', 'iperf'),
+                                  (_OS_TYPE, 'netperf'), (_OS_TYPE, 'ycsb')]:
+      self.assertIsNotNone(planner.GetRecord(os_type, package_name))
+
+
+if __name__ == '__main__':
+  unittest.main()
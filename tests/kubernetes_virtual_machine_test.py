@@ -0,0 +1,121 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.providers.kubernetes.kubernetes_virtual_machine.
+"""
+
+import json
+import re
+import threading
+import unittest
+
+import mock
+
+from perfkitbenchmarker import lifecycle_batch
+from perfkitbenchmarker import virtual_machine
+from perfkitbenchmarker import vm_util
+from perfkitbenchmarker.providers.kubernetes import kubernetes_virtual_machine
+from tests import mock_flags
+
+
+class _FakeKubectl(object):
+  """Stands in for the kubectl commands that create, get and delete PODs.
+
+  Attributes:
+    commands: list of lists of strings. The commands that were issued.
+  """
+
+  def __init__(self):
+    self.commands = []
+    self._pods = {}
+    self._lock = threading.Lock()
+
+  def _GetSelectedPods(self, selector):
+    key, values = re.match(r'(\w+)(?:=| in \()([^)]*)', selector).groups()
+    values = values.split(',')
+    return [pod for pod in self._pods.itervalues()
+            if pod['metadata']['labels'].get(key) in values]
+
+  def __call__(self, cmd, **kwargs):
+    operation = cmd[2]
+    with self._lock:
+      self.commands.append(cmd)
+      if operation == 'create':
+        with open(cmd[-1]) as manifest:
+          for body in manifest.read().split('\n---\n'):
+            pod = json.loads(body)
+            pod['status'] = {'phase': 'Running',
+                             'podIP': '10.0.0.%d' % len(self._pods)}
+            self._pods[pod['metadata']['name']] = pod
+        return 'created\n', '', 0
+      elif operation == 'get':
+        pods = self._GetSelectedPods(cmd[cmd.index('-l') + 1])
+        return json.dumps({'kind': 'List', 'items': pods}), '', 0
+      elif operation == 'delete':
+        for pod in self._GetSelectedPods(cmd[cmd.index('-l') + 1]):
+          del self._pods[pod['metadata']['name']]
+        return 'deleted\n', '', 0
+
+
+class KubernetesLifecycleBatchTestCase(unittest.TestCase):
+
+  def setUp(self):
+    mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    mocked_flags.kubectl = 'kubectl'
+    mocked_flags.kubeconfig = 'kubeconfig'
+    mocked_flags.run_uri = 'aaaaaa'
+    mocked_flags.temp_dir = 'tmp'
+    mocked_flags.vm_lifecycle_batch_window = 60
+    mocked_flags.readiness_poll_min_interval = 0.01
+    mocked_flags.readiness_poll_max_interval = 0.01
+    mocked_flags.readiness_poll_backoff = 1.0
+    self.kubectl = _FakeKubectl()
+    p = mock.patch(vm_util.__name__ + '.IssueCommand',
+                   side_effect=self.kubectl)
+    p.start()
+    self.addCleanup(p.stop)
+
+    self.vms = []
+    for _ in range(3):
+      vm_spec = virtual_machine.BaseVmSpec('test_vm_spec.Kubernetes')
+      self.vms.append(
+          kubernetes_virtual_machine.DebianBasedKubernetesVirtualMachine(
+              vm_spec))
+    group = lifecycle_batch.LifecycleGroup('default', self.vms)
+    for vm in self.vms:
+      vm.lifecycle_group = group
+
+  def _GetOperations(self):
+    return [(cmd[2], cmd[cmd.index('-l') + 1] if '-l' in cmd else None)
+            for cmd in self.kubectl.commands]
+
+  def testGroupLifecycle(self):
+    vm_util.RunThreaded(lambda vm: vm.Create(), self.vms)
+    operations = self._GetOperations()
+    self.assertEqual(operations.count(('create', None)), 1)
+    # One call checks that the PODs exist and one gets their IPs.
+    self.assertEqual(operations.count(('get', 'pkb_group=aaaaaa-default')), 2)
+    self.assertEqual(len(operations), 3 + operations.count(
+        ('get', 'pkb_group in (aaaaaa-default)')))
+    self.assertItemsEqual([vm.internal_ip for vm in self.vms],
+                          ['10.0.0.0', '10.0.0.1', '10.0.0.2'])
+
+    del self.kubectl.commands[:]
+    vm_util.RunThreaded(lambda vm: vm.Delete(), self.vms)
+    self.assertEqual(self._GetOperations(),
+                     [('delete', 'pkb_group=aaaaaa-default'),
+                      ('get', 'pkb_group=aaaaaa-default')])
+
+
+if __name__ == '__main__':
+  unittest.main()
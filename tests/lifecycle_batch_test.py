@@ -0,0 +1,117 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.lifecycle_batch."""
+
+import pickle
+import threading
+import time
+import unittest
+
+from perfkitbenchmarker import lifecycle_batch
+from tests import mock_flags
+
+
+def _CallConcurrently(function, items):
+  """Calls function with each item from its own thread.
+
+  Returns:
+    dict mapping each item to its result or to the exception it raised.
+  """
+  results = {}
+
+  def _Call(item):
+    try:
+      results[item] = function(item)
+    except Exception as e:  # pylint: disable=broad-except
+      results[item] = e
+  threads = [threading.Thread(target=_Call, args=(item,)) for item in items]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return results
+
+
+class CallBatcherTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.batches = []
+
+  def _Double(self, items):
+    self.batches.append(sorted(items))
+    return {item: item * 2 for item in items}
+
+  def testFullBatchIsIssuedOnce(self):
+    batcher = lifecycle_batch.CallBatcher(self._Double, 10, 60)
+    start = time.time()
+    results = _CallConcurrently(batcher.Call, range(10))
+    self.assertLess(time.time() - start, 30)
+    self.assertEqual(results, {item: item * 2 for item in range(10)})
+    self.assertEqual(self.batches, [range(10)])
+
+  def testPartialBatchIsIssuedAfterWindow(self):
+    batcher = lifecycle_batch.CallBatcher(self._Double, 10, 0.5)
+    start = time.time()
+    self.assertEqual(batcher.Call(1), 2)
+    self.assertGreaterEqual(time.time() - start, 0.5)
+    self.assertEqual(batcher.Call(2), 4)
+    self.assertEqual(self.batches, [[1], [2]])
+
+  def testErrorIsRaisedForEachItem(self):
+    def _Fail(items):
+      raise ValueError(len(items))
+    batcher = lifecycle_batch.CallBatcher(_Fail, 3, 60)
+    results = _CallConcurrently(batcher.Call, range(3))
+    for result in results.itervalues():
+      self.assertIsInstance(result, ValueError)
+      self.assertEqual(result.args, (3,))
+
+
+class LifecycleGroupTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self.mocked_flags.vm_lifecycle_batch_window = 60
+    self.group = lifecycle_batch.LifecycleGroup('default', range(8))
+    self.batches = []
+
+  def _Batch(self, items):
+    self.batches.append(sorted(items))
+    return {item: None for item in items}
+
+  def testCallsWithDifferentKeysAreBatchedSeparately(self):
+    _CallConcurrently(
+        lambda item: self.group.Call(lambda i: i % 2, self._Batch, item),
+        range(8))
+    self.assertItemsEqual(self.batches, [[0, 2, 4, 6], [1, 3, 5, 7]])
+
+  def testBatchesAreSizedByTheirKey(self):
+    # Without waiting for the window, a batch is issued once the members with
+    # its key have joined it.
+    start = time.time()
+    _CallConcurrently(
+        lambda item: self.group.Call(lambda i: i < 6, self._Batch, item),
+        range(8))
+    self.assertLess(time.time() - start, 30)
+    self.assertItemsEqual(self.batches, [range(6), [6, 7]])
+
+  def testPickle(self):
+    self.mocked_flags.vm_lifecycle_batch_window = 0
+    group = pickle.loads(pickle.dumps(self.group))
+    self.assertEqual((group.name, group.members), ('default', range(8)))
+    self.assertEqual(group.Call(lambda i: 'key', lambda items: {1: 2}, 1), 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
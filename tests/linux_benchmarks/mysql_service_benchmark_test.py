@@ -16,9 +16,28 @@ import logging
 import os
 import unittest
 
+import mock
+
+from perfkitbenchmarker import errors
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import test_util
 from perfkitbenchmarker.linux_benchmarks import mysql_service_benchmark
+from tests import mock_flags
+
+
+def _IntervalLines(all_tps):
+  return ['[%4ds] threads: 16, tps: %.2f, reads: 0.00, writes: 0.00, response '
+          'time: 50.00ms (99%%), errors: 0.00, reconnects:  0.00\n' %
+          (2 * (i + 1), tps) for i, tps in enumerate(all_tps)]
+
+
+_RESPONSE_TIME_LINES = [
+    'General statistics:\n',
+    '    response time:\n',
+    '         min:                                 18.31ms\n',
+    '         avg:                                 27.26ms\n',
+    '         max:                                313.50ms\n',
+    '         approx.  99 percentile:              57.15ms\n']
 
 
 class MySQLServiceBenchmarkTestCase(unittest.TestCase,
@@ -57,6 +76,81 @@ class MySQLServiceBenchmarkTestCase(unittest.TestCase,
             'milliseconds', {})]
     self.assertSampleListsEqualUpToTimestamp(results, expected_results)
 
+  def testMissingResponseTime(self):
+    contents = self.contents.replace('avg:', 'mean:')
+    with self.assertRaises(mysql_service_benchmark.SysbenchOutputError):
+      mysql_service_benchmark.ParseSysbenchOutput(contents, [], {})
+
+
+class SteadyStateTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.flags = mock_flags.PatchTestCaseFlags(self)
+    self.flags.steady_state_detection = True
+    self.flags.steady_state_window = 5
+    self.flags.steady_state_max_cv = 0.05
+    self.flags.sysbench_report_interval = 2
+    self.flags.sysbench_latency_percentile = 99
+    # A 5 interval warm-up followed by 20 steady intervals.
+    self.all_tps = [100, 200, 300, 400, 500] + [1000, 1010, 990, 1005, 995] * 4
+
+  def testTrimsWarmUp(self):
+    results = []
+    mysql_service_benchmark.ParseSysbenchOutput(
+        ''.join(_IntervalLines(self.all_tps) + _RESPONSE_TIME_LINES), results,
+        {})
+    by_metric = {s.metric: s for s in results}
+    self.assertEqual(10, by_metric['sysbench tps steady state start'].value)
+    self.assertEqual(40, by_metric['sysbench tps steady state duration'].value)
+    self.assertEqual(990, by_metric['sysbench tps p0.1'].value)
+    self.assertTrue(
+        by_metric['sysbench tps p0.1'].metadata['tps_steady_state_only'])
+    # Latency summaries cover the whole run.
+    self.assertEqual(27.26, by_metric['sysbench latency avg'].value)
+    self.assertNotIn('tps_steady_state_only',
+                     by_metric['sysbench latency avg'].metadata)
+
+  def _RunUntilSteady(self, lines):
+    """Runs sysbench on a fake VM that prints lines until interrupted."""
+    self.flags.sysbench_steady_state_stop_seconds = 20
+    vm = mock.Mock()
+
+    def RobustRemoteCommand(command, line_callback=None):
+      for line in lines:
+        line_callback(line)
+        if vm.RemoteCommand.called:
+          raise errors.VirtualMachine.RemoteCommandError('Interrupted.')
+    vm.RobustRemoteCommand.side_effect = RobustRemoteCommand
+
+    stdout, _ = mysql_service_benchmark._RunSysbenchUntilSteady(vm, 'run')
+    return vm, stdout
+
+  def testStopsRunWhenSteady(self):
+    lines = _IntervalLines(self.all_tps)
+    vm, stdout = self._RunUntilSteady(lines)
+    # Ten intervals, i.e. 20 seconds, after the warm-up.
+    self.assertEqual(''.join(lines[:15]), stdout)
+    self.assertIn('pkill -INT', vm.RemoteCommand.call_args[0][0])
+
+  def testParseStoppedRun(self):
+    _, stdout = self._RunUntilSteady(_IntervalLines(self.all_tps))
+    with self.assertRaises(mysql_service_benchmark.SysbenchOutputError):
+      mysql_service_benchmark.ParseSysbenchOutput(stdout, [], {})
+    results = []
+    mysql_service_benchmark.ParseSysbenchOutput(
+        stdout, results, {}, allow_missing_latency=True)
+    metrics = [s.metric for s in results]
+    self.assertIn('sysbench tps p50', metrics)
+    self.assertFalse([m for m in metrics if m.startswith('sysbench latency')])
+
+  def testRunFailure(self):
+    self.flags.sysbench_steady_state_stop_seconds = 20
+    vm = mock.Mock()
+    vm.RobustRemoteCommand.side_effect = (
+        errors.VirtualMachine.RemoteCommandError('Failed.'))
+    with self.assertRaises(errors.VirtualMachine.RemoteCommandError):
+      mysql_service_benchmark._RunSysbenchUntilSteady(vm, 'run')
+
 
 if __name__ == '__main__':
   unittest.main()
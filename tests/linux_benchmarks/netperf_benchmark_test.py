@@ -64,6 +64,17 @@ class NetperfBenchmarkTestCase(unittest.TestCase):
     self.assertEqual(stats['p100'], 5)
     self.assertTrue(abs(stats['stddev'] - 1.538) <= 0.001)
 
+  def testHistogramStatsCalculatorRank(self):
+    # The values at 0-based rank int(N * p / 100), as netperf has always
+    # published them, even where N * p / 100 is a whole number.
+    stats = netperf_benchmark._HistogramStatsCalculator(
+        {1: 5, 2: 10, 5: 5}, [25, 75])
+    self.assertEqual((stats['p25'], stats['p75']), (2, 5))
+    stats = netperf_benchmark._HistogramStatsCalculator(
+        {value: 1 for value in range(1, 101)}, [50, 90, 99])
+    self.assertEqual((stats['p50'], stats['p90'], stats['p99']),
+                     (51, 91, 100))
+
   def testExternalAndInternal(self):
     self._ConfigureIpTypes()
     vm_spec = mock.MagicMock(spec=benchmark_spec.BenchmarkSpec)
@@ -14,9 +14,14 @@
 
 """Tests for object storage service benchmark."""
 
+import os
+import shutil
+import struct
+import tempfile
 import time
 import unittest
 import mock
+import numpy as np
 
 from perfkitbenchmarker.linux_benchmarks import object_storage_service_benchmark
 from tests import mock_flags
@@ -24,13 +29,14 @@ from tests import mock_flags
 
 class TestBuildCommands(unittest.TestCase):
   def setUp(self):
-    mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self.mocked_flags = mocked_flags = mock_flags.PatchTestCaseFlags(self)
 
     mocked_flags.object_storage_multistream_objects_per_stream = 100
     mocked_flags.object_storage_object_sizes = {'1KB': '100%'}
     mocked_flags.object_storage_streams_per_vm = 1
     mocked_flags.num_vms = 1
     mocked_flags.object_storage_object_naming_scheme = 'sequential_by_stream'
+    mocked_flags.temp_dir = '/tmp'
 
   def testBuildCommands(self):
     vm = mock.MagicMock()
@@ -43,7 +49,8 @@ class TestBuildCommands(unittest.TestCase):
       with mock.patch(object_storage_service_benchmark.__name__ +
                       '._ProcessMultiStreamResults'):
         with mock.patch(object_storage_service_benchmark.__name__ +
-                        '.LoadWorkerOutput', return_value=(None, None, None)):
+                        '.LoadColumnarWorkerOutput',
+                        return_value=(None, None, None)):
           object_storage_service_benchmark.MultiStreamRWBenchmark(
               [], {}, [vm], command_builder, service, 'bucket')
 
@@ -54,6 +61,7 @@ class TestBuildCommands(unittest.TestCase):
                    '--num_streams=1',
                    '--start_time=16.1',
                    '--objects_written_file=/tmp/pkb/pkb-objects-written',
+                   '--results_file=/tmp/pkb/pkb-multistream-results',
                    '--object_sizes="{1000: 100.0}"',
                    '--object_naming_scheme=sequential_by_stream',
                    '--scenario=MultiStreamWrite',
@@ -66,9 +74,131 @@ class TestBuildCommands(unittest.TestCase):
                    '--num_streams=1',
                    '--start_time=16.1',
                    '--objects_written_file=/tmp/pkb/pkb-objects-written',
+                   '--results_file=/tmp/pkb/pkb-multistream-results',
                    '--scenario=MultiStreamRead',
                    '--stream_num_start=0']))
 
+  def testBuildCommandsWithStreamsPerProcess(self):
+    self.mocked_flags.object_storage_streams_per_process = 5
+    self.mocked_flags.object_storage_parallel_part_size = 8388608
+    vm = mock.MagicMock()
+    vm.RobustRemoteCommand = mock.MagicMock(return_value=('', ''))
+    command_builder = mock.MagicMock()
+
+    with mock.patch(time.__name__ + '.time', return_value=1.0):
+      with mock.patch(object_storage_service_benchmark.__name__ +
+                      '._ProcessMultiStreamResults'):
+        with mock.patch(object_storage_service_benchmark.__name__ +
+                        '.LoadColumnarWorkerOutput',
+                        return_value=(None, None, None)):
+          object_storage_service_benchmark.MultiStreamWriteBenchmark(
+              [], {}, [vm], command_builder, mock.MagicMock(), 'bucket')
+
+    self.assertEqual(
+        command_builder.BuildCommand.call_args_list[0][0][0][6:8],
+        ['--streams_per_process=5', '--parallel_part_size=8388608'])
+
+  def testWorkerOutputKeepsResultsFiles(self):
+    self.mocked_flags.object_storage_worker_output = '/out/worker'
+    vms = [mock.MagicMock(), mock.MagicMock()]
+    for vm in vms:
+      vm.RobustRemoteCommand = mock.MagicMock(return_value=('', ''))
+
+    with mock.patch(time.__name__ + '.time', return_value=1.0):
+      with mock.patch(object_storage_service_benchmark.__name__ +
+                      '._ProcessMultiStreamResults'):
+        with mock.patch(object_storage_service_benchmark.__name__ +
+                        '.LoadColumnarWorkerOutput',
+                        return_value=(None, None, None)) as mock_load:
+          object_storage_service_benchmark.MultiStreamWriteBenchmark(
+              [], {}, vms, mock.MagicMock(), mock.MagicMock(), 'bucket')
+
+    for idx, vm in enumerate(vms):
+      vm.PullFile.assert_called_once_with(
+          '/out/worker-vm%s' % idx, '/tmp/pkb/pkb-multistream-results')
+    mock_load.assert_called_once_with(['/out/worker-vm0', '/out/worker-vm1'])
+
+
+def _WriteColumnarResults(path, streams):
+  """Writes (stream_num, start_times, latencies, sizes) in columnar format."""
+  with open(path, 'wb') as out:
+    out.write(struct.pack('<8sQ', 'PKBOSC01', len(streams)))
+    for stream_num, start_times, _, _ in streams:
+      out.write(struct.pack('<qq', stream_num, len(start_times)))
+    for column, code in ((1, 'd'), (2, 'd'), (3, 'q')):
+      for stream in streams:
+        out.write(struct.pack('<%d%s' % (len(stream[column]), code),
+                              *stream[column]))
+
+
+class TestLoadColumnarWorkerOutput(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+
+  def testLoad(self):
+    path1 = os.path.join(self.temp_dir, 'vm0')
+    path2 = os.path.join(self.temp_dir, 'vm1')
+    _WriteColumnarResults(path1, [(0, [1.0, 2.0], [0.5, 0.25], [10, 20]),
+                                  (1, [1.5], [0.75], [30])])
+    _WriteColumnarResults(path2, [(2, [], [], [])])
+
+    start_times, latencies, sizes = (
+        object_storage_service_benchmark.LoadColumnarWorkerOutput(
+            [path1, path2]))
+
+    self.assertEqual([[1.0, 2.0], [1.5], []],
+                     [s.tolist() for s in start_times])
+    self.assertEqual([[0.5, 0.25], [0.75], []],
+                     [l.tolist() for l in latencies])
+    self.assertEqual([[10, 20], [30], []], [s.tolist() for s in sizes])
+
+  def testBadMagic(self):
+    path = os.path.join(self.temp_dir, 'vm0')
+    with open(path, 'wb') as out:
+      out.write(struct.pack('<8sQ', 'NOTMAGIC', 0))
+    with self.assertRaises(ValueError):
+      object_storage_service_benchmark.LoadColumnarWorkerOutput([path])
+
+
+class TestProcessMultiStreamResults(unittest.TestCase):
+
+  def setUp(self):
+    mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    mocked_flags.object_storage_streams_per_vm = 2
+    mocked_flags.num_vms = 1
+    mocked_flags.object_storage_multistream_objects_per_stream = 4
+    mocked_flags.object_storage_object_naming_scheme = 'sequential_by_stream'
+    mocked_flags.object_storage_latency_histogram_interval = 0.5
+
+  def testActiveWindowAndHistogram(self):
+    # Stream 0 runs from 0 to 4 and stream 1 from 1 to 5, so both are active
+    # from 1 to 4.
+    start_times = [np.array([0.0, 1.0, 2.0, 3.0]),
+                   np.array([1.0, 2.0, 3.0, 4.0])]
+    latencies = [np.array([1.0, 1.0, 0.5, 1.0]),
+                 np.array([1.0, 1.0, 1.0, 1.0])]
+    sizes = [np.array([1, 2, 1, 2]), np.array([2, 2, 1, 2])]
+    results = []
+
+    object_storage_service_benchmark._ProcessMultiStreamResults(
+        start_times, latencies, sizes, 'upload', [1, 2], results)
+
+    samples = {(s.metric, s.metadata['object_size_B']): s for s in results}
+    # Three operations from each stream finish while both are active.
+    self.assertEqual(
+        2.0, samples[('Multi-stream upload QPS (all streams active)',
+                      'distribution')].value)
+    self.assertEqual(
+        0.5, samples[('Multi-stream upload latency p0.1', 1)].value)
+    self.assertEqual(
+        1.0, samples[('Multi-stream upload latency p0.1', 2)].value)
+    histograms = {
+        s.metadata['object_size_B']: s.metadata['histogram'] for s in results
+        if s.metric == 'Multi-stream upload latency histogram'}
+    self.assertEqual({1: '0,1,2', 2: '0,0,5'}, histograms)
+
 
 class TestDistributionToBackendFormat(unittest.TestCase):
   def testPointDistribution(self):
@@ -50,6 +50,16 @@ class DstatTestCase(unittest.TestCase):
         'majpf__virtual memory', 'minpf__virtual memory',
         'alloc__virtual memory', 'free__virtual memory'], labels)
 
+  def testIterDstatFile(self):
+    path = os.path.join(os.path.dirname(__file__), '..', 'data',
+                        'dstat-result.csv')
+    with open(path) as f:
+      labels, out = dstat.ParseCsvFile(iter(f))
+    with open(path) as f:
+      iter_labels, rows = dstat.IterCsvFile(f)
+      self.assertEqual(labels, iter_labels)
+      self.assertEqual(out.tolist(), [row.tolist() for row in rows])
+
 
 if __name__ == '__main__':
   unittest.main()
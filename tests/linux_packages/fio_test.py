@@ -15,6 +15,7 @@
 
 import json
 import os
+import tempfile
 import unittest
 
 import mock
@@ -22,6 +23,7 @@ import mock
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import test_util
 from perfkitbenchmarker.linux_packages import fio
+from tests import mock_flags
 
 
 class FioTestCase(unittest.TestCase, test_util.SamplesTestMixin):
@@ -427,6 +429,44 @@ class FioTestCase(unittest.TestCase, test_util.SamplesTestMixin):
             fio.DeleteParameterFromJobFile(original_job_file, 'directory'),
             'filename'))
 
+  def testParseHistogram(self):
+    with tempfile.NamedTemporaryFile(suffix='.log') as log:
+      log.write('1000, 0, 4096, 1, 0, 2\n'
+                '2000, 0, 4096, 0, 3, 1\n'
+                '2000, 1, 4096, 0, 0, 5\n')
+      log.flush()
+      samples = fio._ParseHistogram(log.name, [10.5, 20.5, 40.5], 'job',
+                                    {'key': 'value'})
+    histograms = {s.metric: json.loads(s.metadata['histogram'])
+                  for s in samples}
+    self.assertEqual(
+        {'job:4096:read:histogram': {'10.5': 1, '20.5': 3, '40.5': 3},
+         'job:4096:write:histogram': {'40.5': 5}},
+        histograms)
+    self.assertEqual('value', samples[0].metadata['key'])
+
+  def testParseBandwidthSteadyState(self):
+    with mock_flags.PatchFlags() as mocked_flags:
+      mocked_flags.steady_state_window = 3
+      mocked_flags.steady_state_max_cv = 0.05
+      with tempfile.NamedTemporaryFile(suffix='.log') as log:
+        for i, bw in enumerate([100, 300, 500] + [1000, 1010, 990, 1000] * 2):
+          log.write('%d, %d, 0, 4096\n' % (500 * (i + 1), bw))
+        log.write('500, 70, 1, 4096\n')
+        log.flush()
+        samples = fio._ParseBandwidthSteadyState(log.name, 500, 'job',
+                                                 {'key': 'value'})
+    by_metric = {s.metric: s for s in samples}
+    self.assertEqual(1.5,
+                     by_metric['job:read:bandwidth steady state start'].value)
+    self.assertEqual(
+        1000.0, by_metric['job:read:bandwidth steady state average'].value)
+    self.assertEqual('KB/s',
+                     by_metric['job:read:bandwidth steady state average'].unit)
+    # Too few write intervals to find a steady state.
+    self.assertNotIn('job:write:bandwidth steady state average', by_metric)
+    self.assertEqual('value', samples[0].metadata['key'])
+
 
 if __name__ == '__main__':
   unittest.main()
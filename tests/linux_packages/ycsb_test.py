@@ -17,8 +17,11 @@ import copy
 import os
 import unittest
 
+import mock
 
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker.linux_packages import ycsb
+from tests import mock_flags
 
 
 class SimpleResultParserTestCase(unittest.TestCase):
@@ -108,31 +111,113 @@ class DetailedResultParserTestCase(unittest.TestCase):
     self.assertEqual(7, percentiles['p99'])
 
 
-class WeightedQuantileTestCase(unittest.TestCase):
+class IncrementalResultParserTestCase(unittest.TestCase):
 
-  def testEvenlyWeightedSamples(self):
-    x = range(1, 101)  # 1-100
-    weights = [1 for _ in x]
-    self.assertEqual(50, ycsb._WeightedQuantile(x, weights, 0.50))
-    self.assertEqual(75, ycsb._WeightedQuantile(x, weights, 0.75))
-    self.assertEqual(90, ycsb._WeightedQuantile(x, weights, 0.90))
-    self.assertEqual(95, ycsb._WeightedQuantile(x, weights, 0.95))
-    self.assertEqual(99, ycsb._WeightedQuantile(x, weights, 0.99))
-    self.assertEqual(100, ycsb._WeightedQuantile(x, weights, 1))
-
-  def testLowWeight(self):
-    x = [1, 4]
-    weights = [99, 1]
-    for i in xrange(100):
-      self.assertEqual(1, ycsb._WeightedQuantile(x, weights, i / 100.0))
-    self.assertEqual(4, ycsb._WeightedQuantile(x, weights, 0.995))
+  def setUp(self):
+    path = os.path.join(os.path.dirname(__file__), '..', 'data',
+                        'ycsb-test-run.dat')
+    with open(path) as fp:
+      self.lines = fp.readlines()
+    self.statuses = []
+    self.parser = ycsb.IncrementalResultParser(
+        status_callback=self.statuses.append)
+
+  def testMatchesParseResults(self):
+    for line in self.lines:
+      self.parser.Feed(line)
+    self.assertEqual(ycsb.ParseResults(''.join(self.lines)),
+                     self.parser.GetResult())
+
+  def testStatusLinesParsed(self):
+    self.parser.Feed('Loading workload...\n')
+    self.parser.Feed('2016-09-29 10:53:57:447 10 sec: 11634 operations; '
+                     '1163.28 current ops/sec; est completion in 14 minutes '
+                     '[READ AverageLatency(us)=431.06] '
+                     '[UPDATE AverageLatency(us)=410.5]\n')
+    self.parser.Feed('2016-09-29 10:54:07:447 20 sec: 23000 operations; '
+                     '1136.6 current ops/sec; [READ: Count=5, Max=900, '
+                     'Min=100, Avg=500.5, 90=800]\n')
+    self.assertEqual(
+        [ycsb.YcsbStatus(10, 11634, 1163.28,
+                         {'read': 0.43106, 'update': 0.4105}),
+         ycsb.YcsbStatus(20, 23000, 1136.6, {'read': 0.5005})],
+        self.statuses)
+
+  def testPartialResults(self):
+    with self.assertRaises(IOError):
+      self.parser.GetResult()
+    for line in self.lines[:6]:
+      self.parser.Feed(line)
+    result = self.parser.GetResult()
+    self.assertEqual(['overall', 'update'], result['groups'].keys())
+    self.assertEqual(
+        {'Operations': 531, 'AverageLatency(ms)': .0659774011299435},
+        result['groups']['update']['statistics'])
+
+
+class RunTestCase(unittest.TestCase):
 
-  def testMidWeight(self):
-    x = [0, 1.2, 4]
-    weights = [1, 98, 1]
-    for i in xrange(2, 99):
-      self.assertAlmostEqual(1.2, ycsb._WeightedQuantile(x, weights, i / 100.0))
-    self.assertEqual(4, ycsb._WeightedQuantile(x, weights, 0.995))
+  def setUp(self):
+    self.flags = mock_flags.PatchTestCaseFlags(self)
+    self.flags.ycsb_run_parameters = []
+    self.flags.ycsb_status_interval = 5
+    path = os.path.join(os.path.dirname(__file__), '..', 'data',
+                        'ycsb-test-run.dat')
+    with open(path) as fp:
+      self.lines = fp.readlines()
+    self.lines.insert(2, '2016-09-29 10:53:57:447 5 sec: 100 operations; '
+                      '20 current ops/sec; [UPDATE AverageLatency(us)=50]\n')
+    self.vm = mock.Mock()
+
+    def RobustRemoteCommand(command, line_callback=None):
+      for line in self.lines:
+        line_callback(line)
+      return '', ''
+    self.vm.RobustRemoteCommand.side_effect = RobustRemoteCommand
+
+  def testRunStreamsOutput(self):
+    statuses = []
+    executor = ycsb.YCSBExecutor('basic')
+    result = executor._Run(self.vm, status_callback=statuses.append)
+    command = self.vm.RobustRemoteCommand.call_args[0][0]
+    self.assertIn('-p status.interval=5', command)
+    self.assertTrue(command.endswith(' -s 2>&1'))
+    self.assertEqual([ycsb.YcsbStatus(5, 100, 20.0, {'update': 0.05})],
+                     statuses)
+    self.assertEqual(ycsb.ParseResults(''.join(self.lines)), result)
+
+  def testStatusDisabled(self):
+    self.flags.ycsb_status_interval = 0
+    executor = ycsb.YCSBExecutor('basic')
+    executor._Run(self.vm, status_callback=mock.Mock())
+    command = self.vm.RobustRemoteCommand.call_args[0][0]
+    self.assertNotIn('status.interval', command)
+    self.assertNotIn(' -s', command)
+
+  def testCreateSteadyStateSamples(self):
+    self.flags.steady_state_window = 3
+    self.flags.steady_state_max_cv = 0.05
+    # Two client VMs, both steady after their first status report.
+    statuses = [ycsb.YcsbStatus(5 * (i + 1), 0, throughput, {})
+                for i, throughput in enumerate([10.0, 50.0, 51.0, 49.0, 50.0])]
+    statuses += statuses
+    statuses.append(ycsb.YcsbStatus(30, 0, None, {}))
+    samples = ycsb._CreateSteadyStateSamples(statuses, clients=2)
+    by_metric = {s.metric.replace('overall rolling Throughput ', ''): s
+                 for s in samples}
+    self.assertEqual(100.0, by_metric['steady state average'].value)
+    self.assertEqual(5, by_metric['steady state start'].value)
+    self.assertEqual(2, samples[0].metadata['clients'])
+
+  def testCreateStatusSamples(self):
+    samples = ycsb._CreateStatusSamples(
+        ycsb.YcsbStatus(5, 100, 20.0, {'update': 0.05}), result_index=1)
+    self.assertEqual(
+        [('overall rolling Throughput', 20.0, 'ops/sec'),
+         ('update rolling AverageLatency', 0.05, 'ms')],
+        [(s.metric, s.value, s.unit) for s in samples])
+    self.assertEqual({'result_index': 1, 'elapsed_sec': 5, 'operations': 100},
+                     samples[0].metadata)
 
 
 class ParseWorkloadTestCase(unittest.TestCase):
@@ -214,6 +299,27 @@ class CombineResultsTestCase(unittest.TestCase):
     self.assertEqual({'Operations': 196, 'Return=0': 194, 'Return=-1': 2},
                      read_stats)
 
+  def testHistogramsCombined(self):
+    r1 = {
+        'client': '',
+        'command_line': '',
+        'groups': {
+            'read': {
+                'group': 'read',
+                'statistics': {},
+                'histogram': histogram.Histogram.FromPairs([(0, 5), (3, 1)])
+            }
+        }
+    }
+    r2 = copy.deepcopy(r1)
+    r2['groups']['read']['histogram'] = histogram.Histogram.FromPairs(
+        [(1, 2), (3, 4), (10, 1)])
+    combined = ycsb._CombineResults([r1, r2])
+    self.assertEqual([(0, 5), (1, 2), (3, 5), (10, 1)],
+                     combined['groups']['read']['histogram'])
+    # Inputs are not modified.
+    self.assertEqual([(0, 5), (3, 1)], r1['groups']['read']['histogram'])
+
   def testDropUnaggregatedFromSingleResult(self):
     r = {
         'client': '',
@@ -233,3 +339,50 @@ class CombineResultsTestCase(unittest.TestCase):
     self.assertEqual(r, r_copy)
     r['groups']['read']['statistics'] = {}
     self.assertEqual(r, combined)
+
+
+class SearchSaturationTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.flags = mock_flags.PatchTestCaseFlags(self)
+    self.flags.ycsb_threads_per_client = ['1', '64']
+    self.flags.ycsb_latency_slo_ms = 10.0
+
+  def _Result(self, threads):
+    # Latency grows with the thread count; throughput never saturates.
+    return {
+        'groups': {
+            'overall': {
+                'group': 'overall',
+                'statistics': {'Throughput(ops/sec)': 100.0 * threads},
+                'histogram': []
+            },
+            'read': {
+                'group': 'read',
+                'statistics': {},
+                'histogram': histogram.Histogram.FromPairs([(0, 98),
+                                                            (threads, 2)])
+            },
+            'update': {
+                'group': 'update',
+                'statistics': {},
+                'histogram': histogram.Histogram.FromPairs([(1, 100)])
+            }
+        }
+    }
+
+  def testGetP99LatencyMs(self):
+    self.assertEqual(7, ycsb._GetP99LatencyMs(self._Result(7)))
+    self.assertIsNone(ycsb._GetP99LatencyMs({'groups': {}}))
+
+  def testFindsMaxThroughputWithinSlo(self):
+    run_with_threads = mock.Mock(side_effect=self._Result)
+    samples = ycsb._SearchSaturation(run_with_threads, 2, {'workload': 'a'})
+    self.assertEqual(1, len(samples))
+    self.assertEqual('overall max sustainable Throughput', samples[0].metric)
+    self.assertEqual(1000.0, samples[0].value)
+    self.assertEqual(10, samples[0].metadata['threads_per_client_vm'])
+    self.assertEqual(20, samples[0].metadata['clients'])
+    self.assertEqual(10.0, samples[0].metadata['latency_slo_ms'])
+    self.assertEqual(run_with_threads.call_count,
+                     samples[0].metadata['search_runs'])
@@ -14,10 +14,14 @@
 
 """Tests for linux_virtual_machine.py"""
 
+import shutil
+import tempfile
 import unittest
 
 import mock
 
+from perfkitbenchmarker import install_planner
+from perfkitbenchmarker import linux_packages
 from perfkitbenchmarker import linux_virtual_machine
 from tests import mock_flags
 
@@ -100,5 +104,192 @@ class TestSysctl(unittest.TestCase):
         [])
 
 
+class TestSshConnectionReuse(unittest.TestCase):
+
+  def setUp(self):
+    self.mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self.mocked_flags.ssh_reuse_connections = True
+    self.mocked_flags.ssh_control_persist = 30
+    self.mocked_flags.ssh_options = []
+    self.mocked_flags.temp_dir = '/tmp/perfkitbenchmarker'
+    self.mocked_flags.run_uri = 'abcd1234'
+    p = mock.patch(linux_virtual_machine.vm_util.__name__ +
+                   '.RunningOnWindows', return_value=False)
+    p.start()
+    self.addCleanup(p.stop)
+    self.vm = LinuxVM()
+    self.vm.name = 'pkb-test-0'
+    self.vm.user_name = 'perfkit'
+    self.vm.ip_address = '1.2.3.4'
+    self.vm.ssh_private_key = 'key'
+
+  def testFirstCommandOpensConnection(self):
+    self.vm._RecordSshCommand(2.0)
+    self.vm._RecordSshCommand(0.5)
+    self.vm._RecordSshCommand(0.25)
+    self.assertEqual(self.vm.ssh_connection_setup_times, [2.0])
+    self.assertEqual(self.vm.num_multiplexed_ssh_commands, 2)
+    samples = {s.metric: s.value
+               for s in self.vm.GetRemoteConnectionSamples()}
+    self.assertEqual(samples, {'SSH Connection Setup Time': 2.0,
+                               'SSH Multiplexed Commands': 2,
+                               'SSH Handshake Time Saved': 3.5})
+
+  def testNoSamplesWithoutCommands(self):
+    self.assertEqual(self.vm.GetRemoteConnectionSamples(), [])
+
+  def testReuseDisabled(self):
+    self.mocked_flags.ssh_reuse_connections = False
+    self.vm._RecordSshCommand(2.0)
+    self.assertEqual(self.vm.GetRemoteConnectionSamples(), [])
+
+  def testCloseRemoteConnection(self):
+    with mock.patch(linux_virtual_machine.vm_util.__name__ +
+                    '.IssueCommand') as issue_command:
+      self.vm.CloseRemoteConnection()
+      self.assertFalse(issue_command.called)
+      self.vm._RecordSshCommand(2.0)
+      self.vm.CloseRemoteConnection()
+    cmd = issue_command.call_args[0][0]
+    self.assertEqual(cmd[:3], ['ssh', '-O', 'exit'])
+    self.assertIn('ControlMaster=auto', cmd)
+    self.assertIn(
+        'ControlPath=/tmp/perfkitbenchmarker/runs/abcd1234/ssh/%C', cmd)
+    # The next command opens a new master connection.
+    self.vm._RecordSshCommand(1.0)
+    self.assertEqual(self.vm.ssh_connection_setup_times, [2.0, 1.0])
+
+
+class TestRemoteAgentBackend(unittest.TestCase):
+
+  def setUp(self):
+    self.mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self.mocked_flags.remote_command_backend = 'agent'
+    self.vm = LinuxVM()
+    self.vm.name = 'pkb-test-0'
+    self.agent = mock.Mock()
+    self.agent.Run.return_value = ('out\n', '', 0)
+    self.vm._remote_agent = self.agent
+
+  def testRemoteCommand(self):
+    self.assertEqual(self.vm.RemoteCommand('echo out', timeout=5),
+                     ('out\n', ''))
+    self.agent.Run.assert_called_once_with(
+        'echo out', should_log=False, suppress_warning=False, timeout=5,
+        line_callback=None)
+
+  def testRemoteCommandFailure(self):
+    self.agent.Run.return_value = ('', 'err\n', 1)
+    with self.assertRaises(
+            linux_virtual_machine.errors.VirtualMachine.RemoteCommandError):
+      self.vm.RemoteCommand('false')
+    self.assertEqual(self.vm.RemoteCommand('false', ignore_failure=True),
+                     ('', 'err\n'))
+
+  def testRobustRemoteCommand(self):
+    self.vm.RobustRemoteCommand('echo out', should_log=True)
+    self.assertEqual(self.agent.Run.call_args[0], ('echo out',))
+    self.assertTrue(self.agent.Run.call_args[1]['should_log'])
+
+  def testLoginShellUsesSsh(self):
+    with mock.patch.object(self.vm, '_RemoteHostCommandOverSsh',
+                           return_value=('', '')) as over_ssh:
+      self.vm.RemoteCommand('echo out', login_shell=True)
+    self.assertTrue(over_ssh.called)
+    self.assertFalse(self.agent.Run.called)
+
+  def testCloseRemoteConnection(self):
+    self.vm.CloseRemoteConnection()
+    self.agent.Close.assert_called_once_with()
+    self.assertIsNone(self.vm._remote_agent)
+
+
+class DebianVM(linux_virtual_machine.DebianMixin):
+  pass
+
+
+class _FakePackage(object):
+
+  def __init__(self, os_packages, dependencies=()):
+    self.os_packages = os_packages
+    self.dependencies = dependencies
+
+  def AptInstall(self, vm):
+    for dependency in self.dependencies:
+      vm.Install(dependency)
+    vm.InstallPackages(self.os_packages)
+
+
+class TestBatchPackageInstalls(unittest.TestCase):
+
+  def setUp(self):
+    self.mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self.mocked_flags.batch_package_installs = True
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    planner = install_planner.InstallPlanner(temp_dir + '/plans.json')
+    p = mock.patch.object(install_planner, 'GetPlanner', return_value=planner)
+    p.start()
+    self.addCleanup(p.stop)
+    p = mock.patch.object(linux_packages, 'PACKAGES', {
+        'app': _FakePackage('curl libapp', ['runtime']),
+        'runtime': _FakePackage('libruntime curl')})
+    p.start()
+    self.addCleanup(p.stop)
+
+  def _InstallOnNewVm(self, package_name):
+    vm = DebianVM()
+    vm.install_packages = True
+    vm.name = 'pkb-test-0'
+    with mock.patch.object(vm, 'RemoteCommand') as remote_command:
+      vm.Install(package_name)
+    return vm, [c[0][0] for c in remote_command.call_args_list]
+
+  def testFirstInstallRecordsPlan(self):
+    vm, commands = self._InstallOnNewVm('app')
+    installs = [c for c in commands if 'apt-get -y install' in c]
+    # curl is installed once, by runtime.
+    self.assertEqual(2, len(installs))
+    self.assertTrue(installs[0].endswith('install libruntime curl'))
+    self.assertTrue(installs[1].endswith('install libapp'))
+    self.assertEqual(
+        install_planner.PackageRecord(['runtime'], ['curl', 'libapp']),
+        install_planner.GetPlanner().GetRecord(vm.OS_TYPE, 'app'))
+    self.assertEqual(['runtime', 'app'],
+                     [s.metadata['package']
+                      for s in vm.GetPackageInstallSamples()])
+
+  def testLaterInstallBatchesOsPackages(self):
+    self._InstallOnNewVm('app')
+    _, commands = self._InstallOnNewVm('app')
+    installs = [c for c in commands if 'apt-get -y install' in c]
+    self.assertEqual(1, len(installs))
+    self.assertTrue(installs[0].endswith('install libruntime curl libapp'))
+
+  def testBatchFailureFallsBack(self):
+    self._InstallOnNewVm('app')
+    vm = DebianVM()
+    vm.install_packages = True
+    error = linux_virtual_machine.errors.VirtualMachine.RemoteCommandError
+    with mock.patch.object(vm, 'RemoteCommand',
+                           side_effect=[None, error('failed'), None, None,
+                                        None]) as remote_command:
+      vm.Install('app')
+    installs = [c[0][0] for c in remote_command.call_args_list
+                if 'apt-get -y install' in c[0][0]]
+    self.assertEqual(3, len(installs))
+
+
 if __name__ == '__main__':
   unittest.main()
+
+
+class TestFollowedLineFilter(unittest.TestCase):
+
+  def testRetriedLinesDeliveredOnce(self):
+    lines = []
+    line_filter = linux_virtual_machine._FollowedLineFilter(lines.append)
+    marker = linux_virtual_machine.FOLLOW_START_MARKER
+    for line in [marker, 'a\n', 'b\n', marker, 'a\n', 'b\n', 'c\n', 'd']:
+      line_filter(line)
+    self.assertEqual(['a\n', 'b\n', 'c\n', 'd'], lines)
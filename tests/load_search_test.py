@@ -0,0 +1,90 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.load_search."""
+
+import unittest
+
+from perfkitbenchmarker import load_search
+
+
+def _ClosedLoopModel(load, capacity=1000.0, service_time=1.0):
+  """Models a server that saturates at 'capacity' operations per second."""
+  throughput = min(load / service_time * 1000, capacity)
+  # Little's law: latency (ms) = concurrency / throughput.
+  latency = load / throughput * 1000
+  return load_search.LoadMeasurement(load, throughput, latency, 0.0, None)
+
+
+class SaturationSearchTestCase(unittest.TestCase):
+
+  def testStopsWhenThroughputSaturates(self):
+    search = load_search.SaturationSearch(
+        lambda load: _ClosedLoopModel(load, service_time=10.0),
+        max_load=1024)
+    best = search.Run()
+    # Saturates at 10 concurrent operations, which 32 confirms.
+    self.assertEqual([1, 2, 4, 8, 16, 32],
+                     [m.load for m in search.measurements])
+    self.assertEqual(1000.0, best.throughput)
+
+  def testBisectsLatencySlo(self):
+    search = load_search.SaturationSearch(
+        lambda load: load_search.LoadMeasurement(load, 10.0 * load, load, 0.0,
+                                                 None),
+        max_load=1024, latency_slo=20.0)
+    best = search.Run()
+    # Latency equals the load, so the SLO allows loads up to 20.
+    self.assertEqual([1, 2, 4, 8, 16, 32, 24, 20, 22],
+                     [m.load for m in search.measurements])
+    self.assertEqual(20, best.load)
+    self.assertLess(len(search.measurements), 20)
+
+  def testStopsAtMaxLoad(self):
+    search = load_search.SaturationSearch(
+        lambda load: load_search.LoadMeasurement(load, load, None, None, None),
+        max_load=6)
+    best = search.Run()
+    self.assertEqual([1, 2, 4, 6], [m.load for m in search.measurements])
+    self.assertEqual(6, best.load)
+
+  def testErrorRateSlo(self):
+    search = load_search.SaturationSearch(
+        lambda load: load_search.LoadMeasurement(
+            load, load, None, 0.0 if load <= 5 else 0.5, None),
+        max_load=64, max_error_rate=0.01)
+    self.assertEqual(5, search.Run().load)
+
+  def testNoLoadMeetsSlo(self):
+    search = load_search.SaturationSearch(
+        lambda load: load_search.LoadMeasurement(load, load, 100.0, None, None),
+        max_load=64, latency_slo=1.0)
+    self.assertIsNone(search.Run())
+    self.assertEqual(1, len(search.measurements))
+
+  def testMissingLatencyViolatesSlo(self):
+    search = load_search.SaturationSearch(lambda load: None, max_load=1,
+                                          latency_slo=1.0)
+    self.assertFalse(search.MeetsSlo(
+        load_search.LoadMeasurement(1, 1.0, None, None, None)))
+
+  def testInvalidBounds(self):
+    with self.assertRaises(ValueError):
+      load_search.SaturationSearch(lambda load: None, min_load=4, max_load=2)
+    with self.assertRaises(ValueError):
+      load_search.SaturationSearch(lambda load: None, max_load=2,
+                                   growth_factor=1)
+
+
+if __name__ == '__main__':
+  unittest.main()
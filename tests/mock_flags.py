@@ -17,11 +17,27 @@ import contextlib
 
 from perfkitbenchmarker import flag_util
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import module_index
 
 
 FLAGS = flags.FLAGS
 
 
+_modules_loaded = False
+
+
+def _LoadModules():
+  """Imports the modules that PKB otherwise imports on demand.
+
+  Flags cannot be defined while FLAGS is patched, so modules that define flags
+  must be imported before patching it.
+  """
+  global _modules_loaded
+  if not _modules_loaded:
+    module_index.LoadModules()
+    _modules_loaded = True
+
+
 class _MockFlag(object):
   """Mock version of a Flag object.
 
@@ -126,6 +142,7 @@ def PatchFlags(mock_flags=None):
   Yields:
     MockFlags. Either mock_flags or the newly created MockFlags value.
   """
+  _LoadModules()
   mock_flags = mock_flags or MockFlags()
   with flag_util.FlagDictSubstitution(FLAGS, mock_flags.FlagDict):
     yield mock_flags
@@ -144,6 +161,7 @@ def PatchTestCaseFlags(testcase):
   Returns:
     MockFlags. The mocked FlagValues object.
   """
+  _LoadModules()
   mock_flags = MockFlags()
   substitution = flag_util.FlagDictSubstitution(FLAGS, mock_flags.FlagDict)
   substitution.__enter__()
@@ -0,0 +1,105 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.module_index."""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import mock
+
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import module_index
+
+_INDEX = {
+    'registries': {},
+    'flags': {
+        'fio_target': 'perfkitbenchmarker.linux_benchmarks.fio_benchmark',
+        'dstat': 'perfkitbenchmarker.traces.dstat',
+        'ycsb_client_vms': 'perfkitbenchmarker.linux_benchmarks.ycsb',
+    },
+}
+
+
+class ModuleIndexTestCase(unittest.TestCase):
+
+  def testIndexIsUpToDate(self):
+    # The index is built in a new process, so that it is not affected by the
+    # modules the tests import.
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import json, sys\n'
+        'from perfkitbenchmarker import module_index\n'
+        'json.dump(module_index.BuildIndex(), sys.stdout)\n'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    self.assertEqual(
+        json.loads(output), module_index.GetIndex(),
+        'The module index is out of date. Regenerate it with: '
+        'python -m perfkitbenchmarker.module_index')
+
+  def testWriteIndex(self):
+    with tempfile.NamedTemporaryFile() as index_file:
+      module_index.WriteIndex(_INDEX, index_file.name)
+      self.assertEqual(_INDEX, json.load(index_file))
+
+
+class LoadModulesForArgvTestCase(unittest.TestCase):
+
+  def setUp(self):
+    p = mock.patch.object(module_index, 'GetIndex', return_value=_INDEX)
+    p.start()
+    self.addCleanup(p.stop)
+    p = mock.patch.object(module_index.importlib, 'import_module')
+    self.import_module = p.start()
+    self.addCleanup(p.stop)
+    self.flag_values = flags.FlagValues()
+    flags.DEFINE_string('ycsb_client_vms', None, 'Defined.',
+                        flag_values=self.flag_values)
+
+  def _GetImportedModules(self):
+    return sorted(c[0][0] for c in self.import_module.call_args_list)
+
+  def testImportsFlagModules(self):
+    module_index.LoadModulesForArgv(
+        ['pkb.py', '--fio_target=/dev/sdb', '-nodstat', '--ycsb_client_vms',
+         '2', '--unknown_flag', 'positional'], self.flag_values)
+    self.assertEqual(['perfkitbenchmarker.linux_benchmarks.fio_benchmark',
+                      'perfkitbenchmarker.traces.dstat'],
+                     self._GetImportedModules())
+
+  def testStopsAtDoubleDash(self):
+    module_index.LoadModulesForArgv(['pkb.py', '--', '--fio_target=/dev/sdb'],
+                                    self.flag_values)
+    self.assertEqual([], self._GetImportedModules())
+
+  def testFlagfile(self):
+    with tempfile.NamedTemporaryFile() as flagfile:
+      flagfile.write('--dstat\n')
+      flagfile.flush()
+      module_index.LoadModulesForArgv(
+          ['pkb.py', '--flagfile=' + flagfile.name], self.flag_values)
+    self.assertEqual(['perfkitbenchmarker.traces.dstat'],
+                     self._GetImportedModules())
+
+  def testLoadModulesMatching(self):
+    module_index.LoadModules('benchmarks.fio')
+    self.assertEqual(['perfkitbenchmarker.linux_benchmarks.fio_benchmark'],
+                     self._GetImportedModules())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,214 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.poll_coordinator."""
+
+import threading
+import time
+import unittest
+
+import mock
+
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import poll_coordinator
+from perfkitbenchmarker import resource
+from tests import mock_flags
+
+
+class _CountdownChecker(object):
+  """Reports each item ready after it was checked a number of times."""
+
+  def __init__(self, polls_until_ready):
+    self.polls_until_ready = dict(polls_until_ready)
+    self.batches = []
+    self.poll_times = []
+
+  def __call__(self, items):
+    self.batches.append(sorted(items))
+    self.poll_times.append(time.time())
+    for item in items:
+      self.polls_until_ready[item] -= 1
+    return [item for item in items if self.polls_until_ready[item] <= 0]
+
+
+def _WaitConcurrently(function, items):
+  """Calls function with each item from its own thread.
+
+  Returns:
+    dict mapping each item to the exception it raised, or to None.
+  """
+  results = {}
+
+  def _Wait(item):
+    try:
+      function(item)
+      results[item] = None
+    except Exception as e:  # pylint: disable=broad-except
+      results[item] = e
+  threads = [threading.Thread(target=_Wait, args=(item,)) for item in items]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return results
+
+
+class PollCoordinatorTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self.mocked_flags.readiness_poll_min_interval = 0.01
+    self.mocked_flags.readiness_poll_max_interval = 0.04
+    self.mocked_flags.readiness_poll_backoff = 2.0
+    self.coordinator = poll_coordinator.PollCoordinator()
+
+  def testItemsOfKeyArePolledTogether(self):
+    check = _CountdownChecker({'a': 1, 'b': 3, 'c': 3})
+    start = threading.Event()
+
+    def _Wait(item):
+      start.wait()
+      self.coordinator.WaitUntilReady(item, 'key', check, 'Item')
+    threads = [threading.Thread(target=_Wait, args=(item,)) for item in 'abc']
+    for thread in threads:
+      thread.start()
+    start.set()
+    for thread in threads:
+      thread.join()
+    self.assertTrue(any(len(batch) > 1 for batch in check.batches))
+    self.assertLess(len(check.batches), 7)
+    self.assertTrue(all(count <= 0
+                        for count in check.polls_until_ready.itervalues()))
+
+  def testBackoff(self):
+    check = _CountdownChecker({'a': 6})
+    self.coordinator.WaitUntilReady('a', 'a', check, 'Item')
+    intervals = [end - start for start, end in zip(check.poll_times,
+                                                   check.poll_times[1:])]
+    self.assertEqual(len(intervals), 5)
+    # 0.01, 0.02, 0.04, 0.04, 0.04 seconds, give or take the jitter.
+    self.assertLess(intervals[0], intervals[2])
+    self.assertGreaterEqual(intervals[0], 0.008)
+    self.assertGreaterEqual(min(intervals[2:]), 0.032)
+
+  def testTimeout(self):
+    check = _CountdownChecker({'a': 1000})
+    with self.assertRaises(errors.Resource.RetryableCreationError):
+      self.coordinator.WaitUntilReady('a', 'a', check, 'Item', timeout=0.1)
+
+  def testCheckErrorIsRetried(self):
+    check = _CountdownChecker({'a': 2, 'b': 2})
+    failures = []
+
+    def _FailOnce(items):
+      if not failures:
+        failures.append(items)
+        raise errors.VmUtil.CalledProcessException(sorted(items))
+      return check(items)
+    results = _WaitConcurrently(
+        lambda item: self.coordinator.WaitUntilReady(item, 'key', _FailOnce,
+                                                     'Item'), ['a', 'b'])
+    self.assertEqual(results, {'a': None, 'b': None})
+    self.assertEqual(len(failures), 1)
+
+  def testRepeatedCheckErrorIsRaisedForEachItem(self):
+    def _Fail(items):
+      time.sleep(0.01)
+      raise errors.Resource.RetryableCreationError(sorted(items))
+    with mock.patch(poll_coordinator.__name__ + '._MAX_CHECK_FAILURES', 3):
+      results = _WaitConcurrently(
+          lambda item: self.coordinator.WaitUntilReady(item, 'key', _Fail,
+                                                       'Item'), range(3))
+    for result in results.itervalues():
+      self.assertIsInstance(result, errors.Resource.RetryableCreationError)
+
+  def testOtherCheckErrorIsRaisedAtOnce(self):
+    checks = []
+
+    def _Fail(items):
+      checks.append(items)
+      raise ValueError(sorted(items))
+    start = time.time()
+    with self.assertRaises(ValueError):
+      self.coordinator.WaitUntilReady('a', 'key', _Fail, 'Item')
+    self.assertEqual(checks, [['a']])
+    self.assertLess(time.time() - start, 5)
+
+  def testSamples(self):
+    check = _CountdownChecker({'a': 2, 'b': 3})
+    _WaitConcurrently(
+        lambda item: self.coordinator.WaitUntilReady(item, item, check,
+                                                     'Item'), ['a', 'b'])
+    samples = {s.metric: s for s in self.coordinator.statistics.GetSamples()}
+    self.assertEqual(samples['Readiness Polls'].value, 5)
+    self.assertEqual(samples['Readiness Polls'].metadata,
+                     {'kind': 'Item', 'num_item_checks': 5, 'num_ready': 2})
+    self.assertIn('p50', samples['Readiness Wait Time'].metadata)
+    self.assertLess(samples['Readiness Detection Latency'].value,
+                    samples['Readiness Wait Time'].value)
+    self.coordinator.statistics.Reset()
+    self.assertEqual(self.coordinator.statistics.GetSamples(), [])
+
+
+class _Resource(resource.BaseResource):
+
+  checks = []
+
+  def _Create(self):
+    pass
+
+  def _Delete(self):
+    pass
+
+  @classmethod
+  def _AreReady(cls, resources):
+    cls.checks.append(len(resources))
+    return resources if len(cls.checks) > 1 else []
+
+
+class ResourceCreateTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self.mocked_flags.readiness_poll_min_interval = 0.2
+    self.mocked_flags.readiness_poll_max_interval = 0.2
+    self.mocked_flags.readiness_poll_backoff = 1.0
+    _Resource.checks = []
+
+  def testResourcesOfClassArePolledTogether(self):
+    resources = [_Resource() for _ in range(3)]
+    _WaitConcurrently(lambda r: r.Create(), resources)
+    self.assertGreater(max(_Resource.checks), 1)
+    self.assertTrue(all(r.created for r in resources))
+
+  def testHardReadinessErrorFailsCreateAtOnce(self):
+
+    class _FailedResource(resource.BaseResource):
+
+      def _Create(self):
+        pass
+
+      def _Delete(self):
+        pass
+
+      def _IsReady(self):
+        raise errors.Resource.CreationError('Terminated with errors.')
+
+    start = time.time()
+    with self.assertRaises(errors.Resource.CreationError):
+      _FailedResource().Create()
+    self.assertLess(time.time() - start, 5)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -19,6 +19,8 @@ import io
 import json
 import re
 import tempfile
+import threading
+import time
 import uuid
 import unittest
 
@@ -406,6 +408,117 @@ class CSVPublisherTestCase(unittest.TestCase):
     self.assertEqual(3, len(rows))
 
 
+class AsyncPublisherTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.wrapped = mock.MagicMock(spec=publisher.SamplePublisher)
+    p = mock.patch(time.__name__ + '.sleep')
+    self.mock_sleep = p.start()
+    self.addCleanup(p.stop)
+
+  def testPublishesInBackground(self):
+    instance = publisher.AsyncPublisher(self.wrapped)
+    instance.PublishSamples([{'metric': 'a'}])
+    instance.Flush()
+    self.wrapped.PublishSamples.assert_called_once_with([{'metric': 'a'}])
+    instance.Close()
+
+  def testCombinesQueuedBatches(self):
+    publishing = threading.Event()
+    release = threading.Event()
+
+    def BlockFirstPublish(samples):
+      if not publishing.is_set():
+        publishing.set()
+        release.wait()
+    self.wrapped.PublishSamples.side_effect = BlockFirstPublish
+    instance = publisher.AsyncPublisher(self.wrapped)
+    instance.PublishSamples([{'metric': 'a'}])
+    publishing.wait()
+    instance.PublishSamples([{'metric': 'b'}])
+    instance.PublishSamples([{'metric': 'c'}])
+    release.set()
+    instance.Close()
+    self.assertEqual(
+        [mock.call([{'metric': 'a'}]),
+         mock.call([{'metric': 'b'}, {'metric': 'c'}])],
+        self.wrapped.PublishSamples.call_args_list)
+
+  def testRetriesWithBackoff(self):
+    self.wrapped.PublishSamples.side_effect = [IOError(), IOError(), None]
+    instance = publisher.AsyncPublisher(self.wrapped, max_retries=3,
+                                        retry_interval=2)
+    instance.PublishSamples([{'metric': 'a'}])
+    instance.Close()
+    self.assertEqual(3, self.wrapped.PublishSamples.call_count)
+    self.assertEqual([mock.call(2), mock.call(4)],
+                     self.mock_sleep.call_args_list)
+
+  def testDropsBatchAfterRetries(self):
+    self.wrapped.PublishSamples.side_effect = [IOError(), IOError(), None]
+    instance = publisher.AsyncPublisher(self.wrapped, max_retries=1)
+    instance.PublishSamples([{'metric': 'a'}])
+    instance.Flush()
+    instance.PublishSamples([{'metric': 'b'}])
+    instance.Close()
+    self.assertEqual(
+        [mock.call([{'metric': 'a'}]), mock.call([{'metric': 'a'}]),
+         mock.call([{'metric': 'b'}])],
+        self.wrapped.PublishSamples.call_args_list)
+
+  def testSampleCollectorWrapsPublishers(self):
+    with mock.patch(publisher.__name__ + '.FLAGS') as mock_flags:
+      mock_flags.publish_async = True
+      mock_flags.publish_async_queue_size = 4
+      mock_flags.publish_async_retries = 0
+      collector = publisher.SampleCollector(
+          publishers=[self.wrapped], publishers_from_flags=False,
+          add_default_publishers=False)
+    self.assertIsInstance(collector.publishers[0], publisher.AsyncPublisher)
+    collector.samples = [{'metric': 'a'}]
+    collector.PublishSamples()
+    collector.Close()
+    self.wrapped.PublishSamples.assert_called_once_with([{'metric': 'a'}])
+
+  def testSampleCollectorOnlyRetriesRetryablePublishers(self):
+    publishers = [publisher.CloudStoragePublisher('bucket'),
+                  publisher.LogPublisher(),
+                  publisher.NewlineDelimitedJSONPublisher('results.json')]
+    with mock.patch(publisher.__name__ + '.FLAGS') as mock_flags:
+      mock_flags.publish_async = True
+      mock_flags.publish_async_queue_size = 4
+      mock_flags.publish_async_retries = 3
+      collector = publisher.SampleCollector(
+          publishers=publishers, publishers_from_flags=False,
+          add_default_publishers=False)
+    try:
+      retries = {type(p.publisher): p.max_retries
+                 for p in collector.publishers}
+    finally:
+      collector.Close()
+    self.assertEqual(
+        {publisher.CloudStoragePublisher: 3,
+         publisher.LogPublisher: 0,
+         publisher.NewlineDelimitedJSONPublisher: 0},
+        retries)
+
+  def testAppendingPublisherIsNotRetried(self):
+    with tempfile.NamedTemporaryFile() as tf:
+      json_publisher = publisher.NewlineDelimitedJSONPublisher(tf.name)
+      with mock.patch(publisher.__name__ + '.FLAGS') as mock_flags:
+        mock_flags.publish_async = True
+        mock_flags.publish_async_queue_size = 4
+        mock_flags.publish_async_retries = 3
+        collector = publisher.SampleCollector(
+            publishers=[json_publisher], publishers_from_flags=False,
+            add_default_publishers=False)
+      # The second sample cannot be serialized after the first was written.
+      collector.samples = [{'metric': 'a'}, {'metric': object()}]
+      collector.PublishSamples()
+      collector.Close()
+      self.assertEqual(1, len(tf.readlines()))
+
+
 class InfluxDBPublisherTestCase(unittest.TestCase):
   def setUp(self):
     self.db_name = 'test_db'
@@ -0,0 +1,147 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.remote_agent and scripts/remote_agent.py.
+
+The client connects to an agent running locally instead of over SSH.
+"""
+
+import os
+import pickle
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import remote_agent
+from tests import mock_flags
+
+_AGENT_SCRIPT_PATH = os.path.join(os.path.dirname(remote_agent.__file__),
+                                  'scripts', remote_agent.AGENT_SCRIPT)
+
+
+class RemoteAgentClientTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.mocked_flags = mock_flags.PatchTestCaseFlags(self)
+    self.mocked_flags.command_output_max_bytes = 1024 * 1024
+    self.mocked_flags.remote_agent_reconnect_attempts = 2
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.connect_command = [
+        sys.executable, _AGENT_SCRIPT_PATH, 'connect',
+        '--socket', os.path.join(self.directory, 'agent.sock'),
+        '--directory', os.path.join(self.directory, 'spool'),
+        '--idle_timeout', '10']
+    self.client = remote_agent.RemoteAgentClient('vm', self.connect_command)
+    self.addCleanup(self.client.Close)
+
+  def testRun(self):
+    self.assertEqual(self.client.Run('echo out; echo err >&2; exit 3'),
+                     ('out\n', 'err\n', 3))
+    # Released commands leave no output behind. Releases aren't waited for.
+    spool = os.path.join(self.directory, 'spool')
+    deadline = time.time() + 5
+    while os.listdir(spool) and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertEqual(os.listdir(spool), [])
+
+  def testCommandsShareConnection(self):
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda i=i: results.append(self.client.Run('echo %d' % i)))
+        for i in range(10)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertItemsEqual(results, [('%d\n' % i, '', 0) for i in range(10)])
+    self.assertEqual(self.client.num_connections, 1)
+
+  def testLineCallback(self):
+    lines = []
+    result = self.client.Run('printf "a\\nbc\\nd"', line_callback=lines.append)
+    self.assertEqual(result, ('', '', 0))
+    self.assertEqual(lines, ['a\n', 'bc\n', 'd'])
+
+  def testTimeout(self):
+    start = time.time()
+    self.assertEqual(self.client.Run('sleep 10', timeout=0.2)[2], -9)
+    self.assertLess(time.time() - start, 5)
+
+  def testBackgroundCommand(self):
+    # Under sh, e.g. dash, "&>" doesn't redirect, so the background command
+    # would keep the output open and delay the exit status.
+    start = time.time()
+    stdout, _, returncode = self.client.Run('sleep 5 &> /dev/null & echo $!')
+    self.assertLess(time.time() - start, 4)
+    self.assertEqual(returncode, 0)
+    os.kill(int(stdout), signal.SIGKILL)
+
+  def testTimeoutOfConcurrentCommands(self):
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(self.client.Run('sleep 10',
+                                                          timeout=0.2)))
+        for _ in range(3)]
+    start = time.time()
+    for thread in threads:
+      thread.start()
+    result = self.client.Run('sleep 0.5; echo done', timeout=5)
+    for thread in threads:
+      thread.join()
+    self.assertEqual(result, ('done\n', '', 0))
+    self.assertEqual([returncode for _, _, returncode in results], [-9] * 3)
+    self.assertLess(time.time() - start, 5)
+
+  def testCommandThatCannotStart(self):
+    # Longer than the kernel allows a single argument to be.
+    with self.assertRaisesRegexp(errors.VirtualMachine.RemoteCommandError,
+                                 'Could not start the command'):
+      self.client.Run('echo ' + 'x' * 256 * 1024)
+    # The connection is still usable.
+    self.assertEqual(self.client.Run('echo hi'), ('hi\n', '', 0))
+    self.assertEqual(self.client.num_connections, 1)
+
+  def testCommandSurvivesDroppedConnection(self):
+    def _DropConnection():
+      time.sleep(0.5)
+      self.client._channel.kill()
+    dropper = threading.Thread(target=_DropConnection)
+    dropper.start()
+    result = self.client.Run('echo a; sleep 1; echo b')
+    dropper.join()
+    self.assertEqual(result, ('a\nb\n', '', 0))
+    self.assertEqual(self.client.num_connections, 2)
+
+  def testUnreachableAgent(self):
+    self.mocked_flags.remote_agent_reconnect_attempts = 0
+    client = remote_agent.RemoteAgentClient('vm', ['false'])
+    with self.assertRaises(errors.VirtualMachine.RemoteCommandError):
+      client.Run('true')
+
+  def testPickle(self):
+    self.client.Run('true')
+    client = pickle.loads(pickle.dumps(self.client))
+    self.addCleanup(client.Close)
+    self.assertEqual(client.Run('echo hi'), ('hi\n', '', 0))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,127 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.resource_journal."""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from perfkitbenchmarker import context
+from perfkitbenchmarker import resource
+from perfkitbenchmarker import resource_journal
+
+
+class FakeResource(resource.BaseResource):
+
+  def __init__(self, name, attached_to=None):
+    super(FakeResource, self).__init__()
+    self.name = name
+    self.id = None
+    self.attached_to = attached_to
+    self.deleted = False
+    self.interrupt_create = False
+
+  def _Create(self):
+    if self.interrupt_create:
+      raise KeyboardInterrupt()
+    self.id = 'id-' + self.name
+
+  def _Delete(self):
+    self.deleted = True
+
+
+class FakeSpec(object):
+
+  def __init__(self, resources, journal):
+    self.resources = resources
+    self.resource_journal = journal
+
+
+class ResourceJournalTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.journal = resource_journal.ResourceJournal(
+        os.path.join(self.directory, 'journal'))
+    self.vm = FakeResource('vm')
+    self.spec = FakeSpec([self.vm], self.journal)
+    p = mock.patch.object(context, 'GetThreadBenchmarkSpec',
+                          return_value=self.spec)
+    p.start()
+    self.addCleanup(p.stop)
+    # The snapshot the journal applies to.
+    self.snapshot = pickle.dumps(self.spec, 2)
+
+  def _Restore(self):
+    spec = pickle.loads(self.snapshot)
+    return spec, spec.resource_journal.Replay(spec)
+
+  def testReplayUpdatesSnapshotResources(self):
+    self.vm.Create()
+    spec, recovered = self._Restore()
+    self.assertEqual(recovered, [])
+    self.assertTrue(spec.resources[0].created)
+    self.assertEqual(spec.resources[0].id, 'id-vm')
+
+  def testReplayRecoversNewResources(self):
+    self.vm.Create()
+    disk = FakeResource('disk', attached_to=self.vm)
+    disk.Create()
+    deleted_disk = FakeResource('deleted')
+    deleted_disk.Create()
+    deleted_disk.Delete()
+    spec, recovered = self._Restore()
+    self.assertEqual([r.name for r in recovered], ['disk'])
+    self.assertEqual(recovered[0].id, 'id-disk')
+    # References to other resources are restored, not copied.
+    self.assertIs(recovered[0].attached_to, spec.resources[0])
+
+  def testInterruptedCreationIsRecovered(self):
+    disk = FakeResource('disk')
+    disk.interrupt_create = True
+    with self.assertRaises(KeyboardInterrupt):
+      disk.Create()
+    _, recovered = self._Restore()
+    self.assertEqual([r.name for r in recovered], ['disk'])
+    self.assertFalse(recovered[0].created)
+
+  def testTruncatedRecordIgnored(self):
+    self.vm.Create()
+    size = os.path.getsize(self.journal.path)
+    FakeResource('disk').Create()
+    with open(self.journal.path, 'r+b') as journal_file:
+      journal_file.truncate(size + 10)
+    spec, recovered = self._Restore()
+    self.assertEqual(recovered, [])
+    self.assertEqual(spec.resources[0].id, 'id-vm')
+
+  def testTruncate(self):
+    self.vm.Create()
+    self.journal.Truncate()
+    spec, _ = self._Restore()
+    self.assertFalse(spec.resources[0].created)
+
+  def testNoJournal(self):
+    self.spec.resource_journal = None
+    self.vm.Create()
+    self.assertFalse(os.path.exists(self.journal.path))
+
+
+if __name__ == '__main__':
+  unittest.main()
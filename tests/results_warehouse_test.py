@@ -0,0 +1,110 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.results_warehouse."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from perfkitbenchmarker import publisher
+from perfkitbenchmarker import results_warehouse
+
+
+def _Sample(uri, timestamp, value, test='fio', metric='Throughput',
+            run_uri='run1', **metadata):
+  return {'sample_uri': uri, 'timestamp': timestamp, 'test': test,
+          'metric': metric, 'value': value, 'unit': 'MB/s',
+          'run_uri': run_uri, 'product_name': 'PerfKitBenchmarker',
+          'official': False, 'owner': 'me', 'metadata': metadata}
+
+
+class ResultsWarehouseTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.path = os.path.join(self.directory, 'results.db')
+    self.warehouse = results_warehouse.ResultsWarehouse(self.path)
+    self.addCleanup(self.warehouse.Close)
+    self.warehouse.AddSamples([
+        _Sample('a', 100, 1.0, machine_type='small'),
+        _Sample('b', 200, 3.0, machine_type='small', run_uri='run2'),
+        _Sample('c', 300, 10.0, machine_type='large', zone='z1'),
+        _Sample('d', 400, 5.0, test='iperf', metric='Latency')])
+
+  def testAggregateGroupedByLabel(self):
+    rows = self.warehouse.Aggregate(
+        ('count', 'mean', 'max'), group_by=('label:machine_type',),
+        metric='Throughput')
+    self.assertEqual(rows, [
+        {'label:machine_type': 'large', 'count': 1, 'mean': 10.0,
+         'max': 10.0},
+        {'label:machine_type': 'small', 'count': 2, 'mean': 2.0,
+         'max': 3.0}])
+
+  def testAggregateFilters(self):
+    rows = self.warehouse.Aggregate(
+        ('count', 'sum'), group_by=('test',), start_time=150, end_time=400)
+    self.assertEqual(rows, [{'test': 'fio', 'count': 2, 'sum': 13.0}])
+    rows = self.warehouse.Aggregate(('count',),
+                                    labels={'machine_type': 'small'})
+    self.assertEqual(rows, [{'count': 2}])
+    rows = self.warehouse.Aggregate(('count',), run_uri='run2')
+    self.assertEqual(rows, [{'count': 1}])
+
+  def testAggregateRejectsUnknownColumns(self):
+    with self.assertRaises(ValueError):
+      self.warehouse.Aggregate(('count',), group_by=('value; DROP',))
+    with self.assertRaises(ValueError):
+      self.warehouse.Aggregate(('median',))
+
+  def testGetSamples(self):
+    samples = self.warehouse.GetSamples(metric='Throughput',
+                                        labels={'zone': 'z1'})
+    self.assertEqual(len(samples), 1)
+    self.assertEqual(samples[0]['sample_uri'], 'c')
+    self.assertEqual(samples[0]['metadata'],
+                     {'machine_type': 'large', 'zone': 'z1'})
+
+  def testAddSamplesSkipsDuplicates(self):
+    self.assertEqual(self.warehouse.AddSamples(
+        [_Sample('a', 100, 1.0), _Sample('e', 500, 2.0)]), 1)
+    self.assertEqual(self.warehouse.Aggregate(('count',)), [{'count': 5}])
+
+  def testRepublishJSONSamples(self):
+    json_path = os.path.join(self.directory, 'results.json')
+    json_publisher = publisher.NewlineDelimitedJSONPublisher(json_path)
+    json_publisher.PublishSamples([_Sample('e', 500, 7.0, machine_type='xl')])
+    sqlite_publisher = publisher.SQLitePublisher(self.path)
+    with mock.patch.object(publisher.SampleCollector, '_PublishersFromFlags',
+                           return_value=[sqlite_publisher]):
+      publisher.RepublishJSONSamples([json_path])
+    samples = self.warehouse.GetSamples(run_uri='run1', start_time=500)
+    self.assertEqual(samples[0]['metadata'], {'machine_type': 'xl'})
+
+  def testCommandLine(self):
+    json_path = os.path.join(self.directory, 'results.json')
+    with open(json_path, 'w') as json_file:
+      json_file.write(json.dumps(_Sample('e', 500, 7.0)) + '\n')
+    self.assertEqual(
+        results_warehouse.main([self.path, 'import', json_path]), 0)
+    self.assertEqual(self.warehouse.Aggregate(('count',)), [{'count': 5}])
+
+
+if __name__ == '__main__':
+  unittest.main()
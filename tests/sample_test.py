@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import random
 import unittest
 
+import numpy as np
+
 from perfkitbenchmarker import sample
 
 
@@ -45,6 +48,30 @@ class TestPercentileCalculator(unittest.TestCase):
     # 4 percentiles we requested, plus average and stddev
     self.assertEqual(len(percentiles), 6)
 
+  def testMatchesSortedSelection(self):
+    rng = random.Random(0)
+    numbers = [rng.expovariate(1.0) for _ in range(999)]
+    numbers_sorted = sorted(numbers)
+    percentiles = sample.PercentileCalculator(numbers)
+
+    for percentile in sample.PERCENTILES_LIST:
+      index = int(len(numbers) * percentile / 100.0)
+      self.assertEqual(percentiles['p%s' % percentile], numbers_sorted[index])
+    self.assertAlmostEqual(percentiles['average'], np.mean(numbers))
+    self.assertAlmostEqual(percentiles['stddev'], np.std(numbers, ddof=1))
+
+  def testNumpyArray(self):
+    numbers = np.arange(1001)
+    percentiles = sample.PercentileCalculator(numbers, percentiles=[1, 100])
+
+    self.assertEqual(percentiles, {'p1': 10, 'p100': 1000, 'average': 500.0,
+                                   'stddev': np.std(numbers, ddof=1)})
+    self.assertIs(type(percentiles['p1']), int)
+
+  def testSingleNumber(self):
+    self.assertEqual(sample.PercentileCalculator([3], percentiles=[50]),
+                     {'p50': 3, 'average': 3.0, 'stddev': 0})
+
   def testNoNumbers(self):
     with self.assertRaises(ValueError):
       sample.PercentileCalculator([], percentiles=[0, 1, 99])
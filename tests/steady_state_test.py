@@ -0,0 +1,125 @@
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.steady_state."""
+
+import unittest
+
+import numpy as np
+
+from perfkitbenchmarker import steady_state
+
+
+def _WarmUpSeries(seed=0):
+  """A 20 interval ramp, 100 steady intervals and a 10 interval tail-off."""
+  noise = np.random.RandomState(seed).normal(0, 20, 100)
+  return np.concatenate([np.linspace(100, 1000, 20), 1000 + noise,
+                         np.linspace(1000, 200, 10)])
+
+
+class RollingCvTestCase(unittest.TestCase):
+
+  def testMatchesDirectComputation(self):
+    values = np.random.RandomState(1).lognormal(10, 1, 50)
+    expected = [np.std(values[i:i + 5], ddof=1) / np.mean(values[i:i + 5])
+                for i in range(46)]
+    np.testing.assert_allclose(expected, steady_state.RollingCv(values, 5))
+
+  def testZeroMean(self):
+    np.testing.assert_allclose([np.inf, 2 ** 0.5],
+                               steady_state.RollingCv([0, 0, 2], 2))
+
+  def testTooShort(self):
+    self.assertEqual(0, len(steady_state.RollingCv([1, 2], 3)))
+
+
+class FindChangePointsTestCase(unittest.TestCase):
+
+  def testStep(self):
+    noise = np.random.RandomState(0).normal(0, 10, 80)
+    values = np.concatenate([np.full(30, 500.0), np.full(50, 1000.0)]) + noise
+    self.assertEqual([30], steady_state.FindChangePoints(values))
+
+  def testNoChange(self):
+    values = 1000 + np.random.RandomState(0).normal(0, 50, 200)
+    self.assertEqual([], steady_state.FindChangePoints(values))
+
+  def testIgnoresSmallShifts(self):
+    values = np.concatenate([np.full(30, 1000.0), np.full(30, 1010.0)])
+    self.assertEqual([], steady_state.FindChangePoints(values))
+    self.assertEqual([30], steady_state.FindChangePoints(values,
+                                                         min_shift=0.001))
+
+
+class FindSteadyStateTestCase(unittest.TestCase):
+
+  def testTrimsWarmUpAndTailOff(self):
+    state = steady_state.FindSteadyState(_WarmUpSeries())
+    self.assertGreaterEqual(state.start, 15)
+    self.assertLessEqual(state.start, 20)
+    self.assertEqual(120, state.end)
+    self.assertAlmostEqual(1000, state.mean, delta=10)
+    self.assertLess(state.cv, 0.05)
+
+  def testSteadyThroughout(self):
+    values = 1000 + np.random.RandomState(0).normal(0, 20, 60)
+    self.assertEqual((0, 60),
+                     steady_state.FindSteadyState(values)[:2])
+
+  def testNeverSteady(self):
+    values = 1000 + np.random.RandomState(0).normal(0, 300, 60)
+    self.assertIsNone(steady_state.FindSteadyState(values))
+    self.assertIsNone(steady_state.FindSteadyState([1, 2, 3]))
+
+
+class SteadyStateMonitorTestCase(unittest.TestCase):
+
+  def testSignalsOnceSteadyForLongEnough(self):
+    monitor = steady_state.SteadyStateMonitor(30)
+    steady = [monitor.Add(value) for value in _WarmUpSeries()]
+    first = steady.index(True)
+    # Steady from about interval 18, so 30 intervals later.
+    self.assertGreaterEqual(first, 45)
+    self.assertLessEqual(first, 50)
+    self.assertFalse(steady[-1])
+
+  def testRequiresAtLeastOneWindow(self):
+    monitor = steady_state.SteadyStateMonitor(1, window=3)
+    self.assertEqual([False, False, True],
+                     [monitor.Add(value) for value in [5, 5, 5]])
+
+
+class CreateSamplesTestCase(unittest.TestCase):
+
+  def testCreateSamples(self):
+    samples = steady_state.CreateSamples(
+        'tps', steady_state.SteadyState(5, 25, 100.0, 2.0, 0.02), 30, 2,
+        'NA', {'key': 'value'})
+    self.assertEqual(
+        [('tps steady state average', 100.0, 'NA'),
+         ('tps steady state stddev', 2.0, 'NA'),
+         ('tps steady state cv', 0.02, ''),
+         ('tps steady state start', 10, 'seconds'),
+         ('tps steady state duration', 40, 'seconds')],
+        [(s.metric, s.value, s.unit) for s in samples])
+    self.assertEqual({'key': 'value', 'steady_state_start_index': 5,
+                      'steady_state_end_index': 25, 'num_intervals': 30,
+                      'interval_sec': 2}, samples[0].metadata)
+
+  def testNoSteadyState(self):
+    self.assertEqual([], steady_state.CreateSamples('tps', None, 30, 2, 'NA',
+                                                    {}))
+
+
+if __name__ == '__main__':
+  unittest.main()
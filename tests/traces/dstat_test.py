@@ -14,9 +14,16 @@
 """Tests for perfkitbenchmarker.traces.dstat"""
 
 import os
+import shutil
+import tempfile
 import unittest
 
+import mock
+import numpy as np
+
+from perfkitbenchmarker import errors
 from perfkitbenchmarker import events
+from perfkitbenchmarker.linux_packages import dstat as dstat_package
 from perfkitbenchmarker.sample import Sample
 from perfkitbenchmarker.traces import dstat
 
@@ -29,6 +36,8 @@ class DstatTestCase(unittest.TestCase):
     path = os.path.join(directory, 'dstat-result.csv')
     self.collector = dstat._DStatCollector(output_directory=directory)
     self.collector._role_mapping['test_vm0'] = path
+    with open(path) as f:
+      self.labels, self.data = dstat_package.ParseCsvFile(f)
     events.TracingEvent.events = []
     self.samples = []
 
@@ -101,6 +110,98 @@ class DstatTestCase(unittest.TestCase):
     self.assertEqual(
         expected.metadata, self.samples[0].metadata)
 
+  def testAnalyzeOverlappingEvents(self):
+    # Added out of order; each event's average only covers its own rows.
+    events.AddEvent('sender', 'late', 1475708800, 1475709000, {})
+    events.AddEvent('sender', 'early', 1475708690, 1475708900, {})
+    self.collector.Analyze('testSender', None, self.samples)
+    for event, start, end in (('early', 1475708690, 1475708900),
+                              ('late', 1475708800, 1475709000)):
+      rows = self.data[(self.data[:, 0] > start) & (self.data[:, 0] < end)]
+      values = [s.value for s in self.samples
+                if s.metadata['event'] == event]
+      np.testing.assert_allclose(rows[:, 1:].mean(axis=0), values)
+
+  def testAnalyzeStatistics(self):
+    self.collector.statistics = ['min', 'max', 'p50']
+    events.AddEvent('sender', 'event', 1475708693, 1475709076, {})
+    self.collector.Analyze('testSender', None, self.samples)
+    self.assertEqual(61 * 4, len(self.samples))
+    values = {s.metric: s.value for s in self.samples}
+    rows = self.data[(self.data[:, 0] > 1475708693) &
+                     (self.data[:, 0] < 1475709076)]
+    column = rows[:, self.labels.index('csw__system')]
+    self.assertEqual(column.min(), values['csw__system min'])
+    self.assertEqual(column.max(), values['csw__system max'])
+    # Nearest-rank median.
+    median = np.sort(column)[(len(column) + 1) // 2 - 1]
+    self.assertLessEqual(values['csw__system p50'], median)
+    self.assertGreater(values['csw__system p50'], median * 0.99)
+
+
+class DstatStreamTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.path = os.path.join(os.path.dirname(__file__), '..', 'data',
+                             'dstat-result.csv')
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.vm = mock.MagicMock(num_cpus=1)
+    self.vm.name = 'vm0'
+    self.vm.RemoteCommand.side_effect = self._RemoteCommand
+    self.stream_error = None
+    self.spec = mock.MagicMock(vms=[self.vm], vm_groups={'default': [self.vm]},
+                               uid='uid')
+    events.TracingEvent.events = []
+    self.samples = []
+
+  def _RemoteCommand(self, cmd, line_callback=None, **kwargs):
+    if cmd.startswith('lsblk'):
+      return 'sda\n', ''
+    if cmd.startswith('dstat'):
+      return '1234\n', ''
+    if line_callback:
+      self.assertIn('--pid=1234', cmd)
+      if self.stream_error:
+        raise self.stream_error
+      with open(self.path) as f:
+        for line in f:
+          line_callback(line)
+    return '', ''
+
+  def _Run(self):
+    collector = dstat._DStatCollector(output_directory=self.directory,
+                                      stream=True)
+    collector.Start('testSender', self.spec)
+    collector.Stop('testSender', self.spec)
+    return collector
+
+  def testStreamWritesOutputFile(self):
+    collector = self._Run()
+    self.assertFalse(self.vm.PullFile.called)
+    dstat_file = collector._role_mapping['default_0']
+    with open(os.path.join(self.directory,
+                           os.path.basename(dstat_file))) as f:
+      streamed = f.read()
+    with open(self.path) as f:
+      self.assertEqual(f.read(), streamed)
+
+  def testAnalyzeStreamedRows(self):
+    collector = self._Run()
+    events.AddEvent('sender', 'event', 1475708693, 1475709076, {})
+    collector.Analyze('testSender', None, self.samples)
+    values = {s.metric: s.value for s in self.samples
+              if s.metadata['event'] == 'event'}
+    self.assertEqual(61, len(values))
+    self.assertEqual(10.063689295039159, values['usr__total cpu usage'])
+    self.assertEqual('default_0', self.samples[0].metadata['vm_role'])
+
+  def testFailedStreamPullsFile(self):
+    self.stream_error = errors.VirtualMachine.RemoteCommandError('lost')
+    collector = self._Run()
+    self.vm.PullFile.assert_called_once_with(
+        self.directory, collector._role_mapping['default_0'])
+
 
 if __name__ == '__main__':
   unittest.main()
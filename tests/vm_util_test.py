@@ -16,13 +16,12 @@
 
 import os
 import psutil
-import subprocess
-import threading
 import time
 import unittest
 
 import mock
 
+from perfkitbenchmarker import command_engine
 from perfkitbenchmarker import vm_util
 
 
@@ -76,48 +75,30 @@ def HaveSleepSubprocess():
   """Checks if the current process has a sleep subprocess."""
 
   for child in psutil.Process(os.getpid()).children(recursive=True):
-    if 'sleep' in child.cmdline():
-      return True
+    try:
+      if 'sleep' in child.cmdline():
+        return True
+    except psutil.NoSuchProcess:
+      # The child exited, and may be a zombie until it is reaped.
+      pass
   return False
 
 
-class WaitUntilSleepTimer(threading.Thread):
-  """Timer that waits for a sleep subprocess to appear.
+def WaitUntilNoSleepSubprocess(timeout=5):
+  """Returns whether the sleep subprocesses are gone before a timeout."""
+  end_time = time.time() + timeout
+  while HaveSleepSubprocess():
+    if time.time() > end_time:
+      return False
+    time.sleep(0.01)
+  return True
 
-  This is intended for specific tests that want to trigger timer
-  expiry as soon as it detects that a subprocess is executing a
-  "sleep" command.
 
-  It assumes that the test driver is not parallelizing the tests using
-  this method since that may lead to inconsistent results.
-  TODO(klausw): If that's an issue, could add a unique fractional part
-  to the sleep command args to distinguish them.
-  """
-  def __init__(self, interval, function):
-    threading.Thread.__init__(self)
-    self.end_time = time.time() + interval
-    self.function = function
-    self.finished = threading.Event()
-    self.have_sleep = threading.Event()
-
-    def WaitForSleep():
-      while not self.finished.is_set():
-        if HaveSleepSubprocess():
-          self.have_sleep.set()
-          break
-        time.sleep(0)  # yield to other Python threads
-
-    threading.Thread(target=WaitForSleep).run()
-
-  def cancel(self):
-    self.finished.set()
-
-  def run(self):
-    while time.time() < self.end_time and not self.have_sleep.is_set():
-      time.sleep(0)  # yield to other Python threads
-    if not self.finished.is_set():
-      self.function()
-    self.finished.set()
+def InterruptWhenSleeping():
+  """Raises KeyboardInterrupt once a sleep subprocess is running."""
+  while not HaveSleepSubprocess():
+    time.sleep(0.01)
+  raise KeyboardInterrupt()
 
 
 class IssueCommandTestCase(unittest.TestCase):
@@ -126,7 +107,6 @@ class IssueCommandTestCase(unittest.TestCase):
     _, _, retcode = vm_util.IssueCommand(['sleep', '0s'])
     self.assertEqual(retcode, 0)
 
-  @mock.patch('threading.Timer', new=WaitUntilSleepTimer)
   def testTimeoutReached(self):
     _, _, retcode = vm_util.IssueCommand(['sleep', '2s'], timeout=1)
     self.assertEqual(retcode, -9)
@@ -136,12 +116,62 @@ class IssueCommandTestCase(unittest.TestCase):
     _, _, retcode = vm_util.IssueCommand(['sleep', '0s'], timeout=None)
     self.assertEqual(retcode, 0)
 
+  def testLineCallback(self):
+    lines = []
+    stdout, _, retcode = vm_util.IssueCommand(['printf', 'a\\nb\\n'],
+                                              line_callback=lines.append)
+    self.assertEqual(retcode, 0)
+    self.assertEqual(stdout, '')
+    self.assertEqual(lines, ['a\n', 'b\n'])
+
   def testNoTimeout_ExceptionRaised(self):
-    with mock.patch('subprocess.Popen', spec=subprocess.Popen) as mock_popen:
-      mock_popen.return_value.wait.side_effect = KeyboardInterrupt()
+    with mock.patch(command_engine.__name__ + '.Waiter.Wait',
+                    side_effect=InterruptWhenSleeping):
       with self.assertRaises(KeyboardInterrupt):
-        vm_util.IssueCommand(['sleep', '2s'], timeout=None)
-    self.assertFalse(HaveSleepSubprocess())
+        vm_util.IssueCommand(['sleep', '10s'], timeout=None)
+    self.assertTrue(WaitUntilNoSleepSubprocess())
+
+  def testLineCallback_ExceptionRaised(self):
+    def Callback(unused_line):
+      raise ValueError()
+    with self.assertRaises(ValueError):
+      vm_util.IssueCommand(['sh', '-c', 'echo a; exec sleep 10s'],
+                           line_callback=Callback)
+    self.assertTrue(WaitUntilNoSleepSubprocess())
+
+
+class GetSshOptionsTestCase(unittest.TestCase):
+
+  def setUp(self):
+    p = mock.patch(vm_util.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.ssh_options = []
+    self.flags.ssh_control_persist = 30
+    p = mock.patch(vm_util.__name__ + '.temp_dir.GetSshConnectionsDir',
+                   return_value='/tmp/pkb-ssh')
+    p.start()
+    self.addCleanup(p.stop)
+
+  @mock.patch(vm_util.__name__ + '.RunningOnWindows', return_value=False)
+  def testReuseConnections(self, _):
+    self.flags.ssh_reuse_connections = True
+    options = vm_util.GetSshOptions('key')
+    self.assertIn('ControlMaster=auto', options)
+    self.assertIn('ControlPath=/tmp/pkb-ssh/%C', options)
+    self.assertIn('ControlPersist=30m', options)
+
+  @mock.patch(vm_util.__name__ + '.RunningOnWindows', return_value=False)
+  def testNoReuseConnections(self, _):
+    self.flags.ssh_reuse_connections = False
+    options = vm_util.GetSshOptions('key')
+    self.assertFalse(any(o.startswith('Control') for o in options))
+
+  @mock.patch(vm_util.__name__ + '.RunningOnWindows', return_value=True)
+  def testReuseConnectionsOnWindows(self, _):
+    self.flags.ssh_reuse_connections = True
+    options = vm_util.GetSshOptions('key')
+    self.assertFalse(any(o.startswith('Control') for o in options))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Micro-benchmark for the write payloads of the object storage API tests.
+
+Compares the time to set up the payload of an object with the payload pool,
+both when the pool has to grow and when it already holds enough data, against
+the previous implementation, which chose each byte with random.choice.
+"""
+
+import argparse
+import cStringIO
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.append(os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir, 'perfkitbenchmarker',
+    'scripts', 'object_storage_api_test_scripts'))
+
+import object_storage_api_tests  # noqa
+
+
+def _LegacyGenerateWritePayload(size):
+  payload_bytes = bytearray(size)
+  for i in xrange(size):
+    payload_bytes[i] = ord(random.choice(string.letters))
+  return payload_bytes.decode('ascii')
+
+
+def _Time(function, *args):
+  start = time.time()
+  function(*args)
+  return time.time() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sizes', type=float, nargs='+',
+                      default=[1, 1e3, 1e6, 1e7, 1e8])
+  parser.add_argument('--legacy_max_size', type=float, default=1e7,
+                      help='Skip the legacy timings above this size. The '
+                      'legacy implementation takes minutes at 1e8 bytes.')
+  args = parser.parse_args()
+  print('{0:>10} {1:>12} {2:>12} {3:>12}'.format(
+      'bytes', 'legacy (s)', 'new pool (s)', 'cached (s)'))
+  for size in args.sizes:
+    size = int(size)
+    pool = object_storage_api_tests.PayloadPool()
+    new_time = _Time(pool.GetPayloadHandle, size)
+    cached_time = _Time(pool.GetPayloadHandle, size)
+    legacy_time = float('nan')
+    if size <= args.legacy_max_size:
+      legacy_time = _Time(
+          lambda: cStringIO.StringIO(_LegacyGenerateWritePayload(size)))
+    print('{0:>10} {1:>12.4f} {2:>12.4f} {3:>12.6f}'.format(
+        size, legacy_time, new_time, cached_time))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Micro-benchmark for sample.PercentileCalculator.
+
+Compares the NumPy implementation, given both a list and an array, against the
+previous pure Python implementation, which sorted the whole list and computed
+the stddev with a list comprehension.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from perfkitbenchmarker import sample
+
+
+def _LegacyPercentileCalculator(numbers,
+                                percentiles=sample.PERCENTILES_LIST):
+  numbers_sorted = sorted(numbers)
+  count = len(numbers_sorted)
+  total = sum(numbers_sorted)
+  result = {}
+  for percentile in percentiles:
+    percentile_string = 'p%s' % str(percentile)
+    index = int(count * float(percentile) / 100.0)
+    index = min(index, count - 1)
+    result[percentile_string] = numbers_sorted[index]
+
+  average = total / float(count)
+  result['average'] = average
+  if count > 1:
+    total_of_squares = sum([(i - average) ** 2 for i in numbers])
+    result['stddev'] = (total_of_squares / (count - 1)) ** 0.5
+  else:
+    result['stddev'] = 0
+  return result
+
+
+def _Time(function, *args):
+  start = time.time()
+  result = function(*args)
+  return time.time() - start, result
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sizes', type=float, nargs='+',
+                      default=[1e3, 1e4, 1e5, 1e6, 1e7])
+  parser.add_argument('--legacy_max_size', type=float, default=1e7,
+                      help='Skip the list and legacy timings above this size. '
+                      'The legacy implementation needs several GB of memory '
+                      'and minutes at 1e8 elements.')
+  args = parser.parse_args()
+  random_state = np.random.RandomState(0)
+  print('{0:>10} {1:>12} {2:>12} {3:>12}'.format(
+      'elements', 'legacy (s)', 'list (s)', 'array (s)'))
+  for size in args.sizes:
+    size = int(size)
+    # Latency-like data: positive and heavily skewed.
+    numbers = random_state.lognormal(0, 1, size)
+    array_time, array_result = _Time(sample.PercentileCalculator, numbers)
+    legacy_time = list_time = float('nan')
+    if size <= args.legacy_max_size:
+      number_list = numbers.tolist()
+      list_time, list_result = _Time(sample.PercentileCalculator, number_list)
+      legacy_time, legacy_result = _Time(_LegacyPercentileCalculator,
+                                         number_list)
+      for key, value in legacy_result.iteritems():
+        assert np.isclose(value, list_result[key]), key
+        assert np.isclose(value, array_result[key]), key
+    print('{0:>10} {1:>12.4f} {2:>12.4f} {3:>12.4f}'.format(
+        size, legacy_time, list_time, array_time))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Micro-benchmark for PKB startup time.
+
+Times, each in a new Python process:
+
+  lazy: importing pkb, which imports benchmark and package modules on demand
+      (see perfkitbenchmarker/module_index.py).
+  eager: importing pkb and then every indexed module, as pkb used to.
+  helpmatch: running pkb.py --helpmatch=benchmarks.fio.
+
+With --profile, instead prints the modules that take longest to import, in
+this process.
+"""
+
+import __builtin__
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+_LAZY = 'from perfkitbenchmarker import pkb'
+_EAGER = _LAZY + '; from perfkitbenchmarker import module_index; ' \
+    'module_index.LoadModules()'
+
+
+def _TimeProcess(args, repeats):
+  """Returns the run times of a command, in seconds."""
+  times = []
+  with open(os.devnull, 'w') as devnull:
+    for _ in xrange(repeats):
+      start = time.time()
+      subprocess.check_call(args, stdout=devnull)
+      times.append(time.time() - start)
+  return sorted(times)
+
+
+class _ImportProfiler(object):
+  """Measures the time spent importing each module.
+
+  Attributes:
+    cumulative: dict mapping module name to the seconds its import took,
+        including the modules it imported.
+    own: dict mapping module name to the seconds its import took, excluding
+        the modules it imported.
+  """
+
+  def __init__(self):
+    self.cumulative = {}
+    self.own = {}
+    self._stack = []
+    self._import = __builtin__.__import__
+
+  def _Import(self, name, globals=None, locals=None, fromlist=None,
+              level=-1):
+    # 'from package import module' imports 'package' with a fromlist.
+    targets = [name] + ['{0}.{1}'.format(name, item)
+                        for item in fromlist or () if item != '*']
+    new_targets = [target for target in targets if target not in sys.modules]
+    if not new_targets:
+      return self._import(name, globals, locals, fromlist, level)
+    self._stack.append(0.0)
+    start = time.time()
+    try:
+      return self._import(name, globals, locals, fromlist, level)
+    finally:
+      elapsed = time.time() - start
+      nested = self._stack.pop()
+      if self._stack:
+        self._stack[-1] += elapsed
+      key = ', '.join(target for target in new_targets
+                      if sys.modules.get(target)) or name
+      self.cumulative[key] = self.cumulative.get(key, 0.0) + elapsed
+      self.own[key] = self.own.get(key, 0.0) + elapsed - nested
+
+  def __enter__(self):
+    __builtin__.__import__ = self._Import
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    __builtin__.__import__ = self._import
+
+
+def _PrintProfile(statement, top):
+  with _ImportProfiler() as profiler:
+    start = time.time()
+    exec statement in {}
+    total = time.time() - start
+  print('Importing took {0:.3f} s: {1}'.format(total, statement))
+  print('{0:>10} {1:>10}  {2}'.format('own (s)', 'total (s)', 'module'))
+  for name in sorted(profiler.own, key=profiler.own.get, reverse=True)[:top]:
+    print('{0:>10.4f} {1:>10.4f}  {2}'.format(
+        profiler.own[name], profiler.cumulative[name], name))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--repeats', type=int, default=5)
+  parser.add_argument('--profile', choices=['lazy', 'eager'],
+                      help='Print an import-time profile of importing pkb, '
+                      'lazily or eagerly.')
+  parser.add_argument('--top', type=int, default=30,
+                      help='Number of modules in the import-time profile.')
+  args = parser.parse_args()
+  if args.profile:
+    _PrintProfile(_LAZY if args.profile == 'lazy' else _EAGER, args.top)
+    return
+  commands = [
+      ('lazy', [sys.executable, '-c', _LAZY]),
+      ('eager', [sys.executable, '-c', _EAGER]),
+      ('helpmatch', [sys.executable, 'pkb.py', '--helpmatch=benchmarks.fio']),
+  ]
+  print('{0:>10} {1:>10} {2:>10}'.format('startup', 'min (s)', 'median (s)'))
+  for name, command in commands:
+    times = _TimeProcess(command, args.repeats)
+    print('{0:>10} {1:>10.3f} {2:>10.3f}'.format(
+        name, times[0], times[len(times) // 2]))
+
+
+if __name__ == '__main__':
+  main()
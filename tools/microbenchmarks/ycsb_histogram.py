@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+# Copyright 2017 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Micro-benchmark for combining YCSB histograms and computing percentiles.
+
+Compares histogram.Histogram, which YCSB results are parsed into, against the
+previous list-of-tuples implementation, which merged histograms through dicts
+and re-sorted the keys for every client, then re-summed the histogram once per
+percentile.
+"""
+
+import argparse
+import bisect
+import time
+
+import numpy as np
+
+from perfkitbenchmarker import histogram
+from perfkitbenchmarker.linux_packages import ycsb
+
+
+def _LegacyCombine(hist1, hist2):
+  h1 = dict(hist1)
+  h2 = dict(hist2)
+  keys = sorted(frozenset(h1) | frozenset(h2))
+  return [(k, h1.get(k, 0) + h2.get(k, 0)) for k in keys]
+
+
+def _LegacyWeightedQuantile(x, weights, p):
+  target = sum(weights) * float(p)
+  cumulative = list(_LegacyCumulativeSum(weights))
+  i = bisect.bisect_left(cumulative, target)
+  return x[-1] if i == len(x) else x[i]
+
+
+def _LegacyCumulativeSum(xs):
+  total = 0
+  for x in xs:
+    total += x
+    yield total
+
+
+def _LegacyPercentiles(hist, percentiles):
+  hist = sorted(hist)
+  result = []
+  for percentile in percentiles:
+    latencies, freqs = zip(*hist)
+    result.append(_LegacyWeightedQuantile(latencies, freqs, percentile * 0.01))
+  return result
+
+
+def _MakeClientHistograms(num_buckets, num_clients, seed=0):
+  """Returns synthetic per-client histograms as lists of (ms, count) pairs."""
+  random_state = np.random.RandomState(seed)
+  histograms = []
+  for _ in xrange(num_clients):
+    counts = random_state.poisson(5, num_buckets)
+    buckets = np.flatnonzero(counts)
+    histograms.append(zip(buckets.tolist(), counts[buckets].tolist()))
+  return histograms
+
+
+def _Time(function, *args):
+  start = time.time()
+  result = function(*args)
+  return time.time() - start, result
+
+
+def _RunLegacy(histograms, percentiles):
+  combined = histograms[0]
+  for hist in histograms[1:]:
+    combined = _LegacyCombine(combined, hist)
+  return _LegacyPercentiles(combined, percentiles)
+
+
+def _RunCurrent(histograms, percentiles):
+  combined = histogram.Histogram.FromPairs(histograms[0])
+  for hist in histograms[1:]:
+    combined.Merge(histogram.Histogram.FromPairs(hist))
+  return list(combined.Percentiles(percentiles))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--buckets', type=int, nargs='+',
+                      default=[1000, 100000, 1000000])
+  parser.add_argument('--clients', type=int, default=16)
+  parser.add_argument('--skip_legacy', action='store_true',
+                      help='Only time the current implementation.')
+  args = parser.parse_args()
+  percentiles = ycsb._DEFAULT_PERCENTILES
+  print('{0:>10} {1:>8} {2:>12} {3:>12}'.format(
+      'buckets', 'clients', 'legacy (s)', 'current (s)'))
+  for num_buckets in args.buckets:
+    histograms = _MakeClientHistograms(num_buckets, args.clients)
+    current_time, current = _Time(_RunCurrent, histograms, percentiles)
+    if args.skip_legacy:
+      legacy_time = float('nan')
+    else:
+      legacy_time, legacy = _Time(_RunLegacy, histograms, percentiles)
+      assert legacy == current, (legacy, current)
+    print('{0:>10} {1:>8} {2:>12.4f} {3:>12.4f}'.format(
+        num_buckets, args.clients, legacy_time, current_time))
+
+
+if __name__ == '__main__':
+  main()
@@ -14,13 +14,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
+"""Plots a timeline of the operations of the object storage benchmark.
+
+Usage:
+  object_storage_timeline.py RESULTS_FILE [RESULTS_FILE ...] FIGURE_FILE
+
+where each RESULTS_FILE is a worker results file written by the multistream
+object storage benchmark with --object_storage_worker_output.
+"""
+
 import numpy as np
 import matplotlib.collections as mplc
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpl_patches
 import sys
 
+from perfkitbenchmarker.linux_benchmarks import object_storage_service_benchmark
+
 
 class DraggableXRange:
   def __init__(self, figure, updater):
@@ -204,61 +214,12 @@ def GenerateObjectTimeline(file_name, start_times, latencies):
   selection.disconnect()
 
 
-def LoadWorkerOutput(output):
-  """Load output from worker processes to our internal format.
-
-  Args:
-    output: list of strings. The stdouts of all worker processes.
-
-  Returns:
-    A tuple of start_time, latency, size. Each of these is a list of
-    numpy arrays, one array per worker process. start_time[i],
-    latency[i], and size[i] together form a table giving the start
-    time, latency, and size (bytes transmitted or received) of all
-    send/receive operations for worker i.
-
-    start_time holds POSIX timestamps, stored as np.float64. latency
-    holds times in seconds, stored as np.float64. size holds sizes in
-    bytes, stored as np.int64.
-
-    Example:
-      start_time[i]  latency[i]  size[i]
-      -------------  ----------  -------
-               0.0         0.5      100
-               1.0         0.7      200
-               2.3         0.3      100
-
-  Raises:
-    AssertionError, if an individual worker doesn't have the same number of
-    start_times, latencies, or sizes.
-  """
-
-  start_times = []
-  latencies = []
-  sizes = []
-
-  for worker_out in output:
-    json_out = json.loads(worker_out)
-
-    for stream in json_out:
-      assert len(stream['start_times']) == len(stream['latencies'])
-      assert len(stream['latencies']) == len(stream['sizes'])
-
-      start_times.append(np.asarray(stream['start_times'], dtype=np.float64))
-      latencies.append(np.asarray(stream['latencies'], dtype=np.float64))
-      sizes.append(np.asarray(stream['sizes'], dtype=np.int64))
-
-  return start_times, latencies, sizes
-
-
 def main():
-  worker_output = None
   print("Reading worker output")
-  with open(sys.argv[1], 'r') as worker_out_file:
-    worker_output = json.loads(worker_out_file.read())
-  print("Parsing worker output")
-  start_times, latencies, _ = LoadWorkerOutput(worker_output)
-  GenerateObjectTimeline(sys.argv[2], start_times, latencies)
+  start_times, latencies, _ = (
+      object_storage_service_benchmark.LoadColumnarWorkerOutput(
+          sys.argv[1:-1]))
+  GenerateObjectTimeline(sys.argv[-1], start_times, latencies)
 
 ########################################
 